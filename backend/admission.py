@@ -0,0 +1,281 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Set
+
+from .timeframes import timeframe_ms, DERIVED_TIMEFRAMES
+
+logger = logging.getLogger(__name__)
+
+# Cheap syntactic filter before any lookup ("BTC", "BTC/USDT", "1000PEPE")
+SYMBOL_PATTERN = re.compile(r"^[A-Z0-9]{1,20}(/[A-Z0-9:]{1,20})?$")
+
+
+class AdmissionError(Exception):
+    """
+    A request that is refused before it reaches the exchange.
+    404: unknown symbol/timeframe, 503: too many cold fetches in flight.
+    """
+    def __init__(self, status_code: int, detail: str, retry_after: Optional[int] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class KeyedLocks:
+    """
+    asyncio.Lock per key with a bounded table: least recently used locks that
+    are not held are dropped (a fresh lock is created on the next use).
+    """
+    def __init__(self, max_size: int = 2048):
+        self.max_size = max_size
+        self.locks: "OrderedDict[str, asyncio.Lock]" = OrderedDict()
+
+    def __getitem__(self, key: str) -> asyncio.Lock:
+        lock = self.locks.get(key)
+        if lock is None:
+            lock = self.locks[key] = asyncio.Lock()
+            if len(self.locks) > self.max_size:
+                self._evict()
+        else:
+            self.locks.move_to_end(key)
+        return lock
+
+    def _evict(self):
+        for key in list(self.locks):
+            if len(self.locks) <= self.max_size:
+                break
+            # Held locks (and therefore their waiters) stay
+            if not self.locks[key].locked():
+                del self.locks[key]
+
+    def __len__(self):
+        return len(self.locks)
+
+
+class AdmissionController:
+    """
+    Guards the upstream budget against arbitrary symbol/timeframe requests.
+
+    - Registry: listed symbols/timeframes per exchange, from the exchange's
+      market metadata (cached in DATA_DIR/markets.json, refreshed by the
+      ingestion leader). Without a registry, symbols are admitted (fail open).
+    - Negative cache: pairs that turned out to have no data are refused for a while.
+    - Cold fetches (cache misses that go upstream) share a small semaphore with
+      a bounded queue; identical in-flight fetches are coalesced. When the
+      queue is full or the wait times out, callers get a fast 503.
+    """
+    MAX_COLD_FETCHES = 4      # Concurrent upstream fetches for uncached keys
+    MAX_COLD_QUEUE = 16       # Callers allowed to wait for a slot
+    QUEUE_TIMEOUT = 5.0       # Seconds a queued caller waits before 503
+    NEGATIVE_TTL = 900.0      # Seconds an unlisted pair without data is refused
+    MISS_TTL = 60.0           # Same for listed pairs (likely a transient upstream failure)
+    MAX_NEGATIVE = 10000
+    MARKETS_TTL = 6 * 3600    # Seconds between market metadata refreshes
+    RELOAD_CHECK = 60.0       # Seconds between checks for a newer markets file
+    DEFAULT_TIMEFRAMES = ('1m', '3m', '5m', '15m', '30m', '1h', '2h', '4h', '6h', '8h', '12h', '1d')
+
+    def __init__(self, data_dir: str, symbol_mapper: Callable[[str, str], str]):
+        self.MARKETS_FILE = os.path.join(data_dir, "markets.json")
+        # (exchange_id, symbol) -> exchange market symbol, e.g. ("binance", "BTC") -> "BTC/USDT"
+        self.symbol_mapper = symbol_mapper
+        # { exchange_id: set(market symbols) }, { exchange_id: set(timeframes) }
+        self.markets: Dict[str, Set[str]] = {}
+        self.timeframes: Dict[str, Set[str]] = {}
+        self.fetched_at = 0.0
+        self._file_mtime = 0.0
+        self._last_reload_check = 0.0
+        # { "SYMBOL_TF": expires_at }
+        self.negative: "OrderedDict[str, float]" = OrderedDict()
+        self.semaphore = asyncio.Semaphore(self.MAX_COLD_FETCHES)
+        self.waiting = 0
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"admitted": 0, "coalesced": 0, "rejected_invalid": 0,
+                      "rejected_negative": 0, "rejected_busy": 0, "negative_added": 0}
+        self.load()
+
+    # --- Registry ---
+
+    def load(self):
+        try:
+            mtime = os.path.getmtime(self.MARKETS_FILE)
+        except OSError:
+            return
+        try:
+            with open(self.MARKETS_FILE, 'r') as f:
+                data = json.load(f)
+            self.markets = {ex: set(symbols) for ex, symbols in data.get("markets", {}).items()}
+            self.timeframes = {ex: set(tfs) for ex, tfs in data.get("timeframes", {}).items()}
+            self.fetched_at = float(data.get("fetched_at", 0))
+            self._file_mtime = mtime
+            logger.info(f"Loaded market registry ({sum(map(len, self.markets.values()))} markets)")
+        except Exception as e:
+            logger.error(f"Failed to load market registry: {e}")
+
+    def _maybe_reload(self):
+        # Readers pick up the leader's refreshes without restarting
+        now = time.time()
+        if now - self._last_reload_check < self.RELOAD_CHECK:
+            return
+        self._last_reload_check = now
+        try:
+            if os.path.getmtime(self.MARKETS_FILE) > self._file_mtime:
+                self.load()
+        except OSError:
+            pass
+
+    def needs_refresh(self) -> bool:
+        return time.time() - self.fetched_at > self.MARKETS_TTL
+
+    async def refresh(self, exchanges):
+        """
+        Reloads market metadata from the exchanges (one call each) and caches it on disk.
+        """
+        markets, timeframes = {}, {}
+        for exchange in exchanges:
+            try:
+                loaded = await asyncio.wait_for(exchange.load_markets(), timeout=30.0)
+                markets[exchange.id] = {s for s, m in loaded.items() if m.get('active', True) is not False}
+                timeframes[exchange.id] = set((getattr(exchange, 'timeframes', None) or {}).keys())
+            except Exception as e:
+                logger.error(f"Failed to load markets from {exchange.id}: {e}")
+        if not markets:
+            return
+        self.markets, self.timeframes = markets, timeframes
+        self.fetched_at = time.time()
+        # Pairs refused only for lack of a registry may be listed now
+        self.negative.clear()
+        try:
+            tmp = self.MARKETS_FILE + ".tmp"
+            with open(tmp, 'w') as f:
+                json.dump({
+                    "fetched_at": self.fetched_at,
+                    "markets": {ex: sorted(s) for ex, s in markets.items()},
+                    "timeframes": {ex: sorted(t) for ex, t in timeframes.items()}
+                }, f)
+            os.replace(tmp, self.MARKETS_FILE)
+            self._file_mtime = os.path.getmtime(self.MARKETS_FILE)
+        except Exception as e:
+            logger.error(f"Failed to save market registry: {e}")
+        logger.info(f"Market registry refreshed ({sum(map(len, markets.values()))} markets)")
+
+    def is_listed(self, symbol: str) -> Optional[bool]:
+        """
+        True/False if any exchange lists the symbol, None without a registry.
+        """
+        if not self.markets:
+            return None
+        base = symbol.split('/')[0]
+        for exchange_id, symbols in self.markets.items():
+            if symbol in symbols or self.symbol_mapper(exchange_id, base) in symbols:
+                return True
+        return False
+
+    def valid_timeframe(self, timeframe: str) -> bool:
+        if timeframe_ms(timeframe) <= 0:
+            return False
+        if timeframe in DERIVED_TIMEFRAMES:
+            return True
+        supported = set().union(*self.timeframes.values()) if any(self.timeframes.values()) else self.DEFAULT_TIMEFRAMES
+        return timeframe in supported
+
+    # --- Checks ---
+
+    def check_symbol(self, symbol: str):
+        if not SYMBOL_PATTERN.match(symbol or ""):
+            self.stats["rejected_invalid"] += 1
+            raise AdmissionError(404, f"Invalid symbol: {symbol}")
+        self._maybe_reload()
+        if self.is_listed(symbol) is False:
+            self.stats["rejected_invalid"] += 1
+            raise AdmissionError(404, f"Unknown symbol: {symbol}")
+
+    def check(self, symbol: str, timeframe: str):
+        """
+        Raises AdmissionError(404) for malformed, unlisted or recently empty pairs.
+        """
+        if not self.valid_timeframe(timeframe):
+            self.stats["rejected_invalid"] += 1
+            raise AdmissionError(404, f"Unsupported timeframe: {timeframe}")
+        self.check_symbol(symbol)
+
+        key = f"{symbol}_{timeframe}"
+        expires_at = self.negative.get(key)
+        if expires_at is not None:
+            if time.time() < expires_at:
+                self.stats["rejected_negative"] += 1
+                raise AdmissionError(404, f"No data for {symbol} {timeframe}")
+            del self.negative[key]
+
+    def mark_missing(self, symbol: str, timeframe: str):
+        """
+        A cold fetch came back empty: refuse the pair for a while.
+        """
+        ttl = self.MISS_TTL if self.is_listed(symbol) else self.NEGATIVE_TTL
+        key = f"{symbol}_{timeframe}"
+        self.negative[key] = time.time() + ttl
+        self.negative.move_to_end(key)
+        while len(self.negative) > self.MAX_NEGATIVE:
+            self.negative.popitem(last=False)
+        self.stats["negative_added"] += 1
+
+    # --- Cold fetch gate ---
+
+    async def cold_fetch(self, key: str, fetch: Callable):
+        """
+        Runs `fetch()` (an upstream fetch for an uncached key) under the cold
+        fetch limit. Concurrent calls for the same key share one fetch.
+        """
+        pending = self.inflight.get(key)
+        if pending is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(pending)
+
+        if self.semaphore.locked() and self.waiting >= self.MAX_COLD_QUEUE:
+            self.stats["rejected_busy"] += 1
+            raise AdmissionError(503, "Too many uncached requests, retry shortly", retry_after=1)
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self.semaphore.acquire(), timeout=self.QUEUE_TIMEOUT)
+            except asyncio.TimeoutError:
+                self.stats["rejected_busy"] += 1
+                raise AdmissionError(503, "Too many uncached requests, retry shortly", retry_after=2)
+            finally:
+                self.waiting -= 1
+            try:
+                self.stats["admitted"] += 1
+                result = await fetch()
+            finally:
+                self.semaphore.release()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            if not future.done():
+                if isinstance(e, asyncio.CancelledError):
+                    # The first caller went away; followers get a retryable error
+                    e = AdmissionError(503, "Upstream fetch cancelled, retry shortly", retry_after=1)
+                future.set_exception(e)
+                # Followers re-raise it; don't warn if nobody was waiting
+                future.exception()
+            raise
+        finally:
+            self.inflight.pop(key, None)
+
+    def metrics(self) -> dict:
+        return {
+            "markets": sum(map(len, self.markets.values())),
+            "registry_age_s": round(time.time() - self.fetched_at, 1) if self.fetched_at else None,
+            "negative_entries": len(self.negative),
+            "cold_in_flight": self.MAX_COLD_FETCHES - self.semaphore._value,
+            "cold_waiting": self.waiting,
+            **self.stats
+        }
@@ -1,97 +1,93 @@
-import json
 import os
+import asyncio
 import pandas as pd
 import numpy as np
 from typing import Dict, List, Optional
 from .datasources.ccxt_adapter import CCXTAdapter
+from .streak_store import StreakHistoryStore
+from .admission import AdmissionError
+from .candles import CandleSeries, Streaks, StreakAccumulator, COLOR_NAMES, GREEN, RED
+from .datasources.ohlcv_store import frame_to_records
+from .prob_cube import CubeStore, ProbabilityCube
+from .batch_stats import StreakBatch, streak_batches
+from .timeframes import timeframe_ms, next_close_ms, current_open_ms
+from .live_stats import LiveStats, LIVE_TIMEFRAMES, TF_INDEX
 
 class Analyzer:
     def __init__(self):
         # Reverted to CCXTAdapter for stability per user request
         self.adapter = CCXTAdapter()
-        self.HISTORY_FILE = "/data/streak_history.json" if os.path.exists("/data") else "streak_history.json"
+        self.DATA_DIR = "/data" if os.path.exists("/data") else "."
+        self.HISTORY_FILE = os.path.join(self.DATA_DIR, "streak_history.json") # Legacy (imported once)
+        self.HISTORY_DB = os.path.join(self.DATA_DIR, "streak_history.db")
         
         # Watchdog logic remains useful for long-running connections
         self.last_restart_attempt = 0
-        self._load_history()
+        self.history_store = StreakHistoryStore(self.HISTORY_DB, legacy_json=self.HISTORY_FILE)
+        # Conditional continuation counts (color x length x vol regime x ET hour x weekday)
+        self.CUBE_DIR = os.path.join(self.DATA_DIR, "prob_cubes")
+        self.cubes = CubeStore(self.CUBE_DIR)
+        self._cube_builds: Dict[str, asyncio.Future] = {}
+        # Intra-candle P(close green) table from 1m history (see LiveStats)
+        self.LIVE_STATS_FILE = os.path.join(self.DATA_DIR, "live_prob.npz")
+        self.live_stats = LiveStats(self.LIVE_STATS_FILE)
 
-    def _load_history(self):
-        self.history = {}
-        if os.path.exists(self.HISTORY_FILE):
-            try:
-                with open(self.HISTORY_FILE, 'r') as f:
-                    self.history = json.load(f)
-            except: pass
+    def attach_persistence(self, persistence):
+        """
+        Moves candle-store and streak-log writes onto the shared background writer.
+        """
+        self.adapter.attach_persistence(persistence)
+        self.history_store.attach_persistence(persistence)
+        self.cubes.attach_persistence(persistence)
+        self.live_stats.attach_persistence(persistence)
 
-    def _save_history(self):
-        try:
-            with open(self.HISTORY_FILE, 'w') as f:
-                json.dump(self.history, f)
-        except: pass
+    def attach_shared(self, shared):
+        """
+        Shares market data across processes: as leader this process ingests
+        and publishes, as reader it never calls the exchange or writes history.
+        None detaches (local fetching again).
+        """
+        self.history_store.set_read_only(shared is not None and not shared.is_leader)
+        self.cubes.set_read_only(shared is not None and not shared.is_leader)
+        self.live_stats.set_read_only(shared is not None and not shared.is_leader)
+        self.adapter.universe.set_read_only(shared is not None and not shared.is_leader)
+        self.adapter.attach_shared(shared)
 
-    def _update_and_get_distribution(self, symbol, timeframe, streaks_df, active_color):
+    def _update_and_get_distribution(self, symbol, timeframe, streaks: Streaks, active_color: str):
         key = f"{symbol}_{timeframe}"
-        if key not in self.history:
-            self.history[key] = {"last_processed_ts": 0, "green": {"counts": {}, "last_happened": {}}, "red": {"counts": {}, "last_happened": {}}}
-        
-        hist = self.history[key]
-        last_ts = hist["last_processed_ts"]
         
-        completed_streaks = streaks_df.iloc[:-1]
-        
-        updated = False
-        for _, row in completed_streaks.iterrows():
-            end_time_ts = row['end_time']
-            end_ts_ms = int(end_time_ts.timestamp() * 1000)
-            
-            if end_ts_ms > last_ts:
-                color = row['color'] # 'green' or 'red'
-                length = str(row['length'])
-                
-                # Safety for unexpected colors
-                if color not in ['green', 'red']: continue
-                
-                sub_hist = hist[color]
-                sub_hist["counts"][length] = sub_hist["counts"].get(length, 0) + 1
-                sub_hist["last_happened"][length] = max(sub_hist["last_happened"].get(length, 0), end_ts_ms)
-                
-                hist["last_processed_ts"] = max(hist["last_processed_ts"], end_ts_ms)
-                updated = True
-        
-        if updated:
-            self._save_history()
+        # Last streak is still running -> only completed streaks are recorded
+        completed_streaks = streaks.completed()
+        if len(completed_streaks):
+            added = self.history_store.ingest(
+                key,
+                completed_streaks.color_names(),
+                completed_streaks.length,
+                completed_streaks.end_ts
+            )
+            shared = self.adapter.shared
+            if added and shared is not None and shared.is_leader:
+                # Replicas on other hosts mirror the leader's distribution
+                shared.publish_history(key, self.history_store.history[key])
             
         # Return distribution for ACTIVE color
-        if active_color not in ['green', 'red']: return {}
-        
-        target_data = hist[active_color]
-        dist_out = {}
-        for length_str, count in target_data["counts"].items():
-            last_ts_val = target_data["last_happened"].get(length_str, 0)
-            date_str = pd.to_datetime(last_ts_val, unit='ms').strftime("%d.%m.%Y")
-            dist_out[int(length_str)] = {
-                "count": count,
-                "last_happened": date_str
-            }
-            
-        return dict(sorted(dist_out.items()))
+        return self.history_store.distribution(key, active_color)
 
     def _get_timeframe_ms(self, tf: str) -> int:
-        if not tf: return 0
-        unit = tf[-1]
-        if not tf[:-1].isdigit(): return 0
-        value = int(tf[:-1])
-        if unit == 'm': return value * 60 * 1000
-        if unit == 'h': return value * 60 * 60 * 1000
-        if unit == 'd': return value * 24 * 60 * 60 * 1000
-        return 0
+        return timeframe_ms(tf)
 
-    async def get_stats(self, symbol: str, timeframe: str):
+    async def _live_series(self, symbol: str, timeframe: str):
+        """
+        Cached candles synced with the live price: (CandleSeries, close_time, now_ts), or None.
+        """
         # Request more data (5000 candles) to ensure accurate streak history
         # Use fetch_ohlcv directly but with try/catch logic if adapter doesn't have safe method yet?
         # We added fetch_ohlcv_safe but let's just use fetch_ohlcv and catch here to be sure.
         try:
              df = await self.adapter.fetch_ohlcv(symbol, timeframe, limit=5000)
+        except AdmissionError:
+             # Refused before hitting the exchange (404/503) -> let the API say so
+             raise
         except Exception as e:
              print(f"Analyzer fetch error: {e}")
              return None
@@ -99,89 +95,45 @@ class Analyzer:
         if df is None or df.empty:
             return None
 
+        # Compact arrays (views on the cached frame, which is never modified here)
+        candles = CandleSeries.from_frame(df)
 
         # -----------------------------
         # --- SYNC WITH LIVE PRICE AND ALIGN TIME ---
         
         # 1. Calculate Expected Candle Boundaries (Wall-Clock)
+        # 1d: Noon to Noon ET, 4h: 0, 4, 8... ET, others: standard UTC alignment
         import time
         now_ts = time.time()
-        close_time = 0
         duration_ms = self._get_timeframe_ms(timeframe)
         
         try:
-            now_et = pd.Timestamp.now(tz='US/Eastern')
-            
-            if timeframe == '1d':
-                # Daily: Noon to Noon ET
-                target = now_et.replace(hour=12, minute=0, second=0, microsecond=0)
-                if now_et >= target:
-                    target += pd.Timedelta(days=1)
-                close_time = int(target.timestamp() * 1000)
-                
-            elif timeframe == '4h':
-                # 4h: 0, 4, 8, 12...
-                current_hour = now_et.hour
-                next_hour = (current_hour // 4 + 1) * 4
-                
-                target = now_et.replace(minute=0, second=0, microsecond=0)
-                if next_hour >= 24:
-                    target = target.replace(hour=0) + pd.Timedelta(days=1)
-                else:
-                    target = target.replace(hour=next_hour)
-                
-                close_time = int(target.timestamp() * 1000)
-                
-            else:
-                # 15m, 1h (Standard UTC alignment)
-                duration_s = duration_ms / 1000
-                if duration_s > 0:
-                     next_boundary = ((int(now_ts) // int(duration_s)) + 1) * int(duration_s)
-                     close_time = next_boundary * 1000
-                else:
-                     close_time = int(df.index[-1].timestamp() * 1000) + duration_ms
-
+            close_time = next_close_ms(timeframe, int(now_ts * 1000))
         except Exception as e:
+            close_time = 0
+        if not close_time:
             # Fallback
-            duration_s = duration_ms / 1000
-            if duration_s > 0:
-                 next_boundary = ((int(now_ts) // int(duration_s)) + 1) * int(duration_s)
-                 close_time = next_boundary * 1000
-            else:
-                 close_time = int(df.index[-1].timestamp() * 1000) + duration_ms
+            close_time = int(candles.ts[-1]) + duration_ms
         
         # 2. Logic to Update or Append Live Candle
         try:
             live_price = await self.adapter.fetch_current_price(symbol)
             if live_price > 0:
                 expected_start_ms = close_time - duration_ms
-                last_candle_ms = int(df.index[-1].timestamp() * 1000)
+                last_candle_ms = int(candles.ts[-1])
                 
                 # Tolerance for slight mismatches (e.g. 10 sec)
                 if abs(last_candle_ms - expected_start_ms) < 10000:
-                    # We are in the current candle -> Update
-                    close_col_idx = df.columns.get_loc('close')
-                    df.iloc[-1, close_col_idx] = live_price
-                    # Also update high/low if broken
-                    if live_price > df.iloc[-1]['high']: df.iloc[-1, df.columns.get_loc('high')] = live_price
-                    if live_price < df.iloc[-1]['low']: df.iloc[-1, df.columns.get_loc('low')] = live_price
+                    # We are in the current candle -> Update close (and high/low if broken)
+                    candles = candles.with_last_price(live_price)
                     
                 elif last_candle_ms < expected_start_ms:
                     # We are STALE (missing current candle) -> Append
                     # FIX: Use PREVIOUS CLOSE for Open to avoid "Moving Target" effect.
-                    prev_close = df['close'].iloc[-1]
-                    new_ts = pd.Timestamp(expected_start_ms, unit='ms', tz='UTC')
-                    
-                    # Create dictionary correctly
-                    new_row = pd.DataFrame([{
-                        'open': prev_close,
-                        'high': max(prev_close, live_price),
-                        'low': min(prev_close, live_price),
-                        'close': live_price,
-                        'volume': 0
-                    }], index=[new_ts])
-                    
-                    df = pd.concat([df, new_row])
+                    prev_close = float(candles.close[-1])
+                    candles = candles.with_candle(
+                        expected_start_ms, prev_close,
+                        max(prev_close, live_price), min(prev_close, live_price), live_price, 0.0)
                     
                 elif last_candle_ms > expected_start_ms:
                     # Future candle? Weird. Ignore.
@@ -191,56 +143,77 @@ class Analyzer:
             # print(f"Live sync error: {e}")
             pass 
         # -----------------------------
+        return candles, close_time, now_ts
+
+    async def get_stats(self, symbol: str, timeframe: str):
+        live = await self._live_series(symbol, timeframe)
+        if live is None:
+            return None
+        return (await self._stats_from_series(timeframe, [(symbol, live)]))[0]
+
+    async def get_batch_stats(self, symbols: List[str], timeframe: str) -> Dict[str, Optional[dict]]:
+        """
+        get_stats for several symbols of one timeframe: the live series are
+        fetched concurrently, the analytics run once over all of them (StreakBatch).
+        Symbols refused by admission map to {"error": ...}, symbols without data to None.
+        """
+        lives = await asyncio.gather(*(self._live_series(s, timeframe) for s in symbols), return_exceptions=True)
+        results: Dict[str, Optional[dict]] = {}
+        ready = []
+        for symbol, live in zip(symbols, lives):
+            if isinstance(live, AdmissionError):
+                results[symbol] = {"error": live.detail}
+            elif isinstance(live, BaseException):
+                raise live
+            elif live is None:
+                results[symbol] = None
+            else:
+                ready.append((symbol, live))
+        if ready:
+            stats = await self._stats_from_series(timeframe, ready)
+            results.update(zip((symbol for symbol, _ in ready), stats))
+        return {symbol: results[symbol] for symbol in symbols}
+
+    async def _stats_from_series(self, timeframe: str, items: list) -> List[dict]:
+        """
+        get_stats payloads for [(symbol, (candles, close_time, now_ts)), ...] of one timeframe.
+        """
+        # Candle colors are int8 codes (Close > Open: Green +1, Close < Open: Red -1);
+        # flat candles continue the previous color (Trend persistence), see candles.color_codes.
+        # Streaks, probabilities, volatility and whipsaw for blocks of series in one pass
+        duration_s = self._get_timeframe_ms(timeframe) / 1000
+        # Live candle P(close green) for all rows in one table lookup
+        live_probs = self.live_probabilities(
+            [(symbol, timeframe, float(candles.close[-1]), candles) for symbol, (candles, _, _) in items],
+            items[0][1][2] if items else None)
+        results: List[Optional[dict]] = [None] * len(items)
+        for rows, batch in streak_batches([candles for _, (candles, _, _) in items]):
+            for i, row in enumerate(rows):
+                symbol, (candles, close_time, now_ts) = items[row]
+                results[row] = await self._batch_payload(symbol, timeframe, batch, i, candles, close_time, now_ts,
+                                                         duration_s, live_probs[row])
+        return results
+
+    async def _batch_payload(self, symbol: str, timeframe: str, batch: StreakBatch, i: int,
+                             candles: CandleSeries, close_time: int, now_ts: float, duration_s: float,
+                             live_prob: Optional[dict] = None) -> dict:
+        """
+        get_stats payload for row i of a StreakBatch.
+        """
+        close = candles.close
+        n = len(candles)
+        streaks = batch.streaks(i)
 
-        # Determine candle colors (Close > Open: Green, Close < Open: Red)
-        # For flat candles (Close == Open), we continue the previous color (Trend persistence)
-        conditions = [
-            df['close'] > df['open'],
-            df['close'] < df['open']
-        ]
-        choices = ['green', 'red']
-        
-        # Use select to assign colors, defaulting to None (NaN) for flat candles
-        df['color'] = np.select(conditions, choices, default=None)
-        
-        # Forward fill to propagate previous color to flat candles
-        df['color'] = df['color'].ffill()
-        
-        # Fallback: If the very first candle is flat, default to Green (or Red, arbitrary but needed)
-        df['color'] = df['color'].fillna('green')
-        
-        # DEBUG: Print last color calculation
-        # print(f"Last Candle Color Logic: Open={df['open'].iloc[-1]}, Close={df['close'].iloc[-1]}, Color={df['color'].iloc[-1]}")
-        
-        # Calculate streaks
-        df['ts'] = df.index
-        df['streak_group'] = (df['color'] != df['color'].shift()).cumsum()
-        
-        streaks = df.groupby('streak_group').agg(
-            color=('color', 'first'),
-            length=('color', 'count'),
-            end_time=('ts', 'max')
-        )
-        
         # Current streak
-        current_streak_node = streaks.iloc[-1]
-        current_streak_type = current_streak_node['color']
-        current_streak_len = current_streak_node['length']
-        
-        # Historical Probability Logic
-        
-        # Count all streaks of this color with length >= N
-        total_instances_reaching_N = len(streaks[
-            (streaks['color'] == current_streak_type) & 
-            (streaks['length'] >= current_streak_len)
-        ])
-        
-        # Count all streaks of this color with length > N (meaning it continued)
-        instances_continuing = len(streaks[
-            (streaks['color'] == current_streak_type) & 
-            (streaks['length'] > current_streak_len)
-        ])
-        
+        current_color_code = int(batch.current_color[i])
+        current_streak_type = COLOR_NAMES[current_color_code]
+        current_streak_len = int(batch.current_length[i])
+
+        # Historical Probability Logic: streaks of the current color (including the
+        # running one) reaching N, and those continuing past N
+        total_instances_reaching_N = int(batch.reached[i])
+        instances_continuing = int(batch.continued[i])
+
         # Probability to continue (Streak increases)
         if total_instances_reaching_N <= 1:
             # Only the current streak has reached this length (New Record)
@@ -249,47 +222,35 @@ class Analyzer:
         else:
             prob_continue = instances_continuing / total_instances_reaching_N
             prob_reverse = 1.0 - prob_continue
-        
+
         # Distribution Data (Persistent Accumulator)
         # Using persistent history to track all-time stats even if cache is short
         distribution = self._update_and_get_distribution(symbol, timeframe, streaks, current_streak_type)
 
         # --- NEW METRICS ---
-        
+
         # 1. Volatility (Last 100 candles standard deviation of % returns)
-        df['returns'] = df['close'].pct_change()
-        vol_std = df['returns'].tail(100).std()
-        volatility = (vol_std * 100) if pd.notna(vol_std) else 0.0 # In percentage
-        
+        volatility = float(batch.volatility[i]) # In percentage
+
         # 2. Streak Stats
-        avg_streak = streaks['length'].mean()
-        max_streak = streaks['length'].max()
-        
+        avg_streak = float(batch.avg_streak[i])
+        max_streak = int(batch.max_streak[i])
+
         # 3. Conditional Probability Curve
-        # Calculate probability of continuing for streaks 1 to 10
+        # Probability of continuing after streaks of length 1 to 12, for the current streak color
+        reached, continued = batch.curve_reached[i], batch.curve_continued[i]
         prob_curve = []
-        for i in range(1, 13): # 1 to 12
-            # Find streaks of this length (regardless of color for general "continuation" prob, 
-            # or specific to current color? User asked for "Probability After Streak Length".
-            # Usually streaks behave similarly regardless of direction in crypto, but let's stick to current color for precision
-            # or maybe aggregate both for more data? 
-            # Let's use the current streak color to be specific.
-            
-            total_at_i = len(streaks[(streaks['color'] == current_streak_type) & (streaks['length'] >= i)])
-            continued_after_i = len(streaks[(streaks['color'] == current_streak_type) & (streaks['length'] > i)])
-            
-            prob = (continued_after_i / total_at_i * 100) if total_at_i > 0 else 0
-            prob_curve.append({"length": i, "prob": round(prob, 1)})
+        for j in range(12):
+            prob = (continued[j] / reached[j] * 100) if reached[j] > 0 else 0
+            prob_curve.append({"length": j + 1, "prob": round(float(prob), 1)})
 
-        
         # Check for staleness (if data is older than 2x timeframe)
-        last_data_ts = df.index[-1].timestamp()
-        duration_s = self._get_timeframe_ms(timeframe) / 1000
-        is_stale = (now_ts - last_data_ts) > (duration_s * 2) if duration_s > 0 else False
+        last_data_ts = candles.ts[-1] / 1000
+        is_stale = bool((now_ts - last_data_ts) > (duration_s * 2)) if duration_s > 0 else False
 
         # --- WATCHDOG: Auto-Restart if Stale ---
         if is_stale and (now_ts - self.last_restart_attempt > 300):
-            print(f"Watchdog: Data for {symbol} {timeframe} is stale. Last: {df.index[-1]}. Restarting adapter...")
+            print(f"Watchdog: Data for {symbol} {timeframe} is stale. Last: {candles.timestamp(-1)}. Restarting adapter...")
             try:
                 # We can't await restart() here easily because we are inside get_stats? 
                 # Yes get_stats is async.
@@ -302,16 +263,23 @@ class Analyzer:
                 print(f"Watchdog Restart Failed: {e}")
         # ---------------------------------------
 
+        # Whipsaw: candles with a body under 40% of their range
+        whipsaw_count = int(batch.whipsaw[i])
+
+        last_close = float(close[-1])
+        last_open = float(candles.open[-1])
         return {
             "symbol": symbol,
             "timeframe": timeframe,
-            "current_price": df['close'].iloc[-1],
-            "candle_open": df['open'].iloc[-1],
+            "current_price": last_close,
+            "candle_open": last_open,
             "candle_close_time": close_time,
             "is_stale": is_stale,
             "current_streak": {
                 "type": current_streak_type,
-                "length": int(current_streak_len)
+                "length": current_streak_len,
+                # Open time (epoch ms) of the streak's first candle: tells a new streak from the same one
+                "start": int(candles.ts[n - current_streak_len]) if 0 < current_streak_len <= n else None
             },
             "next_candle_prob": {
                 "continue": round(prob_continue * 100, 1) if prob_continue is not None else None,
@@ -320,41 +288,220 @@ class Analyzer:
             "stats": {
                 "volatility": round(volatility, 2),
                 "avg_streak": round(avg_streak, 1),
-                "max_streak": int(max_streak)
+                "max_streak": max_streak
             },
             "smart_trading": {
                 "microtrends": {
-                    "1m": "up" if df['close'].iloc[-1] > df['open'].iloc[-1] else "down",
-                    "5m": ("up" if df['close'].iloc[-1] > df['close'].iloc[-5] else "down") if len(df) > 5 else "flat",
-                    "15m": ("up" if df['close'].iloc[-1] > df['close'].iloc[-15] else "down") if len(df) > 15 else "flat"
+                    "1m": "up" if last_close > last_open else "down",
+                    "5m": ("up" if last_close > close[-5] else "down") if n > 5 else "flat",
+                    "15m": ("up" if last_close > close[-15] else "down") if n > 15 else "flat"
                 },
                 "spread": round(volatility * 0.05, 4), # Simulated spread based on vol
                 "slippage": round(volatility * 0.02, 4),
                 "smart_exit": {
-                    "optimal_price": round(df['close'].iloc[-1] * (1.0 + (volatility/100 * 0.5)), 2),
+                    "optimal_price": round(last_close * (1.0 + (volatility/100 * 0.5)), 2),
                     "offset_pct": round(volatility * 0.5, 1),
                     "liquidity_tightness": "High" if volatility > 1.0 else "Medium" if volatility > 0.5 else "Low",
                     "est_fill_time_ms": int(200 + (volatility * 100))
                 },
                 "whipsaw_risk": {
-                    "probability": round(len(df[((df['high'] - df['low']) > 0) & ((abs(df['open'] - df['close']) / (df['high'] - df['low'])) < 0.4)]) / len(df) * 100, 1),
+                    "probability": round(whipsaw_count / n * 100, 1),
                     "category": "High" if volatility > 2.0 else "Normal" if volatility > 1.0 else "Low"
                 }
             },
             "distribution": distribution,
             "probability_curve": prob_curve,
-            "total_candles": len(df),
+            # Live candle: P(close green) from the intra-candle table (None without enough history)
+            "live_candle_prob": live_prob,
+            "total_candles": n,
             "debug_candles": [
                 {
-                    "time": str(df.index[i]),
-                    "open": df.iloc[i]['open'],
-                    "close": df.iloc[i]['close'],
-                    "color": df.iloc[i]['color']
-                } for i in range(max(0, len(df)-5), len(df))
+                    "time": str(candles.timestamp(k)),
+                    "open": float(candles.open[k]),
+                    "close": float(close[k]),
+                    "color": COLOR_NAMES[int(batch.colors[i, k - n])]
+                } for k in range(max(0, n-5), n)
             ]
         }
 
+    def full_history_stats(self, symbol: str, timeframe: str) -> Optional[dict]:
+        """
+        Streak distribution over the entire archived history (not just the
+        in-memory window), streamed block by block. Blocking: run it in a thread.
+        """
+        key = f"{symbol}_{timeframe}"
+        acc = StreakAccumulator()
+        if timeframe in ['4h', '1d']:
+            # Derived bins span block boundaries: resample the (small) 1h history at once
+            df = self.adapter.read_history(symbol, timeframe)
+            if not df.empty:
+                acc.feed(frame_to_records(df))
+        else:
+            for records in self.adapter.iter_history(key):
+                acc.feed(records)
+        if acc.candles == 0:
+            return None
+
+        return {
+            "symbol": symbol,
+            "timeframe": timeframe,
+            "total_candles": acc.candles,
+            "first_candle": str(pd.Timestamp(acc.first_ts, unit='ms', tz='UTC')),
+            "last_candle": str(pd.Timestamp(acc.last_ts, unit='ms', tz='UTC')),
+            "current_streak": {
+                "type": COLOR_NAMES[acc.run_color],
+                "length": acc.run_length
+            },
+            "distribution": {
+                COLOR_NAMES[color]: acc.distribution(color) for color in (GREEN, RED)
+            },
+            "probability_curve": {
+                COLOR_NAMES[color]: acc.continuation_curve(color) for color in (GREEN, RED)
+            }
+        }
+
+    def _cube_chunks(self, symbol: str, timeframe: str):
+        """
+        Closed candles of the whole archived history as (ts, open, close) chunks.
+        """
+        open_ms = current_open_ms(timeframe)
+        if timeframe in ['4h', '1d']:
+            df = self.adapter.read_history(symbol, timeframe)
+            chunks = [frame_to_records(df)] if not df.empty else []
+        else:
+            chunks = self.adapter.iter_history(f"{symbol}_{timeframe}")
+        for records in chunks:
+            records = records[records['ts'] < open_ms]
+            if len(records):
+                yield records['ts'], records['open'], records['close']
+
+    async def get_cube(self, symbol: str, timeframe: str) -> Optional[ProbabilityCube]:
+        """
+        The key's probability cube, built from the full history on first use
+        (in a thread, once) and caught up with newly closed cached candles.
+        """
+        key = f"{symbol}_{timeframe}"
+        cube = self.cubes.get(key)
+        if cube is None:
+            pending = self._cube_builds.get(key)
+            if pending is None:
+                pending = self._cube_builds[key] = asyncio.ensure_future(
+                    asyncio.to_thread(self.cubes.build, key, self._cube_chunks(symbol, timeframe)))
+                pending.add_done_callback(lambda _: self._cube_builds.pop(key, None))
+            cube = await asyncio.shield(pending)
+        await self.update_cube(symbol, timeframe)
+        return cube
+
+    async def update_cube(self, symbol: str, timeframe: str) -> int:
+        """
+        Feeds candles closed since the cube's last update (called per candle close).
+        """
+        key = f"{symbol}_{timeframe}"
+        cube = self.cubes.get(key)
+        if cube is None:
+            return 0
+        df = await self.adapter.fetch_ohlcv(symbol, timeframe)
+        if df is None or df.empty:
+            return 0
+        ts = df.index.as_unit('ms').asi8
+        new = (ts > cube.last_ts) & (ts < current_open_ms(timeframe))
+        if not new.any():
+            return 0
+        return self.cubes.update(key, ts[new], df['open'].to_numpy(dtype='float64')[new],
+                                 df['close'].to_numpy(dtype='float64')[new])
+
+    def live_probabilities(self, items: List[tuple], now_ts: Optional[float] = None) -> List[Optional[dict]]:
+        """
+        P(live candle closes green) for [(symbol, timeframe, price, CandleSeries or None), ...].
+        Each candle's open/sigma comes from the given series (else the resident
+        cached one) once per candle; then one vectorized table lookup for all.
+        """
+        import time
+        now = now_ts or time.time()
+        now_ms = int(now * 1000)
+        if self.live_stats.read_only:
+            self.live_stats.maybe_reload()
+        close_ms = {}
+        rows, tf_index, fraction, delta = [], [], [], []
+        for row, (symbol, tf, price, candles) in enumerate(items):
+            if tf not in TF_INDEX or not price > 0:
+                continue
+            if tf not in close_ms:
+                close_ms[tf] = next_close_ms(tf, now_ms)
+            tf_ms = timeframe_ms(tf)
+            open_ms = close_ms[tf] - tf_ms
+            key = f"{symbol}_{tf}"
+
+            def load(key=key, candles=candles):
+                if candles is not None:
+                    return candles.ts, candles.open, candles.close
+                df = self.adapter.cache.get(key) if key in self.adapter.cache else None
+                if df is None or df.empty:
+                    return None
+                return df.index.as_unit('ms').asi8, df['open'].to_numpy(dtype='float64'), df['close'].to_numpy(dtype='float64')
+
+            state = self.live_stats.candle_state(key, open_ms, load, now)
+            if state is None:
+                continue
+            open_price, sigma = state
+            rows.append(row)
+            tf_index.append(TF_INDEX[tf])
+            fraction.append((now_ms - open_ms) / tf_ms)
+            delta.append((price / open_price - 1.0) / sigma)
+
+        results: List[Optional[dict]] = [None] * len(items)
+        if not rows:
+            return results
+        fraction = np.clip(np.array(fraction), 0.0, 1.0)
+        delta = np.array(delta)
+        probs, samples = self.live_stats.evaluate(np.array(tf_index), fraction, delta)
+        for row, p, f, z, n in zip(rows, probs.tolist(), fraction.tolist(), delta.tolist(), samples.tolist()):
+            results[row] = {
+                "green": round(p, 1),
+                "red": round(100 - p, 1),
+                "elapsed": round(f, 3),
+                "delta_sigma": round(z, 2),
+                "samples": int(round(n))
+            }
+        return results
+
+    async def update_live_stats(self, symbol: str) -> int:
+        """
+        Feeds the symbol's candles closed since the last update (all of
+        LIVE_TIMEFRAMES, the first time HISTORY_DAYS of them) into the live
+        table, with the 1m closes inside them. Returns candles added.
+        """
+        if self.live_stats.read_only:
+            return 0
+        import time
+        now_ms = int(time.time() * 1000)
+        start = now_ms - self.live_stats.HISTORY_DAYS * 86400 * 1000
+        # Oldest candle not fed yet over all timeframes
+        since = now_ms
+        for tf in LIVE_TIMEFRAMES:
+            fed = self.live_stats.fed.get(f"{symbol}_{tf}")
+            if fed is None or fed + timeframe_ms(tf) < current_open_ms(tf, now_ms):
+                since = min(since, max(start, fed + timeframe_ms(tf) if fed else start))
+        if since >= now_ms:
+            return 0
+        minutes = await self.adapter.fetch_range(symbol, '1m', since)
+        if minutes.empty:
+            return 0
+        minute_ts = minutes.index.as_unit('ms').asi8
+        minute_close = minutes['close'].to_numpy(dtype='float64')
+        added = 0
+        for tf in LIVE_TIMEFRAMES:
+            df = await self.adapter.fetch_ohlcv(symbol, tf, admit=False)
+            if df is None or df.empty:
+                continue
+            ts = df.index.as_unit('ms').asi8
+            closed = ts < current_open_ms(tf, now_ms)
+            added += self.live_stats.feed(symbol, tf, ts[closed], df['open'].to_numpy(dtype='float64')[closed],
+                                          df['close'].to_numpy(dtype='float64')[closed], minute_ts, minute_close)
+        return added
+
     async def close(self):
+        self.history_store.close()
         await self.adapter.close()
 
     async def restart(self):
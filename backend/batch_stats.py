@@ -0,0 +1,150 @@
+import numpy as np
+from typing import List
+
+from .candles import CandleSeries, Streaks, GREEN
+
+CURVE_LENGTH = 12        # probability_curve: N = 1..12
+VOL_WINDOW = 100         # Returns in the volatility estimate
+WHIPSAW_BODY = 0.4       # Body under 40% of the range counts as whipsaw
+BLOCK_CELLS = 1 << 16    # Candles per kernel block (keeps the matrices cache-sized)
+
+
+def stack_right(arrays: List[np.ndarray], fill, dtype) -> np.ndarray:
+    """
+    (rows x max length) matrix with every array aligned on its last element;
+    shorter rows are padded on the left with `fill`.
+    """
+    width = max(len(a) for a in arrays)
+    out = np.full((len(arrays), width), fill, dtype=dtype)
+    for row, a in zip(out, arrays):
+        row[width - len(a):] = a
+    return out
+
+
+class StreakBatch:
+    """
+    get_stats analytics for many series of one timeframe in one pass.
+
+    The series are stacked right-aligned (the live candles share the last
+    column) into 2D matrices; colors, streak run-lengths, volatility,
+    whipsaw counts and continuation curves come from a single set of
+    vectorized kernels over all rows instead of one pandas/NumPy round per
+    symbol. Per-row results are plain arrays indexed by row.
+    """
+    def __init__(self, series: List[CandleSeries]):
+        rows = len(series)
+        self.rows = rows
+        self.n = np.array([len(s) for s in series], dtype=np.int64)
+        width = int(self.n.max())
+        first = width - self.n                    # First real column per row
+        cols = np.arange(width, dtype=np.int32)
+        valid = cols >= first[:, None]
+        padded = bool(first.any())
+
+        # Zero padding: flat candles with no range
+        open_ = stack_right([s.open for s in series], 0.0, np.float64)
+        high = stack_right([s.high for s in series], 0.0, np.float64)
+        low = stack_right([s.low for s in series], 0.0, np.float64)
+        close = stack_right([s.close for s in series], 0.0, np.float64)
+
+        # Colors (candles.color_codes per row): padding is flat, so leading
+        # flat candles find no earlier color and count as green
+        raw = np.sign(close - open_).astype(np.int8)
+        idx = np.where(raw != 0, cols, 0)
+        np.maximum.accumulate(idx, axis=1, out=idx)
+        colors = np.take_along_axis(raw, idx, axis=1)
+        colors[colors == 0] = GREEN
+        self.colors = colors
+
+        # Streak run-lengths: starts in row-major order are sorted by row, so
+        # every row's streaks are a contiguous slice of the flat arrays
+        start = np.zeros((rows, width), dtype=bool)
+        start[:, 1:] = colors[:, 1:] != colors[:, :-1]
+        start[np.arange(rows), first] = True
+        if padded:
+            start &= valid
+        flat = np.flatnonzero(start)
+        row = np.repeat(np.arange(rows), np.count_nonzero(start, axis=1))
+        # A streak ends before the next start, or at the end of its row
+        end = np.minimum(np.append(flat[1:], rows * width), (row + 1) * width)
+        length = end - flat
+        color = colors.reshape(-1)[flat]
+        self.streak_row = row
+        self.streak_color = color
+        self.streak_length = length.astype(np.uint32)
+        self.streak_end = end
+        self.series = series
+        self.width = width
+        self.first = first
+        self.row_first = np.searchsorted(row, np.arange(rows))
+        last = np.append(self.row_first[1:], len(flat)) - 1
+
+        # Running streak per row and the same-color streaks (running one included)
+        self.current_color = color[last]
+        self.current_length = length[last]
+        same = color == self.current_color[row]
+        cur = self.current_length[row]
+        self.reached = np.bincount(row[same & (length >= cur)], minlength=rows)
+        self.continued = np.bincount(row[same & (length > cur)], minlength=rows)
+
+        # Continuation curve N = 1..CURVE_LENGTH (columns): per-row histogram of the
+        # same-color lengths (longer ones in the last bin), reversed cumulative sum
+        bins = CURVE_LENGTH + 2
+        hist = np.bincount(row[same] * bins + np.minimum(length[same], bins - 1), minlength=rows * bins)
+        at_least = np.cumsum(hist.reshape(rows, bins)[:, ::-1], axis=1)[:, ::-1]
+        self.curve_reached = at_least[:, 1:CURVE_LENGTH + 1]
+        self.curve_continued = at_least[:, 2:CURVE_LENGTH + 2]
+
+        # Streak lengths of a row add up to its candle count
+        self.avg_streak = self.n / np.diff(np.append(self.row_first, len(flat)))
+        self.max_streak = np.maximum.reduceat(length, self.row_first)
+
+        # Volatility: sample std of the last VOL_WINDOW % returns (padding and 0/0 skipped)
+        tail = close[:, -(VOL_WINDOW + 1):]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = np.diff(tail, axis=1) / tail[:, :-1]
+        # A return counts when its previous candle is real
+        counted = valid[:, -(VOL_WINDOW + 1):][:, :-1] & ~np.isnan(returns)
+        count = counted.sum(axis=1)
+        returns = np.where(counted, returns, 0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = returns.sum(axis=1) / count
+            var = np.where(counted, (returns - mean[:, None]) ** 2, 0.0).sum(axis=1) / (count - 1)
+            vol = np.sqrt(var) * 100
+        self.volatility = np.where((count > 1) & np.isfinite(vol), vol, 0.0)
+
+        # Whipsaw: candles with a body under WHIPSAW_BODY of their range
+        candle_range = high - low
+        ranged = candle_range > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.abs(open_ - close) / candle_range
+        self.whipsaw = np.count_nonzero(ranged & (ratio < WHIPSAW_BODY), axis=1)
+
+    def streaks(self, i: int) -> Streaks:
+        """
+        Row i's streaks (color/length are views on the flat arrays).
+        """
+        lo = self.row_first[i]
+        hi = self.row_first[i + 1] if i + 1 < self.rows else len(self.streak_row)
+        # Last candle of each streak, as an index into the row's own series
+        last = self.streak_end[lo:hi] - 1 - i * self.width - self.first[i]
+        return Streaks(self.streak_color[lo:hi], self.streak_length[lo:hi], self.series[i].ts[last])
+
+
+def streak_batches(series: List[CandleSeries], block_cells: int = BLOCK_CELLS):
+    """
+    Yields (row indices into `series`, StreakBatch) over blocks of about
+    `block_cells` candles. Series are grouped by length (little padding);
+    a single 100 x 5000 matrix would fall out of the CPU caches and run
+    slower than per-symbol arrays.
+    """
+    order = sorted(range(len(series)), key=lambda i: len(series[i]))
+    lo = 0
+    while lo < len(order):
+        # Widest series of the block decides how many rows fit
+        hi = lo + 1
+        while hi < len(order) and (hi - lo + 1) * len(series[order[hi]]) <= block_cells:
+            hi += 1
+        rows = order[lo:hi]
+        yield rows, StreakBatch([series[i] for i in rows])
+        lo = hi
@@ -0,0 +1,268 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend:
+    """
+    Key/value store shared by replicas (series, prices, snapshots, proxy
+    responses, leader lease). Values are bytes; TTLs are in milliseconds.
+    """
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl_ms: Optional[int] = None, nx: bool = False) -> bool:
+        """
+        With `nx`, only sets if the key doesn't exist. Returns True if set.
+        """
+        raise NotImplementedError
+
+    async def delete(self, *keys: str) -> int:
+        raise NotImplementedError
+
+    async def pexpire(self, key: str, ttl_ms: int) -> bool:
+        raise NotImplementedError
+
+    async def renew(self, key: str, value: bytes, ttl_ms: int) -> bool:
+        """
+        Atomically extends the TTL of `key` only while it still holds `value`
+        (a lease renewed by its owner). Returns True if renewed.
+        """
+        raise NotImplementedError
+
+    async def rpush(self, key: str, *values: bytes) -> int:
+        raise NotImplementedError
+
+    async def lpop(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+    async def get_json(self, key: str):
+        raw = await self.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    async def set_json(self, key: str, obj, ttl_ms: Optional[int] = None) -> bool:
+        return await self.set(key, json.dumps(obj, default=str).encode('utf-8'), ttl_ms)
+
+    async def drain_list(self, key: str, limit: int = 1000) -> List[bytes]:
+        items = []
+        while len(items) < limit:
+            item = await self.lpop(key)
+            if item is None:
+                break
+            items.append(item)
+        return items
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    In-process implementation (single replica / tests).
+    """
+    def __init__(self):
+        # { key: (value, expires_at monotonic or None) }
+        self.data: Dict[str, Tuple[object, Optional[float]]] = {}
+
+    def _live(self, key: str):
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and time.monotonic() >= expires_at:
+            del self.data[key]
+            return None
+        return value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        value = self._live(key)
+        return value if isinstance(value, bytes) else None
+
+    async def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        return [await self.get(key) for key in keys]
+
+    async def set(self, key: str, value: bytes, ttl_ms: Optional[int] = None, nx: bool = False) -> bool:
+        if nx and self._live(key) is not None:
+            return False
+        self.data[key] = (bytes(value), time.monotonic() + ttl_ms / 1000 if ttl_ms else None)
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        return sum(1 for key in keys if self.data.pop(key, None) is not None)
+
+    async def pexpire(self, key: str, ttl_ms: int) -> bool:
+        value = self._live(key)
+        if value is None:
+            return False
+        self.data[key] = (value, time.monotonic() + ttl_ms / 1000)
+        return True
+
+    async def renew(self, key: str, value: bytes, ttl_ms: int) -> bool:
+        if self._live(key) != bytes(value):
+            return False
+        return await self.pexpire(key, ttl_ms)
+
+    async def rpush(self, key: str, *values: bytes) -> int:
+        items = self._live(key)
+        if not isinstance(items, list):
+            items = []
+        items.extend(bytes(v) for v in values)
+        self.data[key] = (items, None)
+        return len(items)
+
+    async def lpop(self, key: str) -> Optional[bytes]:
+        items = self._live(key)
+        if not isinstance(items, list) or not items:
+            return None
+        return items.pop(0)
+
+
+# KEYS[1] = lease key, ARGV[1] = owner, ARGV[2] = ttl ms
+RENEW_SCRIPT = (
+    "if redis.call('GET', KEYS[1]) == ARGV[1] then "
+    "return redis.call('PEXPIRE', KEYS[1], ARGV[2]) else return 0 end"
+)
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Minimal Redis (RESP2) client over one asyncio connection.
+    Commands are serialized with a lock; the connection is re-opened once on failure.
+    url: redis://[:password@]host[:port][/db]
+    """
+    def __init__(self, url: str, timeout: float = 5.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), timeout=self.timeout)
+        if self.password:
+            await self._roundtrip("AUTH", self.password)
+        if self.db:
+            await self._roundtrip("SELECT", self.db)
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode('utf-8')
+            out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(out)
+
+    async def _read_reply(self):
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = await self.reader.readexactly(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(rest)
+            if count < 0:
+                return None
+            return [await self._read_reply() for _ in range(count)]
+        raise RedisError(f"Unexpected reply: {line!r}")
+
+    async def _roundtrip(self, *args):
+        self.writer.write(self._encode(args))
+        await self.writer.drain()
+        return await asyncio.wait_for(self._read_reply(), timeout=self.timeout)
+
+    async def execute(self, *args):
+        async with self._lock:
+            for attempt in range(2):
+                try:
+                    if self.writer is None:
+                        await self._connect()
+                    return await self._roundtrip(*args)
+                except (ConnectionError, OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                    await self._reset()
+                    if attempt:
+                        raise ConnectionError(f"Redis {args[0]} failed: {e}")
+
+    async def _reset(self):
+        if self.writer is not None:
+            try:
+                self.writer.close()
+            except Exception:
+                pass
+        self.reader = self.writer = None
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.execute("GET", key)
+
+    async def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        if not keys:
+            return []
+        return await self.execute("MGET", *keys)
+
+    async def set(self, key: str, value: bytes, ttl_ms: Optional[int] = None, nx: bool = False) -> bool:
+        args = ["SET", key, value]
+        if ttl_ms:
+            args += ["PX", int(ttl_ms)]
+        if nx:
+            args.append("NX")
+        return await self.execute(*args) == "OK"
+
+    async def delete(self, *keys: str) -> int:
+        return await self.execute("DEL", *keys) if keys else 0
+
+    async def pexpire(self, key: str, ttl_ms: int) -> bool:
+        return await self.execute("PEXPIRE", key, int(ttl_ms)) == 1
+
+    async def renew(self, key: str, value: bytes, ttl_ms: int) -> bool:
+        # Compare-and-pexpire in one server-side step
+        return await self.execute("EVAL", RENEW_SCRIPT, 1, key, value, int(ttl_ms)) == 1
+
+    async def rpush(self, key: str, *values: bytes) -> int:
+        return await self.execute("RPUSH", key, *values)
+
+    async def lpop(self, key: str) -> Optional[bytes]:
+        return await self.execute("LPOP", key)
+
+    async def close(self):
+        async with self._lock:
+            await self._reset()
+
+
+def create_cache_backend(url: Optional[str] = None) -> CacheBackend:
+    """
+    CACHE_BACKEND_URL=redis://... selects Redis; anything else stays in memory.
+    """
+    url = url if url is not None else os.getenv("CACHE_BACKEND_URL", "")
+    if url.startswith("redis://"):
+        logger.info(f"Using Redis cache backend at {urlparse(url).hostname}")
+        return RedisCacheBackend(url)
+    return MemoryCacheBackend()
@@ -0,0 +1,235 @@
+import numpy as np
+import pandas as pd
+
+# Candle color codes (close > open: green, close < open: red)
+GREEN = 1
+RED = -1
+COLOR_NAMES = {GREEN: 'green', RED: 'red'}
+COLOR_CODES = {'green': GREEN, 'red': RED}
+
+
+def color_codes(open_: np.ndarray, close: np.ndarray, prev_color: int = 0) -> np.ndarray:
+    """
+    int8 candle colors. Flat candles (close == open) continue the previous
+    color (trend persistence); leading flat candles take `prev_color`
+    (the color before this chunk) or count as green.
+    """
+    raw = np.sign(close - open_).astype(np.int8)
+    if len(raw) == 0:
+        return raw
+    # Forward fill the zeros: index of the last non-flat candle at every position
+    idx = np.where(raw != 0, np.arange(len(raw)), 0)
+    np.maximum.accumulate(idx, out=idx)
+    colors = raw[idx]
+    colors[colors == 0] = prev_color or GREEN
+    return colors
+
+
+def streak_ids(colors: np.ndarray) -> np.ndarray:
+    """
+    uint32 id per candle, incremented at every color change (0-based).
+    """
+    ids = np.zeros(len(colors), dtype=np.uint32)
+    if len(colors) > 1:
+        np.cumsum(colors[1:] != colors[:-1], out=ids[1:])
+    return ids
+
+
+class Streaks:
+    """
+    Consecutive same-color runs of a CandleSeries (the last one may still be running).
+    """
+    __slots__ = ('color', 'length', 'end_ts')
+
+    def __init__(self, color: np.ndarray, length: np.ndarray, end_ts: np.ndarray):
+        self.color = color      # int8 (+1 / -1)
+        self.length = length    # uint32 candles per streak
+        self.end_ts = end_ts    # int64 epoch ms of the streak's last candle
+
+    def __len__(self) -> int:
+        return len(self.length)
+
+    def completed(self) -> "Streaks":
+        return Streaks(self.color[:-1], self.length[:-1], self.end_ts[:-1])
+
+    def color_names(self) -> np.ndarray:
+        return np.where(self.color == GREEN, 'green', 'red')
+
+
+class CandleSeries:
+    """
+    Compact, read-only candle arrays for analytics: int64 epoch-ms times,
+    float64 OHLCV, int8 colors and uint32 streak ids (computed on first use,
+    so series handed to a StreakBatch never pay for them).
+
+    Built from a cached frame (or store records) without copying the OHLCV
+    columns where the source layout allows NumPy views. "Modifications"
+    (live price) return a new series and never touch the cached frame.
+    """
+    __slots__ = ('ts', 'open', 'high', 'low', 'close', 'volume', 'prev_color', '_color', '_streak_id')
+
+    def __init__(self, ts: np.ndarray, open_: np.ndarray, high: np.ndarray, low: np.ndarray,
+                 close: np.ndarray, volume: np.ndarray, prev_color: int = 0):
+        self.ts = ts
+        self.open = open_
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.prev_color = prev_color
+        self._color = None
+        self._streak_id = None
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "CandleSeries":
+        index = df.index
+        if not isinstance(index, pd.DatetimeIndex):
+            index = pd.to_datetime(index, utc=True)
+        ts = index.as_unit('ms').asi8
+        if list(df.columns) == ['open', 'high', 'low', 'close', 'volume']:
+            # Cache layout: one float block, so a single view (rows are the columns)
+            # instead of five pandas column lookups
+            values = df.to_numpy(dtype='float64', copy=False).T
+            return cls(ts, *values)
+        cols = [df[c].to_numpy(dtype='float64', copy=False) for c in ('open', 'high', 'low', 'close')]
+        volume = df['volume'].to_numpy(dtype='float64', copy=False) if 'volume' in df.columns else np.zeros(len(df))
+        return cls(ts, *cols, volume)
+
+    @classmethod
+    def from_records(cls, records: np.ndarray, prev_color: int = 0) -> "CandleSeries":
+        """
+        Views into an OHLCVStore record array (RECORD_DTYPE).
+        """
+        return cls(records['ts'], records['open'], records['high'], records['low'],
+                   records['close'], records['volume'], prev_color)
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    @property
+    def color(self) -> np.ndarray:
+        if self._color is None:
+            self._color = color_codes(self.open, self.close, self.prev_color)
+        return self._color
+
+    @property
+    def streak_id(self) -> np.ndarray:
+        if self._streak_id is None:
+            self._streak_id = streak_ids(self.color)
+        return self._streak_id
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in ('ts', 'open', 'high', 'low', 'close', 'volume', 'color', 'streak_id'))
+
+    def with_last_price(self, price: float) -> "CandleSeries":
+        """
+        The last candle re-closed at `price` (high/low widened if broken).
+        Only close/high/low are copied.
+        """
+        close, high, low = self.close.copy(), self.high.copy(), self.low.copy()
+        close[-1] = price
+        high[-1] = max(high[-1], price)
+        low[-1] = min(low[-1], price)
+        return CandleSeries(self.ts, self.open, high, low, close, self.volume)
+
+    def with_candle(self, ts_ms: int, open_: float, high: float, low: float, close: float, volume: float = 0.0) -> "CandleSeries":
+        return CandleSeries(
+            np.append(self.ts, np.int64(ts_ms)), np.append(self.open, open_), np.append(self.high, high),
+            np.append(self.low, low), np.append(self.close, close), np.append(self.volume, volume))
+
+    def streaks(self) -> Streaks:
+        n = len(self.color)
+        if n == 0:
+            empty = np.empty(0)
+            return Streaks(empty.astype(np.int8), empty.astype(np.uint32), empty.astype(np.int64))
+        starts = np.flatnonzero(np.diff(self.streak_id, prepend=np.uint32(0)) != 0)
+        starts = np.concatenate(([0], starts))
+        ends = np.append(starts[1:], n)
+        return Streaks(self.color[starts], (ends - starts).astype(np.uint32), self.ts[ends - 1])
+
+    def timestamp(self, i: int) -> pd.Timestamp:
+        return pd.Timestamp(int(self.ts[i]), unit='ms', tz='UTC')
+
+
+def continuation_counts(lengths: np.ndarray, upto: int) -> tuple:
+    """
+    For N = 1..upto: streaks reaching N (length >= N) and continuing past N (length > N).
+    """
+    lens = np.sort(lengths)
+    n = np.arange(1, upto + 1)
+    reached = len(lens) - np.searchsorted(lens, n, side='left')
+    continued = len(lens) - np.searchsorted(lens, n, side='right')
+    return reached, continued
+
+
+class StreakAccumulator:
+    """
+    Streak length counts over a history fed in chronological chunks (e.g.
+    archive blocks), so years of candles never have to be in memory at once.
+    The run at a chunk boundary is carried into the next chunk.
+    """
+    __slots__ = ('counts', 'candles', 'first_ts', 'last_ts', 'run_color', 'run_length')
+
+    def __init__(self):
+        # { color code: counts indexed by streak length }
+        self.counts = {GREEN: np.zeros(1, dtype=np.int64), RED: np.zeros(1, dtype=np.int64)}
+        self.candles = 0
+        self.first_ts = None
+        self.last_ts = None
+        self.run_color = 0
+        self.run_length = 0
+
+    def _add(self, color: int, lengths: np.ndarray):
+        if len(lengths) == 0:
+            return
+        binned = np.bincount(lengths.astype(np.int64))
+        current = self.counts[color]
+        if len(binned) > len(current):
+            current = np.concatenate([current, np.zeros(len(binned) - len(current), dtype=np.int64)])
+        current[:len(binned)] += binned
+        self.counts[color] = current
+
+    def feed(self, records: np.ndarray):
+        """
+        Adds a chunk of candles (RECORD_DTYPE) newer than everything fed so far.
+        """
+        if len(records) == 0:
+            return
+        series = CandleSeries.from_records(records, self.run_color)
+        streaks = series.streaks()
+        lengths = streaks.length.astype(np.int64)
+        if self.run_length:
+            if int(streaks.color[0]) == self.run_color:
+                lengths[0] += self.run_length
+            else:
+                self._add(self.run_color, np.array([self.run_length]))
+        # The last streak keeps running into the next chunk
+        for color in (GREEN, RED):
+            self._add(color, lengths[:-1][streaks.color[:-1] == color])
+        self.run_color = int(streaks.color[-1])
+        self.run_length = int(lengths[-1])
+        self.candles += len(records)
+        if self.first_ts is None:
+            self.first_ts = int(records['ts'][0])
+        self.last_ts = int(records['ts'][-1])
+
+    def distribution(self, color: int) -> dict:
+        """
+        { length: completed streaks of exactly that length }
+        """
+        counts = self.counts[color]
+        return {int(length): int(counts[length]) for length in np.flatnonzero(counts)}
+
+    def continuation_curve(self, color: int, upto: int = 12) -> list:
+        """
+        P(streak continues past N | it reached N) over completed streaks.
+        """
+        counts = self.counts[color]
+        lengths = np.repeat(np.arange(len(counts)), counts)
+        reached, continued = continuation_counts(lengths, upto)
+        return [{
+            "length": n + 1,
+            "prob": round(float(continued[n] / reached[n] * 100), 1) if reached[n] else None,
+            "samples": int(reached[n])
+        } for n in range(upto)]
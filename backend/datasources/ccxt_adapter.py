@@ -4,6 +4,14 @@ import pandas as pd
 import numpy as np
 from typing import List, Dict, Optional
 from .adapter_base import DataAdapter
+from .ohlcv_store import OHLCVStore, records_to_frame
+from .series_cache import SeriesCache
+from .segment_store import SegmentStore
+from ..timeframes import timeframe_ms, split_key, current_open_ms, resample_ohlcv, DERIVED_TIMEFRAMES, BASE_DERIVED_TIMEFRAMES
+from ..events import EventBus, CandleClosed, CandleRevised, PriceTick, MicroBar, GapRepaired
+from ..microbars import MicroBarStore
+from ..admission import KeyedLocks
+from ..universe import SymbolUniverse
 import logging
 import os
 
@@ -39,82 +47,308 @@ class CCXTAdapter(DataAdapter):
             logger.error("CRITICAL: No exchanges initialized! Check network/requirements.")
 
 
-        # Map common symbols to exchange-specific symbols
-        self.symbol_map = {
-            'BTC': {
-                'binance': 'BTC/USDT', 
-                'coinbase': 'BTC/USD', 
-                'kraken': 'BTC/USD', 
-                'hyperliquid': 'BTC/USDC:USDC',
-                'coinbaseinternational': 'BTC/USDC:USDC'
-            },
-            'ETH': {
-                'binance': 'ETH/USDT', 
-                'coinbase': 'ETH/USD', 
-                'kraken': 'ETH/USD',
-                'hyperliquid': 'ETH/USDC:USDC',
-                'coinbaseinternational': 'ETH/USDC:USDC'
-            },
-            'SOL': {
-                'binance': 'SOL/USDT', 
-                'coinbase': 'SOL/USD', 
-                'kraken': 'SOL/USD',
-                'hyperliquid': 'SOL/USDC:USDC',
-                'coinbaseinternational': 'SOL/USDC:USDC'
-            },
-            'XRP': {
-                'binance': 'XRP/USDT', 
-                'coinbase': 'XRP/USD', 
-                'kraken': 'XRP/USD',
-                'hyperliquid': 'XRP/USDC:USDC',
-                'coinbaseinternational': 'XRP/USDC:USDC'
-            },
-        }
-        # In-memory cache: { "SYMBOL_TIMEFRAME": pd.DataFrame }
-        self.cache: Dict[str, pd.DataFrame] = {}
+        # In-memory cache: { "SYMBOL_TIMEFRAME": pd.DataFrame }, bounded by a byte budget.
+        # Cold series are evicted (spilled to the store) and reloaded on next access.
+        self.CACHE_BUDGET_MB = int(os.getenv("SERIES_CACHE_MB", "256"))
+        self.cache = SeriesCache(self.CACHE_BUDGET_MB * 1024 * 1024,
+                                 load=self._load_series, spill=self._spill_series)
         # Short-term price cache: { "SYMBOL": (price, timestamp) }
         self.price_cache: Dict[str, tuple] = {}
+        # 1-second micro-bars built from the same ticks (live widgets)
+        self.micro = MicroBarStore()
         
         # Persistence
         self.DATA_DIR = "/data" if os.path.exists("/data") else "." 
-        self.CACHE_FILE = os.path.join(self.DATA_DIR, "ohlcv_cache.pkl")
+        self.CACHE_FILE = os.path.join(self.DATA_DIR, "ohlcv_cache.pkl") # Legacy pickle (migrated on load)
+        self.STORE_DIR = os.path.join(self.DATA_DIR, "ohlcv_store")
+        self.store = OHLCVStore(self.STORE_DIR)
+        # Compressed archive of closed candles (full history, see archive_closed)
+        self.SEGMENT_DIR = os.path.join(self.DATA_DIR, "ohlcv_segments")
+        self.segments = SegmentStore(self.SEGMENT_DIR)
+        # Symbol -> exchange market mapping (from loaded markets) and the tracked symbols
+        self.universe = SymbolUniverse(self.DATA_DIR)
+        self._archive_dirty = set()
+        
+        # Max candles kept in memory per key (the segment archive keeps everything)
+        self.MAX_CANDLES = 10000
+        # Once archived, the hot store is trimmed back to MAX_CANDLES beyond this size
+        self.STORE_KEEP_ROWS = 2 * self.MAX_CANDLES
+        # Optional debounced background writer (see attach_persistence)
+        self.persistence = None
+        
+        # Candle/price events for in-process subscribers (alerts, snapshots, SSE)
+        self.bus = EventBus()
         
-        # Concurrency Locks (Granular per symbol_timeframe)
-        from collections import defaultdict
-        self.locks = defaultdict(asyncio.Lock)
+        # Cross-process market data (see attach_shared): the leader publishes, readers never fetch
+        self.shared = None
+        
+        # Optional cold-fetch gate for uncached keys (see attach_admission)
+        self.admission = None
+        
+        # Concurrency Locks (Granular per symbol_timeframe, bounded table)
+        self.MAX_LOCKS = 2048
+        self.locks = KeyedLocks(self.MAX_LOCKS)
         
         # Throttling
         self.last_update: Dict[str, float] = {}
+        # Single-ticker requests per fetch_current_prices call when the bulk call misses symbols
+        self.MAX_TICKER_FALLBACK = 8
+        
+        # Base-feed mode (BASE_TIMEFRAME=1m): only the base series is fetched,
+        # 15m/1h/4h/1d are seeded once and then folded from it (see _fold_base)
+        self.BASE_TIMEFRAME = os.getenv("BASE_TIMEFRAME") or None
+        # Upstream OHLCV requests per timeframe, bins re-aggregated by _fold_base
+        self.fetch_counts: Dict[str, int] = {}
+        self.fold_stats = {"folds": 0, "bins": 0, "seeds": 0}
         
         self.load_cache()
 
     def load_cache(self):
-        if os.path.exists(self.CACHE_FILE):
-            try:
-                import pickle
-                with open(self.CACHE_FILE, 'rb') as f:
-                    self.cache = pickle.load(f)
-                
-                # Reset throttling timers on load to ensure we fetch fresh data immediately on startup
-                self.last_update = {} 
-                logger.info(f"Loaded persist cache from {self.CACHE_FILE}. Keys: {list(self.cache.keys())}")
-            except Exception as e:
-                logger.error(f"Failed to load cache: {e}")
-        else:
+        """
+        Warm start: maps the per-key store files instead of unpickling one big dict.
+        Derived timeframes (4h/1d) are not stored, they are resampled from 1h.
+        """
+        self._migrate_legacy_cache()
+        
+        keys = self.store.keys()
+        if not keys:
             logger.info("No persistent cache found. Starting fresh.")
+            return
+            
+        try:
+            for key in keys:
+                if self.cache.over_budget():
+                    # The rest reloads from the store on first use
+                    break
+                df = self.store.load(key, limit=self.MAX_CANDLES)
+                if not df.empty:
+                    self.cache[key] = df
+                    
+            for key in list(self.cache.keys()):
+                if key.endswith('_1h'):
+                    self._update_derived_cache(key[:-len('_1h')])
+            
+            # Reset throttling timers on load to ensure we fetch fresh data immediately on startup
+            self.last_update = {} 
+            logger.info(f"Loaded persist cache from {self.STORE_DIR}. Keys: {list(self.cache.keys())}")
+        except Exception as e:
+            logger.error(f"Failed to load cache: {e}")
 
-    def save_cache(self):
+    def _migrate_legacy_cache(self):
+        """
+        One-off import of the old pickled {key: DataFrame} cache into the store.
+        """
+        if not os.path.exists(self.CACHE_FILE):
+            return
         try:
             import pickle
-            # Create temp file then rename for atomic write
-            temp_file = self.CACHE_FILE + ".tmp"
-            with open(temp_file, 'wb') as f:
-                pickle.dump(self.cache, f)
-            os.replace(temp_file, self.CACHE_FILE)
-            logger.info(f"Saved cache to {self.CACHE_FILE}")
+            with open(self.CACHE_FILE, 'rb') as f:
+                legacy = pickle.load(f)
+            for key, df in legacy.items():
+                if key.endswith(('_4h', '_1d')) or df is None or df.empty:
+                    continue
+                self.store.append(key, df)
+            os.remove(self.CACHE_FILE)
+            logger.info(f"Migrated legacy cache {self.CACHE_FILE} into {self.STORE_DIR}")
+        except Exception as e:
+            logger.error(f"Failed to migrate legacy cache: {e}")
+
+    def attach_persistence(self, persistence):
+        """
+        Routes store appends through the shared background writer.
+        """
+        self.persistence = persistence
+        persistence.register("ohlcv_store", self.store.flush_pending)
+        persistence.register("segment_store", self.archive_closed)
+
+    def attach_admission(self, admission):
+        """
+        Routes cache-miss fetches through the admission controller's limits.
+        """
+        self.admission = admission
+
+    def map_symbol(self, exchange_id: str, symbol: str) -> str:
+        """
+        Exchange market symbol for our symbol ("BTC" -> "BTC/USDT" on Binance).
+        """
+        return self.universe.map(exchange_id, symbol)
+
+    def attach_shared(self, shared):
+        """
+        Joins the shared market-data segments (None detaches and fetches locally again).
+        As leader every cached series is published right away.
+        """
+        self.shared = shared
+        self.share_all()
+
+    @property
+    def read_only(self) -> bool:
+        return self.shared is not None and not self.shared.is_leader
+
+    def share_all(self):
+        if self.shared is not None and self.shared.is_leader:
+            for key in list(self.cache.keys()):
+                self._share(key)
+
+    def _share(self, key: str):
+        if self.shared is not None and self.shared.is_leader:
+            self.shared.publish_series(key, self.cache.get(key))
+
+    def sync_from_shared(self, key: str) -> bool:
+        """
+        Reader: pulls the leader's latest copy of `key` into memory and
+        publishes candle events locally when it changed.
+        """
+        df = self.shared.read_series(key)
+        if df is None:
+            return False
+        before = self.cache.get(key)
+        if before is not df:
+            self.cache[key] = df
+            symbol, timeframe = split_key(key)
+            self._emit_candle_changes(symbol, timeframe, before, df)
+        return True
+
+    def sync_all_shared(self):
+        for key in list(self.cache.keys()):
+            self.sync_from_shared(key)
+
+    async def _wait_for_shared(self, key: str) -> bool:
+        """
+        Reader: asks the leader to ingest `key` and waits briefly for it to appear.
+        """
+        if self.sync_from_shared(key):
+            return True
+        self.shared.request(key)
+        import time
+        deadline = time.time() + self.shared.READER_WAIT
+        while time.time() < deadline:
+            await asyncio.sleep(0.25)
+            if self.sync_from_shared(key):
+                return True
+        return False
+
+    def save_cache(self):
+        """
+        Full resync of the in-memory cache into the store.
+        Not needed in the hot path: update_cache/backfill_history append incrementally.
+        """
+        try:
+            for key, df in list(self.cache.items()):
+                if key.endswith(('_4h', '_1d')):
+                    continue
+                self.store.queue(key, df)
+            self._schedule_store_flush()
+            logger.info(f"Saved cache to {self.STORE_DIR}")
         except Exception as e:
             logger.error(f"Failed to save cache: {e}")
 
+    def _persist(self, key: str, df: pd.DataFrame):
+        if self.read_only:
+            return
+        try:
+            self.store.queue(key, df)
+            self._schedule_store_flush()
+            self._schedule_archive(key)
+        except Exception as e:
+            logger.error(f"Failed to persist {key}: {e}")
+
+    def _schedule_archive(self, key: str):
+        self._archive_dirty.add(key)
+        if self.persistence is not None:
+            self.persistence.mark_dirty("segment_store")
+        else:
+            self.archive_closed()
+
+    def archive_closed(self) -> int:
+        """
+        Moves closed candles from the hot store into the compressed segment
+        archive (the newest, possibly still open candle stays out), then trims
+        the hot store. Runs on the persistence writer thread. Returns bytes written.
+        """
+        keys, self._archive_dirty = self._archive_dirty, set()
+        written = 0
+        if any(self.store.has_pending(key) for key in keys):
+            # The archive reads from disk: land queued candles first
+            written += self.store.flush_pending()
+        for key in keys:
+            try:
+                before = self.segments.size_bytes(key)
+                seg_range = self.segments.time_range(key)
+                store_range = self.store.time_range(key)
+                if store_range is None:
+                    continue
+                if seg_range is not None and store_range[0] < seg_range[0]:
+                    # Older candles were backfilled into the store: rebuild the archive
+                    records = self.store.records(key)[:-1]
+                    self.segments.replace(key, np.concatenate([self.segments.read(key), records]))
+                else:
+                    since = seg_range[1] if seg_range is not None else None
+                    self.segments.append(key, self.store.records(key, since_ms=since)[:-1])
+                written += max(0, self.segments.size_bytes(key) - before)
+                if self.store.row_count(key) > self.STORE_KEEP_ROWS:
+                    self.store.trim(key, self.MAX_CANDLES)
+            except Exception as e:
+                logger.error(f"Failed to archive {key}: {e}")
+        return written
+
+    def read_history(self, symbol: str, timeframe: str, start_ms: Optional[int] = None,
+                     end_ms: Optional[int] = None) -> pd.DataFrame:
+        """
+        Full-history candles in [start_ms, end_ms] from the archive plus the
+        hot store (4h/1d resampled from 1h). Blocking: run it in a thread.
+        """
+        if timeframe in ['4h', '1d']:
+            df_1h = self.read_history(symbol, '1h', start_ms, end_ms)
+            return self.resample_ohlcv(df_1h, timeframe) if not df_1h.empty else df_1h
+        chunks = list(self.iter_history(f"{symbol}_{timeframe}", start_ms, end_ms))
+        if not chunks:
+            return pd.DataFrame()
+        return records_to_frame(np.concatenate(chunks))
+
+    def iter_history(self, key: str, start_ms: Optional[int] = None, end_ms: Optional[int] = None):
+        """
+        Yields record chunks in time order: archive blocks, then newer hot-store candles.
+        """
+        for records in self.segments.iter_blocks(key, start_ms, end_ms):
+            yield records
+        seg_range = self.segments.time_range(key)
+        since = seg_range[1] if seg_range is not None else None
+        if start_ms is not None and (since is None or since < start_ms - 1):
+            since = start_ms - 1
+        tail = self.store.records(key, since_ms=since)
+        if end_ms is not None:
+            tail = tail[tail['ts'] <= end_ms]
+        if len(tail):
+            yield tail
+
+    def _schedule_store_flush(self):
+        if self.persistence is not None:
+            self.persistence.mark_dirty("ohlcv_store")
+        else:
+            self.store.flush_pending()
+
+    def has_history(self, symbol: str, timeframe: str, days: int) -> bool:
+        """
+        True if the store already covers `days` of history for this key and the
+        tail is recent enough for an incremental `since` fetch to close the gap.
+        """
+        import time
+        time_range = self.store.time_range(f"{symbol}_{timeframe}")
+        if time_range is None:
+            return False
+        first_ts, last_ts = time_range
+        # Older candles may already have moved to the archive
+        archived = self.segments.time_range(f"{symbol}_{timeframe}")
+        if archived is not None:
+            first_ts = min(first_ts, archived[0])
+        now_ms = int(time.time() * 1000)
+        tf_ms = timeframe_ms(timeframe)
+        if tf_ms <= 0:
+            return False
+        # Incremental updates fetch 100 candles at a time
+        return first_ts <= now_ms - days * 86400 * 1000 and now_ms - last_ts < 100 * tf_ms
+
     async def close(self):
         for exchange in self.exchanges:
             await exchange.close()
@@ -140,28 +374,91 @@ class CCXTAdapter(DataAdapter):
             
         logger.info("CCXT Adapter restarted successfully (Strict Binance Mode).")
 
-    async def fetch_ohlcv(self, symbol: str, timeframe: str, limit: int = 1000) -> pd.DataFrame:
+    async def fetch_ohlcv(self, symbol: str, timeframe: str, limit: int = 1000, admit: bool = True) -> pd.DataFrame:
         """
         Returns cached data. If missing, triggers immediate update (Hybrid Mode).
         For 4h and 1d, this ensures resampling happens if 1h is available.
+        admit=False skips the admission gate (scheduled refreshes of tracked
+        symbols, which run under the scheduler's own budgets).
         """
         key = f"{symbol}_{timeframe}"
+        
+        # Shared-memory reader: the leader does all the fetching
+        if self.read_only:
+            if not self.sync_from_shared(key):
+                await self._wait_for_shared(key)
+            return self.cache.get(key, pd.DataFrame())
+        
+        resident = key in self.cache
+        # Non-resident keys are re-mapped from the persistent store (see _load_series)
         data = self.cache.get(key, pd.DataFrame())
         
+        # Reloaded (first use or after eviction): catch up incrementally
+        if not resident and not data.empty:
+            await self.update_cache(symbol, timeframe)
+            data = self.cache.get(key, pd.DataFrame())
+        
         # If cash miss or empty, fetch immediately
         if data.empty:
             logger.info(f"Cache miss for {key}, fetching immediately...")
             
             # For 4h/1d, we need 1h update logic which handles recursion
-            if timeframe in ['4h', '1d']:
-                await self.update_cache(symbol, '1h')
+            # (base-feed mode: update_cache seeds the series and folds the base feed)
+            source_tf = '1h' if timeframe in ['4h', '1d'] and not self.BASE_TIMEFRAME else timeframe
+            if self.admission is not None and admit:
+                # Bounded, coalesced upstream fetch (raises AdmissionError when saturated)
+                await self.admission.cold_fetch(f"{symbol}_{source_tf}", lambda: self.update_cache(symbol, source_tf))
             else:
-                await self.update_cache(symbol, timeframe)
-                
-            return self.cache.get(key, pd.DataFrame())
+                await self.update_cache(symbol, source_tf)
+            
+            data = self.cache.get(key, pd.DataFrame())
+            if data.empty and self.admission is not None and admit:
+                self.admission.mark_missing(symbol, timeframe)
+            return data
             
         return data
 
+    def _load_series(self, key: str) -> Optional[pd.DataFrame]:
+        """
+        SeriesCache loader: a series that is not in memory (evicted or never
+        loaded) comes back from the store, 4h/1d are resampled from 1h.
+        """
+        if self.read_only:
+            return self.shared.read_series(key)
+        symbol, timeframe = split_key(key)
+        if timeframe in ['4h', '1d']:
+            df_1h = self.cache.get(f"{symbol}_1h")
+            if df_1h is None or df_1h.empty:
+                return None
+            return self.resample_ohlcv(df_1h, timeframe)
+        if self.store.has_pending(key):
+            # Spilled/queued candles must be on disk before re-mapping
+            self.store.flush_pending()
+        df = self.store.load(key, limit=self.MAX_CANDLES)
+        if df.empty:
+            return None
+        logger.info(f"Restored {key} from store ({len(df)} candles)")
+        return df
+
+    def _spill_series(self, key: str, df: pd.DataFrame):
+        """
+        SeriesCache eviction hook: makes sure the store holds what memory had.
+        Derived (4h/1d) and read-only (shared) series are simply dropped.
+        """
+        if self.read_only or key.endswith(('_4h', '_1d')) or df is None or df.empty:
+            return
+        time_range = self.store.time_range(key)
+        last_ms = int(df.index[-1].value // 10**6)
+        if time_range is None or time_range[1] < last_ms:
+            self.store.queue(key, df[['open', 'high', 'low', 'close', 'volume']])
+            self._schedule_store_flush()
+
+    def pin_series(self, symbols: List[str], timeframes: List[str]):
+        """
+        Keeps these series resident regardless of the memory budget.
+        """
+        self.cache.pin(f"{symbol}_{tf}" for symbol in symbols for tf in timeframes)
+
     async def fetch_ohlcv_safe(self, symbol: str, timeframe: str, limit: int = 1000) -> pd.DataFrame:
         """
         Wrapper to catch all errors and return empty DF instead of crashing.
@@ -175,93 +472,38 @@ class CCXTAdapter(DataAdapter):
 
     def resample_ohlcv(self, df: pd.DataFrame, timeframe: str) -> pd.DataFrame:
         """
-        Resample 1h data to custom timeframe.
-        Polymarket Daily: 12:00 ET to 12:00 ET (Noon).
+        Resample 1h data to custom timeframe (see timeframes.resample_ohlcv).
         """
-        if df.empty:
-            return df
-            
-        # Ensure index is datetime
-        if not isinstance(df.index, pd.DatetimeIndex):
-            df.index = pd.to_datetime(df.index, utc=True)
-            
-        # Convert to US/Eastern to handle DST automatically
-        df_et = df.tz_convert('US/Eastern')
-        
-        # Use a fixed origin to ensure stable alignment
-        # We use a recent date to ensure no timezone weirdness (though US/Eastern handles it)
-        # 2024-01-01 is a Monday.
-        midnight_et = pd.Timestamp("2024-01-01 00:00:00").tz_localize("US/Eastern")
-        
-        if timeframe == '1d':
-            # Daily closes at 12:00 PM (Noon) ET.
-            # Origin at 12:00 PM ensures bins are 12:00 -> 12:00.
-            # We use a fixed recent origin.
-            origin = pd.Timestamp("2024-01-01 12:00:00").tz_localize("US/Eastern")
-            rule = '24h'
-        elif timeframe == '4h':
-            # 4h candles align to 00, 04, 08...
-            origin = pd.Timestamp("2024-01-01 00:00:00").tz_localize("US/Eastern")
-            rule = '4h'
-        else:
-            origin = pd.Timestamp("2024-01-01 00:00:00").tz_localize("US/Eastern")
-            rule = timeframe
-        
-        # Ensure sorted
-        df_et = df_et.sort_index()
-
-        # Strategy 1: Strict Noon ET (Preferred)
-        try:
-            resampled = df_et.resample(rule, origin=origin).agg({
-                'open': 'first',
-                'high': 'max',
-                'low': 'min',
-                'close': 'last',
-                'volume': 'sum'
-            })
-            # Check if valid
-            # Allow partial last bin by NOT dropping all NaNs if we have at least some data
-            # But we want to avoid completely empty rows.
-            # partial bins usually have data, just maybe 'volume' missing? No, pandas resample handles it.
-            # The issue is probably that the first bin is partial and getting dropped?
-            # Let's just return resampled if not empty, without strict dropna if it kills everything.
-            if not resampled.empty:
-                # Only drop execution errors (all-NaN rows), keep partials
-                clean = resampled.dropna(how='all')
-                if not clean.empty:
-                    return clean
-            
-            logger.warning(f"Strategy 1 (Strict) returned empty for {timeframe}. Trying fallback...")
-        except Exception as e:
-            logger.error(f"Strategy 1 failed for {timeframe}: {e}")
+        return resample_ohlcv(df, timeframe)
 
-        # Strategy 2: Simple/Standard Resampling (Fallback)
-        # Just use standard daily/4h without custom origin if the above fails
-        try:
-            fallback_rule = '1D' if timeframe == '1d' else '4h'
-            fallback = df_et.resample(fallback_rule).agg({
-                'open': 'first',
-                'high': 'max',
-                'low': 'min',
-                'close': 'last',
-                'volume': 'sum'
-            })
-            clean_fallback = fallback.dropna()
-            if not clean_fallback.empty:
-                logger.info(f"Strategy 2 (Fallback) succeeded for {timeframe}.")
-                return clean_fallback
-        except Exception as e:
-             logger.error(f"Strategy 2 failed for {timeframe}: {e}")
+    async def update_cache(self, symbol: str, timeframe: str):
+        # Shared-memory reader: just pick up the leader's latest copy
+        if self.read_only:
+            key = f"{symbol}_{timeframe}"
+            if not self.sync_from_shared(key):
+                self.shared.request(key)
+            return
 
-        return pd.DataFrame()
+        # Base-feed mode: derived timeframes only ever refresh through the base series
+        if self.BASE_TIMEFRAME and timeframe in BASE_DERIVED_TIMEFRAMES:
+            await self._seed_derived(symbol, timeframe)
+            await self.update_cache(symbol, self.BASE_TIMEFRAME)
+            return
 
-    async def update_cache(self, symbol: str, timeframe: str):
         # If 4h/1d requested, we redirect to 1h update
         if timeframe in ['4h', '1d']:
             await self.update_cache(symbol, '1h')
             return
 
+        await self._update_series(symbol, timeframe)
+
+    async def _update_series(self, symbol: str, timeframe: str):
+        """
+        Fetches new candles for a source series (incremental `since` update,
+        or the initial fetch) and fans them out to the derived series.
+        """
         key = f"{symbol}_{timeframe}"
+        is_base = timeframe == self.BASE_TIMEFRAME
         
         # Use granular locking to allow other symbols to update in parallel
         async with self.locks[key]:
@@ -283,8 +525,8 @@ class CCXTAdapter(DataAdapter):
                 # Case 1: Updating existing cache (Fast)
                 if current_df is not None and not current_df.empty:
                     last_ts_val = current_df.index[-1].value // 10**6
-                    # Fetch only new data
-                    new_data = await self._fetch_aggregated_ohlcv(symbol, timeframe, limit=100, since=last_ts_val)
+                    # Fetch only new data (a whole page for the base feed: it is polled every minute)
+                    new_data = await self._fetch_aggregated_ohlcv(symbol, timeframe, limit=1000 if is_base else 100, since=last_ts_val)
                     
                     if new_data.empty:
                         # Recovery: If incremental fetch failed, maybe 'since' is wrong/future?
@@ -302,29 +544,176 @@ class CCXTAdapter(DataAdapter):
                     combined.sort_index(inplace=True)
                     
                     # Keep up to 10,000 candles
-                    if len(combined) > 10000:
-                        combined = combined.iloc[-10000:]
+                    if len(combined) > self.MAX_CANDLES:
+                        combined = combined.iloc[-self.MAX_CANDLES:]
                     
                     self.cache[key] = combined
                     self.last_update[key] = now
+                    self._persist(key, new_data)
+                    self._share(key)
+                    self._emit_candle_changes(symbol, timeframe, current_df, combined)
+                    if is_base:
+                        self._fold_base(symbol, new_data.index[0])
                     logger.info(f"Updated cache for {key}. New total: {len(combined)}")
 
                 # Case 2: Initial Deep Fetch (DISABLED FOR DEBUGGING/STABILITY)
                 else:
                      # Standard fetch for new cache
                      logger.info(f"Initializing cache for {key} (Standard fetch)...")
-                     new_data = await self._fetch_aggregated_ohlcv(symbol, timeframe, limit=1000)
+                     if is_base:
+                         new_data = await self._fetch_base_warmup(symbol)
+                     else:
+                         new_data = await self._fetch_aggregated_ohlcv(symbol, timeframe, limit=1000)
                      if not new_data.empty:
                          self.cache[key] = new_data
                          self.last_update[key] = now
+                         self._persist(key, new_data)
+                         self._share(key)
+                         if is_base:
+                             self._fold_base(symbol, new_data.index[0])
                          
-                # Trigger derived cache update if we just updated 1h
+                # Trigger derived cache update if we just updated 1h (fetched directly, not folded)
                 if timeframe == '1h':
                     self._update_derived_cache(symbol)
                     
             except Exception as e:
                 logger.error(f"Failed to update cache for {key}: {e}")
 
+    async def _seed_derived(self, symbol: str, timeframe: str):
+        """
+        Base-feed mode: gives a derived series its history once (store, 1h
+        resample for 4h/1d, or a single upstream fetch); _fold_base keeps it current.
+        """
+        key = f"{symbol}_{timeframe}"
+        # Restores from the store (4h/1d: resampled from 1h) if not resident
+        if not self.cache.get(key, pd.DataFrame()).empty:
+            return
+        if timeframe in DERIVED_TIMEFRAMES:
+            await self._seed_derived(symbol, '1h')
+            self._update_derived_cache(symbol)
+            return
+        async with self.locks[key]:
+            if not self.cache.get(key, pd.DataFrame()).empty:
+                return
+            logger.info(f"Seeding {key} for base-feed mode...")
+            self.fold_stats["seeds"] += 1
+            new_data = await self._fetch_aggregated_ohlcv(symbol, timeframe, limit=1000)
+            if new_data.empty:
+                return
+            self.cache[key] = new_data
+            self._persist(key, new_data)
+            self._share(key)
+
+    async def _fetch_base_warmup(self, symbol: str) -> pd.DataFrame:
+        """
+        Initial base-feed fetch: pages far enough back to cover the open bin of
+        every derived timeframe (the ET-noon daily bar can span 1440 x 1m).
+        """
+        import time
+        since = min(current_open_ms(tf) for tf in BASE_DERIVED_TIMEFRAMES)
+        tf_ms = timeframe_ms(self.BASE_TIMEFRAME)
+        pages = []
+        now_ms = int(time.time() * 1000)
+        while since < now_ms:
+            page = await self._fetch_aggregated_ohlcv(symbol, self.BASE_TIMEFRAME, limit=1000, since=since)
+            if page.empty:
+                break
+            pages.append(page)
+            next_since = int(page.index[-1].value // 10**6) + tf_ms
+            if next_since <= since or len(page) < 1000:
+                break
+            since = next_since
+        if not pages:
+            # Exchange lagging behind the wall clock: settle for the latest page
+            return await self._fetch_aggregated_ohlcv(symbol, self.BASE_TIMEFRAME, limit=1000)
+        df = pd.concat(pages)
+        return df[~df.index.duplicated(keep='last')].sort_index()
+
+    async def fetch_range(self, symbol: str, timeframe: str, since_ms: int) -> pd.DataFrame:
+        """
+        Candles from since_ms up to the live one for model inputs that aren't
+        ingested (e.g. 1m history for LiveStats): paged from the exchange,
+        bypassing the cache and store. The base timeframe is read locally.
+        """
+        import time
+        key = f"{symbol}_{timeframe}"
+        if timeframe == self.BASE_TIMEFRAME:
+            pages = [await asyncio.to_thread(self.read_history, symbol, timeframe, since_ms)]
+            # The store may lag the cache by a debounced write
+            pages.append(self.cache.get(key, pd.DataFrame()))
+        else:
+            tf_ms = timeframe_ms(timeframe)
+            pages = []
+            since = since_ms
+            now_ms = int(time.time() * 1000)
+            while since <= now_ms:
+                page = await self._fetch_aggregated_ohlcv(symbol, timeframe, limit=1000, since=since)
+                if page.empty:
+                    break
+                pages.append(page)
+                next_since = int(page.index[-1].value // 10**6) + tf_ms
+                if next_since <= since or len(page) < 1000:
+                    break
+                since = next_since
+        pages = [p for p in pages if not p.empty]
+        if not pages:
+            return pd.DataFrame()
+        df = pd.concat(pages)
+        df = df[~df.index.duplicated(keep='last')].sort_index()
+        return df[df.index >= pd.Timestamp(since_ms, unit='ms', tz='UTC')]
+
+    def _fold_base(self, symbol: str, first_changed: pd.Timestamp):
+        """
+        Re-aggregates the derived bins touched by base candles from
+        `first_changed` on (closed bins and the live partial one), so every
+        timeframe reflects the same base candles at any instant.
+
+        Bins are rebuilt with resample_ohlcv from the base series, so they are
+        identical to a full resample. A bin that starts before the in-memory
+        base history is left as fetched/seeded.
+        """
+        base = self.cache.get(f"{symbol}_{self.BASE_TIMEFRAME}")
+        if base is None or base.empty:
+            return
+        for timeframe in BASE_DERIVED_TIMEFRAMES:
+            key = f"{symbol}_{timeframe}"
+            derived = self.cache.get(key)
+            if derived is None or derived.empty:
+                continue
+            try:
+                # Start of the derived bin containing the first changed base candle
+                pos = derived.index.searchsorted(first_changed, side='right') - 1
+                start = derived.index[pos] if pos >= 0 else first_changed
+                bins = self.resample_ohlcv(base[base.index >= start], timeframe)
+                if bins.empty:
+                    continue
+                if pos >= 0 and start < base.index[0]:
+                    # Only partially covered by the base series: keep that bar
+                    bins = bins[bins.index > start]
+                    if bins.empty:
+                        continue
+                # resample_ohlcv works in ET; 15m/1h series are kept in UTC
+                bins = bins.tz_convert(derived.index.tz)
+                combined = pd.concat([derived[derived.index < bins.index[0]], bins])
+                if len(combined) > self.MAX_CANDLES:
+                    combined = combined.iloc[-self.MAX_CANDLES:]
+                self.cache[key] = combined
+                if timeframe not in DERIVED_TIMEFRAMES:
+                    self._persist(key, bins)
+                self._share(key)
+                self._emit_candle_changes(symbol, timeframe, derived, combined)
+                self.fold_stats["folds"] += 1
+                self.fold_stats["bins"] += len(bins)
+            except Exception as e:
+                logger.error(f"Failed to fold {self.BASE_TIMEFRAME} into {key}: {e}")
+
+    def base_feed_metrics(self) -> dict:
+        return {
+            "base_timeframe": self.BASE_TIMEFRAME,
+            "upstream_fetches": dict(sorted(self.fetch_counts.items())),
+            **self.fold_stats
+        }
+
     def _update_derived_cache(self, symbol: str):
         """
         Resamples 1h data to 4h and 1d and updates their caches.
@@ -333,21 +722,47 @@ class CCXTAdapter(DataAdapter):
         if df_1h is None or df_1h.empty:
             return
 
-        # Resample to 4h
-        df_4h = self.resample_ohlcv(df_1h, '4h')
-        self.cache[f"{symbol}_4h"] = df_4h
-        
-        # Resample to 1d
-        df_1d = self.resample_ohlcv(df_1h, '1d')
-        self.cache[f"{symbol}_1d"] = df_1d
+        for timeframe in ['4h', '1d']:
+            key = f"{symbol}_{timeframe}"
+            previous = self.cache.get(key)
+            derived = self.resample_ohlcv(df_1h, timeframe)
+            self.cache[key] = derived
+            self._share(key)
+            self._emit_candle_changes(symbol, timeframe, previous, derived)
         
         # logger.info(f"Updated derived cache (4h/1d) for {symbol}")
 
+    def _emit_candle_changes(self, symbol: str, timeframe: str, before: Optional[pd.DataFrame], after: Optional[pd.DataFrame]):
+        """
+        Publishes CandleClosed for candles that closed between two versions of a
+        series and CandleRevised for the (new) open candle.
+        """
+        if not self.bus.subscribers:
+            return
+        if before is None or before.empty or after is None or after.empty:
+            return
+        try:
+            prev_last = before.index[-1]
+            new_last = after.index[-1]
+            cols = ['open', 'high', 'low', 'close', 'volume']
+            
+            if new_last > prev_last:
+                closed = after.loc[(after.index >= prev_last) & (after.index < new_last), cols]
+                for ts, o, h, l, c, v in closed.itertuples(name=None):
+                    self.bus.publish(CandleClosed(symbol, timeframe, int(ts.value // 10**6), float(o), float(h), float(l), float(c), float(v)))
+            
+            last = after[cols].iloc[-1]
+            if new_last != prev_last or not np.allclose(last.to_numpy(dtype=float), before[cols].iloc[-1].to_numpy(dtype=float), equal_nan=True):
+                self.bus.publish(CandleRevised(symbol, timeframe, int(new_last.value // 10**6), *[float(x) for x in last]))
+        except Exception as e:
+            logger.error(f"Failed to emit candle events for {symbol} {timeframe}: {e}")
+
     async def _fetch_aggregated_ohlcv(self, symbol: str, timeframe: str, limit: int, since: Optional[int] = None) -> pd.DataFrame:
         if not self.exchanges:
              logger.warning("No exchanges available for fetch.")
              return pd.DataFrame()
              
+        self.fetch_counts[timeframe] = self.fetch_counts.get(timeframe, 0) + 1
         # "Waterfall" Strategy: Try exchanges in order (Binance Futures First)
         # Return the FIRST valid response immediately. Do NOT aggregate.
         for exchange in self.exchanges:
@@ -366,14 +781,7 @@ class CCXTAdapter(DataAdapter):
 
     async def _fetch_full_ohlcv(self, exchange, symbol: str, timeframe: str, limit: int, since: Optional[int] = None) -> pd.DataFrame:
         try:
-            base_currency = symbol.split('/')[0] if '/' in symbol else symbol
-            mapped_symbol = self.symbol_map.get(base_currency, {}).get(exchange.id)
-            if not mapped_symbol:
-                # Default logic if map misses
-                if exchange.id == 'binance': mapped_symbol = f"{base_currency}/USDT"
-                elif 'coinbase' in exchange.id: mapped_symbol = f"{base_currency}/USD" 
-                elif 'hyperliquid' in exchange.id: mapped_symbol = f"{base_currency}/USDC:USDC"
-                else: mapped_symbol = f"{base_currency}/USD"
+            mapped_symbol = self.map_symbol(exchange.id, symbol)
             
             # logger.info(f"Fetching {mapped_symbol} from {exchange.id} ({timeframe}) since={since}...")
             # logger.info(f"Fetching {mapped_symbol} from {exchange.id} ({timeframe}) since={since}...")
@@ -395,6 +803,9 @@ class CCXTAdapter(DataAdapter):
         Used primarily for 1h data to ensure robust 4h/1d resampling.
         Iterates through exchanges until one works.
         """
+        if self.read_only:
+            # The ingestion leader backfills; readers see it through shared memory
+            return
         import time
         logger.info(f"Backfilling {symbol} {timeframe} for {days} days...")
         
@@ -413,17 +824,7 @@ class CCXTAdapter(DataAdapter):
             failed_exchange = False
             
             # Map symbol
-            base_currency = symbol.split('/')[0] if '/' in symbol else symbol
-            mapped_symbol = self.symbol_map.get(base_currency, {}).get(exchange.id)
-            
-            if not mapped_symbol:
-                # Basic fallback
-                if 'hyperliquid' in exchange.id: mapped_symbol = f"{base_currency}/USDC:USDC"
-                elif 'coinbase' in exchange.id: mapped_symbol = f"{base_currency}/USD" # Covers intl too mostly
-                else: mapped_symbol = f"{base_currency}/USDT"
-                
-                # Careful with Coinbase futures if not mapped
-                if exchange.id == 'coinbaseinternational': mapped_symbol = f"{base_currency}/USDC:USDC"
+            mapped_symbol = self.map_symbol(exchange.id, symbol)
 
             try:
                 while True:
@@ -474,7 +875,18 @@ class CCXTAdapter(DataAdapter):
                     combined = pd.concat([existing, df])
                     combined = combined[~combined.index.duplicated(keep='last')].sort_index()
                     
+                    if len(combined) > self.MAX_CANDLES:
+                        combined = combined.iloc[-self.MAX_CANDLES:]
+                    
                     self.cache[key] = combined
+                    self._persist(key, df)
+                    self._share(key)
+                    if not existing.empty:
+                        # Only candles that were missing inside the cached range count as a repair
+                        filled = df.index.difference(existing.index)
+                        filled = filled[filled < existing.index[-1]]
+                        if len(filled):
+                            self.bus.publish(GapRepaired(symbol, timeframe, int(filled[0].value // 10**6), int(filled[-1].value // 10**6), len(filled)))
                     # Trigger derived updates (4h/1d)
                     self._update_derived_cache(symbol)
                     return # Success! Exit function
@@ -485,26 +897,33 @@ class CCXTAdapter(DataAdapter):
         
         logger.error(f"All exchanges failed to backfill {symbol}")
 
-    async def fetch_current_price(self, symbol: str) -> float:
-        # Check cache (TTL 2 seconds)
+    async def fetch_current_price(self, symbol: str, max_age: float = 2.0) -> float:
+        # Check cache (TTL 2 seconds by default; the micro-bar pump asks for 1)
         import time
         now = time.time()
             
         if symbol in self.price_cache:
             price, ts = self.price_cache[symbol]
-            if now - ts < 2.0: # 2 second cache
+            if now - ts < max_age:
                 return price
 
+        # Shared-memory reader: the leader keeps prices fresh
+        if self.read_only:
+            shared_price = self.shared.read_price(symbol)
+            if shared_price is None:
+                self.shared.request(f"{symbol}_1h")
+                return 0.0
+            price, ts = shared_price
+            previous = self.price_cache.get(symbol)
+            self.price_cache[symbol] = (price, ts)
+            if previous is None or ts > previous[1]:
+                self._record_tick(symbol, price, ts)
+            return price
+
         # Similar logic for ticker
         tasks = []
         for ex in self.exchanges:
-            base = symbol.split('/')[0] if '/' in symbol else symbol
-            mapped = self.symbol_map.get(base, {}).get(ex.id)
-            if not mapped:
-                if 'hyperliquid' in ex.id: mapped = f"{base}/USDC:USDC"
-                elif 'coinbase' in ex.id: mapped = f"{base}/USD" # International uses USDC but spot uses USD
-                elif ex.id == 'binance': mapped = f"{base}/USDT"
-                else: mapped = f"{base}/USD"
+            mapped = self.map_symbol(ex.id, symbol)
 
             # Create a task for each exchange and track them
             t = asyncio.create_task(self._safe_fetch_ticker(ex, mapped))
@@ -517,7 +936,7 @@ class CCXTAdapter(DataAdapter):
                     price = await future
                     if price > 0:
                         # Update cache and return immediately
-                        self.price_cache[symbol] = (price, now)
+                        self._set_price(symbol, price, now)
                         
                         # Cancel remaining tasks to free connections
                         for t in tasks:
@@ -536,20 +955,80 @@ class CCXTAdapter(DataAdapter):
         # If all failed (or returned 0)
         return 0.0
 
+    async def fetch_current_prices(self, symbols: List[str], max_age: float = 2.0) -> Dict[str, float]:
+        """
+        Live prices for many symbols: one fetch_tickers call per exchange instead
+        of a ticker request per symbol. Symbols an exchange doesn't return fall
+        through to the next exchange, then (a few per call) to fetch_current_price.
+        """
+        import time
+        now = time.time()
+        prices: Dict[str, float] = {}
+        missing = []
+        for symbol in dict.fromkeys(symbols):
+            cached = self.price_cache.get(symbol)
+            if cached is not None and now - cached[1] < max_age:
+                prices[symbol] = cached[0]
+            else:
+                missing.append(symbol)
+
+        if not self.read_only:
+            for exchange in self.exchanges:
+                if not missing:
+                    break
+                if not (getattr(exchange, 'has', None) or {}).get('fetchTickers'):
+                    continue
+                mapped = {self.map_symbol(exchange.id, symbol): symbol for symbol in missing}
+                try:
+                    tickers = await asyncio.wait_for(exchange.fetch_tickers(list(mapped)), timeout=8.0)
+                except Exception as e:
+                    logger.warning(f"fetch_tickers failed on {exchange.id} ({len(mapped)} symbols): {e}")
+                    continue
+                for market, ticker in (tickers or {}).items():
+                    symbol = mapped.get(market)
+                    price = self._ticker_price(ticker)
+                    if symbol is not None and price > 0:
+                        self._set_price(symbol, price, now)
+                        prices[symbol] = price
+                missing = [s for s in missing if s not in prices]
+            # Single-ticker fallback stays small so a bulk failure can't fan out
+            fallback = missing[:self.MAX_TICKER_FALLBACK]
+        else:
+            # Readers: shared-memory lookups, no network
+            fallback = missing
+
+        results = await asyncio.gather(*(self.fetch_current_price(s, max_age) for s in fallback), return_exceptions=True)
+        for symbol, price in zip(fallback, results):
+            if isinstance(price, float) and price > 0:
+                prices[symbol] = price
+        return prices
+
+    def _set_price(self, symbol: str, price: float, now: float):
+        self.price_cache[symbol] = (price, now)
+        self.bus.publish(PriceTick(symbol, price, now))
+        self._record_tick(symbol, price, now)
+        if self.shared is not None:
+            self.shared.publish_price(symbol, price, now)
+
+    @staticmethod
+    def _ticker_price(ticker: dict) -> float:
+        # First valid price of the ticker
+        for field in ('last', 'close', 'markPrice', 'indexPrice'):
+            price = (ticker or {}).get(field)
+            if price is not None:
+                return float(price)
+        return 0.0
+
+    def _record_tick(self, symbol: str, price: float, ts: float):
+        bar = self.micro.add(symbol, price, ts)
+        if bar is not None and self.bus.subscribers:
+            self.bus.publish(MicroBar(symbol, *bar))
+
     async def _safe_fetch_ticker(self, exchange, symbol: str) -> float:
         try:
             # Short timeout for live checks
             ticker = await asyncio.wait_for(exchange.fetch_ticker(symbol), timeout=5.0)
-            
-            # Helper to get first valid price
-            price = ticker.get('last')
-            if price is None: price = ticker.get('close')
-            if price is None: price = ticker.get('markPrice')
-            if price is None: price = ticker.get('indexPrice')
-            
-            if price is not None:
-                return float(price)
-            return 0.0
+            return self._ticker_price(ticker)
         except Exception:
             return 0.0
 
@@ -0,0 +1,260 @@
+import os
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Fixed-width record layout: one row per candle, 48 bytes.
+# Timestamps are epoch milliseconds (UTC) so files stay tz-agnostic.
+RECORD_DTYPE = np.dtype([
+    ('ts', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+])
+
+OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+
+class OHLCVStore:
+    """
+    Append-only columnar candle store. One memory-mapped file per
+    (symbol, timeframe) key, e.g. `BTC_1h.bin`.
+
+    - Newer candles are appended to the end of the file.
+    - A revised last candle (live bar) is overwritten in place.
+    - Older candles that are already on disk are ignored (closed candles don't change).
+    - Missing older candles (gap repair / backfill) trigger a one-off merge rewrite.
+    """
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        os.makedirs(self.root_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # Queued appends waiting for the background writer: { key: [records, ...] }
+        self._pending: Dict[str, List[np.ndarray]] = {}
+        self._pending_lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root_dir, f"{key}.bin")
+
+    def keys(self) -> List[str]:
+        try:
+            return sorted(f[:-4] for f in os.listdir(self.root_dir) if f.endswith('.bin'))
+        except FileNotFoundError:
+            return []
+
+    def _map(self, key: str) -> Optional[np.memmap]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        size = os.path.getsize(path)
+        n = size // RECORD_DTYPE.itemsize
+        if n == 0:
+            return None
+        # A torn trailing record (crash mid-append) is ignored
+        return np.memmap(path, dtype=RECORD_DTYPE, mode='r', shape=(n,))
+
+    def row_count(self, key: str) -> int:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return 0
+        return os.path.getsize(path) // RECORD_DTYPE.itemsize
+
+    def time_range(self, key: str) -> Optional[tuple]:
+        """
+        Returns (first_ts_ms, last_ts_ms) for a key, or None if empty.
+        """
+        mm = self._map(key)
+        if mm is None:
+            return None
+        return int(mm['ts'][0]), int(mm['ts'][-1])
+
+    def load(self, key: str, limit: Optional[int] = None) -> pd.DataFrame:
+        """
+        Maps the file and returns the last `limit` candles as a DataFrame
+        (DatetimeIndex UTC, same shape as the adapter's cache entries).
+        """
+        mm = self._map(key)
+        if mm is None:
+            return pd.DataFrame()
+        if limit is not None and len(mm) > limit:
+            mm = mm[-limit:]
+        return records_to_frame(mm)
+
+    def records(self, key: str, since_ms: Optional[int] = None) -> np.ndarray:
+        """
+        Copy of the raw records (RECORD_DTYPE), only those after `since_ms` if given.
+        """
+        mm = self._map(key)
+        if mm is None:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        if since_ms is not None:
+            mm = mm[np.searchsorted(mm['ts'], since_ms, side='right'):]
+        return np.array(mm)
+
+    def trim(self, key: str, keep_last: int) -> int:
+        """
+        Drops all but the newest `keep_last` candles (after they were archived).
+        Returns the number of candles dropped.
+        """
+        with self._lock:
+            mm = self._map(key)
+            if mm is None or len(mm) <= keep_last:
+                return 0
+            dropped = len(mm) - keep_last
+            kept = np.array(mm[-keep_last:])
+            del mm
+            self._write_atomic(self._path(key), kept)
+            return dropped
+
+    def append(self, key: str, df: pd.DataFrame) -> int:
+        """
+        Incrementally persists candles. Returns number of records written.
+        """
+        if df is None or df.empty:
+            return 0
+        records = frame_to_records(df)
+        with self._lock:
+            return self._append_records(key, records)
+
+    def queue(self, key: str, df: pd.DataFrame):
+        """
+        Buffers candles for a later `flush_pending()` (no disk I/O).
+        Records are converted now so later mutations of `df` don't leak in.
+        """
+        if df is None or df.empty:
+            return
+        records = frame_to_records(df)
+        with self._pending_lock:
+            self._pending.setdefault(key, []).append(records)
+
+    def has_pending(self, key: str) -> bool:
+        with self._pending_lock:
+            return key in self._pending
+
+    def flush_pending(self) -> int:
+        """
+        Appends all queued candles. Returns bytes written.
+        """
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        written = 0
+        for key, chunks in pending.items():
+            records = chunks[0] if len(chunks) == 1 else _dedupe_records(np.concatenate(chunks))
+            with self._lock:
+                written += self._append_records(key, records) * RECORD_DTYPE.itemsize
+        return written
+
+    def _append_records(self, key: str, records: np.ndarray) -> int:
+        path = self._path(key)
+        if os.path.exists(path):
+            size = os.path.getsize(path)
+            if size % RECORD_DTYPE.itemsize:
+                # Drop a torn trailing record before appending after it
+                with open(path, 'r+b') as f:
+                    f.truncate(size - size % RECORD_DTYPE.itemsize)
+        mm = self._map(key)
+        if mm is None:
+            with open(path, 'wb') as f:
+                f.write(records.tobytes())
+            return len(records)
+
+        last_ts = int(mm['ts'][-1])
+        older = records[records['ts'] < last_ts]
+        same = records[records['ts'] == last_ts]
+        newer = records[records['ts'] > last_ts]
+
+        # Gap repair: older candles that are not on disk yet -> merge rewrite
+        if len(older) and not np.isin(older['ts'], mm['ts']).all():
+            existing = np.array(mm)
+            del mm
+            merged = np.concatenate([existing, records])
+            # Keep the incoming version for duplicate timestamps
+            _, idx = np.unique(merged['ts'][::-1], return_index=True)
+            merged = merged[::-1][idx]
+            self._write_atomic(path, merged)
+            return len(records)
+
+        # Sizes/offsets are computed before the map is released
+        tail_offset = (len(mm) - 1) * RECORD_DTYPE.itemsize
+        del mm
+
+        written = 0
+        with open(path, 'r+b') as f:
+            if len(same):
+                # Live candle revision: rewrite the tail record in place
+                f.seek(tail_offset)
+                f.write(same[-1:].tobytes())
+                written += 1
+            if len(newer):
+                f.seek(0, os.SEEK_END)
+                f.write(newer.tobytes())
+                written += len(newer)
+        return written
+
+    def replace(self, key: str, df: pd.DataFrame):
+        """
+        Rewrites a key from scratch (atomic temp file + rename).
+        """
+        records = frame_to_records(df) if df is not None and not df.empty else np.empty(0, dtype=RECORD_DTYPE)
+        with self._lock:
+            self._write_atomic(self._path(key), records)
+
+    def _write_atomic(self, path: str, records: np.ndarray):
+        temp_file = path + ".tmp"
+        with open(temp_file, 'wb') as f:
+            f.write(records.tobytes())
+        os.replace(temp_file, path)
+
+    def delete(self, key: str):
+        with self._pending_lock:
+            self._pending.pop(key, None)
+        with self._lock:
+            path = self._path(key)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def clear(self) -> int:
+        removed = 0
+        for key in self.keys():
+            self.delete(key)
+            removed += 1
+        return removed
+
+
+def frame_to_records(df: pd.DataFrame) -> np.ndarray:
+    """
+    Converts an OHLCV DataFrame (DatetimeIndex) to a sorted, de-duplicated record array.
+    """
+    index = df.index
+    if not isinstance(index, pd.DatetimeIndex):
+        index = pd.to_datetime(index, utc=True)
+    records = np.empty(len(df), dtype=RECORD_DTYPE)
+    records['ts'] = index.as_unit('ms').asi8
+    for col in OHLCV_COLUMNS:
+        if col in df.columns:
+            records[col] = df[col].to_numpy(dtype='float64', na_value=np.nan)
+        else:
+            records[col] = 0.0
+    return _dedupe_records(records)
+
+
+def _dedupe_records(records: np.ndarray) -> np.ndarray:
+    # Sort + keep the last occurrence of duplicated timestamps
+    order = np.argsort(records['ts'], kind='stable')
+    records = records[order]
+    if len(records) > 1:
+        keep = np.append(records['ts'][1:] != records['ts'][:-1], True)
+        records = records[keep]
+    return records
+
+
+def records_to_frame(records: np.ndarray) -> pd.DataFrame:
+    index = pd.to_datetime(np.asarray(records['ts']), unit='ms', utc=True)
+    index.name = 'timestamp'
+    return pd.DataFrame({col: np.asarray(records[col]) for col in OHLCV_COLUMNS}, index=index)
@@ -0,0 +1,329 @@
+import os
+import zlib
+import struct
+import bisect
+import logging
+import threading
+import numpy as np
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from .ohlcv_store import RECORD_DTYPE, OHLCV_COLUMNS, _dedupe_records
+
+logger = logging.getLogger(__name__)
+
+# Block header: magic, rows, first/last ts (ms), min low, max high, payload bytes, payload crc32
+HEADER = struct.Struct('<4sIqqddII')
+MAGIC = b'PMS1'
+# Column section: codec, decimal scale, integer width, data bytes
+COLUMN = struct.Struct('<BBBI')
+
+CODEC_DELTA = 1   # Scaled integers (value * 10^scale), first differences
+CODEC_XOR = 2     # float64 bits XOR the previous value's bits
+MAX_SCALE = 8
+
+
+class BlockInfo(NamedTuple):
+    first_ts: int
+    last_ts: int
+    offset: int      # File offset of the header
+    length: int      # Header + payload bytes
+    rows: int
+    min_low: float
+    max_high: float
+
+
+def _pack_ints(values: np.ndarray) -> Tuple[int, bytes]:
+    if len(values) == 0 or (values.min() >= -2**31 and values.max() < 2**31):
+        return 4, values.astype('<i4').tobytes()
+    return 8, values.astype('<i8').tobytes()
+
+
+def _encode_timestamps(ts: np.ndarray) -> bytes:
+    # Delta-of-delta: regular candles make this all zeros after the first entry
+    deltas = np.diff(ts)
+    dod = np.diff(deltas, prepend=0) if len(deltas) else deltas
+    width, data = _pack_ints(dod)
+    return COLUMN.pack(CODEC_DELTA, 0, width, len(data)) + data
+
+
+def _decode_timestamps(first_ts: int, width: int, data: bytes, rows: int) -> np.ndarray:
+    dod = np.frombuffer(data, dtype='<i4' if width == 4 else '<i8').astype(np.int64)
+    ts = np.empty(rows, dtype=np.int64)
+    ts[0] = first_ts
+    if rows > 1:
+        np.cumsum(np.cumsum(dod), out=ts[1:])
+        ts[1:] += first_ts
+    return ts
+
+
+def _decimal_scale(values: np.ndarray) -> Optional[int]:
+    """
+    Smallest k with values == round(values * 10^k) / 10^k exactly, or None.
+    """
+    if not np.isfinite(values).all():
+        return None
+    for k in range(MAX_SCALE + 1):
+        scaled = np.round(values * 10.0 ** k)
+        if np.abs(scaled).max(initial=0) >= 2**53:
+            return None
+        if np.array_equal(scaled / 10.0 ** k, values):
+            return k
+    return None
+
+
+def _encode_float(values: np.ndarray) -> bytes:
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    scale = _decimal_scale(values)
+    if scale is not None:
+        ints = np.round(values * 10.0 ** scale).astype(np.int64)
+        width, data = _pack_ints(np.diff(ints, prepend=0))
+        return COLUMN.pack(CODEC_DELTA, scale, width, len(data)) + data
+    bits = values.view(np.uint64)
+    data = (bits ^ np.concatenate(([np.uint64(0)], bits[:-1]))).astype('<u8').tobytes()
+    return COLUMN.pack(CODEC_XOR, 0, 8, len(data)) + data
+
+
+def _decode_float(codec: int, scale: int, width: int, data: bytes) -> np.ndarray:
+    if codec == CODEC_DELTA:
+        ints = np.cumsum(np.frombuffer(data, dtype='<i4' if width == 4 else '<i8').astype(np.int64))
+        return ints / 10.0 ** scale
+    return np.bitwise_xor.accumulate(np.frombuffer(data, dtype='<u8')).view(np.float64)
+
+
+def encode_block(records: np.ndarray, level: int = 6) -> bytes:
+    payload = _encode_timestamps(records['ts']) + b''.join(_encode_float(records[c]) for c in OHLCV_COLUMNS)
+    compressed = zlib.compress(payload, level)
+    return HEADER.pack(
+        MAGIC, len(records), int(records['ts'][0]), int(records['ts'][-1]),
+        float(np.nanmin(records['low'])) if len(records) else 0.0,
+        float(np.nanmax(records['high'])) if len(records) else 0.0,
+        len(compressed), zlib.crc32(compressed)) + compressed
+
+
+def decode_block(header: tuple, compressed: bytes) -> np.ndarray:
+    _, rows, first_ts = header[0], header[1], header[2]
+    payload = zlib.decompress(compressed)
+    records = np.empty(rows, dtype=RECORD_DTYPE)
+    pos = 0
+    for column in ['ts'] + OHLCV_COLUMNS:
+        codec, scale, width, nbytes = COLUMN.unpack_from(payload, pos)
+        pos += COLUMN.size
+        data = payload[pos:pos + nbytes]
+        pos += nbytes
+        if column == 'ts':
+            records['ts'] = _decode_timestamps(first_ts, width, data, rows)
+        else:
+            records[column] = _decode_float(codec, scale, width, data)
+    return records
+
+
+class SegmentStore:
+    """
+    Compressed, append-only archive of closed candles for long histories
+    (years of 1m bars). One file per key, e.g. `BTC_1m.seg`, made of
+    independent blocks of up to BLOCK_ROWS candles:
+
+    - header: row count, first/last timestamp, min low / max high, crc
+    - timestamps as delta-of-delta (regular bars -> zeros), prices/volume as
+      scaled-integer deltas when they are exact decimals, else float XOR
+    - the payload is zlib-compressed
+
+    Blocks decode with a handful of vectorized NumPy ops. The per-key block
+    index (from the headers) gives random access by time without reading payloads.
+    """
+    BLOCK_ROWS = 4096
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        os.makedirs(self.root_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index: Dict[str, List[BlockInfo]] = {}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root_dir, f"{key}.seg")
+
+    def keys(self) -> List[str]:
+        try:
+            return sorted(f[:-4] for f in os.listdir(self.root_dir) if f.endswith('.seg'))
+        except FileNotFoundError:
+            return []
+
+    # --- Index ---
+
+    def _blocks(self, key: str) -> List[BlockInfo]:
+        blocks = self._index.get(key)
+        if blocks is None:
+            with self._lock:
+                blocks = self._index.get(key)
+                if blocks is None:
+                    blocks = self._index[key] = self._scan(key)
+        return blocks
+
+    def _scan(self, key: str) -> List[BlockInfo]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return []
+        blocks = []
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            offset = 0
+            while offset + HEADER.size <= size:
+                header = HEADER.unpack(f.read(HEADER.size))
+                magic, rows, first_ts, last_ts, min_low, max_high, nbytes, crc = header
+                if magic != MAGIC or offset + HEADER.size + nbytes > size:
+                    break
+                if zlib.crc32(f.read(nbytes)) != crc:
+                    break
+                blocks.append(BlockInfo(first_ts, last_ts, offset, HEADER.size + nbytes, rows, min_low, max_high))
+                offset += HEADER.size + nbytes
+        if offset < size:
+            # Torn trailing block (crash mid-append): drop it
+            logger.warning(f"Truncating torn segment tail of {key} at {offset} bytes")
+            with open(path, 'r+b') as f:
+                f.truncate(offset)
+        return blocks
+
+    def time_range(self, key: str) -> Optional[tuple]:
+        blocks = self._blocks(key)
+        if not blocks:
+            return None
+        return blocks[0].first_ts, blocks[-1].last_ts
+
+    def row_count(self, key: str) -> int:
+        return sum(b.rows for b in self._blocks(key))
+
+    def size_bytes(self, key: str) -> int:
+        blocks = self._blocks(key)
+        return blocks[-1].offset + blocks[-1].length if blocks else 0
+
+    # --- Reads ---
+
+    def _read_block(self, key: str, block: BlockInfo) -> Optional[np.ndarray]:
+        with self._lock:
+            current = self._index.get(key, [])
+            if block not in current:
+                # Re-encoded meanwhile (tail block grew, or the key was rebuilt)
+                block = next((b for b in current if b.first_ts == block.first_ts), None)
+                if block is None:
+                    return None
+            with open(self._path(key), 'rb') as f:
+                f.seek(block.offset)
+                raw = f.read(block.length)
+        # Decoding happens outside the lock
+        return decode_block(HEADER.unpack_from(raw, 0), raw[HEADER.size:])
+
+    def iter_blocks(self, key: str, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> Iterator[np.ndarray]:
+        """
+        Yields decoded record arrays per block, clipped to [start_ms, end_ms].
+        Only blocks overlapping the range are read.
+        """
+        blocks = self._blocks(key)
+        if not blocks:
+            return
+        lo = 0
+        if start_ms is not None:
+            # First block whose last_ts >= start
+            lo = bisect.bisect_left([b.last_ts for b in blocks], start_ms)
+        for block in blocks[lo:]:
+            if end_ms is not None and block.first_ts > end_ms:
+                break
+            records = self._read_block(key, block)
+            if records is None:
+                continue
+            if start_ms is not None and records['ts'][0] < start_ms:
+                records = records[records['ts'] >= start_ms]
+            if end_ms is not None and records['ts'][-1] > end_ms:
+                records = records[records['ts'] <= end_ms]
+            if len(records):
+                yield records
+
+    def read(self, key: str, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> np.ndarray:
+        chunks = list(self.iter_blocks(key, start_ms, end_ms))
+        if not chunks:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        return chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+
+    # --- Writes ---
+
+    def append(self, key: str, records: np.ndarray) -> int:
+        """
+        Archives candles newer than the last archived one. A partial last
+        block is re-encoded together with the new rows. Returns rows added.
+        """
+        with self._lock:
+            # Copy-on-write: readers keep iterating their own snapshot of the index
+            blocks = list(self._index[key] if key in self._index else self._scan(key))
+            if blocks:
+                records = records[records['ts'] > blocks[-1].last_ts]
+            if len(records) == 0:
+                return 0
+            added = len(records)
+
+            path = self._path(key)
+            offset = blocks[-1].offset + blocks[-1].length if blocks else 0
+            if blocks and blocks[-1].rows < self.BLOCK_ROWS:
+                tail = blocks.pop()
+                with open(path, 'rb') as f:
+                    f.seek(tail.offset)
+                    raw = f.read(tail.length)
+                records = np.concatenate([decode_block(HEADER.unpack_from(raw, 0), raw[HEADER.size:]), records])
+                offset = tail.offset
+
+            data, new_blocks = self._encode(records, offset)
+            mode = 'r+b' if os.path.exists(path) else 'wb'
+            with open(path, mode) as f:
+                f.seek(offset)
+                f.write(data)
+                f.truncate()
+            self._index[key] = blocks + new_blocks
+            return added
+
+    def replace(self, key: str, records: np.ndarray):
+        """
+        Rewrites a key from scratch (e.g. after older candles were backfilled).
+        """
+        with self._lock:
+            data, blocks = self._encode(_dedupe_records(records), 0)
+            path = self._path(key)
+            temp_file = path + ".tmp"
+            with open(temp_file, 'wb') as f:
+                f.write(data)
+            os.replace(temp_file, path)
+            self._index[key] = blocks
+
+    def _encode(self, records: np.ndarray, offset: int) -> Tuple[bytes, List[BlockInfo]]:
+        parts, blocks = [], []
+        for i in range(0, len(records), self.BLOCK_ROWS):
+            chunk = records[i:i + self.BLOCK_ROWS]
+            raw = encode_block(chunk)
+            header = HEADER.unpack_from(raw, 0)
+            blocks.append(BlockInfo(header[2], header[3], offset, len(raw), header[1], header[4], header[5]))
+            parts.append(raw)
+            offset += len(raw)
+        return b''.join(parts), blocks
+
+    def delete(self, key: str):
+        with self._lock:
+            self._index.pop(key, None)
+            path = self._path(key)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def clear(self) -> int:
+        removed = 0
+        for key in self.keys():
+            self.delete(key)
+            removed += 1
+        return removed
+
+    def metrics(self) -> dict:
+        keys = self.keys()
+        rows = sum(self.row_count(k) for k in keys)
+        size = sum(self.size_bytes(k) for k in keys)
+        return {
+            "keys": len(keys),
+            "rows": rows,
+            "bytes": size,
+            "bytes_per_row": round(size / rows, 2) if rows else None,
+            "raw_bytes_per_row": RECORD_DTYPE.itemsize
+        }
@@ -0,0 +1,201 @@
+import logging
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Callable, Dict, Iterable, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# dtype kinds measured from their buffers (bool, ints, floats, datetimes)
+NUMERIC_KINDS = 'biufmM'
+
+
+def frame_nbytes(df: Optional[pd.DataFrame]) -> int:
+    """
+    Bytes held by a frame, including the index and object columns (e.g. 'color').
+    """
+    if df is None:
+        return 0
+    try:
+        # Numeric columns/index: buffer sizes (deep introspection only for object data)
+        if all(getattr(dtype, 'kind', 'O') in NUMERIC_KINDS for dtype in [*df.dtypes, df.index.dtype]):
+            return int(sum(df[c].values.nbytes for c in df.columns) + df.index.nbytes)
+        return int(df.memory_usage(index=True, deep=True).sum())
+    except Exception:
+        return 0
+
+
+class SeriesCache(MutableMapping):
+    """
+    Memory-budgeted { "SYMBOL_TF": DataFrame } cache (drop-in for the adapter's dict).
+
+    - Sizes are accounted per entry (deep memory usage) against `budget_bytes`.
+    - Over budget, cold entries are evicted: among the SAMPLE least recently
+      used unpinned entries, the least frequently used one goes first.
+    - Evicted entries are handed to `spill(key, df)` (persist if the store is
+      behind) and come back transparently through `load(key)` on the next
+      get/[] access. `in`, len() and iteration only see resident entries.
+    - Pinned keys (dashboard series) are never evicted.
+    """
+    SAMPLE = 8              # LRU candidates compared by hit count per eviction
+    REMEASURE_EVERY = 64    # Full re-measure after this many inserts, at least (in case a frame was modified in place)
+
+    def __init__(self, budget_bytes: int,
+                 load: Optional[Callable[[str], Optional[pd.DataFrame]]] = None,
+                 spill: Optional[Callable[[str, pd.DataFrame], None]] = None):
+        self.budget_bytes = budget_bytes
+        self.load = load
+        self.spill = spill
+        # LRU order: oldest first
+        self.entries: "OrderedDict[str, pd.DataFrame]" = OrderedDict()
+        self.sizes: Dict[str, int] = {}
+        self.hits: Dict[str, int] = {}
+        self.pinned = set()
+        self.total_bytes = 0
+        self._inserts = 0
+        self._loading = set()
+        self.stats = {"hits": 0, "misses": 0, "reloads": 0, "evictions": 0, "evicted_bytes": 0, "spill_errors": 0}
+
+    # --- Mapping interface ---
+
+    def __getitem__(self, key: str) -> pd.DataFrame:
+        df = self.entries.get(key)
+        if df is not None:
+            self.entries.move_to_end(key)
+            self.hits[key] = self.hits.get(key, 0) + 1
+            self.stats["hits"] += 1
+            return df
+        self.stats["misses"] += 1
+        df = self._reload(key)
+        if df is None:
+            raise KeyError(key)
+        return df
+
+    def __setitem__(self, key: str, df: pd.DataFrame):
+        self.total_bytes -= self.sizes.get(key, 0)
+        self.entries[key] = df
+        self.entries.move_to_end(key)
+        self.sizes[key] = frame_nbytes(df)
+        self.total_bytes += self.sizes[key]
+        self.hits.setdefault(key, 1)
+        self._inserts += 1
+        # At least one insert per resident entry between full re-measures (amortized O(1))
+        if self._inserts >= max(self.REMEASURE_EVERY, len(self.entries)):
+            self._inserts = 0
+            self.remeasure()
+        self._enforce_budget(keep=key)
+
+    def __delitem__(self, key: str):
+        del self.entries[key]
+        self.total_bytes -= self.sizes.pop(key, 0)
+        self.hits.pop(key, None)
+
+    def __contains__(self, key) -> bool:
+        return key in self.entries
+
+    def __iter__(self):
+        # Snapshot: callers may touch entries (LRU reorder) while iterating
+        return iter(list(self.entries))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def keys(self):
+        return list(self.entries)
+
+    def items(self):
+        # No LRU/hit bookkeeping for bulk scans
+        return list(self.entries.items())
+
+    def values(self):
+        return list(self.entries.values())
+
+    def clear(self):
+        self.entries.clear()
+        self.sizes.clear()
+        self.hits.clear()
+        self.total_bytes = 0
+
+    # --- Budget ---
+
+    def pin(self, keys: Iterable[str]):
+        self.pinned.update(keys)
+
+    def unpin(self, keys: Iterable[str]):
+        self.pinned.difference_update(keys)
+
+    def remeasure(self):
+        """
+        Re-measures every resident entry (catches frames modified in place).
+        """
+        self.sizes = {key: frame_nbytes(df) for key, df in self.entries.items()}
+        self.total_bytes = sum(self.sizes.values())
+
+    def over_budget(self) -> bool:
+        return self.total_bytes > self.budget_bytes
+
+    def _victim(self, keep: Optional[str]) -> Optional[str]:
+        candidates = []
+        for key in self.entries:
+            if key == keep or key in self.pinned:
+                continue
+            candidates.append(key)
+            if len(candidates) >= self.SAMPLE:
+                break
+        if not candidates:
+            return None
+        victim = min(candidates, key=lambda k: self.hits.get(k, 0))
+        # Age the survivors so formerly hot entries can become cold
+        for key in candidates:
+            self.hits[key] = self.hits.get(key, 0) // 2
+        return victim
+
+    def _enforce_budget(self, keep: Optional[str] = None):
+        while self.total_bytes > self.budget_bytes:
+            victim = self._victim(keep)
+            if victim is None:
+                # Only pinned/just-written entries left: allow the overshoot
+                return
+            self.evict(victim)
+
+    def evict(self, key: str):
+        df = self.entries.get(key)
+        if df is None:
+            return
+        if self.spill is not None:
+            try:
+                self.spill(key, df)
+            except Exception as e:
+                self.stats["spill_errors"] += 1
+                logger.error(f"Failed to spill {key}: {e}")
+        self.stats["evictions"] += 1
+        self.stats["evicted_bytes"] += self.sizes.get(key, 0)
+        del self[key]
+
+    def _reload(self, key: str) -> Optional[pd.DataFrame]:
+        if self.load is None or key in self._loading:
+            return None
+        # Guard: loaders may read other keys (4h/1d -> 1h) through this cache
+        self._loading.add(key)
+        try:
+            df = self.load(key)
+        except Exception as e:
+            logger.error(f"Failed to reload {key}: {e}")
+            df = None
+        finally:
+            self._loading.discard(key)
+        if df is None or df.empty:
+            return None
+        self.stats["reloads"] += 1
+        self[key] = df
+        return df
+
+    def metrics(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+            "budget_bytes": self.budget_bytes,
+            "pinned": len(self.pinned),
+            **self.stats
+        }
@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional, Tuple, Type
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Event:
+    emitted_at: float = field(default_factory=time.time, init=False)
+
+    @property
+    def kind(self) -> str:
+        return type(self).__name__
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["event"] = self.kind
+        return data
+
+
+@dataclass
+class CandleClosed(Event):
+    symbol: str
+    timeframe: str
+    time: int  # Candle open time (epoch ms)
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+
+
+@dataclass
+class CandleRevised(Event):
+    """
+    The open (live) candle changed after a refresh.
+    """
+    symbol: str
+    timeframe: str
+    time: int
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+
+
+@dataclass
+class PriceTick(Event):
+    symbol: str
+    price: float
+    ts: float
+
+
+@dataclass
+class MicroBar(Event):
+    """
+    The 1-second micro-bar of a symbol after a price tick (see MicroBarStore).
+    """
+    symbol: str
+    time: int  # Bar open time (epoch ms)
+    open: float
+    high: float
+    low: float
+    close: float
+    ticks: int
+
+
+@dataclass
+class LiveProbability(Event):
+    """
+    P(live candle closes green) after a price tick (see LiveStats).
+    """
+    symbol: str
+    timeframe: str
+    green: float
+    elapsed: float       # Fraction of the candle elapsed
+    delta_sigma: float   # Move from the open in sigmas
+    samples: int
+
+
+@dataclass
+class GapRepaired(Event):
+    symbol: str
+    timeframe: str
+    start: int  # epoch ms
+    end: int    # epoch ms
+    candles: int
+
+
+@dataclass
+class StatsSnapshot(Event):
+    """
+    Fresh `Analyzer.get_stats` payload, published once per closed candle.
+    """
+    symbol: str
+    timeframe: str
+    stats: dict
+
+
+class Subscription:
+    """
+    Bounded per-subscriber queue. When full, the oldest event is dropped so a
+    slow subscriber never blocks the publisher or the other subscribers.
+    """
+    def __init__(self, bus: "EventBus", name: str, event_types: Optional[Tuple[Type[Event], ...]], maxsize: int):
+        self.bus = bus
+        self.name = name
+        self.event_types = event_types
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        # emitted_at of the queued events, oldest first (mirrors the queue)
+        self._pending: deque = deque()
+        self.delivered = 0
+        self.dropped = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+
+    def accepts(self, event: Event) -> bool:
+        return self.event_types is None or isinstance(event, self.event_types)
+
+    def _offer(self, event: Event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            try:
+                self.queue.get_nowait()
+                self._pending.popleft()
+            except asyncio.QueueEmpty:
+                pass
+            self.dropped += 1
+            self.queue.put_nowait(event)
+        self._pending.append(event.emitted_at)
+
+    def _record(self, event: Event):
+        if self._pending:
+            self._pending.popleft()
+        self.delivered += 1
+        self.last_lag_ms = (time.time() - event.emitted_at) * 1000
+        self.max_lag_ms = max(self.max_lag_ms, self.last_lag_ms)
+
+    async def get(self) -> Event:
+        event = await self.queue.get()
+        self._record(event)
+        return event
+
+    async def get_batch(self, max_items: int = 500) -> List[Event]:
+        """
+        Waits for one event, then drains whatever else is already queued.
+        """
+        events = [await self.get()]
+        while len(events) < max_items:
+            try:
+                event = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            self._record(event)
+            events.append(event)
+        return events
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+    def metrics(self) -> dict:
+        oldest_ms = None
+        if self._pending:
+            oldest_ms = round((time.time() - self._pending[0]) * 1000, 1)
+        return {
+            "depth": self.queue.qsize(),
+            "maxsize": self.queue.maxsize,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "last_lag_ms": round(self.last_lag_ms, 1),
+            "max_lag_ms": round(self.max_lag_ms, 1),
+            "oldest_pending_ms": oldest_ms
+        }
+
+
+class EventBus:
+    """
+    In-process async pub/sub for market-data events.
+    `publish` is synchronous and non-blocking (call it from the event loop).
+    """
+    def __init__(self):
+        self.subscribers: List[Subscription] = []
+        self.published: Dict[str, int] = {}
+
+    def subscribe(self, name: str, event_types: Optional[Tuple[Type[Event], ...]] = None, maxsize: int = 1000) -> Subscription:
+        sub = Subscription(self, name, event_types, maxsize)
+        self.subscribers.append(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        if sub in self.subscribers:
+            self.subscribers.remove(sub)
+
+    def publish(self, event: Event):
+        self.published[event.kind] = self.published.get(event.kind, 0) + 1
+        for sub in self.subscribers:
+            if sub.accepts(event):
+                sub._offer(event)
+
+    def metrics(self) -> dict:
+        subs = {}
+        for sub in self.subscribers:
+            # Several SSE clients share a name; suffix duplicates
+            name = sub.name if sub.name not in subs else f"{sub.name}#{id(sub)}"
+            subs[name] = sub.metrics()
+        return {"published": dict(self.published), "subscribers": subs}
@@ -0,0 +1,134 @@
+import logging
+import time
+from typing import Dict, List, Optional
+from .timeframes import timeframe_ms, next_close_ms, current_open_ms, source_timeframe, derived_timeframes, split_key
+
+logger = logging.getLogger(__name__)
+
+
+class FreshnessManager:
+    """
+    Keeps cached series fresh by refreshing them right after candle boundaries.
+
+    Tracks, per fetched (source) key, the next expected candle close. When it
+    passes (+ a small exchange settle delay) the key gets an incremental
+    `since` update. Derived 4h/1d keys follow their 1h source (in base-feed
+    mode every dashboard timeframe follows the 1m base key).
+    Data that is behind the wall clock is marked stale, never dropped.
+    """
+    SETTLE_DELAY = 1.0        # Seconds after a boundary before the exchange has the closed candle
+    RETRY_DELAY = 10.0        # Seconds before retrying a key that is still behind
+    MAX_SLEEP = 30.0          # Upper bound so newly tracked keys are picked up
+
+    def __init__(self, adapter):
+        self.adapter = adapter
+        # { source_key: epoch seconds when the next refresh is due }
+        self.next_refresh: Dict[str, float] = {}
+        # { key: {"last_candle": ms, "expected_open": ms, "stale": bool, "checked_at": s} }
+        self.status: Dict[str, dict] = {}
+        self.refresh_count = 0
+        # Keys tracked explicitly even before they are cached (e.g. dashboard symbols)
+        self.extra_keys = set()
+
+    @property
+    def base(self) -> Optional[str]:
+        return getattr(self.adapter, 'BASE_TIMEFRAME', None)
+
+    def track(self, symbol: str, timeframe: str):
+        self.extra_keys.add(f"{symbol}_{source_timeframe(timeframe, self.base)}")
+
+    def tracked_keys(self) -> List[str]:
+        """
+        Source keys to keep fresh: everything in the adapter cache (4h/1d -> 1h).
+        """
+        keys = set(self.extra_keys)
+        base = self.base
+        for key in list(self.adapter.cache.keys()):
+            symbol, tf = split_key(key)
+            if timeframe_ms(tf) > 0:
+                keys.add(f"{symbol}_{source_timeframe(tf, base)}")
+        return sorted(keys)
+
+    def _due_time(self, tf: str, now: float) -> float:
+        return next_close_ms(tf, int(now * 1000)) / 1000 + self.SETTLE_DELAY
+
+    def due_keys(self, now: Optional[float] = None, keys: Optional[List[str]] = None) -> List[str]:
+        """
+        Due source keys (of `keys`, default all tracked), most overdue first.
+        """
+        now = now or time.time()
+        due = []
+        for key in self.tracked_keys() if keys is None else keys:
+            if key not in self.next_refresh:
+                # Newly tracked: catch up once, then follow the boundaries
+                self.next_refresh[key] = now
+            if self.next_refresh[key] <= now:
+                due.append(key)
+        due.sort(key=self.next_refresh.__getitem__)
+        return due
+
+    def next_due_in(self, now: Optional[float] = None, keys: Optional[List[str]] = None) -> float:
+        now = now or time.time()
+        times = self.next_refresh.values() if keys is None else [self.next_refresh[k] for k in keys if k in self.next_refresh]
+        if not times:
+            return self.MAX_SLEEP
+        wait = min(times) - now
+        return max(0.0, min(wait, self.MAX_SLEEP))
+
+    def is_stale(self, key: str, now: Optional[float] = None) -> bool:
+        """
+        True if the cached series doesn't contain the currently open candle yet.
+        """
+        df = self.adapter.cache.get(key)
+        if df is None or df.empty:
+            return True
+        _, tf = split_key(key)
+        expected_open = current_open_ms(tf, int((now or time.time()) * 1000))
+        return int(df.index[-1].value // 10**6) < expected_open
+
+    def _mark(self, key: str, now: float):
+        symbol, tf = split_key(key)
+        keys = [key] + [f"{symbol}_{d}" for d in derived_timeframes(tf, self.base)]
+        for k in keys:
+            df = self.adapter.cache.get(k)
+            if df is None or df.empty:
+                continue
+            _, k_tf = split_key(k)
+            self.status[k] = {
+                "last_candle": int(df.index[-1].value // 10**6),
+                "expected_open": current_open_ms(k_tf, int(now * 1000)),
+                "stale": self.is_stale(k, now),
+                "checked_at": now
+            }
+
+    async def refresh(self, key: str):
+        symbol, tf = split_key(key)
+        now = time.time()
+        try:
+            cached = self.adapter.cache.get(key)
+            if cached is None or cached.empty:
+                # Not in memory yet: store restore + catch-up (or first fetch);
+                # the scheduler's budgets apply instead of the request admission gate
+                await self.adapter.fetch_ohlcv(symbol, tf, admit=False)
+            else:
+                # Incremental `since` fetch
+                await self.adapter.update_cache(symbol, tf)
+            self.refresh_count += 1
+        except Exception as e:
+            logger.error(f"Freshness refresh failed for {key}: {e}")
+
+        now = time.time()
+        self._mark(key, now)
+        if self.status.get(key, {}).get("stale") or key not in self.status:
+            # Exchange hasn't published the new candle yet (or nothing fetched) -> retry soon
+            self.next_refresh[key] = now + self.RETRY_DELAY
+        else:
+            self.next_refresh[key] = self._due_time(tf, now)
+
+    def metrics(self) -> dict:
+        return {
+            "tracked": len(self.next_refresh),
+            "refreshes": self.refresh_count,
+            "stale_keys": sorted(k for k, v in self.status.items() if v.get("stale")),
+            "next_refresh_in": {k: round(v - time.time(), 1) for k, v in sorted(self.next_refresh.items())}
+        }
@@ -0,0 +1,441 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+import ccxt.async_support as ccxt
+import numpy as np
+
+from .universe import preferred_markets
+
+logger = logging.getLogger(__name__)
+
+# Spot markets only (one market type per venue, so one bulk ticker call works);
+# USD and stablecoin quotes are treated as the same unit
+INDEX_QUOTES = {
+    'binance': ('USDT', 'USDC'),
+    'coinbase': ('USD', 'USDC'),
+    'kraken': ('USD', 'USDT'),
+    'okx': ('USDT', 'USDC'),
+    'bybit': ('USDT', 'USDC'),
+}
+DEFAULT_VENUES = ('binance', 'coinbase', 'kraken', 'okx', 'bybit')
+METHODS = ('median', 'vwap')
+MIN_OUTLIER_VENUES = 3
+
+# Suffix of the shared price slot the leader publishes the composite under
+SHARED_SUFFIX = "@IDX"
+
+
+def weighted_median(values: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    Lower weighted median of each column of `values` (venues x columns).
+    Zero-weight or NaN entries are ignored; columns without weight are NaN.
+    """
+    weights = np.where(np.isnan(values), 0.0, weights)
+    order = np.argsort(np.where(weights > 0, values, np.inf), axis=0)
+    v = np.take_along_axis(values, order, axis=0)
+    cum = np.cumsum(np.take_along_axis(weights, order, axis=0), axis=0)
+    total = cum[-1]
+    # First row whose cumulative weight reaches half the column's weight
+    idx = np.minimum((cum < total / 2).sum(axis=0), len(values) - 1)
+    median = v[idx, np.arange(values.shape[1])]
+    return np.where(total > 0, median, np.nan)
+
+
+def combine(values: np.ndarray, weights: np.ndarray, volumes: Optional[np.ndarray] = None,
+            method: str = 'median') -> np.ndarray:
+    """
+    Weighted median or, for 'vwap', volume x weight mean of each column
+    (the median where a column has no known volume).
+    """
+    median = weighted_median(values, weights)
+    if method != 'vwap' or volumes is None:
+        return median
+    with np.errstate(invalid='ignore', divide='ignore'):
+        w = np.where(np.isnan(values), 0.0, weights * np.nan_to_num(volumes))
+        total = w.sum(axis=0)
+        mean = (np.where(w > 0, values, 0.0) * w).sum(axis=0) / total
+    return np.where(total > 0, mean, median)
+
+
+def composite(prices: np.ndarray, weights: np.ndarray, volumes: Optional[np.ndarray] = None,
+              method: str = 'median', outlier_pct: float = 1.0):
+    """
+    Composite price per column of venue x column matrices in one pass.
+
+    Venues further than `outlier_pct` % from the weighted median are dropped
+    (weight 0) where at least MIN_OUTLIER_VENUES contribute, then the rest combine as a weighted median or, for 'vwap', a
+    volume x weight mean (falling back to the median where no volume is known).
+    Returns (price, final weights, outlier mask).
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weights = np.where(np.isnan(prices), 0.0, weights)
+        center = weighted_median(prices, weights)
+        outliers = (weights > 0) & (np.abs(prices / center - 1.0) * 100 > outlier_pct)
+        # Two venues apart have no majority to decide which one is off: keep both
+        outliers &= (weights > 0).sum(axis=0) >= MIN_OUTLIER_VENUES
+        weights = np.where(outliers, 0.0, weights)
+    return combine(prices, weights, volumes, method), weights, outliers
+
+
+class IndexPrice:
+    """
+    Multi-exchange composite ("index") price, independent of the adapter's
+    single-exchange candle feed.
+
+    - Tickers: one bulk ticker call per venue, all venues concurrently under a
+      shared deadline (DEADLINE); venues still running at the deadline are
+      cancelled and counted as timeouts instead of delaying the composite.
+    - Every venue's last quote is kept with its timestamp. A venue that missed
+      a round keeps contributing with a freshness weight (halving every
+      FRESH_HALF_LIFE seconds) until MAX_AGE, so a slow or failed venue fades
+      out instead of flipping the index.
+    - Composite: venue x symbol matrices, outlier cut around the weighted
+      median, then weighted median (default) or volume-weighted mean.
+    - Klines: the same fan-out for OHLCV, combined per candle timestamp.
+    - Per-venue latency (last / EWMA), timeouts, errors and how often the venue
+      was the slowest one of a round, so a venue that slows the composite shows up.
+
+    Only the leader fetches tickers; it publishes composite prices into the
+    shared price slots ("BTC@IDX") for reader processes.
+    """
+    DEADLINE = float(os.getenv("INDEX_DEADLINE", "1.5"))             # Seconds per ticker round
+    KLINE_DEADLINE = float(os.getenv("INDEX_KLINE_DEADLINE", "5.0"))  # Seconds per OHLCV round
+    METHOD = os.getenv("INDEX_METHOD", "median")
+    OUTLIER_PCT = float(os.getenv("INDEX_OUTLIER_PCT", "1.0"))  # Max deviation from the median
+    FRESH_HALF_LIFE = 5.0     # Seconds for a quote's weight to halve
+    MAX_AGE = 30.0            # Quotes older than this carry no weight
+    MIN_VENUES = 2            # Fewer contributing venues -> "degraded"
+    MARKETS_TTL = 6 * 60 * 60
+    MARKETS_RETRY = 300.0     # Seconds before retrying a venue whose markets failed to load
+    KLINE_TTL = 10.0          # Seconds a composite candle series is reused
+    LATENCY_ALPHA = 0.2       # EWMA weight of the newest latency sample
+
+    def __init__(self, venues: Optional[List[str]] = None):
+        if venues is None:
+            env = os.getenv("INDEX_VENUES", "")
+            venues = [v.strip().lower() for v in env.split(',') if v.strip()] or list(DEFAULT_VENUES)
+        if self.METHOD not in METHODS:
+            logger.warning(f"Unknown INDEX_METHOD {self.METHOD!r}, using median")
+            self.METHOD = 'median'
+        self.exchanges = {}
+        for venue in venues:
+            try:
+                self.exchanges[venue] = getattr(ccxt, venue)({'timeout': 5000, 'enableRateLimit': True})
+            except Exception as e:
+                logger.error(f"Failed to init index venue {venue}: {e}")
+        self.venues: List[str] = list(self.exchanges)
+        # { venue: { base: market symbol } } from each venue's loaded markets
+        self.markets: Dict[str, Dict[str, str]] = {}
+        self.markets_at: Dict[str, float] = {}
+        self._markets_tried: Dict[str, float] = {}
+        self._loading: Dict[str, asyncio.Task] = {}
+        # { venue: { base: (price, quote volume, ts) } } last quote per venue
+        self.quotes: Dict[str, Dict[str, tuple]] = {v: {} for v in self.venues}
+        # Latest composite per symbol
+        self.latest: Dict[str, dict] = {}
+        self._klines: Dict[tuple, tuple] = {}
+        self.shared = None
+        self.stats = {v: {"rounds": 0, "ok": 0, "timeouts": 0, "errors": 0, "slowest": 0,
+                          "last_ms": None, "ewma_ms": None, "last_error": None, "last_ok": None}
+                      for v in self.venues}
+        self.rounds = 0
+        self.last_round: Optional[dict] = None
+
+    def attach_shared(self, shared):
+        self.shared = shared
+
+    @property
+    def read_only(self) -> bool:
+        return self.shared is not None and not self.shared.is_leader
+
+    async def close(self):
+        for task in list(self._loading.values()):
+            task.cancel()
+        for exchange in self.exchanges.values():
+            try:
+                await exchange.close()
+            except Exception:
+                pass
+
+    # --- Markets ---
+
+    async def _load_markets(self, venue: str):
+        self._markets_tried[venue] = time.time()
+        try:
+            loaded = await asyncio.wait_for(self.exchanges[venue].load_markets(), timeout=30.0)
+            listed = [s for s, m in loaded.items() if m.get('active', True) is not False]
+            self.markets[venue] = preferred_markets(listed, INDEX_QUOTES.get(venue, ('USD', 'USDT', 'USDC')))
+            self.markets_at[venue] = time.time()
+        except Exception as e:
+            logger.error(f"Failed to load index markets from {venue}: {e}")
+
+    def load_markets(self) -> list:
+        """
+        Starts (re)loading the markets of venues never loaded or older than
+        MARKETS_TTL in the background; a venue is skipped until its markets
+        are loaded. Returns the loads in flight (await them to wait).
+        """
+        now = time.time()
+        for venue in self.venues:
+            if venue in self._loading or now - self.markets_at.get(venue, 0) <= self.MARKETS_TTL:
+                continue
+            if now - self._markets_tried.get(venue, 0) <= self.MARKETS_RETRY:
+                continue
+            task = asyncio.create_task(self._load_markets(venue))
+            task.add_done_callback(lambda _, v=venue: self._loading.pop(v, None))
+            self._loading[venue] = task
+        return list(self._loading.values())
+
+    def venues_for(self, symbol: str) -> List[str]:
+        base = symbol.split('/')[0]
+        return [v for v in self.venues if base in self.markets.get(v, {})]
+
+    # --- Fan-out ---
+
+    def _record(self, venue: str, ms: Optional[float], error: Optional[str] = None, timeout: bool = False):
+        stats = self.stats[venue]
+        stats["rounds"] += 1
+        if timeout:
+            stats["timeouts"] += 1
+        elif error is not None:
+            stats["errors"] += 1
+            stats["last_error"] = error
+        else:
+            stats["ok"] += 1
+            stats["last_ok"] = time.time()
+        if ms is not None:
+            stats["last_ms"] = round(ms, 1)
+            ewma = stats["ewma_ms"]
+            stats["ewma_ms"] = round(ms if ewma is None else ewma + self.LATENCY_ALPHA * (ms - ewma), 1)
+
+    async def _fan_out(self, calls: Dict[str, object], deadline: float) -> Dict[str, object]:
+        """
+        Runs {venue: coroutine} concurrently until `deadline` seconds have
+        passed; returns {venue: result} of the venues that answered in time.
+        """
+        started = time.perf_counter()
+        elapsed: Dict[str, float] = {}
+
+        async def timed(venue, call):
+            try:
+                return await call
+            finally:
+                elapsed[venue] = (time.perf_counter() - started) * 1000
+
+        tasks = {asyncio.create_task(timed(v, c)): v for v, c in calls.items()}
+        if not tasks:
+            return {}
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in pending:
+            task.cancel()
+        results = {}
+        for task, venue in tasks.items():
+            if task in pending:
+                self._record(venue, deadline * 1000, timeout=True)
+                continue
+            error = task.exception()
+            if error is not None:
+                self._record(venue, elapsed.get(venue), error=f"{type(error).__name__}: {error}"[:200])
+                continue
+            self._record(venue, elapsed.get(venue))
+            results[venue] = task.result()
+        # The venue the round waited for (the deadline if anyone timed out)
+        slowest = tasks[next(iter(pending))] if pending else max(elapsed, key=elapsed.get)
+        self.stats[slowest]["slowest"] += 1
+        return results
+
+    async def _fetch_tickers(self, venue: str, markets: Dict[str, str]) -> Dict[str, tuple]:
+        exchange = self.exchanges[venue]
+        if exchange.has.get('fetchTickers'):
+            tickers = await exchange.fetch_tickers(list(markets))
+        else:
+            fetched = await asyncio.gather(*(exchange.fetch_ticker(m) for m in markets), return_exceptions=True)
+            tickers = {m: t for m, t in zip(markets, fetched) if isinstance(t, dict)}
+        received = time.time()
+        quotes = {}
+        for market, base in markets.items():
+            ticker = tickers.get(market)
+            if not ticker:
+                continue
+            price = ticker.get('last') or ticker.get('close')
+            if not price or price <= 0:
+                continue
+            volume = ticker.get('quoteVolume')
+            if volume is None and ticker.get('baseVolume') is not None:
+                volume = ticker['baseVolume'] * price
+            # Venues without a ticker timestamp: time of receipt
+            ts = ticker.get('timestamp')
+            ts = min(ts / 1000, received) if ts else received
+            quotes[base] = (float(price), float(volume) if volume is not None else np.nan, ts)
+        return quotes
+
+    async def refresh(self, symbols: List[str]) -> Dict[str, dict]:
+        """
+        Leader: one ticker round over every venue for `symbols`, then the
+        composite for all of them (published to the shared price slots).
+        """
+        self.load_markets()
+        bases = list(dict.fromkeys(s.split('/')[0] for s in symbols))
+        calls = {}
+        for venue in self.venues:
+            listed = self.markets.get(venue, {})
+            markets = {listed[b]: b for b in bases if b in listed}
+            if markets:
+                calls[venue] = self._fetch_tickers(venue, markets)
+        started = time.time()
+        results = await self._fan_out(calls, self.DEADLINE)
+        for venue, quotes in results.items():
+            self.quotes[venue].update(quotes)
+        self.rounds += 1
+        self.last_round = {
+            "at": started,
+            "venues": len(calls),
+            "answered": len(results),
+            "ms": round((time.time() - started) * 1000, 1)
+        }
+        computed = self.compute(bases)
+        if self.shared is not None and self.shared.is_leader:
+            for symbol, entry in computed.items():
+                if entry["price"] is not None:
+                    self.shared.publish_price(symbol + SHARED_SUFFIX, entry["price"], entry["ts"])
+        return computed
+
+    # --- Composite ---
+
+    def compute(self, symbols: List[str], now: Optional[float] = None) -> Dict[str, dict]:
+        """
+        Composite of the venues' last quotes for every symbol at once.
+        """
+        now = time.time() if now is None else now
+        if not symbols:
+            return {}
+        shape = (len(self.venues), len(symbols))
+        prices = np.full(shape, np.nan)
+        volumes = np.full(shape, np.nan)
+        ts = np.full(shape, np.nan)
+        for i, venue in enumerate(self.venues):
+            quotes = self.quotes[venue]
+            for j, symbol in enumerate(symbols):
+                quote = quotes.get(symbol)
+                if quote is not None:
+                    prices[i, j], volumes[i, j], ts[i, j] = quote
+        age = np.maximum(now - ts, 0.0)
+        with np.errstate(invalid='ignore'):
+            fresh = np.where(age <= self.MAX_AGE, 0.5 ** (age / self.FRESH_HALF_LIFE), 0.0)
+        price, weights, outliers = composite(prices, fresh, volumes, self.METHOD, self.OUTLIER_PCT)
+        used = (weights > 0).sum(axis=0)
+        total = weights.sum(axis=0)
+        # Weight-averaged quote time of the contributing venues
+        with np.errstate(invalid='ignore', divide='ignore'):
+            quote_ts = np.nansum(np.where(weights > 0, ts, 0.0) * weights, axis=0) / total
+
+        result = {}
+        for j, symbol in enumerate(symbols):
+            sources = {}
+            for i, venue in enumerate(self.venues):
+                if np.isnan(prices[i, j]):
+                    continue
+                sources[venue] = {
+                    "price": float(prices[i, j]),
+                    "age_s": round(float(age[i, j]), 2),
+                    "weight": round(float(weights[i, j] / total[j]), 4) if total[j] > 0 else 0.0,
+                    "volume": None if np.isnan(volumes[i, j]) else float(volumes[i, j]),
+                    "outlier": bool(outliers[i, j])
+                }
+            ok = used[j] > 0 and not np.isnan(price[j])
+            result[symbol] = {
+                "symbol": symbol,
+                "price": float(price[j]) if ok else None,
+                "ts": float(quote_ts[j]) if ok else None,
+                "method": self.METHOD,
+                "venues": int(used[j]),
+                "degraded": bool(used[j] < self.MIN_VENUES),
+                "sources": sources
+            }
+        self.latest.update(result)
+        return result
+
+    def get(self, symbol: str) -> Optional[dict]:
+        """
+        Latest composite for `symbol`; readers get the leader's price from
+        shared memory (without the per-venue breakdown). None once its quotes
+        are older than MAX_AGE (e.g. a symbol no longer in the ticker rounds).
+        """
+        base = symbol.split('/')[0]
+        now = time.time()
+        if self.read_only:
+            shared = self.shared.read_price(base + SHARED_SUFFIX)
+            if shared is None or now - shared[1] > self.MAX_AGE:
+                return None
+            price, ts = shared
+            return {"symbol": base, "price": price, "ts": ts, "method": self.METHOD, "source": "leader"}
+        entry = self.latest.get(base)
+        if entry is not None and (entry["ts"] is None or now - entry["ts"] > self.MAX_AGE):
+            del self.latest[base]
+            return None
+        return entry
+
+    # --- Klines ---
+
+    async def _fetch_ohlcv(self, venue: str, market: str, timeframe: str, limit: int):
+        return await self.exchanges[venue].fetch_ohlcv(market, timeframe, limit=limit)
+
+    async def candles(self, symbol: str, timeframe: str = '1m', limit: int = 60) -> dict:
+        """
+        Composite OHLCV: every venue's candles fetched concurrently under
+        KLINE_DEADLINE and combined per candle timestamp (OHLC each through the
+        same venue weights; volume summed over the contributing venues).
+        Rows: [time_ms, open, high, low, close, volume, venues].
+        """
+        base = symbol.split('/')[0]
+        cache_key = (base, timeframe, limit)
+        cached = self._klines.get(cache_key)
+        if cached is not None and time.time() - cached[0] < self.KLINE_TTL:
+            return cached[1]
+
+        await asyncio.gather(*self.load_markets())
+        # Venues that don't offer the timeframe (e.g. 4h on Coinbase) sit the series out
+        calls = {v: self._fetch_ohlcv(v, self.markets[v][base], timeframe, limit) for v in self.venues_for(base)
+                 if timeframe in (getattr(self.exchanges[v], 'timeframes', None) or {timeframe: None})}
+        results = {v: rows for v, rows in (await self._fan_out(calls, self.KLINE_DEADLINE)).items() if rows}
+        venues = list(results)
+        times = np.unique(np.concatenate([np.asarray([r[0] for r in rows], dtype=np.int64)
+                                          for rows in results.values()])) if venues else np.zeros(0, dtype=np.int64)
+        times = times[-limit:]
+        # fields x venues x candles
+        ohlcv = np.full((5, len(venues), len(times)), np.nan)
+        for i, venue in enumerate(venues):
+            rows = np.asarray([r[:6] for r in results[venue]], dtype=float)
+            rows = rows[np.isin(rows[:, 0].astype(np.int64), times)]
+            cols = np.searchsorted(times, rows[:, 0].astype(np.int64))
+            ohlcv[:, i, cols] = rows[:, 1:6].T
+        if venues:
+            close, weights, _ = composite(ohlcv[3], np.ones(ohlcv[3].shape), ohlcv[4], self.METHOD, self.OUTLIER_PCT)
+            # Open/high/low through the close's weights (a venue cut as an outlier is
+            # cut for the whole candle), so high >= open/close >= low still holds
+            fields = [combine(ohlcv[k], weights, ohlcv[4], self.METHOD) for k in range(3)] + [close]
+            volume = np.where(weights > 0, np.nan_to_num(ohlcv[4]), 0.0).sum(axis=0)
+            used = (weights > 0).sum(axis=0)
+            rows = [[int(t), *(float(f[j]) for f in fields), float(volume[j]), int(used[j])]
+                    for j, t in enumerate(times) if used[j] > 0]
+        else:
+            rows = []
+        data = {"symbol": base, "timeframe": timeframe, "method": self.METHOD, "venues": venues, "candles": rows}
+        self._klines[cache_key] = (time.time(), data)
+        if len(self._klines) > 256:
+            oldest = min(self._klines, key=lambda k: self._klines[k][0])
+            del self._klines[oldest]
+        return data
+
+    def metrics(self) -> dict:
+        return {
+            "venues": {v: {**self.stats[v], "markets": len(self.markets.get(v, {}))} for v in self.venues},
+            "method": self.METHOD,
+            "deadline_s": self.DEADLINE,
+            "rounds": self.rounds,
+            "last_round": self.last_round,
+            "symbols": len(self.latest)
+        }
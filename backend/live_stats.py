@@ -1,35 +1,322 @@
-import pandas as pd
+import os
+import math
+import time
+import logging
+import threading
 import numpy as np
+from typing import Callable, Dict, Optional, Tuple
+
+from .timeframes import timeframe_ms, realigned_timeframes, BIN_VERSION
+
+logger = logging.getLogger(__name__)
+
+# Table axes, in order: timeframe x elapsed fraction of the candle x move from
+# the open in units of the candle's return volatility (sigma). Every cell holds
+# the (weighted) 1m samples that fell into it and how many of them belonged
+# to a candle that closed green.
+LIVE_TIMEFRAMES = ('15m', '1h', '4h', '1d')
+TF_INDEX = {tf: i for i, tf in enumerate(LIVE_TIMEFRAMES)}
+FRACTION_BINS = 12
+DELTA_BINS = 24
+DELTA_LIMIT = 3.0          # Moves beyond +-3 sigma land in the end bins
+SHAPE = (len(LIVE_TIMEFRAMES), FRACTION_BINS, DELTA_BINS)
+DELTA_CENTERS = -DELTA_LIMIT + (np.arange(DELTA_BINS) + 0.5) * (2 * DELTA_LIMIT / DELTA_BINS)
+FRACTION_CENTERS = (np.arange(FRACTION_BINS) + 0.5) / FRACTION_BINS
+
+# Sigma of a candle: sample std of the close-to-close returns before it opened
+VOL_WINDOW = 100
+VOL_MIN_RETURNS = 20
+PRIOR_WEIGHT = 20.0        # Pseudo-candles of the random-walk prior per cell
+MINUTE_MS = 60_000
+
+
+def candle_sigmas(close: np.ndarray) -> np.ndarray:
+    """
+    Per candle: sample std of the (up to VOL_WINDOW) returns that closed before
+    it opened; NaN with fewer than VOL_MIN_RETURNS. Known at the open, so it
+    stays fixed while the candle is live.
+    """
+    n = len(close)
+    out = np.full(n, np.nan)
+    if n < VOL_MIN_RETURNS + 2:
+        return out
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.diff(close) / close[:-1]
+    returns = np.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0)
+    c1 = np.concatenate(([0.0], np.cumsum(returns)))
+    c2 = np.concatenate(([0.0], np.cumsum(returns * returns)))
+    # Candle j: returns[lo:hi] with hi = j - 1 (returns[k] ends at close k + 1)
+    hi = np.arange(0, n - 1)
+    lo = np.maximum(hi - VOL_WINDOW, 0)
+    count = hi - lo
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s1 = c1[hi] - c1[lo]
+        var = (c2[hi] - c2[lo] - s1 * s1 / count) / (count - 1)
+    out[1:] = np.where(count >= VOL_MIN_RETURNS, np.sqrt(np.maximum(var, 0.0)), np.nan)
+    return out
+
+
+def diffusion_prior() -> np.ndarray:
+    """
+    P(green) at the cell centers for a driftless random walk: z sigmas from the
+    open after a fraction f, the rest of the candle moves ~ N(0, (1 - f) sigma^2).
+    """
+    x = DELTA_CENTERS[None, :] / np.sqrt(1.0 - FRACTION_CENTERS)[:, None]
+    cdf = 0.5 * (1.0 + np.vectorize(math.erf)(x / math.sqrt(2.0)))
+    return np.broadcast_to(cdf, SHAPE)
+
 
 class LiveStats:
-    def calculate_live_probability(self, open_price: float, current_price: float, volatility: float, time_elapsed_fraction: float):
-        """
-        Calculate probability of closing Green based on current progress.
-        
-        Args:
-            open_price: Candle open
-            current_price: Current real-time price
-            volatility: Average True Range (ATR) or typical candle range
-            time_elapsed_fraction: 0.0 to 1.0 (how much of the candle is done)
-        """
-        delta = current_price - open_price
-        
-        # If volatility is 0, avoid div by zero
-        if volatility == 0:
-            return 50.0
-            
-        # Normalize delta by volatility
-        # As time passes, the "uncertainty" decreases.
-        # We can model this as a drift diffusion or just a sigmoid of the Z-score.
-        
-        # Simple heuristic:
-        # If we are +0.5 ATR up and 90% time is done, prob is very high.
-        # If we are +0.1 ATR up and 10% time is done, prob is slightly > 50%.
-        
-        # Z-score roughly:
-        z_score = (delta / volatility) * (1 + time_elapsed_fraction * 2) 
-        
-        # Sigmoid function to map to 0-100
-        prob_green = 1 / (1 + np.exp(-z_score))
-        
-        return round(prob_green * 100, 1)
+    """
+    Empirical intra-candle model: P(candle closes green | timeframe, elapsed
+    fraction, move from the open in sigmas), counted from 1m history.
+
+    - Fed closed candles of each symbol/timeframe with the 1m closes inside
+      them (every 1m close is a sample); candles already fed are skipped, so
+      the table is built once from the history and then grows per close.
+      Symbols are pooled (moves are normalized by each candle's own sigma).
+    - Samples are weighted so a candle counts about once per fraction bin
+      whatever its length, and cells are smoothed towards a random-walk prior,
+      so sparse cells (1d) stay sensible.
+    - evaluate() is one vectorized bilinear lookup for any number of live
+      candles; candle_state() caches each live candle's open/sigma until it
+      rolls over, so a tick only costs the lookup.
+    Green follows the Polymarket up/down rule: close >= open.
+    """
+    HISTORY_DAYS = 30         # 1m history the table is first built from
+    RELOAD_CHECK = 60.0       # Seconds between checks for a newer table file (readers)
+    STATE_RECHECK = 10.0      # Seconds before re-reading a live candle not in its series yet
+
+    def __init__(self, path: str):
+        self.path = path
+        self.weights = np.zeros(SHAPE)
+        self.greens = np.zeros(SHAPE)
+        # { "SYMBOL_TF": open ms of the last candle fed }
+        self.fed: Dict[str, int] = {}
+        self.candles = 0
+        self._grid = None
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.persistence = None
+        # Readers of shared market data load the leader's table, never write
+        self.read_only = False
+        self._file_mtime = 0.0
+        self._last_reload_check = 0.0
+        # Live candle per key: (open_ms, open price, sigma, in series, checked_at)
+        self.live: Dict[str, tuple] = {}
+        self.load()
+
+    # --- Table ---
+
+    def feed(self, symbol: str, timeframe: str, candle_ts: np.ndarray, candle_open: np.ndarray,
+             candle_close: np.ndarray, minute_ts: np.ndarray, minute_close: np.ndarray) -> int:
+        """
+        Adds the closed candles (time-ordered arrays, with earlier candles for
+        their sigma) newer than what was fed for this symbol/timeframe, sampled
+        at the 1m closes inside them. Returns candles added.
+        """
+        t = TF_INDEX.get(timeframe)
+        tf_ms = timeframe_ms(timeframe)
+        if t is None or not len(candle_ts) or not len(minute_ts):
+            return 0
+        key = f"{symbol}_{timeframe}"
+        sigma = candle_sigmas(candle_close)
+        # Candles whose minutes have all been seen; those without a sigma (too
+        # little earlier history) are passed over for good
+        complete = (candle_ts > self.fed.get(key, 0)) & (candle_ts + tf_ms <= minute_ts[-1] + MINUTE_MS)
+        if not complete.any():
+            return 0
+        new = complete & (sigma > 0)
+        if not new.any():
+            with self._lock:
+                self.fed[key] = int(candle_ts[complete].max())
+            self.mark_dirty()
+            return 0
+
+        # Candle of each 1m close (minutes in gaps or at the final close are dropped)
+        j = np.searchsorted(candle_ts, minute_ts, side='right') - 1
+        inside = j >= 0
+        j = np.where(inside, j, 0)
+        elapsed = minute_ts + MINUTE_MS - candle_ts[j]
+        inside &= new[j] & (elapsed < tf_ms)
+        j, elapsed = j[inside], elapsed[inside]
+        fraction = elapsed / tf_ms
+        delta = (minute_close[inside] / candle_open[j] - 1.0) / sigma[j]
+        green = candle_close[j] >= candle_open[j]
+
+        cells = np.ravel_multi_index((
+            np.full(len(j), t, dtype=np.intp),
+            np.minimum((fraction * FRACTION_BINS).astype(np.intp), FRACTION_BINS - 1),
+            np.clip(np.floor((delta + DELTA_LIMIT) * (DELTA_BINS / (2 * DELTA_LIMIT))), 0, DELTA_BINS - 1).astype(np.intp)
+        ), SHAPE)
+        # About one unit per candle and fraction bin (a 1d candle has 1440 samples, 15m has 15)
+        weight = np.full(len(j), FRACTION_BINS * MINUTE_MS / tf_ms)
+        size = self.weights.size
+        added = len(np.unique(j))
+        with self._lock:
+            self.weights += np.bincount(cells, weights=weight, minlength=size).reshape(SHAPE)
+            self.greens += np.bincount(cells[green], weights=weight[green], minlength=size).reshape(SHAPE)
+            self.fed[key] = int(candle_ts[complete].max())
+            self.candles += added
+            self._grid = None
+        self.mark_dirty()
+        return added
+
+    def grid(self) -> np.ndarray:
+        """
+        Smoothed P(green) per cell.
+        """
+        grid = self._grid
+        if grid is None:
+            grid = self._grid = (self.greens + PRIOR_WEIGHT * diffusion_prior()) / (self.weights + PRIOR_WEIGHT)
+        return grid
+
+    def evaluate(self, tf_index: np.ndarray, fraction: np.ndarray, delta: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        P(green) in % for live candles given as arrays (TF_INDEX, elapsed
+        fraction, move in sigmas): bilinear between cell centers. Also returns
+        the samples behind the nearest cell.
+        """
+        grid = self.grid()
+        x = np.clip(fraction * FRACTION_BINS - 0.5, 0, FRACTION_BINS - 1)
+        y = np.clip((delta + DELTA_LIMIT) * (DELTA_BINS / (2 * DELTA_LIMIT)) - 0.5, 0, DELTA_BINS - 1)
+        x0 = np.minimum(x.astype(np.intp), FRACTION_BINS - 2)
+        y0 = np.minimum(y.astype(np.intp), DELTA_BINS - 2)
+        wx, wy = x - x0, y - y0
+        prob = ((grid[tf_index, x0, y0] * (1 - wy) + grid[tf_index, x0, y0 + 1] * wy) * (1 - wx)
+                + (grid[tf_index, x0 + 1, y0] * (1 - wy) + grid[tf_index, x0 + 1, y0 + 1] * wy) * wx)
+        samples = self.weights[tf_index, np.rint(x).astype(np.intp), np.rint(y).astype(np.intp)]
+        return prob * 100, samples
+
+    # --- Live candles ---
+
+    def candle_state(self, key: str, open_ms: int, load: Callable[[], Optional[tuple]],
+                     now: float) -> Optional[Tuple[float, float]]:
+        """
+        (open price, sigma) of the candle of `key` opening at open_ms. `load()`
+        returns the series as (ts, open, close) arrays; it is only called when
+        the candle rolled over (or wasn't in the series yet, then it opens at
+        the previous close).
+        """
+        state = self.live.get(key)
+        if state is not None and state[0] == open_ms and (state[3] or now - state[4] < self.STATE_RECHECK):
+            return state[1:3] if state[2] > 0 else None
+        series = load()
+        if series is None or not len(series[0]):
+            return None
+        ts, open_, close = series
+        last = int(ts[-1])
+        if last == open_ms:
+            price, closed = float(open_[-1]), close[:-1]
+        elif last < open_ms:
+            price, closed = float(close[-1]), close
+        else:
+            return None
+        sigma = candle_sigmas(np.append(closed[-(VOL_WINDOW + 1):], price))[-1]
+        sigma = float(sigma) if np.isfinite(sigma) else 0.0
+        self.live[key] = (open_ms, price, sigma, last == open_ms, now)
+        return (price, sigma) if sigma > 0 else None
+
+    # --- Persistence ---
+
+    def load(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        try:
+            with np.load(self.path) as data:
+                if data["weights"].shape != SHAPE:
+                    raise ValueError(f"Table shape {data['weights'].shape} != {SHAPE}")
+                version = int(data["version"]) if "version" in data.files else 1
+                with self._lock:
+                    self.weights = data["weights"].astype(np.float64)
+                    self.greens = data["greens"].astype(np.float64)
+                    self.fed = {str(k): int(v) for k, v in zip(data["fed_keys"], data["fed_ts"])}
+                    self.candles = int(data["candles"])
+                    self._grid = None
+                    stale = realigned_timeframes(version) & set(LIVE_TIMEFRAMES)
+                    for tf in stale:
+                        # Refed from HISTORY_DAYS of history by the next update
+                        self.weights[TF_INDEX[tf]] = 0.0
+                        self.greens[TF_INDEX[tf]] = 0.0
+                        self.fed = {k: v for k, v in self.fed.items() if not k.endswith(f"_{tf}")}
+                    if stale:
+                        logger.info(f"Live probability table bins v{version} < v{BIN_VERSION}: reset {sorted(stale)}")
+                        self._dirty = True
+            self._file_mtime = mtime
+        except Exception as e:
+            logger.error(f"Failed to load live probability table: {e}")
+
+    def maybe_reload(self):
+        """
+        Readers pick up the leader's table.
+        """
+        now = time.time()
+        if now - self._last_reload_check < self.RELOAD_CHECK:
+            return
+        self._last_reload_check = now
+        try:
+            if os.path.getmtime(self.path) > self._file_mtime:
+                self.load()
+        except OSError:
+            pass
+
+    def attach_persistence(self, persistence):
+        self.persistence = persistence
+        persistence.register("live_stats", self.flush)
+
+    def mark_dirty(self):
+        if self.read_only:
+            return
+        self._dirty = True
+        if self.persistence is not None:
+            self.persistence.mark_dirty("live_stats")
+        else:
+            self.flush()
+
+    def flush(self) -> int:
+        with self._lock:
+            if not self._dirty:
+                return 0
+            self._dirty = False
+            # Consistent copies: the event loop keeps feeding while we write
+            arrays = {
+                "weights": self.weights.copy(), "greens": self.greens.copy(),
+                "fed_keys": np.array(list(self.fed), dtype=str), "fed_ts": np.array(list(self.fed.values()), dtype=np.int64),
+                "candles": np.int64(self.candles), "version": np.int64(BIN_VERSION)
+            }
+        temp_file = self.path + ".tmp.npz"
+        try:
+            np.savez(temp_file, **arrays)
+            os.replace(temp_file, self.path)
+            self._file_mtime = os.path.getmtime(self.path)
+            return os.path.getsize(self.path)
+        except Exception as e:
+            logger.error(f"Failed to save live probability table: {e}")
+            return 0
+
+    def set_read_only(self, read_only: bool):
+        self.read_only = read_only
+
+    def clear(self) -> bool:
+        with self._lock:
+            self.weights = np.zeros(SHAPE)
+            self.greens = np.zeros(SHAPE)
+            self.fed.clear()
+            self.candles = 0
+            self._grid = None
+            self._dirty = False
+        self.live.clear()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+            return True
+        return False
+
+    def metrics(self) -> dict:
+        return {
+            "candles": self.candles,
+            "samples": {tf: round(float(self.weights[i].sum()), 1) for tf, i in TF_INDEX.items()},
+            "series_fed": len(self.fed),
+            "live_candles": len(self.live)
+        }
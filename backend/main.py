@@ -1,15 +1,27 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Header, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse
 from pydantic import BaseModel
 import asyncio
+import hmac
 import httpx
+import json
+import logging
 import os
 from .analyzer import Analyzer
-from .live_stats import LiveStats
 from .datasources.ccxt_adapter import CCXTAdapter
 from .notification import TelegramNotifier
+from .persistence import PersistenceService
+from .freshness import FreshnessManager
+from .scheduler import CandleScheduler
+from .shared_market import create_shared_market
+from .cache_backend import create_cache_backend
+from .admission import AdmissionController, AdmissionError
+from .index_price import IndexPrice, SHARED_SUFFIX
+from .universe import polymarket_tickers
+from .timeframes import split_key
+from .events import CandleClosed, PriceTick, MicroBar, StatsSnapshot, LiveProbability
 from dotenv import load_dotenv
 
 # Load env vars
@@ -30,6 +42,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(AdmissionError)
+async def admission_error_handler(request, exc: AdmissionError):
+    headers = {"Retry-After": str(exc.retry_after)} if exc.retry_after else None
+    return JSONResponse({"detail": exc.detail}, status_code=exc.status_code, headers=headers)
+
 @app.middleware("http")
 async def add_no_cache_header(request, call_next):
     try:
@@ -45,8 +62,59 @@ async def add_no_cache_header(request, call_next):
             return JSONResponse({"error": "Request timed out or client disconnected"}, status_code=504)
         raise e
 
-analyzer = Analyzer()
-live_stats = LiveStats()
+# Endpoints that message arbitrary chats or wipe persistent stores: admin only
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+def require_admin(x_admin_token: str = Header(None), authorization: str = Header(None)):
+    """
+    Admin token as `X-Admin-Token: <token>` or `Authorization: Bearer <token>`.
+    Without ADMIN_TOKEN configured the admin endpoints are disabled.
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN not set)")
+    supplied = x_admin_token
+    if not supplied and authorization and authorization.lower().startswith("bearer "):
+        supplied = authorization[7:].strip()
+    if not supplied or not hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+# Debounced background writer for all disk persistence
+persistence = PersistenceService()
+analyzer.attach_persistence(persistence)
+notifier.registry.attach_persistence(persistence)
+
+# One ingestion leader publishes candles/prices (shared memory on one host, or the
+# CACHE_BACKEND_URL backend across replicas); everyone else attaches read-only
+shared = create_shared_market(analyzer.DATA_DIR)
+
+# Shared cache for upstream proxy responses (in memory unless CACHE_BACKEND_URL is set)
+cache = create_cache_backend()
+
+# Symbol/timeframe registry, negative cache and cold-fetch limits for arbitrary requests
+admission = AdmissionController(analyzer.DATA_DIR, analyzer.adapter.map_symbol)
+analyzer.adapter.attach_admission(admission)
+MAX_BATCH_SYMBOLS = 20
+MARKETS_REFRESH_INTERVAL = 3600  # Seconds between registry age checks (leader)
+
+# Tracked symbols (SYMBOLS seeds + Polymarket-listed symbols admitted on request)
+# and their exchange market names, built from the loaded markets
+universe = analyzer.adapter.universe
+if not universe.markets and admission.markets:
+    universe.build(admission.markets)
+TRACKED_TIMEFRAMES = ['15m', '1h', '4h', '1d']
+POLYMARKET_MARKETS_URL = "https://gamma-api.polymarket.com/markets"
+POLYMARKET_PAGE = 500
+POLYMARKET_MAX_PAGES = 10
+BACKFILL_CONCURRENCY = 4         # Concurrent 30-day backfills at ingestion start
+
+# Multi-exchange composite price (its own venues; the candle feed stays single-exchange)
+index_price = IndexPrice()
+INDEX_INTERVAL = 2.0             # Seconds between index ticker rounds (leader)
+INDEX_TIMEFRAMES = ['1m', '5m', '15m', '1h', '4h', '1d']
+MAX_INDEX_CANDLES = 500
+
+# Refreshes cached series right after candle boundaries (stale data is marked, not dropped)
+freshness = FreshnessManager(analyzer.adapter)
 
 # Cache to avoid hitting rate limits too hard
 # Simple in-memory cache
@@ -64,80 +132,26 @@ async def startup():
     # Let's set a reasonable timeout to avoid hanging indefinitely if Polymarket is down.
     http_client = httpx.AsyncClient(timeout=10.0)
     
-    # CLEAR STALE CACHE ON STARTUP (Railway Fix)
-    # This ensures each deployment starts with fresh data
-    import time
-    cache_files = [
-        "/data/ohlcv_cache.pkl" if os.path.exists("/data") else "ohlcv_cache.pkl",
-        "/data/streak_history.json" if os.path.exists("/data") else "streak_history.json"
-    ]
-    for cache_file in cache_files:
-        if os.path.exists(cache_file):
-            try:
-                # Check if file is older than 1 hour
-                file_age = time.time() - os.path.getmtime(cache_file)
-                if file_age > 3600:  # 1 hour
-                    os.remove(cache_file)
-                    print(f"[STARTUP] Cleared stale cache: {cache_file} (age: {file_age/3600:.1f}h)")
-            except Exception as e:
-                print(f"[STARTUP] Failed to clear {cache_file}: {e}")
-    
-    # Also clear adapter's in-memory cache
-    if hasattr(analyzer, 'adapter') and hasattr(analyzer.adapter, 'cache'):
-        analyzer.adapter.cache.clear()
-        print("[STARTUP] Cleared in-memory OHLCV cache")
+    persistence.start()
     
-    # Start background cache auto-clear task
-    asyncio.create_task(auto_clear_cache_loop())
-
-
-async def auto_clear_cache_loop():
-    """
-    Background task that periodically clears stale cache.
-    Runs every 15 minutes to prevent cache from getting stuck.
-    """
-    import time
+    # NOTE: Persistent caches are NOT cleared on startup anymore.
+    # OHLCV candles warm-start from the adapter's append-only store and the
+    # streak distribution from the SQLite history store; both catch up incrementally.
     
-    CLEAR_INTERVAL = 60  # 1 minute
-    MAX_CACHE_AGE = 60   # 1 minute - clear if older than this
-    
-    while True:
-        await asyncio.sleep(CLEAR_INTERVAL)
-        
-        try:
-            # Check adapter's last_update timestamps
-            if hasattr(analyzer, 'adapter') and hasattr(analyzer.adapter, 'last_update'):
-                now = time.time()
-                stale_keys = []
-                
-                for key, last_ts in analyzer.adapter.last_update.items():
-                    age = now - last_ts
-                    if age > MAX_CACHE_AGE:
-                        stale_keys.append(key)
-                
-                # Clear stale cache entries
-                if stale_keys:
-                    for key in stale_keys:
-                        if key in analyzer.adapter.cache:
-                            del analyzer.adapter.cache[key]
-                        if key in analyzer.adapter.last_update:
-                            del analyzer.adapter.last_update[key]
-                    
-                    print(f"[AUTO-CLEAR] Cleared {len(stale_keys)} stale cache entries: {stale_keys}")
-                else:
-                    print(f"[AUTO-CLEAR] Cache healthy, no stale entries")
-                    
-        except Exception as e:
-            print(f"[AUTO-CLEAR] Error: {e}")
 
 
 # Cache Clear Endpoint (Manual trigger)
-@app.post("/api/clear-cache")
-async def clear_cache():
+@app.post("/api/clear-cache", dependencies=[Depends(require_admin)])
+async def clear_cache(archive: bool = False):
     """
     Emergency cache clear endpoint.
     Clears all OHLCV cache to force fresh data fetch.
+    Leader only: the persistent stores belong to the ingestion leader.
+    The compressed long-history archive can't be cheaply re-fetched: it is
+    only cleared with `?archive=true`.
     """
+    if not shared.is_leader:
+        raise HTTPException(status_code=409, detail="Not the ingestion leader: send the clear to the leader process")
     cleared = []
     
     # Clear file caches
@@ -153,6 +167,38 @@ async def clear_cache():
             except Exception as e:
                 print(f"Failed to clear {cache_file}: {e}")
     
+    # Clear persistent OHLCV store
+    if hasattr(analyzer, 'adapter') and hasattr(analyzer.adapter, 'store'):
+        try:
+            removed = analyzer.adapter.store.clear()
+            cleared.append(f"ohlcv store ({removed} series)")
+        except Exception as e:
+            print(f"Failed to clear OHLCV store: {e}")
+    
+    # Clear probability cubes
+    if hasattr(analyzer, 'cubes'):
+        try:
+            removed = analyzer.cubes.clear()
+            cleared.append(f"probability cubes ({removed})")
+        except Exception as e:
+            print(f"Failed to clear probability cubes: {e}")
+    
+    # Clear live candle probability table
+    if hasattr(analyzer, 'live_stats'):
+        try:
+            if analyzer.live_stats.clear():
+                cleared.append("live probability table")
+        except Exception as e:
+            print(f"Failed to clear live probability table: {e}")
+    
+    # Clear compressed long-history archive (opt-in)
+    if archive and hasattr(analyzer, 'adapter') and hasattr(analyzer.adapter, 'segments'):
+        try:
+            removed = analyzer.adapter.segments.clear()
+            cleared.append(f"ohlcv segments ({removed} series)")
+        except Exception as e:
+            print(f"Failed to clear OHLCV segments: {e}")
+    
     # Clear in-memory cache
     if hasattr(analyzer, 'adapter') and hasattr(analyzer.adapter, 'cache'):
         analyzer.adapter.cache.clear()
@@ -160,20 +206,57 @@ async def clear_cache():
         cleared.append("in-memory cache")
     
     # Clear analyzer history
-    if hasattr(analyzer, 'history'):
-        analyzer.history.clear()
+    if hasattr(analyzer, 'history_store'):
+        analyzer.history_store.clear()
         cleared.append("streak history")
     
     return {"status": "ok", "cleared": cleared}
 
 @app.on_event("shutdown")
 async def shutdown():
+    # Flush pending writes before the stores close
+    await asyncio.to_thread(persistence.stop)
     await analyzer.close()
+    await index_price.close()
+    shared.close()
+    await cache.close()
+    # Deliver queued alerts before exiting
+    await notifier.close()
     if http_client:
         await http_client.aclose()
 
 # --- NEW: Polymarket Proxy Endpoints ---
 
+async def proxy_get(url: str, params: dict, ttl_ms: int, label: str = ""):
+    """
+    GETs an upstream JSON API through the shared cache, so replicas and
+    repeated requests within `ttl_ms` share one upstream call.
+    """
+    cache_key = "proxy:" + url + "?" + "&".join(f"{k}={v}" for k, v in sorted(params.items()))
+    try:
+        cached = await cache.get_json(cache_key)
+        if cached is not None:
+            return cached
+    except Exception as e:
+        print(f"Proxy cache read failed {url}: {e}")
+
+    try:
+        resp = await http_client.get(url, params=params)
+        resp.raise_for_status()
+        data = resp.json()
+    except httpx.HTTPStatusError as exc:
+        print(f"Proxy Error {url}{label}: {exc.response.status_code} - {exc.response.text}")
+        raise HTTPException(status_code=exc.response.status_code, detail=f"Upstream Error: {exc.response.text}")
+    except Exception as e:
+        print(f"Proxy Exception {url}{label}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    try:
+        await cache.set_json(cache_key, data, ttl_ms=ttl_ms)
+    except Exception as e:
+        print(f"Proxy cache write failed {url}: {e}")
+    return data
+
 @app.get("/api/poly/markets")
 async def get_poly_markets(active: bool = True, limit: int = 20):
     """
@@ -185,16 +268,7 @@ async def get_poly_markets(active: bool = True, limit: int = 20):
         "limit": limit,
         "closed": "false"
     }
-    try:
-        resp = await http_client.get(url, params=params)
-        resp.raise_for_status()
-        return resp.json()
-    except httpx.HTTPStatusError as exc:
-        print(f"Proxy Error {url}: {exc.response.status_code} - {exc.response.text}")
-        raise HTTPException(status_code=exc.response.status_code, detail=f"Upstream Error: {exc.response.text}")
-    except Exception as e:
-        print(f"Proxy Exception {url}: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    return await proxy_get(url, params, ttl_ms=30000)
 
 @app.get("/api/poly/orderbook")
 async def get_poly_orderbook(market_id: str):
@@ -203,16 +277,7 @@ async def get_poly_orderbook(market_id: str):
     """
     url = "https://gamma-api.polymarket.com/orderbook"
     params = {"market_id": market_id}
-    try:
-        resp = await http_client.get(url, params=params)
-        resp.raise_for_status()
-        return resp.json()
-    except httpx.HTTPStatusError as exc:
-        print(f"Proxy Error {url}: {exc.response.status_code} - {exc.response.text}")
-        raise HTTPException(status_code=exc.response.status_code, detail=f"Upstream Error: {exc.response.text}")
-    except Exception as e:
-        print(f"Proxy Exception {url}: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    return await proxy_get(url, params, ttl_ms=2000)
 
 @app.get("/api/poly/clob/book")
 async def get_clob_book(token_id: str):
@@ -221,16 +286,7 @@ async def get_clob_book(token_id: str):
     """
     url = "https://clob.polymarket.com/book"
     params = {"token_id": token_id}
-    try:
-        resp = await http_client.get(url, params=params)
-        resp.raise_for_status()
-        return resp.json()
-    except httpx.HTTPStatusError as exc:
-        print(f"Proxy Error {url} ({token_id}): {exc.response.status_code} - {exc.response.text}")
-        raise HTTPException(status_code=exc.response.status_code, detail=f"Upstream Error: {exc.response.text}")
-    except Exception as e:
-        print(f"Proxy Exception {url} ({token_id}): {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    return await proxy_get(url, params, ttl_ms=2000, label=f" ({token_id})")
 
 @app.get("/api/poly/events")
 async def get_poly_events(slug: str = None):
@@ -241,17 +297,7 @@ async def get_poly_events(slug: str = None):
     params = {}
     if slug:
         params["slug"] = slug
-        
-    try:
-        resp = await http_client.get(url, params=params)
-        resp.raise_for_status()
-        return resp.json()
-    except httpx.HTTPStatusError as exc:
-        print(f"Proxy Error {url}: {exc.response.status_code} - {exc.response.text}")
-        raise HTTPException(status_code=exc.response.status_code, detail=f"Upstream Error: {exc.response.text}")
-    except Exception as e:
-        print(f"Proxy Exception {url}: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    return await proxy_get(url, params, ttl_ms=30000)
 
 @app.get("/api/poly/candles")
 async def get_poly_candles(market_id: str, tf: str = "1h"):
@@ -262,16 +308,7 @@ async def get_poly_candles(market_id: str, tf: str = "1h"):
     # Polymarket supports: 1m, 5m, 15m, 30m, 1h, 6h, 1d
     url = "https://gamma-api.polymarket.com/candles"
     params = {"market_id": market_id, "resolution": tf} 
-    try:
-        resp = await http_client.get(url, params=params)
-        resp.raise_for_status()
-        return resp.json()
-    except httpx.HTTPStatusError as exc:
-        print(f"Proxy Error {url}: {exc.response.status_code} - {exc.response.text}")
-        raise HTTPException(status_code=exc.response.status_code, detail=f"Upstream Error: {exc.response.text}")
-    except Exception as e:
-        print(f"Proxy Exception {url}: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    return await proxy_get(url, params, ttl_ms=30000)
 
 # --- Original Endpoints ---
 
@@ -281,23 +318,35 @@ async def get_batch_stats(timeframe: str, symbols: str = "BTC,ETH,SOL,XRP"):
     Fetch stats for multiple symbols in one request.
     symbols: comma-separated list of symbols
     """
-    symbol_list = symbols.split(',')
+    symbol_list = list(dict.fromkeys(s.strip().upper() for s in symbols.split(',') if s.strip()))
+    if len(symbol_list) > MAX_BATCH_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SYMBOLS} symbols per request")
+    # Reject an unsupported timeframe once, not per symbol
+    if not admission.valid_timeframe(timeframe):
+        raise HTTPException(status_code=404, detail=f"Unsupported timeframe: {timeframe}")
     results = {}
-    
-    # Process sequentially or with gather. Gather is better.
-    tasks = []
+    allowed = []
     for symbol in symbol_list:
-        tasks.append(analyzer.get_stats(symbol, timeframe))
+        try:
+            admission.check(symbol, timeframe)
+            admit_on_demand(symbol)
+            allowed.append(symbol)
+        except AdmissionError as e:
+            results[symbol] = {"error": e.detail}
     
-    stats_list = await asyncio.gather(*tasks)
+    # Live series fetched concurrently, analytics vectorized across symbols (StreakBatch)
+    batch = await analyzer.get_batch_stats(allowed, timeframe) if allowed else {}
     
-    for symbol, stats in zip(symbol_list, stats_list):
+    for symbol in symbol_list:
+        if symbol in results:
+            continue
+        stats = batch.get(symbol)
         if not stats:
             results[symbol] = {"error": "No data"}
         else:
             results[symbol] = stats
             
-    return results
+    return {symbol: results[symbol] for symbol in symbol_list}
 
 @app.get("/api/stats/{symbol}/{timeframe}")
 async def get_stats(symbol: str, timeframe: str):
@@ -306,41 +355,141 @@ async def get_stats(symbol: str, timeframe: str):
     """
     # Normalize symbol
     symbol = symbol.upper()
+    admission.check(symbol, timeframe)
+    admit_on_demand(symbol)
     
     try:
         data = await analyzer.get_stats(symbol, timeframe)
         if not data:
             raise HTTPException(status_code=404, detail="Data not found")
         return data
+    except (HTTPException, AdmissionError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/stats/{symbol}/{timeframe}/full-history")
+async def get_full_history_stats(symbol: str, timeframe: str):
+    """
+    Streak distribution and continuation curve over the whole archived history.
+    """
+    symbol = symbol.upper()
+    admission.check(symbol, timeframe)
+    data = await asyncio.to_thread(analyzer.full_history_stats, symbol, timeframe)
+    if not data:
+        raise HTTPException(status_code=404, detail="No archived history")
+    return data
+
+@app.get("/api/stats/{symbol}/{timeframe}/cube")
+async def get_probability_cube(symbol: str, timeframe: str, color: str = None, length: str = None,
+                               regime: str = None, hour: str = None, dow: str = None,
+                               by: str = None, min_samples: int = 1):
+    """
+    Streak continuation probability over the full history, conditioned on any
+    of color, streak length, volatility regime (low/normal/high), ET hour of
+    the next candle and its ET weekday (mon..sun). Omitted dimensions are
+    marginalized; `by` breaks the result down along one dimension.
+    """
+    symbol = symbol.upper()
+    admission.check(symbol, timeframe)
+    cube = await analyzer.get_cube(symbol, timeframe)
+    if cube is None or cube.candles == 0:
+        raise HTTPException(status_code=404, detail="No history")
+    try:
+        result = cube.query({"color": color, "length": length, "regime": regime, "hour": hour, "dow": dow},
+                            by=by, min_samples=max(min_samples, 1))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"symbol": symbol, "timeframe": timeframe, **result, "cube": cube.metrics()}
+
 @app.get("/api/live/{symbol}")
 async def get_live(symbol: str):
     """
     Get live price and simple probability for current candle.
     """
+    symbol = symbol.upper()
+    admission.check_symbol(symbol)
     try:
         price = await analyzer.adapter.fetch_current_price(symbol)
-        return {"symbol": symbol, "price": price}
+        # P(close green) per timeframe from the cached series (None if not cached)
+        probs = analyzer.live_probabilities([(symbol, tf, price, None) for tf in TRACKED_TIMEFRAMES])
+        return {"symbol": symbol, "price": price, "live_candle_prob": dict(zip(TRACKED_TIMEFRAMES, probs))}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/index/{symbol}")
+async def get_index(symbol: str):
+    """
+    Composite price across INDEX_VENUES with each venue's quote, age, weight
+    and latency. Readers serve the leader's composite price only.
+    """
+    symbol = symbol.upper()
+    admission.check_symbol(symbol)
+    entry = index_price.get(symbol)
+    if entry is None and not index_price.read_only:
+        # Untracked (or expired) symbol: one ticker round for it, under the
+        # cold fetch limit and shared by concurrent requests
+        base = symbol.split('/')[0]
+        computed = await admission.cold_fetch(base + SHARED_SUFFIX, lambda: index_price.refresh([base]))
+        entry = computed.get(base)
+    if entry is None or entry["price"] is None:
+        raise HTTPException(status_code=503, detail=f"No index price for {symbol} yet")
+    latency = {v: {k: index_price.stats[v][k] for k in ("last_ms", "ewma_ms", "timeouts", "slowest")}
+               for v in entry.get("sources", {})}
+    return {**entry, "venue_latency": latency}
+
+@app.get("/api/index/{symbol}/candles")
+async def get_index_candles(symbol: str, timeframe: str = "1m", limit: int = 60):
+    """
+    Composite candles: [[time_ms, open, high, low, close, volume, venues], ...].
+    """
+    symbol = symbol.upper()
+    admission.check_symbol(symbol)
+    if timeframe not in INDEX_TIMEFRAMES:
+        raise HTTPException(status_code=404, detail=f"Unsupported timeframe: {timeframe}")
+    return await index_price.candles(symbol, timeframe, min(max(limit, 1), MAX_INDEX_CANDLES))
+
+MAX_MICRO_BARS = 900
+
+@app.get("/api/live/{symbol}/micro")
+async def get_live_micro(symbol: str, since: int = None, limit: int = 300):
+    """
+    1-second micro-bars of the live price: [[time_ms, open, high, low, close, ticks], ...].
+    since (epoch ms, inclusive): poll with the last bar's time to receive only
+    that (possibly still updating) bar and newer ones.
+    """
+    symbol = symbol.upper()
+    admission.check_symbol(symbol)
+    micro = analyzer.adapter.micro
+    micro.touch(symbol)
+    # Seed/refresh on demand; the leader's micro pump keeps active symbols at 1 Hz
+    await analyzer.adapter.fetch_current_price(symbol, max_age=1.0)
+    bars = micro.since(symbol, since, min(max(limit, 1), MAX_MICRO_BARS))
+    return {"symbol": symbol, "last": micro.last_ts(symbol), "bars": bars}
+
 @app.get("/api/history/{symbol}/{timeframe}")
-async def get_history(symbol: str, timeframe: str, limit: int = 2000):
+async def get_history(symbol: str, timeframe: str, limit: int = 2000, start: int = None, end: int = None):
     """
     Get OHLCV history for a symbol. Optimized for speed.
+    start/end (epoch ms): read from the full archived history instead of the
+    in-memory window; returns the first `limit` candles from `start`.
     """
+    symbol = symbol.upper()
+    admission.check(symbol, timeframe)
     try:
-        # Use CCXT adapter directly
-        ohlcv = await analyzer.adapter.fetch_ohlcv(symbol, timeframe)
+        if start is not None or end is not None:
+            ohlcv = await asyncio.to_thread(analyzer.adapter.read_history, symbol, timeframe, start, end)
+            if not ohlcv.empty and len(ohlcv) > limit:
+                ohlcv = ohlcv.iloc[:limit] if start is not None else ohlcv.iloc[-limit:]
+        else:
+            # Use CCXT adapter directly
+            ohlcv = await analyzer.adapter.fetch_ohlcv(symbol, timeframe)
+            # Slice to limit
+            if len(ohlcv) > limit:
+                ohlcv = ohlcv.iloc[-limit:]
         
         if ohlcv.empty:
             return []
-
-        # Slice to limit
-        if len(ohlcv) > limit:
-            ohlcv = ohlcv.iloc[-limit:]
         
         # Vectorized formatting (100x faster than iterrows)
         # Create a temp df for serialization
@@ -352,6 +501,8 @@ async def get_history(symbol: str, timeframe: str, limit: int = 2000):
         # Return as list of dicts
         return export_df[['time', 'price']].to_dict(orient='records')
         
+    except AdmissionError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -359,93 +510,468 @@ async def get_history(symbol: str, timeframe: str, limit: int = 2000):
 def health():
     return {"status": "ok"}
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """
+    Internal metrics (disk write latency/bytes per persistence job).
+    """
+    return {
+        "persistence": persistence.metrics(),
+        "freshness": freshness.metrics(),
+        "scheduler": scheduler.metrics(),
+        "event_bus": bus.metrics(),
+        "telegram": notifier.delivery.metrics(),
+        "subscriptions": notifier.registry.metrics(),
+        "alert_rules": notifier.engine.metrics(),
+        "shared_market": shared.metrics(),
+        "admission": admission.metrics(),
+        "series_cache": analyzer.adapter.cache.metrics(),
+        "segment_store": analyzer.adapter.segments.metrics(),
+        "base_feed": analyzer.adapter.base_feed_metrics(),
+        "micro_bars": analyzer.adapter.micro.metrics(),
+        "universe": universe.metrics(),
+        "live_stats": analyzer.live_stats.metrics(),
+        "prob_cubes": analyzer.cubes.metrics(),
+        "index_price": index_price.metrics()
+    }
+
 @app.on_event("startup")
 async def startup_event():
     import logging
     logger = logging.getLogger(__name__)
     logger.info("Starting up App (Hyperliquid Mode)...")
     
-    # Valid Symbols
-    symbols = ['BTC', 'ETH', 'SOL', 'XRP']
+    # Tracked symbols: seeds plus symbols admitted earlier (see SymbolUniverse)
+    symbols = universe.tracked()
+    # Dashboard (seed) series stay in memory whatever the cache budget;
+    # admitted symbols are evicted/reloaded like any other series
+    analyzer.adapter.pin_series(universe.seeds, TRACKED_TIMEFRAMES)
+    if analyzer.adapter.BASE_TIMEFRAME:
+        # Base-feed mode: the 1m series every dashboard timeframe is folded from
+        analyzer.adapter.pin_series(universe.seeds, [analyzer.adapter.BASE_TIMEFRAME])
+    
+    # Every worker keeps snapshots and live probabilities for its own SSE clients
+    asyncio.create_task(snapshot_publisher())
+    asyncio.create_task(live_prob_pump())
+    
+    asyncio.create_task(shared.run())
+    index_price.attach_shared(shared)
+    if await shared.elect():
+        analyzer.attach_shared(shared)
+        start_ingestion(symbols)
+    else:
+        logger.info("Another process is ingesting market data, attaching read-only.")
+        analyzer.attach_shared(shared)
+        asyncio.create_task(follow_leader())
+
+# Tasks started by start_ingestion (cancelled if this process loses leadership)
+ingestion_tasks = set()
+
+def ingest_task(coro):
+    task = asyncio.create_task(coro)
+    ingestion_tasks.add(task)
+    task.add_done_callback(ingestion_tasks.discard)
+    return task
+
+def start_ingestion(symbols):
+    """
+    Leader only: exchange fetching, alerts and shared-memory publishing.
+    """
+    logger = logging.getLogger(__name__)
     
     # Warmup & Backfill Cache (Reduced to 30 days to prevent startup congestion)
+    # Symbols already covered by the persistent store are served from disk and skip the backfill burst.
     logger.info("Starting Deep Backfill (30 Days) for major symbols...")
+    backfill_slots = asyncio.Semaphore(BACKFILL_CONCURRENCY)
+
+    async def backfill(sym):
+        # Bounded so hundreds of tracked symbols don't start hundreds of backfills at once
+        async with backfill_slots:
+            await analyzer.adapter.backfill_history(sym, '1h', days=30)
+
     for sym in symbols:
+       if analyzer.adapter.has_history(sym, '1h', days=30):
+            logger.info(f"Warm start for {sym}: history served from store, skipping backfill.")
+            continue
        # We only backfill 1h, others derived
        if hasattr(analyzer.adapter, 'backfill_history'):
-            asyncio.create_task(analyzer.adapter.backfill_history(sym, '1h', days=30))
+            ingest_task(backfill(sym))
+
+    # Alerts go out once, from the leader
+    ingest_task(alert_engine())
+    
+    # Start candle-boundary scheduler (refreshes right after each close)
+    scheduler.track(symbols, TRACKED_TIMEFRAMES)
+    ingest_task(scheduler.run())
+    ingest_task(serve_shared_readers())
+    ingest_task(micro_bar_pump())
+    ingest_task(refresh_markets())
+    ingest_task(build_live_stats())
+    ingest_task(index_pump())
+    asyncio.create_task(leadership_watch())
+
+async def leadership_watch():
+    """
+    Leader: if the lease is lost (replica backend), stops this process's
+    ingestion so two replicas never ingest at once, then follows the new leader.
+    """
+    while shared.is_leader:
+        await asyncio.sleep(1.0)
+    logging.getLogger(__name__).critical(f"Lost market-data leadership, stopping {len(ingestion_tasks)} ingestion tasks.")
+    for task in list(ingestion_tasks):
+        task.cancel()
+    # Read-only again (history/cube/live-table writes stop); may take over later
+    analyzer.attach_shared(shared)
+    asyncio.create_task(follow_leader())
+
+async def refresh_markets():
+    """
+    Leader: keeps the exchange market registry (admission control), the symbol
+    mapping built from it and the Polymarket listing current.
+    """
+    while True:
+        if admission.needs_refresh():
+            await admission.refresh(analyzer.adapter.exchanges)
+            universe.build(admission.markets)
+        if universe.polymarket_due():
+            await refresh_polymarket()
+        await asyncio.sleep(min(MARKETS_REFRESH_INTERVAL, universe.POLYMARKET_TTL))
+
+async def refresh_polymarket():
+    """
+    Symbols with an active Polymarket up/down market (admission of new symbols).
+    """
+    markets = []
+    try:
+        for page in range(POLYMARKET_MAX_PAGES):
+            resp = await http_client.get(POLYMARKET_MARKETS_URL, params={
+                "active": "true", "closed": "false", "limit": POLYMARKET_PAGE, "offset": page * POLYMARKET_PAGE})
+            resp.raise_for_status()
+            batch = resp.json()
+            markets.extend(batch)
+            if len(batch) < POLYMARKET_PAGE:
+                break
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Polymarket listing refresh failed: {e}")
+        if not markets:
+            return
+    universe.update_polymarket(polymarket_tickers(markets))
+
+def admit_on_demand(symbol: str):
+    """
+    Leader: a request for an untracked symbol starts tracking it when Polymarket
+    lists a market for it (readers forward their requests to the leader).
+    """
+    if shared.is_leader and universe.admit(symbol):
+        scheduler.track([symbol], TRACKED_TIMEFRAMES)
 
-    # Start background updater
-    asyncio.create_task(background_updater())
+PRICE_PUMP_INTERVAL = 2.0   # Seconds between shared live-price refreshes (leader)
+LIVE_PROB_INTERVAL = 2.0    # Seconds between live candle probability pushes
+LEADER_RETRY_INTERVAL = 5.0 # Seconds between leadership attempts (readers)
 
-async def background_updater():
+async def serve_shared_readers():
     """
-    Background task to keep data fresh and check alerts.
+    Leader: keeps live prices fresh in shared memory and starts ingesting
+    keys that reader processes asked for.
     """
-    import logging
-    import time
-    logger = logging.getLogger(__name__)
-    symbols = ['BTC', 'ETH', 'SOL', 'XRP']
-    timeframes = ['15m', '1h']
-    
-    logger.info("Starting background updater...")
-    
-    consecutive_errors = 0
-    last_restart_time = time.time()
-    RESTART_INTERVAL = 6 * 60 * 60  # 6 hours
-    MAX_CONSECUTIVE_ERRORS = 3
-    
     while True:
-        # Periodic proactive restart
-        if time.time() - last_restart_time > RESTART_INTERVAL:
-            logger.info("Performing scheduled restart of adapters...")
+        try:
+            for key in shared.pending_requests():
+                symbol, tf = split_key(key)
+                try:
+                    admission.check(symbol, tf)
+                except AdmissionError:
+                    continue
+                admit_on_demand(symbol)
+                freshness.track(symbol, tf)
+                if key not in analyzer.adapter.cache:
+                    asyncio.create_task(analyzer.adapter.fetch_ohlcv_safe(symbol, tf))
+            tracked = sorted({split_key(k)[0] for k in freshness.tracked_keys()})
+            # One bulk ticker call instead of a request per symbol
+            await analyzer.adapter.fetch_current_prices(tracked)
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Shared market-data pump failed: {e}")
+        await asyncio.sleep(PRICE_PUMP_INTERVAL)
+
+MICRO_PUMP_INTERVAL = 1.0  # Seconds between ticks for symbols with micro-bar viewers (leader)
+
+async def micro_bar_pump():
+    """
+    Leader: ticks symbols that have micro-bar viewers once per second (the
+    regular price pump runs every PRICE_PUMP_INTERVAL).
+    """
+    while True:
+        try:
+            active = analyzer.adapter.micro.active_symbols()
+            if active:
+                await asyncio.gather(*(analyzer.adapter.fetch_current_price(sym, max_age=MICRO_PUMP_INTERVAL) for sym in active), return_exceptions=True)
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Micro-bar pump failed: {e}")
+        await asyncio.sleep(MICRO_PUMP_INTERVAL)
+
+async def index_pump():
+    """
+    Leader: one concurrent ticker round over the index venues for every
+    tracked symbol (published to shared memory for readers).
+    """
+    while True:
+        try:
+            await index_price.refresh(universe.tracked())
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Index price pump failed: {e}")
+        await asyncio.sleep(INDEX_INTERVAL)
+
+async def build_live_stats():
+    """
+    Leader: builds the live candle probability table from the seed symbols'
+    1m history (skipped for candles already in the persisted table).
+    """
+    for symbol in universe.seeds:
+        try:
+            added = await analyzer.update_live_stats(symbol)
+            logging.getLogger(__name__).info(f"Live probability table: {added} candles from {symbol}")
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Live probability table build failed for {symbol}: {e}")
+
+async def live_prob_pump():
+    """
+    Pushes P(live candle closes green) for every tracked, cached series as
+    LiveProbability events (only values that changed), one table lookup per tick.
+    """
+    last = {}
+    while True:
+        await asyncio.sleep(LIVE_PROB_INTERVAL)
+        try:
+            if not any(LiveProbability in (sub.event_types or (LiveProbability,)) for sub in bus.subscribers):
+                continue
+            cache = analyzer.adapter.cache
+            symbols = universe.tracked()
+            # Shared prices (the leader's pump keeps them fresh)
+            prices = await analyzer.adapter.fetch_current_prices(symbols, max_age=2 * PRICE_PUMP_INTERVAL)
+            items = [(symbol, tf, prices[symbol], None) for symbol in symbols if symbol in prices
+                     for tf in TRACKED_TIMEFRAMES if f"{symbol}_{tf}" in cache]
+            for (symbol, tf, _, _), prob in zip(items, analyzer.live_probabilities(items)):
+                if prob is None or last.get((symbol, tf)) == prob["green"]:
+                    continue
+                last[(symbol, tf)] = prob["green"]
+                bus.publish(LiveProbability(symbol, tf, prob["green"], prob["elapsed"], prob["delta_sigma"], prob["samples"]))
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Live probability pump failed: {e}")
+
+async def follow_leader():
+    """
+    Reader: mirrors the leader's series (publishing local candle events so
+    snapshots/SSE keep working) and takes over ingestion if the leader exits.
+    """
+    last_attempt = 0.0
+    while True:
+        try:
+            # The leader admits symbols; pick up its universe file
+            universe.maybe_reload()
+            for key in (f"{sym}_{tf}" for sym in universe.tracked() for tf in TRACKED_TIMEFRAMES):
+                if key not in analyzer.adapter.cache:
+                    analyzer.adapter.sync_from_shared(key)
+            analyzer.adapter.sync_all_shared()
+            # Replicas on other hosts: leader's streak distributions and snapshots
+            for key, entry in shared.read_histories().items():
+                analyzer.history_store.import_entry(key, entry)
+            for key, stats in shared.read_snapshots().items():
+                snapshots.setdefault(key, stats)
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Shared market-data sync failed: {e}")
+        
+        now = asyncio.get_event_loop().time()
+        if now - last_attempt >= LEADER_RETRY_INTERVAL:
+            last_attempt = now
+            if shared.try_acquire_leadership():
+                logging.getLogger(__name__).info("Leader gone, taking over market-data ingestion.")
+                analyzer.attach_shared(shared)
+                start_ingestion(universe.tracked())
+                return
+        await asyncio.sleep(1.0)
+
+scheduler = CandleScheduler(analyzer, freshness)
+
+# --- Event Bus Subscribers ---
+# The adapter publishes CandleClosed / CandleRevised / PriceTick / GapRepaired.
+bus = analyzer.adapter.bus
+
+# Latest stats per "SYMBOL_TF", refreshed once per closed candle
+snapshots = {}
+
+async def snapshot_publisher():
+    """
+    Recomputes stats once per closed candle (which also feeds the streak
+    distribution store) and republishes them as StatsSnapshot events.
+    """
+    sub = bus.subscribe("snapshot_publisher", (CandleClosed,))
+    while True:
+        events = await sub.get_batch()
+        # A catch-up refresh can close several candles of one series: compute once
+        keys = sorted({(e.symbol, e.timeframe) for e in events})
+        # Candles of one timeframe close together: one batch per timeframe
+        by_tf = {}
+        for symbol, tf in keys:
+            by_tf.setdefault(tf, []).append(symbol)
+        batches = await asyncio.gather(*(analyzer.get_batch_stats(symbols, tf) for tf, symbols in by_tf.items()), return_exceptions=True)
+        computed = {}
+        for (tf, symbols), batch in zip(by_tf.items(), batches):
+            for symbol in symbols:
+                computed[(symbol, tf)] = batch if isinstance(batch, Exception) else batch.get(symbol)
+        results = [computed[key] for key in keys]
+        # Probability cubes: count the closed candles (builds from the full history on first close)
+        await asyncio.gather(*(analyzer.get_cube(symbol, tf) for symbol, tf in keys), return_exceptions=True)
+        for (symbol, tf), stats in zip(keys, results):
+            if isinstance(stats, Exception) or not stats or "error" in stats:
+                continue
+            snapshots[f"{symbol}_{tf}"] = stats
+            shared.publish_snapshot(f"{symbol}_{tf}", stats)
+            bus.publish(StatsSnapshot(symbol, tf, stats))
+        if shared.is_leader:
+            # Live candle table: feed the seed symbols' newly closed candles (after publishing)
+            closed = sorted({symbol for symbol, _ in keys if symbol in universe.seeds})
+            await asyncio.gather(*(analyzer.update_live_stats(symbol) for symbol in closed), return_exceptions=True)
+
+async def alert_engine():
+    """
+    Evaluates the alert rules over each batch of fresh snapshots and fans hits
+    out to every matching subscriber (one message per chat per batch).
+    """
+    sub = bus.subscribe("alert_engine", (StatsSnapshot,))
+    try:
+        while True:
+            events = await sub.get_batch()
             try:
-                await analyzer.restart()
-                last_restart_time = time.time()
-                consecutive_errors = 0
+                await notifier.check_and_alert_batch([e.stats for e in events])
             except Exception as e:
-                logger.error(f"Failed to restart adapters: {e}")
+                logging.getLogger(__name__).error(f"Alert engine failed for {len(events)} snapshots: {e}")
+    finally:
+        sub.close()
+
+class SubscriptionRequest(BaseModel):
+    chat_id: str
+    symbols: list = []
+    timeframes: list = []
+    threshold: int = 5
+
+@app.get("/api/subscriptions", dependencies=[Depends(require_admin)])
+async def list_subscriptions():
+    return {"subscribers": notifier.registry.all()}
+
+@app.post("/api/subscriptions", dependencies=[Depends(require_admin)])
+async def upsert_subscription(req: SubscriptionRequest):
+    """
+    Adds or replaces a chat's alert subscription. Empty symbols/timeframes mean all.
+    """
+    if req.threshold < 1:
+        raise HTTPException(status_code=400, detail="threshold must be >= 1")
+    return notifier.registry.subscribe(req.chat_id, req.symbols, req.timeframes, req.threshold)
+
+@app.delete("/api/subscriptions/{chat_id}", dependencies=[Depends(require_admin)])
+async def delete_subscription(chat_id: str):
+    if not notifier.registry.unsubscribe(chat_id):
+        raise HTTPException(status_code=404, detail="Subscription not found")
+    return {"status": "ok"}
+
+@app.get("/api/stream")
+async def stream_events(request: Request, symbols: str = None, micro: bool = False):
+    """
+    Server-Sent Events fan-out of snapshots, candle closes, price ticks and
+    live candle probabilities.
+    symbols: optional comma-separated filter
+    micro: also push the updated 1-second micro-bar after every tick
+    """
+    symbol_set = set(symbols.upper().split(',')) if symbols else None
+    kinds = (StatsSnapshot, CandleClosed, PriceTick, LiveProbability) + ((MicroBar,) if micro else ())
+    sub = bus.subscribe("sse", kinds, maxsize=200)
 
+    async def event_source():
         try:
-            for symbol in symbols:
-                for timeframe in timeframes:
-                    # In Hyperliquid Mode, get_stats fetches fresh data directly.
-                    # We just need to call it to check for alerts.
-                    
-                    # Check for Alerts
-                    try:
-                        stats = await analyzer.get_stats(symbol, timeframe)
-                        if stats:
-                            await notifier.check_and_alert(
-                                symbol, 
-                                timeframe, 
-                                stats['current_streak']['type'], # Fixed key from previous logic?
-                                stats['current_streak']['length'], # Fixed key
-                                stats['current_price'] # Fixed key
-                            )
-                    except Exception as e:
-                        # logger.error(f"Alert check failed for {symbol} {timeframe}: {e}")
-                        pass
-
-                    await asyncio.sleep(0.5) 
-            
-            # logger.info("Background update cycle complete.")
-            consecutive_errors = 0 # Reset on success
-            await asyncio.sleep(15) 
-        except Exception as e:
-            consecutive_errors += 1
-            logger.error(f"Error in background updater (Count: {consecutive_errors}): {e}")
-            
-            if consecutive_errors >= MAX_CONSECUTIVE_ERRORS:
-                logger.warning("Too many consecutive errors. Restarting adapters...")
+            yield ": connected\n\n"
+            while True:
+                if await request.is_disconnected():
+                    break
+                if micro and symbol_set:
+                    # Streaming micro-bar viewers keep their symbols ticking at 1 Hz
+                    for symbol in symbol_set:
+                        analyzer.adapter.micro.touch(symbol)
                 try:
-                    await analyzer.restart()
-                    consecutive_errors = 0
-                    last_restart_time = time.time() 
-                except Exception as restart_err:
-                    logger.error(f"Failed to restart adapters during recovery: {restart_err}")
-            
-            await asyncio.sleep(15)
+                    event = await asyncio.wait_for(sub.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if symbol_set and event.symbol not in symbol_set:
+                    continue
+                yield f"event: {event.kind}\ndata: {json.dumps(event.to_dict(), default=str)}\n\n"
+        finally:
+            sub.close()
+
+    return StreamingResponse(event_source(), media_type="text/event-stream")
+
+def compact_streak(stats: dict) -> dict:
+    """
+    Minimal streak event pushed to alert subscribers (e.g. the notifier service).
+    """
+    return {
+        "symbol": stats['symbol'],
+        "timeframe": stats['timeframe'],
+        "type": stats['current_streak']['type'],
+        "length": stats['current_streak']['length'],
+        "start": stats['current_streak'].get('start'),
+        "price": float(stats['current_price']),
+        "close_time": stats['candle_close_time']
+    }
+
+@app.get("/api/alerts/stream")
+async def stream_alerts(request: Request, threshold: int = 5, symbols: str = None, timeframes: str = None):
+    """
+    Push-based alert feed (Server-Sent Events).
+    Sends a compact `streak` event only when a streak is at/above `threshold`
+    and its (start, type, length) changed since the last event sent on this
+    connection; `start` lets clients tell a new streak from the one they alerted on.
+    Current qualifying streaks are sent on connect so reconnects resync.
+    """
+    symbol_set = set(symbols.upper().split(',')) if symbols else None
+    tf_set = set(timeframes.split(',')) if timeframes else None
+    sub = bus.subscribe("alerts_sse", (StatsSnapshot,), maxsize=200)
+    last_sent = {}
+
+    def qualifies(stats: dict) -> bool:
+        if symbol_set and stats['symbol'] not in symbol_set:
+            return False
+        if tf_set and stats['timeframe'] not in tf_set:
+            return False
+        streak = stats['current_streak']
+        if streak['length'] < threshold:
+            last_sent.pop((stats['symbol'], stats['timeframe']), None)
+            return False
+        key = (stats['symbol'], stats['timeframe'])
+        state = (streak.get('start'), streak['type'], streak['length'])
+        if last_sent.get(key) == state:
+            return False
+        last_sent[key] = state
+        return True
+
+    async def event_source():
+        try:
+            yield ": connected\n\n"
+            for stats in list(snapshots.values()):
+                if qualifies(stats):
+                    yield f"event: streak\ndata: {json.dumps(compact_streak(stats))}\n\n"
+            while True:
+                if await request.is_disconnected():
+                    break
+                try:
+                    event = await asyncio.wait_for(sub.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if qualifies(event.stats):
+                    yield f"event: streak\ndata: {json.dumps(compact_streak(event.stats))}\n\n"
+        finally:
+            sub.close()
+
+    return StreamingResponse(event_source(), media_type="text/event-stream")
 
 # Mount frontend static files
 # This expects the frontend to be built and located at ../frontend/dist (relative to where main.py is run, which is usually root)
@@ -0,0 +1,115 @@
+import time
+import numpy as np
+from typing import Dict, List, Optional
+
+
+class MicroBarRing:
+    """
+    Fixed-capacity ring of 1-second OHLC bars built from price ticks.
+    Seconds without a tick have no bar (clients carry the last close forward).
+    """
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.ts = np.zeros(capacity, dtype=np.int64)     # Bar open time (epoch ms, whole second)
+        self.ohlc = np.zeros((capacity, 4), dtype=np.float64)
+        self.ticks = np.zeros(capacity, dtype=np.int32)
+        self.count = 0    # Bars written so far (head = count % capacity)
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def last_ts(self) -> int:
+        return int(self.ts[(self.count - 1) % self.capacity]) if self.count else 0
+
+    def add(self, price: float, ts: float) -> tuple:
+        """
+        Folds a tick into the bar of its second. Returns (time_ms, o, h, l, c, ticks).
+        Ticks older than the current bar are dropped.
+        """
+        second_ms = int(ts) * 1000
+        last = self.last_ts()
+        if self.count and second_ms == last:
+            i = (self.count - 1) % self.capacity
+            bar = self.ohlc[i]
+            bar[1] = max(bar[1], price)
+            bar[2] = min(bar[2], price)
+            bar[3] = price
+            self.ticks[i] += 1
+        elif second_ms > last:
+            i = self.count % self.capacity
+            self.ts[i] = second_ms
+            self.ohlc[i] = price
+            self.ticks[i] = 1
+            self.count += 1
+        else:
+            i = (self.count - 1) % self.capacity
+        return (int(self.ts[i]), *map(float, self.ohlc[i]), int(self.ticks[i]))
+
+    def since(self, since_ms: Optional[int] = None, limit: Optional[int] = None) -> List[list]:
+        """
+        Bars with a time >= since_ms (oldest first) as [time_ms, o, h, l, c, ticks].
+        `since` is inclusive so a poller re-receives the still-updating last bar.
+        """
+        n = len(self)
+        if n == 0:
+            return []
+        # Chronological view of the ring
+        start = self.count - n
+        order = (np.arange(start, self.count) % self.capacity)
+        ts = self.ts[order]
+        lo = int(np.searchsorted(ts, since_ms, side='left')) if since_ms else 0
+        if limit is not None and n - lo > limit:
+            lo = n - limit
+        idx = order[lo:]
+        return [[int(t), *row, int(k)] for t, row, k in zip(self.ts[idx], self.ohlc[idx].tolist(), self.ticks[idx])]
+
+
+class MicroBarStore:
+    """
+    Per-symbol 1-second micro-bars for live widgets (intra-candle price paths).
+
+    Fed from every price tick the adapter sees; keeps the last CAPACITY seconds
+    per symbol. Symbols with a recent viewer are reported by active_symbols()
+    so the leader can tick them at 1 Hz instead of the regular price pump rate.
+    """
+    CAPACITY = 900            # Seconds kept per symbol (one 15m candle)
+    ACTIVE_WINDOW = 30.0      # Seconds a symbol stays "active" after a micro-bar request
+
+    def __init__(self, capacity: Optional[int] = None):
+        self.capacity = capacity or self.CAPACITY
+        self.rings: Dict[str, MicroBarRing] = {}
+        self.viewed_at: Dict[str, float] = {}
+        self.ticks = 0
+
+    def add(self, symbol: str, price: float, ts: float) -> Optional[tuple]:
+        if not price or price <= 0:
+            return None
+        ring = self.rings.get(symbol)
+        if ring is None:
+            ring = self.rings[symbol] = MicroBarRing(self.capacity)
+        self.ticks += 1
+        return ring.add(price, ts)
+
+    def since(self, symbol: str, since_ms: Optional[int] = None, limit: Optional[int] = None) -> List[list]:
+        ring = self.rings.get(symbol)
+        return ring.since(since_ms, limit) if ring is not None else []
+
+    def last_ts(self, symbol: str) -> int:
+        ring = self.rings.get(symbol)
+        return ring.last_ts() if ring is not None else 0
+
+    def touch(self, symbol: str):
+        self.viewed_at[symbol] = time.time()
+
+    def active_symbols(self) -> List[str]:
+        cutoff = time.time() - self.ACTIVE_WINDOW
+        return sorted(s for s, t in self.viewed_at.items() if t >= cutoff)
+
+    def metrics(self) -> dict:
+        return {
+            "symbols": len(self.rings),
+            "active": self.active_symbols(),
+            "ticks": self.ticks,
+            "capacity_s": self.capacity,
+            "bytes": sum(r.ts.nbytes + r.ohlc.nbytes + r.ticks.nbytes for r in self.rings.values())
+        }
@@ -3,66 +3,108 @@ import os
 import httpx
 import logging
 import asyncio
+from typing import List, Optional
+from .telegram_delivery import TelegramDelivery
+from .subscriptions import SubscriptionRegistry
+from .rules import RuleEngine, streak_rule, load_rules
 
 logger = logging.getLogger(__name__)
 
 class TelegramNotifier:
-    def __init__(self):
+    def __init__(self, registry: Optional[SubscriptionRegistry] = None):
         self.token = os.getenv("TELEGRAM_BOT_TOKEN")
         self.chat_id = os.getenv("TELEGRAM_CHAT_ID")
         self.client = httpx.AsyncClient(timeout=10.0)
-        # Store last alerted level for each (symbol, timeframe)
-        # Key: (symbol, timeframe) -> int (last streak length alerted)
-        self.alert_history = {}
+        # Queued, rate-limited, coalescing delivery (never blocks the evaluation loop)
+        self.delivery = TelegramDelivery(self.token, client=self.client)
+        # Per-subscriber symbols/timeframes/thresholds; the env chat keeps the old default of 5
+        self.registry = registry or SubscriptionRegistry()
+        self.registry.ensure_default(self.chat_id, threshold=5)
+        # Streak rule against each series' lowest subscriber threshold, plus optional
+        # custom rules (alert_rules.json); all evaluated at once over every series
+        data_dir = "/data" if os.path.exists("/data") else "."
+        self.RULES_FILE = os.path.join(data_dir, "alert_rules.json")
+        self.engine = RuleEngine([streak_rule("threshold")] + load_rules(self.RULES_FILE), columns=["threshold"])
 
     async def check_and_alert(self, symbol: str, timeframe: str, streak_type: str, streak_count: int, price: float):
-        if not self.token or not self.chat_id:
+        await self.check_and_alert_batch([{
+            "symbol": symbol,
+            "timeframe": timeframe,
+            "type": streak_type,
+            "length": streak_count,
+            "price": price
+        }])
+
+    async def check_and_alert_batch(self, batch: List[dict]):
+        """
+        Evaluates a batch of stats payloads (or compact streak events) against
+        the alert rules and fans fired alerts out per subscriber (queued per
+        alert; the delivery queue coalesces each chat's alerts into digests).
+        """
+        if not self.token:
             # logger.warning("Telegram credentials missing.")
             return
 
-        if streak_count < 5:
-            # Reset history if streak broke or dropped below threshold
-            if (symbol, timeframe) in self.alert_history:
-                del self.alert_history[(symbol, timeframe)]
+        # Subscriptions may have been edited through another API worker
+        self.registry.reload_if_changed()
+        for stats in batch:
+            self.engine.update(stats, threshold=self.registry.min_threshold(stats['symbol'], stats['timeframe']))
+        fired = self.engine.evaluate()
+        if not fired:
             return
 
-        # Check loop prevention
-        last_alerted = self.alert_history.get((symbol, timeframe), 0)
-        
-        # Alert ONLY if:
-        # 1. New streak count is strictly greater than last alerted count
-        #    (Prevents spamming "Streak is 5" every 15 seconds)
-        if streak_count > last_alerted:
-            await self.send_alert(symbol, timeframe, streak_type, streak_count, price)
-            self.alert_history[(symbol, timeframe)] = streak_count
+        alerts = []
+        for f in fired:
+            stats = f["stats"]
+            streak = stats.get("current_streak") or stats
+            price = stats.get("current_price", stats.get("price"))
+            if f["rule"] == "streak":
+                # Subscribers whose own threshold is reached
+                length = int(streak["length"])
+                text = self.format_alert(f["symbol"], f["timeframe"], streak["type"], length, price)
+            else:
+                # Custom rules go to everyone subscribed to the series
+                length = float("inf")
+                text = self.format_rule_alert(f["message"] or f["rule"], f["symbol"], f["timeframe"], price)
+            alerts.append({"symbol": f["symbol"], "timeframe": f["timeframe"], "length": length, "text": text})
+
+        for chat_id, matched in self.registry.route(alerts).items():
+            # One text per alert: the delivery queue coalesces them into digests
+            # within Telegram's length limit (and can resend them one by one)
+            for alert in matched:
+                self.delivery.enqueue(chat_id, alert["text"], parse_mode="Markdown")
+        logger.info(f"Telegram alerts queued: {len(alerts)} rule hits")
+
+    @staticmethod
+    def format_rule_alert(title: str, symbol: str, timeframe: str, price: float) -> str:
+        return (
+            f"🔔 **{title}: {symbol}** ({timeframe})\n"
+            f"💰 Fiyat: ${price}\n\n"
+            f"#{symbol} #PolymarketBar"
+        )
+
+    @staticmethod
+    def format_alert(symbol: str, timeframe: str, streak_type: str, count: int, price: float) -> str:
+        is_up = streak_type in ("up", "green")
+        emoji = "🟢" if is_up else "🔴"
+        direction = "YÜKSELİŞ" if is_up else "DÜŞÜŞ"
+
+        return (
+            f"🚨 **STREAK ALARMI: {symbol}** 🚨\n\n"
+            f"{emoji} **{count} Mumdur {direction}** ({timeframe})\n"
+            f"💰 Fiyat: ${price}\n\n"
+            f"#{symbol} #{streak_type} #PolymarketBar"
+        )
 
     async def send_alert(self, symbol: str, timeframe: str, streak_type: str, count: int, price: float):
         try:
-            emoji = "🟢" if streak_type == "up" else "🔴"
-            direction = "YÜKSELİŞ" if streak_type == "up" else "DÜŞÜŞ"
-            
-            msg = (
-                f"🚨 **STREAK ALARMI: {symbol}** 🚨\n\n"
-                f"{emoji} **{count} Mumdur {direction}** ({timeframe})\n"
-                f"💰 Fiyat: ${price}\n\n"
-                f"#{symbol} #{streak_type} #PolymarketBar"
-            )
-            
-            url = f"https://api.telegram.org/bot{self.token}/sendMessage"
-            payload = {
-                "chat_id": self.chat_id,
-                "text": msg,
-                "parse_mode": "Markdown"
-            }
-            
-            resp = await self.client.post(url, json=payload)
-            if resp.status_code == 200:
-                logger.info(f"Telegram alert sent for {symbol} {timeframe} ({count})")
-            else:
-                logger.error(f"Telegram failed: {resp.text}")
+            msg = self.format_alert(symbol, timeframe, streak_type, count, price)
+            self.delivery.enqueue(self.chat_id, msg, parse_mode="Markdown")
+            logger.info(f"Telegram alert queued for {symbol} {timeframe} ({count})")
                 
         except Exception as e:
             logger.error(f"Telegram exception: {e}")
 
     async def close(self):
+        await self.delivery.close()
         await self.client.aclose()
@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def atomic_write(path: str, data: bytes) -> int:
+    """
+    Writes bytes via temp file + rename so readers never see a partial file.
+    """
+    temp_file = path + ".tmp"
+    with open(temp_file, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, path)
+    return len(data)
+
+
+def atomic_write_json(path: str, obj) -> int:
+    return atomic_write(path, json.dumps(obj).encode('utf-8'))
+
+
+class PersistenceService:
+    """
+    Debounced background writer shared by every component that persists state.
+
+    Components register a named flush callable (runs on the writer thread and
+    returns the number of bytes written) and call `mark_dirty(name)` from the
+    request path. Marks arriving within `window` seconds of the first one are
+    coalesced into a single flush. `stop()` flushes everything that is still dirty.
+    """
+    def __init__(self, window: Optional[float] = None):
+        self.window = window if window is not None else float(os.getenv("PERSIST_WINDOW_SECONDS", "2.0"))
+        self._jobs: Dict[str, Callable[[], int]] = {}
+        self._dirty: Dict[str, float] = {}  # name -> time of first un-flushed mark
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._stats: Dict[str, dict] = {}
+
+    def register(self, name: str, flush: Callable[[], int]):
+        with self._cond:
+            self._jobs[name] = flush
+            self._stats.setdefault(name, {
+                "writes": 0,
+                "marks": 0,
+                "bytes_written": 0,
+                "last_latency_ms": None,
+                "max_latency_ms": 0.0,
+                "total_latency_ms": 0.0,
+                "errors": 0,
+                "last_write": None
+            })
+
+    def mark_dirty(self, name: str):
+        """
+        Cheap, non-blocking. Safe to call from the event loop.
+        """
+        with self._cond:
+            if name not in self._jobs:
+                logger.warning(f"mark_dirty for unknown persistence job '{name}'")
+                return
+            self._stats[name]["marks"] += 1
+            if name not in self._dirty:
+                self._dirty[name] = time.monotonic()
+                self._cond.notify()
+        # Not started (scripts/tests): write inline so nothing is lost
+        if self._thread is None:
+            self.flush_all()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="persistence-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"Persistence writer started (window={self.window}s)")
+
+    def stop(self, timeout: float = 10.0):
+        """
+        Stops the writer thread and flushes any remaining dirty jobs.
+        """
+        if self._thread is not None:
+            with self._cond:
+                self._stopping = True
+                self._cond.notify()
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush_all()
+
+    def flush_all(self):
+        with self._cond:
+            names = list(self._dirty.keys())
+            self._dirty.clear()
+        for name in names:
+            self._flush(name)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping and not self._dirty:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                # Sleep until the oldest dirty mark has aged past the window
+                now = time.monotonic()
+                deadline = min(self._dirty.values()) + self.window
+                if deadline > now:
+                    self._cond.wait(deadline - now)
+                    continue
+                due = [name for name, ts in self._dirty.items() if ts + self.window <= now]
+                for name in due:
+                    del self._dirty[name]
+            for name in due:
+                self._flush(name)
+
+    def _flush(self, name: str):
+        flush = self._jobs.get(name)
+        if flush is None:
+            return
+        start = time.perf_counter()
+        try:
+            written = flush() or 0
+        except Exception as e:
+            logger.error(f"Persistence job '{name}' failed: {e}")
+            with self._cond:
+                self._stats[name]["errors"] += 1
+            return
+        latency_ms = (time.perf_counter() - start) * 1000
+        with self._cond:
+            stats = self._stats[name]
+            stats["writes"] += 1
+            stats["bytes_written"] += int(written)
+            stats["last_latency_ms"] = round(latency_ms, 3)
+            stats["max_latency_ms"] = round(max(stats["max_latency_ms"], latency_ms), 3)
+            stats["total_latency_ms"] += latency_ms
+            stats["last_write"] = time.time()
+
+    def metrics(self) -> dict:
+        with self._cond:
+            out = {}
+            for name, stats in self._stats.items():
+                avg = stats["total_latency_ms"] / stats["writes"] if stats["writes"] else None
+                out[name] = {
+                    **{k: v for k, v in stats.items() if k != "total_latency_ms"},
+                    "avg_latency_ms": round(avg, 3) if avg is not None else None,
+                    "dirty": name in self._dirty
+                }
+            return {"window_seconds": self.window, "running": self._thread is not None, "jobs": out}
@@ -0,0 +1,340 @@
+import os
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, Optional
+
+from .candles import color_codes, streak_ids, RED
+from .timeframes import split_key, realigned_timeframes, BIN_VERSION
+
+logger = logging.getLogger(__name__)
+
+# Cube axes, in order. Every cell holds counts for "a streak of this color
+# reached this length; the next candle opens at this ET hour/weekday in this
+# volatility regime" (reached) and how often that next candle continued it.
+MAX_LENGTH = 20                               # Last length bucket is "20+"
+COLOR_AXIS = ('green', 'red')
+REGIME_AXIS = ('low', 'normal', 'high')
+DOW_AXIS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+AXES = ('color', 'length', 'regime', 'hour', 'dow')
+SHAPE = (len(COLOR_AXIS), MAX_LENGTH, len(REGIME_AXIS), 24, len(DOW_AXIS))
+
+# Volatility regime: short-window vs long-window std of close-to-close returns
+VOL_SHORT = 20
+VOL_LONG = 100
+REGIME_LOW = 0.8      # short/long below this: calm
+REGIME_HIGH = 1.25    # above this: volatile
+
+
+def _rolling_std(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Population std over the trailing `window` values (NaN until the window is full).
+    """
+    out = np.full(len(values), np.nan)
+    if len(values) < window:
+        return out
+    c1 = np.concatenate(([0.0], np.cumsum(values)))
+    c2 = np.concatenate(([0.0], np.cumsum(values * values)))
+    s1 = c1[window:] - c1[:-window]
+    s2 = c2[window:] - c2[:-window]
+    var = np.maximum(s2 / window - (s1 / window) ** 2, 0.0)
+    out[window - 1:] = np.sqrt(var)
+    return out
+
+
+def volatility_regimes(closes: np.ndarray) -> np.ndarray:
+    """
+    int8 regime per close (0 low, 1 normal, 2 high). Closes without enough
+    history count as normal.
+    """
+    regimes = np.ones(len(closes), dtype=np.int8)
+    if len(closes) <= VOL_SHORT:
+        return regimes
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.diff(closes) / closes[:-1]
+    returns = np.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0)
+    ratio = _rolling_std(returns, VOL_SHORT) / _rolling_std(returns, VOL_LONG)
+    # returns[k] ends at close k+1
+    ratio = np.concatenate(([np.nan], ratio))
+    regimes[ratio < REGIME_LOW] = 0
+    regimes[ratio > REGIME_HIGH] = 2
+    return regimes
+
+
+class ProbabilityCube:
+    """
+    Streak continuation counts sliced by color x length x volatility regime x
+    ET hour x ET weekday (int32 ndarrays, ~80 KB each).
+
+    Fed closed candles in chronological chunks (first the full archive, then
+    each newly closed candle); the running streak, the last closed candle's
+    state and the recent closes are carried across chunks, so incremental
+    updates give exactly the counts of a rebuild.
+    """
+    def __init__(self):
+        self.reached = np.zeros(SHAPE, dtype=np.int32)
+        self.continued = np.zeros(SHAPE, dtype=np.int32)
+        self.last_ts = 0          # Last candle fed (epoch ms)
+        self.version = BIN_VERSION  # Bin version of the candles counted
+        self.candles = 0
+        self.run_color = 0        # Running streak (may continue into the next chunk)
+        self.run_length = 0
+        self.regime = 1           # Regime at the last candle fed
+        self.tail = np.empty(0)   # Last VOL_LONG + 1 closes
+
+    def feed(self, ts: np.ndarray, open_: np.ndarray, close: np.ndarray) -> int:
+        """
+        Adds closed candles newer than everything fed so far. Returns events added.
+        """
+        keep = ts > self.last_ts
+        ts, open_, close = ts[keep], open_[keep], close[keep]
+        n = len(ts)
+        if n == 0:
+            return 0
+
+        colors = color_codes(open_, close, self.run_color)
+        ids = streak_ids(colors)
+        starts = np.flatnonzero(np.diff(ids, prepend=np.uint32(0)) != 0)
+        first_start = np.zeros(int(ids[-1]) + 1, dtype=np.int64)
+        first_start[1:] = starts
+        lengths = np.arange(n) - first_start[ids] + 1
+        if self.run_length and colors[0] == self.run_color:
+            lengths[ids == 0] += self.run_length
+
+        closes = np.concatenate((self.tail, close))
+        regimes = volatility_regimes(closes)[len(self.tail):]
+
+        # State before each candle: the previous candle's color/length/regime
+        # (for the first candle: the carried state, if any)
+        state_color = np.concatenate(([self.run_color], colors[:-1]))
+        state_length = np.concatenate(([self.run_length], lengths[:-1]))
+        state_regime = np.concatenate(([self.regime], regimes[:-1]))
+        valid = state_length > 0
+
+        # Conditions are known when the candle opens: its ET hour/weekday
+        opened = pd.to_datetime(ts[valid], unit='ms', utc=True).tz_convert('US/Eastern')
+        cells = np.ravel_multi_index((
+            (state_color[valid] == RED).astype(np.intp),
+            np.minimum(state_length[valid], MAX_LENGTH) - 1,
+            state_regime[valid].astype(np.intp),
+            np.asarray(opened.hour, dtype=np.intp),
+            np.asarray(opened.dayofweek, dtype=np.intp)
+        ), SHAPE)
+        continued = colors[valid] == state_color[valid]
+        size = self.reached.size
+        self.reached += np.bincount(cells, minlength=size).reshape(SHAPE).astype(np.int32)
+        self.continued += np.bincount(cells[continued], minlength=size).reshape(SHAPE).astype(np.int32)
+
+        self.run_color = int(colors[-1])
+        self.run_length = int(lengths[-1])
+        self.regime = int(regimes[-1])
+        self.tail = closes[-(VOL_LONG + 1):].copy()
+        self.last_ts = int(ts[-1])
+        self.candles += n
+        return int(valid.sum())
+
+    # --- Queries ---
+
+    @staticmethod
+    def parse_filters(filters: Dict[str, Optional[str]]) -> tuple:
+        """
+        {"color": "green", "length": "3", ...} -> index tuple (slice(None) for
+        omitted axes). Raises ValueError for unknown values.
+        """
+        index = []
+        for axis in AXES:
+            value = filters.get(axis)
+            if value is None or value == '':
+                index.append(slice(None))
+                continue
+            value = str(value).lower()
+            if axis == 'color':
+                pos = COLOR_AXIS.index(value) if value in COLOR_AXIS else -1
+            elif axis == 'regime':
+                pos = REGIME_AXIS.index(value) if value in REGIME_AXIS else -1
+            elif axis == 'dow':
+                pos = DOW_AXIS.index(value[:3]) if value[:3] in DOW_AXIS else (int(value) if value.isdigit() and int(value) < 7 else -1)
+            elif axis == 'length':
+                pos = min(int(value), MAX_LENGTH) - 1 if value.isdigit() and int(value) >= 1 else -1
+            else:
+                pos = int(value) if value.isdigit() and int(value) < 24 else -1
+            if pos < 0:
+                raise ValueError(f"Invalid {axis}: {value}")
+            index.append(pos)
+        return tuple(index)
+
+    def query(self, filters: Dict[str, Optional[str]], by: Optional[str] = None, min_samples: int = 1) -> dict:
+        """
+        Continuation probability for the selected cell/slab (omitted axes are
+        summed out). `by` breaks the result down along one axis.
+        """
+        index = self.parse_filters(filters)
+        if by is not None and by not in AXES:
+            raise ValueError(f"Invalid axis: {by}")
+        reached = self.reached[index]
+        continued = self.continued[index]
+
+        def summary(r, c) -> dict:
+            r, c = int(r), int(c)
+            return {
+                "samples": r,
+                "continue": round(c / r * 100, 1) if r >= min_samples and r else None,
+                "reverse": round((r - c) / r * 100, 1) if r >= min_samples and r else None
+            }
+
+        result = {"filters": {a: filters.get(a) for a in AXES if filters.get(a) not in (None, '')},
+                  **summary(reached.sum(), continued.sum())}
+        if by is not None:
+            if not isinstance(index[AXES.index(by)], slice):
+                raise ValueError(f"Cannot break down by filtered axis: {by}")
+            # Axis position among the remaining (sliced) axes
+            remaining = [a for a, i in zip(AXES, index) if isinstance(i, slice)]
+            axis = remaining.index(by)
+            other = tuple(i for i in range(len(remaining)) if i != axis)
+            r_by = reached.sum(axis=other)
+            c_by = continued.sum(axis=other)
+            labels = {
+                'color': COLOR_AXIS, 'regime': REGIME_AXIS, 'dow': DOW_AXIS,
+                'length': [str(n) for n in range(1, MAX_LENGTH)] + [f"{MAX_LENGTH}+"],
+                'hour': list(range(24))
+            }[by]
+            result["by"] = by
+            result["breakdown"] = [{by: label, **summary(r, c)} for label, r, c in zip(labels, r_by, c_by)]
+        return result
+
+    def metrics(self) -> dict:
+        return {"candles": self.candles, "events": int(self.reached.sum()), "last_ts": self.last_ts}
+
+    # --- Persistence ---
+
+    def to_arrays(self) -> dict:
+        return {
+            "reached": self.reached, "continued": self.continued, "tail": self.tail,
+            "state": np.array([self.last_ts, self.candles, self.run_color, self.run_length, self.regime], dtype=np.int64),
+            "version": np.int64(self.version)
+        }
+
+    @classmethod
+    def from_arrays(cls, data) -> "ProbabilityCube":
+        cube = cls()
+        if data["reached"].shape != SHAPE:
+            raise ValueError(f"Cube shape {data['reached'].shape} != {SHAPE}")
+        cube.reached = data["reached"].astype(np.int32)
+        cube.continued = data["continued"].astype(np.int32)
+        cube.tail = data["tail"].astype(np.float64)
+        cube.last_ts, cube.candles, cube.run_color, cube.run_length, cube.regime = (int(x) for x in data["state"])
+        cube.version = int(data["version"]) if "version" in data else 1
+        return cube
+
+
+class CubeStore:
+    """
+    ProbabilityCube per "SYMBOL_TF", persisted as one .npz per key under
+    `root_dir` (written by the persistence writer when attached).
+    """
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        os.makedirs(self.root_dir, exist_ok=True)
+        self.cubes: Dict[str, ProbabilityCube] = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self.persistence = None
+        # Readers of shared market data update cubes in memory but never write
+        self.read_only = False
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root_dir, f"{key}.npz")
+
+    def attach_persistence(self, persistence):
+        self.persistence = persistence
+        persistence.register("prob_cube", self.flush)
+
+    def get(self, key: str) -> Optional[ProbabilityCube]:
+        cube = self.cubes.get(key)
+        if cube is None and os.path.exists(self._path(key)):
+            try:
+                with np.load(self._path(key)) as data:
+                    cube = ProbabilityCube.from_arrays(data)
+                if split_key(key)[1] in realigned_timeframes(cube.version):
+                    # Counted from bins that have moved since: rebuilt on first use
+                    logger.info(f"Probability cube {key} bins v{cube.version} < v{BIN_VERSION}: rebuilding")
+                    return None
+                self.cubes[key] = cube
+            except Exception as e:
+                logger.error(f"Failed to load probability cube {key}: {e}")
+        return cube
+
+    def build(self, key: str, chunks: Iterable[tuple]) -> ProbabilityCube:
+        """
+        Builds a cube from (ts, open, close) chunks in time order. Blocking.
+        """
+        cube = ProbabilityCube()
+        for ts, open_, close in chunks:
+            cube.feed(ts, open_, close)
+        with self._lock:
+            self.cubes[key] = cube
+        self.mark_dirty(key)
+        return cube
+
+    def update(self, key: str, ts: np.ndarray, open_: np.ndarray, close: np.ndarray) -> int:
+        """
+        Feeds newly closed candles into an existing cube. Returns events added.
+        """
+        cube = self.cubes.get(key)
+        if cube is None:
+            return 0
+        with self._lock:
+            added = cube.feed(ts, open_, close)
+        if added:
+            self.mark_dirty(key)
+        return added
+
+    def mark_dirty(self, key: str):
+        if self.read_only:
+            return
+        with self._lock:
+            self._dirty.add(key)
+        if self.persistence is not None:
+            self.persistence.mark_dirty("prob_cube")
+        else:
+            self.flush()
+
+    def flush(self) -> int:
+        with self._lock:
+            keys, self._dirty = self._dirty, set()
+            # Consistent copies: the event loop keeps feeding while we write
+            snapshots = {key: {name: np.array(a) for name, a in self.cubes[key].to_arrays().items()}
+                         for key in keys if key in self.cubes}
+        written = 0
+        for key, arrays in snapshots.items():
+            path = self._path(key)
+            temp_file = path + ".tmp.npz"
+            try:
+                np.savez(temp_file, **arrays)
+                os.replace(temp_file, path)
+                written += os.path.getsize(path)
+            except Exception as e:
+                logger.error(f"Failed to save probability cube {key}: {e}")
+        return written
+
+    def set_read_only(self, read_only: bool):
+        self.read_only = read_only
+
+    def clear(self) -> int:
+        with self._lock:
+            self._dirty.clear()
+        self.cubes.clear()
+        removed = 0
+        for name in os.listdir(self.root_dir):
+            if name.endswith('.npz'):
+                os.remove(os.path.join(self.root_dir, name))
+                removed += 1
+        return removed
+
+    def metrics(self) -> dict:
+        return {
+            "cubes": len(self.cubes),
+            "cells": int(np.prod(SHAPE)),
+            "bytes": sum(c.reached.nbytes + c.continued.nbytes for c in self.cubes.values())
+        }
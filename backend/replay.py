@@ -0,0 +1,315 @@
+"""
+Offline replay/backtest of the streak prediction shown by get_stats.
+
+Replays long candle histories (store/archive directories or CSV files) with
+the same semantics as Analyzer.get_stats and scores every prediction:
+
+- candle colors: close vs open, flat candles carry the previous color
+- live-candle sync: the prediction for candle t is made with candle t live
+  (at its open price, or at its close price right before it closes) and the
+  running streak includes it
+- window: streak counts come from the last `window` candles, like the cache
+  (MAX_CANDLES); None uses the whole history up to t
+- 4h/1d bars are resampled from 1h with the Polymarket ET alignment
+
+Every step is computed with array operations over the whole history (one
+short loop over distinct streak lengths), never by calling get_stats per step.
+
+Usage:
+    python -m backend.replay --data /data --symbols BTC,ETH --timeframes 15m,1h,4h,1d
+    python -m backend.replay --csv BTC_1h.csv ETH_1h.csv --timeframes 1h,4h,1d --json report.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .candles import color_codes, streak_ids
+from .datasources.ohlcv_store import OHLCVStore, frame_to_records, records_to_frame
+from .datasources.segment_store import SegmentStore
+from .timeframes import resample_ohlcv, split_key
+
+DEFAULT_WINDOW = 10000       # Adapter MAX_CANDLES: what get_stats sees
+RELIABILITY_BINS = 10
+LENGTH_BUCKETS = 10          # by_length groups N >= 10 together
+
+
+def replay_series(ts: np.ndarray, open_: np.ndarray, close: np.ndarray,
+                  window: Optional[int] = DEFAULT_WINDOW, at: str = 'close') -> Dict[str, np.ndarray]:
+    """
+    Per-candle predictions for one series.
+
+    at='close': candle t is live at its final price; predicts whether the
+    running streak (including t) continues with candle t+1.
+    at='open': candle t is live at its open price (flat, so it extends the
+    previous streak); predicts whether that streak outlasts candle t.
+
+    Returns arrays (one entry per scored step): time (live candle open, ms),
+    color (+1/-1), length (N), prob (P(continue), NaN when get_stats returns
+    None) and outcome (1 continued, 0 reversed, -1 not decided yet).
+    """
+    n = len(ts)
+    empty = {"time": np.empty(0, np.int64), "color": np.empty(0, np.int8), "length": np.empty(0, np.int64),
+             "prob": np.empty(0), "outcome": np.empty(0, np.int8)}
+    if n < 2:
+        return empty
+
+    colors = color_codes(open_, close)
+    ids = streak_ids(colors).astype(np.int64)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(ids)) + 1))
+    ends = np.append(starts[1:], n) - 1
+    lengths = ends - starts + 1
+    scolor = colors[starts]
+    pos = np.arange(n) - starts[ids] + 1   # Streak length so far at each candle
+    n_streaks = len(starts)
+
+    # Query per live candle t: running streak s, its color c and length N
+    if at == 'close':
+        t = np.arange(n)
+        s = ids
+        N = pos.copy()
+    elif at == 'open':
+        t = np.arange(1, n)
+        s = ids[:-1]
+        N = pos[:-1] + 1
+    else:
+        raise ValueError(f"at must be 'open' or 'close', not {at!r}")
+    c = scolor[s]
+
+    # Window start (the live candle is the window's last candle)
+    ws = np.maximum(t - window + 1, 0) if window else np.zeros(len(t), dtype=np.int64)
+    k0 = ids[ws]                               # Streak containing the window start
+    trunc = ends[k0] - ws + 1                  # Its length inside the window
+
+    # Completed streaks strictly between k0 and s, per color, with length >= N / > N:
+    # one cumulative count per distinct N (streak lengths are short)
+    reached = np.ones(len(t), dtype=np.int64)  # The running streak itself reaches N
+    continued = np.zeros(len(t), dtype=np.int64)
+    is_green = scolor == 1
+    for value in np.unique(N):
+        sel = np.flatnonzero(N == value)
+        for color_mask, code in ((is_green, 1), (~is_green, -1)):
+            q = sel[c[sel] == code]
+            if len(q) == 0:
+                continue
+            ge = np.concatenate(([0], np.cumsum(color_mask & (lengths >= value))))
+            gt = np.concatenate(([0], np.cumsum(color_mask & (lengths > value))))
+            lo = np.minimum(k0[q] + 1, s[q])
+            reached[q] += ge[s[q]] - ge[lo]
+            continued[q] += gt[s[q]] - gt[lo]
+
+    # The (truncated) streak at the window start, when it is not the running one
+    head = (k0 < s) & (scolor[k0] == c)
+    reached += head & (trunc >= N)
+    continued += head & (trunc > N)
+
+    # Running streak started before the window: get_stats sees a lone, truncated streak
+    lone = k0 == s
+
+    # get_stats colors the window's leading flat candles green (nothing before
+    # them to carry from); here they carried red from before the window
+    raw = np.sign(close - open_)
+    nonflat = np.flatnonzero(raw != 0)
+    nf = np.searchsorted(nonflat, ws)
+    f = np.where(nf < len(nonflat), nonflat[np.minimum(nf, len(nonflat) - 1)], n)
+    # The live candle is flat when predicting at its open
+    all_flat = f >= t if at == 'open' else f > t
+    recolored = (raw[ws] == 0) & (colors[ws] == -1) & (ws > 0) & ~all_flat
+    lone |= (raw[ws] == 0) & (ws > 0) & all_flat
+    if recolored.any():
+        # A: red continues after the flats -> green head (f - ws) + red rest of k0
+        # B: green follows -> one green streak: flats + the next streak k1
+        fi = np.minimum(f, n - 1)
+        case_a = recolored & (colors[fi] == -1) & ~lone
+        case_b = recolored & (colors[fi] == 1)
+        k1 = np.minimum(k0 + 1, n_streaks - 1)
+        lone |= case_b & (k1 == s)
+        case_b &= ~lone
+        red, green = c == -1, c == 1
+        flats = f - ws
+        for counts, op in ((reached, np.greater_equal), (continued, np.greater)):
+            counts -= (case_a | case_b) & red & op(trunc, N)
+            counts += case_a & green & op(flats, N)
+            counts += case_a & red & op(trunc - flats, N)
+            counts -= case_b & green & op(lengths[k1], N)
+            counts += case_b & green & op(trunc + lengths[k1], N)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        prob = np.where(reached > 1, continued / reached, np.nan)
+    prob[lone] = np.nan
+
+    # Outcome: did the streak end up longer than N? (unknown if it is still running at the end)
+    final = lengths[s]
+    decided = (s < n_streaks - 1) | (final > N)
+    outcome = np.where(decided, (final > N).astype(np.int8), np.int8(-1))
+
+    return {"time": ts[t], "color": c.astype(np.int8), "length": N, "prob": prob, "outcome": outcome}
+
+
+def calibration(prob: np.ndarray, outcome: np.ndarray, lengths: Optional[np.ndarray] = None) -> dict:
+    """
+    Brier score, skill vs. the base rate, and reliability bins over the scored
+    (predicted and decided) steps.
+    """
+    steps = len(prob)
+    scored = ~np.isnan(prob) & (outcome >= 0)
+    p, y = prob[scored], outcome[scored].astype(np.float64)
+    result = {"steps": int(steps), "scored": int(scored.sum()),
+              "coverage": round(float(scored.sum() / steps), 4) if steps else None}
+    if len(p) == 0:
+        return result
+
+    brier = float(np.mean((p - y) ** 2))
+    base_rate = float(y.mean())
+    brier_ref = base_rate * (1 - base_rate)
+    bins = np.minimum((p * RELIABILITY_BINS).astype(np.int64), RELIABILITY_BINS - 1)
+    count = np.bincount(bins, minlength=RELIABILITY_BINS)
+    sum_p = np.bincount(bins, weights=p, minlength=RELIABILITY_BINS)
+    sum_y = np.bincount(bins, weights=y, minlength=RELIABILITY_BINS)
+    result.update({
+        "brier": round(brier, 5),
+        "base_rate": round(base_rate, 4),
+        "brier_skill": round(1 - brier / brier_ref, 4) if brier_ref > 0 else None,
+        "reliability": [{
+            "bin": f"{i / RELIABILITY_BINS:.1f}-{(i + 1) / RELIABILITY_BINS:.1f}",
+            "count": int(count[i]),
+            "mean_prob": round(float(sum_p[i] / count[i]), 4),
+            "observed": round(float(sum_y[i] / count[i]), 4)
+        } for i in range(RELIABILITY_BINS) if count[i]]
+    })
+    if lengths is not None:
+        bucket = np.minimum(lengths[scored], LENGTH_BUCKETS)
+        by_length = []
+        for b in range(1, LENGTH_BUCKETS + 1):
+            m = bucket == b
+            if m.any():
+                by_length.append({
+                    "length": f"{b}+" if b == LENGTH_BUCKETS else str(b),
+                    "count": int(m.sum()),
+                    "mean_prob": round(float(p[m].mean()), 4),
+                    "observed": round(float(y[m].mean()), 4),
+                    "brier": round(float(np.mean((p[m] - y[m]) ** 2)), 5)
+                })
+        result["by_length"] = by_length
+    return result
+
+
+# --- Offline inputs ---
+
+def load_store_series(data_dir: str, key: str) -> np.ndarray:
+    """
+    Full history of a key from a DATA_DIR: compressed archive + hot store.
+    """
+    segments = SegmentStore(os.path.join(data_dir, "ohlcv_segments"))
+    store = OHLCVStore(os.path.join(data_dir, "ohlcv_store"))
+    archived = segments.read(key)
+    since = int(archived['ts'][-1]) if len(archived) else None
+    tail = store.records(key, since_ms=since)
+    return np.concatenate([archived, tail]) if len(archived) else tail
+
+
+def load_csv_series(path: str) -> np.ndarray:
+    """
+    CSV with a timestamp column (epoch ms or ISO) and open/high/low/close[/volume].
+    """
+    df = pd.read_csv(path)
+    ts_col = next((c for c in ('timestamp', 'time', 'ts', 'date') if c in df.columns), df.columns[0])
+    values = df[ts_col]
+    index = pd.to_datetime(values, unit='ms', utc=True) if np.issubdtype(values.dtype, np.number) else pd.to_datetime(values, utc=True)
+    df = df.drop(columns=[ts_col]).set_index(pd.DatetimeIndex(index))
+    return frame_to_records(df)
+
+
+def derive(records: np.ndarray, timeframe: str) -> np.ndarray:
+    """
+    4h/1d (ET-aligned) bars from 1h records, like the adapter.
+    """
+    if len(records) == 0:
+        return records
+    return frame_to_records(resample_ohlcv(records_to_frame(records), timeframe))
+
+
+def replay(series: Dict[str, np.ndarray], window: Optional[int] = DEFAULT_WINDOW, at: str = 'close') -> dict:
+    """
+    { "SYMBOL_TF": records } -> calibration per series and over everything.
+    """
+    report, probs, outcomes, lengths = {}, [], [], []
+    for key, records in series.items():
+        result = replay_series(records['ts'], records['open'], records['close'], window, at)
+        report[key] = {"candles": int(len(records)), **calibration(result["prob"], result["outcome"], result["length"])}
+        probs.append(result["prob"])
+        outcomes.append(result["outcome"])
+        lengths.append(result["length"])
+    overall = calibration(np.concatenate(probs), np.concatenate(outcomes), np.concatenate(lengths)) if probs else {}
+    return {"window": window, "at": at, "series": report, "overall": overall}
+
+
+def _collect(args) -> Dict[str, np.ndarray]:
+    timeframes = [tf for tf in args.timeframes.split(',') if tf]
+    series = {}
+    if args.csv:
+        for path in args.csv:
+            # BTC_1h.csv -> ("BTC", "1h")
+            symbol, tf = split_key(os.path.splitext(os.path.basename(path))[0])
+            records = load_csv_series(path)
+            series[f"{symbol}_{tf}"] = records
+            if tf == '1h':
+                for derived_tf in ('4h', '1d'):
+                    if derived_tf in timeframes:
+                        series[f"{symbol}_{derived_tf}"] = derive(records, derived_tf)
+        return {k: v for k, v in series.items() if split_key(k)[1] in timeframes}
+
+    symbols = [s for s in args.symbols.upper().split(',') if s]
+    for symbol in symbols:
+        for tf in timeframes:
+            if tf in ('4h', '1d'):
+                records = derive(load_store_series(args.data, f"{symbol}_1h"), tf)
+            else:
+                records = load_store_series(args.data, f"{symbol}_{tf}")
+            if len(records):
+                series[f"{symbol}_{tf}"] = records
+    return series
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Replay streak predictions over stored history and score them.")
+    parser.add_argument("--data", default="/data" if os.path.exists("/data") else ".", help="DATA_DIR with ohlcv_store/ohlcv_segments")
+    parser.add_argument("--csv", nargs="*", help="SYMBOL_TF.csv files instead of a data dir")
+    parser.add_argument("--symbols", default="BTC,ETH,SOL,XRP")
+    parser.add_argument("--timeframes", default="15m,1h,4h,1d")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="Candles visible to get_stats (0: all history)")
+    parser.add_argument("--at", choices=("close", "open"), default="close", help="Live-candle price the prediction is made at")
+    parser.add_argument("--json", help="Write the full report here")
+    args = parser.parse_args(argv)
+
+    started = time.time()
+    series = _collect(args)
+    loaded = time.time()
+    if not series:
+        print("No candles found.", file=sys.stderr)
+        return 1
+    report = replay(series, args.window or None, args.at)
+    done = time.time()
+
+    print(f"{'series':<12} {'candles':>9} {'scored':>9} {'brier':>8} {'skill':>8} {'base':>6}")
+    for key, r in list(report["series"].items()) + [("overall", report["overall"])]:
+        print(f"{key:<12} {r.get('candles', sum(s['candles'] for s in report['series'].values())):>9} "
+              f"{r.get('scored', 0):>9} {r.get('brier', float('nan')):>8} {str(r.get('brier_skill')):>8} {r.get('base_rate', float('nan')):>6}")
+    print("\nReliability (overall):")
+    for b in report["overall"].get("reliability", []):
+        print(f"  p {b['bin']}: n={b['count']:<8} predicted={b['mean_prob']:.3f} observed={b['observed']:.3f}")
+    print(f"\nLoaded in {loaded - started:.2f}s, replayed in {done - loaded:.2f}s")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,359 @@
+import ast
+import json
+import logging
+import os
+import numpy as np
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Streak colours as numbers so `streak_type == "green"` works on a float column
+TYPE_CODES = {"green": 1.0, "up": 1.0, "red": -1.0, "down": -1.0}
+
+
+def _num(value) -> float:
+    try:
+        return float(value) if value is not None else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def extract_fields(stats: dict) -> Dict[str, float]:
+    """
+    Flattens an `Analyzer.get_stats` payload (or a compact streak event from
+    /api/alerts/stream) into the numeric fields rules can reference.
+    Missing values become NaN, which makes any comparison on them False.
+    """
+    if "current_streak" in stats:
+        streak = stats["current_streak"]
+        s_type, length = streak.get("type"), streak.get("length")
+        price, candle_open = stats.get("current_price"), stats.get("candle_open")
+    else:
+        s_type, length = stats.get("type"), stats.get("length")
+        price, candle_open = stats.get("price"), stats.get("candle_open")
+
+    prob = stats.get("next_candle_prob") or {}
+    extra = stats.get("stats") or {}
+    whipsaw = (stats.get("smart_trading") or {}).get("whipsaw_risk") or {}
+
+    price, candle_open = _num(price), _num(candle_open)
+    return {
+        "streak_length": _num(length),
+        "streak_type": TYPE_CODES.get(s_type, 0.0),
+        # +length for green, -length for red: changes whenever the streak does
+        "streak_signed": TYPE_CODES.get(s_type, 0.0) * _num(length),
+        "prob_continue": _num(prob.get("continue")),
+        "prob_reverse": _num(prob.get("reverse")),
+        "volatility": _num(extra.get("volatility")),
+        "avg_streak": _num(extra.get("avg_streak")),
+        "max_streak": _num(extra.get("max_streak")),
+        "whipsaw_risk": _num(whipsaw.get("probability")),
+        "price": price,
+        "candle_open": candle_open,
+        # Signed % distance of the price from the candle open
+        "open_distance_pct": (price - candle_open) / candle_open * 100 if candle_open else np.nan,
+        "is_stale": 1.0 if stats.get("is_stale") else 0.0
+    }
+
+
+FIELDS = tuple(extract_fields({}).keys())
+FUNCTIONS = {"abs": np.abs, "minimum": np.minimum, "maximum": np.maximum}
+
+
+def _truth(node):
+    """
+    `x != 0`: the bitwise operators that replace and/or/not need booleans
+    (`not is_stale` on a float column would be `~1.0`).
+    """
+    return ast.Compare(left=node, ops=[ast.NotEq()], comparators=[ast.Constant(0)])
+
+
+class _Vectorize(ast.NodeTransformer):
+    """
+    Rewrites a rule expression so it runs on NumPy columns:
+    `and`/`or`/`not` -> `&`/`|`/`~`, chained comparisons -> `&` of pairs,
+    string literals -> TYPE_CODES. Anything outside the whitelist is rejected.
+    """
+    ALLOWED = (ast.Expression, ast.BoolOp, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Name, ast.Load,
+               ast.Constant, ast.Call, ast.And, ast.Or, ast.Not, ast.USub, ast.UAdd,
+               ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Mod,
+               ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+
+    def __init__(self, names):
+        self.names = set(names)
+
+    def generic_visit(self, node):
+        if not isinstance(node, self.ALLOWED):
+            raise ValueError(f"Unsupported syntax in rule: {type(node).__name__}")
+        return super().generic_visit(node)
+
+    def visit_Name(self, node):
+        if node.id not in self.names and node.id not in FUNCTIONS:
+            raise ValueError(f"Unknown field in rule: {node.id}")
+        return node
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+            raise ValueError("Only abs/minimum/maximum calls are allowed in rules")
+        return self.generic_visit(node)
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, str):
+            if node.value not in TYPE_CODES:
+                raise ValueError(f"Unknown string in rule: {node.value!r}")
+            return ast.copy_location(ast.Constant(TYPE_CODES[node.value]), node)
+        if not isinstance(node.value, (int, float)):
+            raise ValueError(f"Unsupported constant in rule: {node.value!r}")
+        return node
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+        result = _truth(node.values[0])
+        for value in node.values[1:]:
+            result = ast.BinOp(left=result, op=op, right=_truth(value))
+        return ast.copy_location(result, node)
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return ast.copy_location(ast.UnaryOp(op=ast.Invert(), operand=_truth(node.operand)), node)
+        return node
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        parts, left = [], node.left
+        for op, right in zip(node.ops, node.comparators):
+            parts.append(ast.Compare(left=left, ops=[op], comparators=[right]))
+            left = right
+        result = parts[0]
+        for part in parts[1:]:
+            result = ast.BinOp(left=result, op=ast.BitAnd(), right=part)
+        return ast.copy_location(result, node)
+
+
+def _eval(code, columns: Dict[str, np.ndarray]) -> np.ndarray:
+    return eval(code, {"__builtins__": {}, **FUNCTIONS}, columns)
+
+
+def compile_expression(expr: str, names=FIELDS):
+    """
+    Compiles a rule expression to a boolean column expression. Raises
+    ValueError for anything that doesn't evaluate on a sample row.
+    """
+    try:
+        tree = _Vectorize(names).visit(ast.parse(expr, mode="eval"))
+    except SyntaxError as e:
+        raise ValueError(f"Invalid rule {expr!r}: {e}")
+    # The result as a boolean column, whatever the expression's type (e.g. "volatility")
+    tree.body = _truth(tree.body)
+    code = compile(ast.fix_missing_locations(tree), f"<rule: {expr}>", "eval")
+    try:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result = _eval(code, {name: np.ones(2) for name in names})
+        if np.asarray(result).dtype != bool:
+            raise TypeError(f"result is {np.asarray(result).dtype}, not bool")
+    except Exception as e:
+        raise ValueError(f"Invalid rule {expr!r}: {e}")
+    return code
+
+
+class Rule:
+    """
+    A named alert condition over the fields in `FIELDS` (plus caller columns).
+
+    - `when`: expression that triggers the rule, e.g. "streak_length >= 5 and prob_reverse > 60"
+    - `rearm`: hysteresis; once fired the rule stays latched until this is true
+      (default: until `when` is false again)
+    - `repeat_on`: field that re-fires a latched rule when its value changes
+      (e.g. "streak_length" alerts on 5, 6, 7... but not twice on 5)
+    """
+    def __init__(self, name: str, when: str, rearm: Optional[str] = None,
+                 repeat_on: Optional[str] = None, message: Optional[str] = None):
+        self.name = name
+        self.when = when
+        self.rearm = rearm
+        self.repeat_on = repeat_on
+        self.message = message
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Rule":
+        return cls(data["name"], data["when"], data.get("rearm"), data.get("repeat_on"), data.get("message"))
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "when": self.when, "rearm": self.rearm,
+                "repeat_on": self.repeat_on, "message": self.message}
+
+
+def streak_rule(threshold="threshold") -> Rule:
+    """
+    The classic alert: streak at/above the threshold, once per new length
+    (or new colour). `threshold` is a number or the name of a per-row column.
+    """
+    return Rule("streak", f"streak_length >= {threshold}", repeat_on="streak_signed")
+
+
+def load_rules(path: str) -> List[Rule]:
+    """
+    Optional extra rules from a JSON list of {"name", "when", "rearm", "repeat_on", "message"}.
+    """
+    if not path or not os.path.exists(path):
+        return []
+    try:
+        with open(path, "r") as f:
+            return [Rule.from_dict(r) for r in json.load(f)]
+    except Exception as e:
+        logger.error(f"Failed to load alert rules from {path}: {e}")
+        return []
+
+
+class RuleEngine:
+    """
+    Evaluates every rule at once over a table of all symbol x timeframe states.
+
+    Each series is a row; each field a float64 column. `update()` writes the
+    latest stats of a series, `evaluate()` runs each compiled rule as one NumPy
+    expression over all rows and returns the rows that fire, applying the
+    per-rule latch (hysteresis) and repeat dedupe state.
+    """
+    INITIAL_ROWS = 64
+
+    def __init__(self, rules: List[Rule], columns: Optional[List[str]] = None):
+        # Caller-provided per-row columns (e.g. "threshold" = lowest subscriber threshold)
+        self.extra_columns = list(columns or [])
+        self.names = list(FIELDS) + self.extra_columns
+        self.rows: Dict[str, int] = {}       # "SYMBOL_TF" -> row
+        self.keys: List[str] = []            # row -> "SYMBOL_TF"
+        self.payloads: List[dict] = []       # row -> latest stats (for messages)
+        self.table = {name: np.full(self.INITIAL_ROWS, np.nan) for name in self.names}
+        self.dirty = np.zeros(self.INITIAL_ROWS, dtype=bool)
+        self.rules: List[Rule] = []
+        self._compiled: Dict[str, tuple] = {}
+        # Per rule: latched flag and repeat_on value at the last fire
+        self.state: Dict[str, Dict[str, np.ndarray]] = {}
+        self.set_rules(rules)
+
+    def _new_state(self, size: int) -> Dict[str, np.ndarray]:
+        return {"latched": np.zeros(size, dtype=bool), "last": np.full(size, np.nan)}
+
+    def set_rules(self, rules: List[Rule]):
+        """
+        (Re)compiles rules. Rules keeping their name keep their dedupe state;
+        invalid rules are logged and left out so they can't break the others.
+        """
+        compiled, valid = {}, []
+        for rule in rules:
+            try:
+                if rule.repeat_on and rule.repeat_on not in self.names:
+                    raise ValueError(f"Unknown repeat_on field: {rule.repeat_on}")
+                compiled[rule.name] = (
+                    compile_expression(rule.when, self.names),
+                    compile_expression(rule.rearm, self.names) if rule.rearm else None
+                )
+            except ValueError as e:
+                logger.error(f"Rejected alert rule {rule.name!r}: {e}")
+                continue
+            valid.append(rule)
+        rules = valid
+        size = len(self.dirty)
+        self.state = {r.name: self.state.get(r.name) or self._new_state(size) for r in rules}
+        self.rules, self._compiled = list(rules), compiled
+
+    def _grow(self):
+        size = len(self.dirty) * 2
+        for name, col in self.table.items():
+            grown = np.full(size, np.nan)
+            grown[:len(col)] = col
+            self.table[name] = grown
+        dirty = np.zeros(size, dtype=bool)
+        dirty[:len(self.dirty)] = self.dirty
+        self.dirty = dirty
+        for state in self.state.values():
+            latched = np.zeros(size, dtype=bool)
+            latched[:len(state["latched"])] = state["latched"]
+            last = np.full(size, np.nan)
+            last[:len(state["last"])] = state["last"]
+            state["latched"], state["last"] = latched, last
+
+    def update(self, stats: dict, **columns):
+        key = f"{stats['symbol']}_{stats['timeframe']}"
+        row = self.rows.get(key)
+        if row is None:
+            if len(self.keys) == len(self.dirty):
+                self._grow()
+            row = len(self.keys)
+            self.rows[key] = row
+            self.keys.append(key)
+            self.payloads.append(stats)
+        self.payloads[row] = stats
+        for name, value in extract_fields(stats).items():
+            self.table[name][row] = value
+        for name in self.extra_columns:
+            self.table[name][row] = _num(columns.get(name))
+        self.dirty[row] = True
+
+    def evaluate(self, only_updated: bool = True) -> List[dict]:
+        """
+        Runs all rules over the table. With `only_updated`, rows that didn't
+        change since the last call can't fire (their state is kept as is).
+        Returns [{"rule", "key", "symbol", "timeframe", "previous", "stats"}, ...].
+        """
+        n = len(self.keys)
+        if n == 0:
+            return []
+        columns = {name: col[:n] for name, col in self.table.items()}
+        scope = np.ones(n, dtype=bool) if not only_updated else self.dirty[:n].copy()
+        fired = []
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for rule in self.rules:
+                when_code, rearm_code = self._compiled[rule.name]
+                state = self.state[rule.name]
+                latched, last = state["latched"][:n], state["last"][:n]
+
+                try:
+                    hit = np.broadcast_to(_eval(when_code, columns), (n,)) & scope
+                    if rearm_code is not None:
+                        release = np.broadcast_to(_eval(rearm_code, columns), (n,))
+                    else:
+                        release = ~hit
+                except Exception as e:
+                    # One failing rule must not silence the others
+                    logger.error(f"Alert rule {rule.name!r} failed: {e}")
+                    continue
+                # Hysteresis: latched rows re-arm only when the release condition holds
+                latched &= ~(release & scope)
+                last[~latched] = np.nan
+
+                fire = hit & ~latched
+                if rule.repeat_on:
+                    value = columns[rule.repeat_on]
+                    # Latched and the watched value moved (e.g. streak 5 -> 6)
+                    fire |= hit & latched & (value != last) & ~np.isnan(value)
+
+                rows = np.flatnonzero(fire)
+                for row in rows:
+                    symbol, _, tf = self.keys[row].rpartition('_')
+                    previous = last[row]
+                    fired.append({
+                        "rule": rule.name,
+                        "message": rule.message,
+                        "key": self.keys[row],
+                        "symbol": symbol,
+                        "timeframe": tf,
+                        "previous": None if np.isnan(previous) else float(previous),
+                        "stats": self.payloads[row]
+                    })
+                latched[rows] = True
+                if rule.repeat_on:
+                    last[rows] = columns[rule.repeat_on][rows]
+
+        self.dirty[:n] = False
+        return fired
+
+    def metrics(self) -> dict:
+        return {
+            "rows": len(self.keys),
+            "rules": [r.to_dict() for r in self.rules],
+            "latched": {name: int(s["latched"][:len(self.keys)].sum()) for name, s in self.state.items()}
+        }
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List
+from .freshness import FreshnessManager
+from .timeframes import split_key
+from .universe import SymbolUniverse
+
+logger = logging.getLogger(__name__)
+
+
+class CandleScheduler:
+    """
+    Candle-boundary-aligned background scheduler.
+
+    Tracked series are sharded by symbol (stable hash, all timeframes of a
+    symbol on one shard) across concurrent refresh workers. Each worker sleeps
+    until its next series is due (just after its timeframe boundary + settle
+    delay) and refreshes due series under its own budgets: at most
+    SHARD_CONCURRENCY fetches in flight and SHARD_PASS_BUDGET series per pass
+    (the most overdue first, the rest follow right after), so a burst on one
+    shard neither starves the others nor floods the exchange. Refreshes make
+    the adapter publish CandleClosed events (4h/1d ride on their 1h source),
+    which drive snapshots and alerts via the event bus.
+    """
+    SHARDS = int(os.getenv("SCHEDULER_SHARDS", "4"))
+    SHARD_CONCURRENCY = 4      # Fetches in flight per shard
+    SHARD_PASS_BUDGET = 64     # Series refreshed per shard pass
+    RESTART_INTERVAL = 6 * 60 * 60  # 6 hours
+    MAX_CONSECUTIVE_ERRORS = 3
+
+    def __init__(self, analyzer, freshness: FreshnessManager, shards: int = None):
+        self.analyzer = analyzer
+        self.freshness = freshness
+        self.shards = max(1, shards or self.SHARDS)
+        self.semaphores = [asyncio.Semaphore(self.SHARD_CONCURRENCY) for _ in range(self.shards)]
+        self.last_pass: Dict[int, dict] = {}
+        # Per shard: a shard that keeps failing restarts the adapters even while others succeed
+        self.consecutive_errors: Dict[int, int] = {i: 0 for i in range(self.shards)}
+        self.last_restart_time = time.time()
+        self._restart_lock = asyncio.Lock()
+
+    def track(self, symbols: List[str], timeframes: List[str]):
+        for symbol in symbols:
+            for tf in timeframes:
+                self.freshness.track(symbol, tf)
+
+    def shard_of(self, key: str) -> int:
+        return SymbolUniverse.shard_of(split_key(key)[0], self.shards)
+
+    def shard_keys(self, shard: int) -> List[str]:
+        return [key for key in self.freshness.tracked_keys() if self.shard_of(key) == shard]
+
+    async def _refresh(self, shard: int, key: str):
+        async with self.semaphores[shard]:
+            await self.freshness.refresh(key)
+
+    async def run_shard_once(self, shard: int) -> dict:
+        keys = self.shard_keys(shard)
+        due = self.freshness.due_keys(keys=keys)
+        if not due:
+            return {}
+        batch = due[:self.SHARD_PASS_BUDGET]
+        started = time.time()
+        await asyncio.gather(*(self._refresh(shard, key) for key in batch))
+
+        self.last_pass[shard] = {
+            "at": started,
+            "tracked": len(keys),
+            "refreshed": len(batch),
+            "deferred": len(due) - len(batch),
+            "refresh_ms": round((time.time() - started) * 1000, 1)
+        }
+        return self.last_pass[shard]
+
+    async def run_once(self) -> dict:
+        """
+        One pass of every shard (concurrently).
+        """
+        passes = await asyncio.gather(*(self.run_shard_once(i) for i in range(self.shards)))
+        return {i: p for i, p in enumerate(passes) if p}
+
+    async def _restart(self, reason: str):
+        async with self._restart_lock:
+            logger.warning(f"{reason} Restarting adapters...")
+            try:
+                await self.analyzer.restart()
+                self.consecutive_errors = {i: 0 for i in range(self.shards)}
+                self.last_restart_time = time.time()
+            except Exception as e:
+                logger.error(f"Failed to restart adapters: {e}")
+
+    async def _run_shard(self, shard: int):
+        while True:
+            try:
+                await self.run_shard_once(shard)
+                self.consecutive_errors[shard] = 0
+            except Exception as e:
+                self.consecutive_errors[shard] += 1
+                logger.error(f"Error in candle scheduler shard {shard} (Count: {self.consecutive_errors[shard]}): {e}")
+                if self.consecutive_errors[shard] >= self.MAX_CONSECUTIVE_ERRORS:
+                    await self._restart(f"Too many consecutive errors on shard {shard}.")
+                await asyncio.sleep(5)
+
+            await asyncio.sleep(self.freshness.next_due_in(keys=self.shard_keys(shard)))
+
+    async def run(self):
+        logger.info(f"Starting candle scheduler ({self.shards} shards)...")
+        workers = [asyncio.create_task(self._run_shard(i)) for i in range(self.shards)]
+        try:
+            while True:
+                # Periodic proactive restart
+                if time.time() - self.last_restart_time > self.RESTART_INTERVAL:
+                    await self._restart("Performing scheduled restart of adapters.")
+                await asyncio.sleep(60)
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    def metrics(self) -> dict:
+        return {
+            "tracked": len(self.freshness.tracked_keys()),
+            "shards": self.shards,
+            "max_concurrent_fetches": self.shards * self.SHARD_CONCURRENCY,
+            "shard_pass_budget": self.SHARD_PASS_BUDGET,
+            "consecutive_errors": self.consecutive_errors,
+            "last_pass": self.last_pass
+        }
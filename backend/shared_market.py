@@ -0,0 +1,592 @@
+import os
+import re
+import json
+import time
+import socket
+import asyncio
+import logging
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory, resource_tracker
+from typing import Dict, List, Optional, Tuple
+from .datasources.ohlcv_store import RECORD_DTYPE, frame_to_records, records_to_frame
+from .cache_backend import CacheBackend, create_cache_backend
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, every process ingests on its own
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Segment header, guarded by a seqlock: `seq` is odd while the writer is mid-update
+HEADER_DTYPE = np.dtype([
+    ('seq', '<u8'),
+    ('count', '<u8'),
+    ('updated_ms', '<i8'),
+    ('epoch', '<i8'),      # Leader epoch that created the segment
+    ('retired', '<u8'),    # Set before unlink so attached readers re-attach
+    ('_pad', '<u8', 3)
+])
+PRICE_DTYPE = np.dtype([('symbol', 'S16'), ('price', '<f8'), ('ts', '<f8')])
+PRICE_SLOTS = 512
+
+
+class SeqlockSegment:
+    """
+    Fixed-capacity record array in a named shared-memory block.
+    One writer (the ingestion leader), any number of readers; readers retry
+    while `seq` is odd or changed during their copy, so they never see a torn write.
+    """
+    def __init__(self, name: str, dtype: np.dtype, capacity: int = 0, create: bool = False, epoch: int = 0):
+        self.name = name
+        self.dtype = dtype
+        size = HEADER_DTYPE.itemsize + dtype.itemsize * capacity
+        if create:
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError:
+                # Left behind by a previous leader: retire it and start a fresh one
+                old = shared_memory.SharedMemory(name=name)
+                np.ndarray((1,), dtype=HEADER_DTYPE, buffer=old.buf)[0]['retired'] = 1
+                old.close()
+                old.unlink()
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # Readers must not unlink the leader's segments when they exit
+            try:
+                resource_tracker.unregister(self.shm._name, "shared_memory")
+            except Exception:
+                pass
+        self.header = np.ndarray((1,), dtype=HEADER_DTYPE, buffer=self.shm.buf)
+        self.capacity = (self.shm.size - HEADER_DTYPE.itemsize) // dtype.itemsize
+        self.data = np.ndarray((self.capacity,), dtype=dtype, buffer=self.shm.buf, offset=HEADER_DTYPE.itemsize)
+        if create:
+            self.header[0] = (0, 0, 0, epoch, 0, (0, 0, 0))
+
+    @property
+    def seq(self) -> int:
+        return int(self.header[0]['seq'])
+
+    @property
+    def retired(self) -> bool:
+        return bool(self.header[0]['retired'])
+
+    @property
+    def epoch(self) -> int:
+        return int(self.header[0]['epoch'])
+
+    def write(self, records: np.ndarray):
+        n = min(len(records), self.capacity)
+        h = self.header[0]
+        h['seq'] += 1
+        self.data[:n] = records[-n:] if n else records[:0]
+        h['count'] = n
+        h['updated_ms'] = int(time.time() * 1000)
+        h['seq'] += 1
+
+    def read(self, retries: int = 100) -> Optional[Tuple[np.ndarray, int]]:
+        for _ in range(retries):
+            before = self.seq
+            if before & 1:
+                time.sleep(0)
+                continue
+            n = min(int(self.header[0]['count']), self.capacity)
+            records = self.data[:n].copy()
+            if self.seq == before:
+                return records, before
+        return None
+
+    def close(self, unlink: bool = False):
+        if unlink and self.header is not None:
+            self.header[0]['retired'] = 1
+        self.header = self.data = None
+        try:
+            self.shm.close()
+        except Exception:
+            pass
+        if unlink:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class SharedMarketData:
+    """
+    Cross-process market data: one ingestion leader, many read-only readers.
+
+    The process holding the `ingest.lock` file lock is the leader: it fetches
+    from the exchange and publishes every cached series (and live prices) into
+    named shared-memory segments. API workers and bots attach read-only and
+    never call the exchange. Readers ask the leader to start tracking a key by
+    dropping a marker file into `shared_requests/`.
+    """
+    READER_WAIT = 10.0   # Seconds a reader waits for the leader to publish a requested key
+
+    def __init__(self, data_dir: str, prefix: Optional[str] = None):
+        self.prefix = prefix or os.getenv("SHARED_MARKET_PREFIX", "pmbar")
+        self.LOCK_FILE = os.path.join(data_dir, "ingest.lock")
+        self.REQUEST_DIR = os.path.join(data_dir, "shared_requests")
+        self.is_leader = False
+        self.epoch = 0
+        self._lock_fd = None
+        # Leader side
+        self._writers: Dict[str, SeqlockSegment] = {}
+        self._price_slots: Dict[str, int] = {}
+        self._prices: Optional[SeqlockSegment] = None
+        # Reader side: { key: (segment, last seen seq, frame) }
+        self._readers: Dict[str, tuple] = {}
+        self._price_reader: Optional[SeqlockSegment] = None
+        self._leader_epoch_cache = (0.0, 0)
+        self.stats = {"published": 0, "reads": 0, "reattached": 0, "requests": 0}
+
+    def _segment_name(self, key: str) -> str:
+        return f"{self.prefix}_" + re.sub(r'[^A-Za-z0-9_]', '_', key)
+
+    # --- Leadership ---
+
+    def try_acquire_leadership(self) -> bool:
+        """
+        Non-blocking: becomes the ingestion leader if nobody else is.
+        """
+        if self.is_leader:
+            return True
+        if fcntl is None:
+            self.is_leader = True
+            return True
+        fd = os.open(self.LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        self.epoch = time.time_ns()
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()} {self.epoch}".encode())
+        self.is_leader = True
+        logger.info(f"Became market-data ingestion leader (pid {os.getpid()})")
+        return True
+
+    def leader_alive(self) -> bool:
+        if self.is_leader:
+            return True
+        if fcntl is None or not os.path.exists(self.LOCK_FILE):
+            return False
+        fd = os.open(self.LOCK_FILE, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            return False
+        except OSError:
+            return True
+        finally:
+            os.close(fd)
+
+    async def elect(self) -> bool:
+        return self.try_acquire_leadership()
+
+    async def run(self):
+        """
+        Nothing to pump: segments are written in place.
+        """
+        return
+
+    # Same host: readers count streaks from the same SQLite file and candles,
+    # and compute their own snapshots, so these travel only between replicas.
+    def publish_history(self, key: str, entry: dict):
+        pass
+
+    def read_histories(self) -> Dict[str, dict]:
+        return {}
+
+    def publish_snapshot(self, key: str, stats: dict):
+        pass
+
+    def read_snapshots(self) -> Dict[str, dict]:
+        return {}
+
+    def _leader_epoch(self) -> int:
+        """
+        Epoch of the current leader (from the lock file), re-read at most once a second.
+        """
+        checked_at, epoch = self._leader_epoch_cache
+        if time.time() - checked_at < 1.0:
+            return epoch
+        try:
+            with open(self.LOCK_FILE, 'r') as f:
+                epoch = int(f.read().split()[1])
+        except Exception:
+            epoch = 0
+        self._leader_epoch_cache = (time.time(), epoch)
+        return epoch
+
+    # --- Leader: publish ---
+
+    def publish_series(self, key: str, df: pd.DataFrame):
+        if not self.is_leader or df is None or df.empty:
+            return
+        try:
+            records = frame_to_records(df)
+            segment = self._writers.get(key)
+            if segment is None or segment.capacity < len(records):
+                if segment is not None:
+                    segment.close(unlink=True)
+                # Headroom so a growing series doesn't reallocate every candle
+                capacity = max(len(records) + 256, 1024)
+                segment = SeqlockSegment(self._segment_name(key), RECORD_DTYPE, capacity, create=True, epoch=self.epoch)
+                self._writers[key] = segment
+            segment.write(records)
+            self.stats["published"] += 1
+        except Exception as e:
+            logger.error(f"Failed to publish {key} to shared memory: {e}")
+
+    def publish_price(self, symbol: str, price: float, ts: float):
+        if not self.is_leader:
+            return
+        try:
+            if self._prices is None:
+                self._prices = SeqlockSegment(self._segment_name("prices"), PRICE_DTYPE, PRICE_SLOTS, create=True, epoch=self.epoch)
+            if symbol not in self._price_slots:
+                if len(self._price_slots) >= PRICE_SLOTS:
+                    return
+                self._price_slots[symbol] = len(self._price_slots)
+            records = self._prices.data[:len(self._price_slots)].copy()
+            records[self._price_slots[symbol]] = (symbol.encode()[:16], price, ts)
+            self._prices.write(records)
+        except Exception as e:
+            logger.error(f"Failed to publish price for {symbol}: {e}")
+
+    def pending_requests(self) -> List[str]:
+        """
+        Keys readers asked for since the last call (leader only).
+        """
+        if not os.path.isdir(self.REQUEST_DIR):
+            return []
+        keys = []
+        for name in os.listdir(self.REQUEST_DIR):
+            keys.append(name)
+            try:
+                os.remove(os.path.join(self.REQUEST_DIR, name))
+            except OSError:
+                pass
+        return keys
+
+    # --- Readers ---
+
+    def _attach(self, key: str) -> Optional[SeqlockSegment]:
+        entry = self._readers.get(key)
+        if entry is not None:
+            segment = entry[0]
+            # Re-attach if the leader replaced the segment or a new leader took over
+            if not segment.retired and segment.epoch == self._leader_epoch():
+                return segment
+            segment.close()
+            self._readers.pop(key, None)
+            self.stats["reattached"] += 1
+        try:
+            segment = SeqlockSegment(self._segment_name(key), RECORD_DTYPE)
+        except FileNotFoundError:
+            return None
+        self._readers[key] = (segment, -1, None)
+        return segment
+
+    def read_series(self, key: str) -> Optional[pd.DataFrame]:
+        """
+        Latest published series for `key` (None if the leader hasn't published it).
+        The frame is only rebuilt when the segment changed since the last read.
+        """
+        segment = self._attach(key)
+        if segment is None:
+            return None
+        _, last_seq, frame = self._readers[key]
+        if segment.seq == last_seq and frame is not None:
+            return frame
+        result = segment.read()
+        if result is None:
+            return frame
+        records, seq = result
+        frame = records_to_frame(records)
+        self._readers[key] = (segment, seq, frame)
+        self.stats["reads"] += 1
+        return frame
+
+    def read_price(self, symbol: str) -> Optional[Tuple[float, float]]:
+        if self._price_reader is not None and (self._price_reader.retired or self._price_reader.epoch != self._leader_epoch()):
+            self._price_reader.close()
+            self._price_reader = None
+        if self._price_reader is None:
+            try:
+                self._price_reader = SeqlockSegment(self._segment_name("prices"), PRICE_DTYPE)
+            except FileNotFoundError:
+                return None
+        result = self._price_reader.read()
+        if result is None:
+            return None
+        records, _ = result
+        hit = records[records['symbol'] == symbol.encode()[:16]]
+        if len(hit) == 0:
+            return None
+        return float(hit[0]['price']), float(hit[0]['ts'])
+
+    def request(self, key: str):
+        """
+        Asks the leader to start ingesting `key`.
+        """
+        try:
+            os.makedirs(self.REQUEST_DIR, exist_ok=True)
+            with open(os.path.join(self.REQUEST_DIR, re.sub(r'[^A-Za-z0-9_]', '_', key)), 'w'):
+                pass
+            self.stats["requests"] += 1
+        except OSError as e:
+            logger.error(f"Failed to request {key} from the ingestion leader: {e}")
+
+    def close(self):
+        for segment, _, _ in self._readers.values():
+            segment.close()
+        self._readers.clear()
+        if self._price_reader is not None:
+            self._price_reader.close()
+        for segment in self._writers.values():
+            segment.close(unlink=True)
+        self._writers.clear()
+        if self._prices is not None:
+            self._prices.close(unlink=True)
+            self._prices = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)  # Releases the lock
+            self._lock_fd = None
+        self.is_leader = False
+
+    def metrics(self) -> dict:
+        return {
+            "role": "leader" if self.is_leader else "reader",
+            "published_keys": len(self._writers),
+            "attached_keys": len(self._readers),
+            **self.stats
+        }
+
+
+class ReplicaMarketData:
+    """
+    Same interface as SharedMarketData, for replicas on different hosts.
+
+    A leader lease in the cache backend (SET NX PX, renewed atomically by its
+    owner only) picks the one replica that ingests. The leader's publishes are buffered
+    and pushed by `run()`; readers' `run()` mirrors series, prices, streak
+    histories and snapshots into local memory, so every read stays a dict
+    lookup and only changed series (by version) cross the network.
+    """
+    READER_WAIT = 10.0   # Seconds a reader waits for the leader to publish a requested key
+    LEASE_MS = 15000
+    SYNC_INTERVAL = 1.0
+
+    def __init__(self, backend: CacheBackend, prefix: Optional[str] = None):
+        self.backend = backend
+        self.prefix = (prefix or os.getenv("SHARED_MARKET_PREFIX", "pmbar")) + ":"
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{time.time_ns()}"
+        self.is_leader = False
+        self._leader_seen = False
+        # Leader side: latest value per key waiting to be pushed
+        self._pending_series: Dict[str, pd.DataFrame] = {}
+        self._pending_prices: Dict[str, tuple] = {}
+        self._pending_history: Dict[str, dict] = {}
+        self._pending_snapshots: Dict[str, dict] = {}
+        self._versions: Dict[str, int] = {}
+        self._incoming_requests: List[str] = []
+        # Reader side mirror: { key: (version, frame) }
+        self.frames: Dict[str, tuple] = {}
+        self.prices: Dict[str, tuple] = {}
+        self.histories: Dict[str, dict] = {}
+        self.snapshots: Dict[str, dict] = {}
+        self._outgoing_requests = set()
+        self.stats = {"published": 0, "reads": 0, "synced_bytes": 0, "requests": 0, "errors": 0}
+
+    def _k(self, name: str) -> str:
+        return self.prefix + name
+
+    # --- Leadership ---
+
+    async def elect(self) -> bool:
+        """
+        Takes (or renews) the leader lease. Returns True while this replica leads.
+        """
+        try:
+            owner = self.owner.encode()
+            # Renewal only extends our own lease (atomic compare-and-pexpire), so a
+            # lease another replica took after ours lapsed is never extended
+            if await self.backend.renew(self._k("leader"), owner, self.LEASE_MS):
+                self.is_leader = True
+            elif await self.backend.set(self._k("leader"), owner, ttl_ms=self.LEASE_MS, nx=True):
+                logger.info(f"Replica {self.owner} became market-data ingestion leader")
+                self.is_leader = True
+            else:
+                self.is_leader = False
+            self._leader_seen = True
+        except Exception as e:
+            logger.error(f"Leader election failed: {e}")
+            self.stats["errors"] += 1
+        return self.is_leader
+
+    def try_acquire_leadership(self) -> bool:
+        # Leadership changes happen in elect()/run(); this only reports it
+        return self.is_leader
+
+    def leader_alive(self) -> bool:
+        return self.is_leader or self._leader_seen
+
+    # --- Leader: publish (buffered, pushed by run) ---
+
+    def publish_series(self, key: str, df: pd.DataFrame):
+        if self.is_leader and df is not None and not df.empty:
+            self._pending_series[key] = df
+
+    def publish_price(self, symbol: str, price: float, ts: float):
+        if self.is_leader:
+            self._pending_prices[symbol] = (price, ts)
+
+    def publish_history(self, key: str, entry: dict):
+        if self.is_leader:
+            self._pending_history[key] = entry
+
+    def publish_snapshot(self, key: str, stats: dict):
+        if self.is_leader:
+            self._pending_snapshots[key] = stats
+
+    def pending_requests(self) -> List[str]:
+        keys, self._incoming_requests = self._incoming_requests, []
+        return keys
+
+    async def _push(self):
+        series, self._pending_series = self._pending_series, {}
+        prices, self._pending_prices = self._pending_prices, {}
+        history, self._pending_history = self._pending_history, {}
+        snapshots, self._pending_snapshots = self._pending_snapshots, {}
+
+        new_keys = False
+        for key, df in series.items():
+            version = self._versions.get(key, int(time.time() * 1000)) + 1
+            new_keys |= key not in self._versions
+            self._versions[key] = version
+            payload = frame_to_records(df).tobytes()
+            await self.backend.set(self._k(f"series:{key}"), version.to_bytes(8, 'little') + payload)
+            await self.backend.set(self._k(f"ver:{key}"), str(version).encode())
+            self.stats["published"] += 1
+        if new_keys:
+            await self.backend.set_json(self._k("index"), sorted(self._versions))
+        for symbol, value in prices.items():
+            await self.backend.set_json(self._k(f"price:{symbol}"), value)
+        for key, entry in history.items():
+            await self.backend.set_json(self._k(f"history:{key}"), entry)
+        for key, stats in snapshots.items():
+            await self.backend.set_json(self._k(f"snapshot:{key}"), stats)
+
+        for raw in await self.backend.drain_list(self._k("requests")):
+            self._incoming_requests.append(raw.decode())
+
+    # --- Readers: local mirror ---
+
+    def read_series(self, key: str) -> Optional[pd.DataFrame]:
+        entry = self.frames.get(key)
+        if entry is None:
+            self._outgoing_requests.add(key)
+            return None
+        return entry[1]
+
+    def read_price(self, symbol: str) -> Optional[Tuple[float, float]]:
+        return self.prices.get(symbol)
+
+    def read_histories(self) -> Dict[str, dict]:
+        histories, self.histories = self.histories, {}
+        return histories
+
+    def read_snapshots(self) -> Dict[str, dict]:
+        return self.snapshots
+
+    def request(self, key: str):
+        self._outgoing_requests.add(key)
+        self.stats["requests"] += 1
+
+    async def _pull(self):
+        if self._outgoing_requests:
+            await self.backend.rpush(self._k("requests"), *[k.encode() for k in sorted(self._outgoing_requests)])
+            self._outgoing_requests.clear()
+
+        keys = await self.backend.get_json(self._k("index")) or []
+        if not keys:
+            return
+        versions = await self.backend.mget([self._k(f"ver:{key}") for key in keys])
+        changed = [key for key, ver in zip(keys, versions)
+                   if ver is not None and self.frames.get(key, (None,))[0] != int(ver)]
+        for key in changed:
+            raw = await self.backend.get(self._k(f"series:{key}"))
+            if raw is None:
+                continue
+            version = int.from_bytes(raw[:8], 'little')
+            records = np.frombuffer(raw[8:], dtype=RECORD_DTYPE)
+            self.frames[key] = (version, records_to_frame(records))
+            self.stats["synced_bytes"] += len(raw)
+            self.stats["reads"] += 1
+
+        # Prices, streak histories and snapshots are small: one MGET each
+        symbols = sorted({key.rpartition('_')[0] for key in keys})
+        for symbol, raw in zip(symbols, await self.backend.mget([self._k(f"price:{s}") for s in symbols])):
+            if raw is not None:
+                price, ts = json.loads(raw)
+                self.prices[symbol] = (float(price), float(ts))
+        for key, raw in zip(keys, await self.backend.mget([self._k(f"history:{k}") for k in keys])):
+            if raw is not None:
+                self.histories[key] = json.loads(raw)
+        for key, raw in zip(keys, await self.backend.mget([self._k(f"snapshot:{k}") for k in keys])):
+            if raw is not None:
+                self.snapshots[key] = json.loads(raw)
+
+    async def run(self):
+        """
+        Leader: renews the lease and pushes buffered publishes.
+        Reader: mirrors the leader's data (and takes the lease when it lapses).
+        """
+        while True:
+            try:
+                was_leader = self.is_leader
+                await self.elect()
+                if was_leader and not self.is_leader:
+                    # main.leadership_watch stops this process's ingestion tasks
+                    logger.critical("Lost the market-data leader lease; publishing stopped.")
+                    self._pending_series.clear()
+                    self._pending_prices.clear()
+                    self._pending_history.clear()
+                    self._pending_snapshots.clear()
+                if self.is_leader:
+                    await self._push()
+                else:
+                    await self._pull()
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Replica market-data sync failed: {e}")
+            await asyncio.sleep(self.SYNC_INTERVAL)
+
+    def close(self):
+        # The lease simply expires (LEASE_MS); a new leader takes over after that
+        self.is_leader = False
+
+    def metrics(self) -> dict:
+        return {
+            "role": "leader" if self.is_leader else "reader",
+            "owner": self.owner,
+            "published_keys": len(self._versions),
+            "mirrored_keys": len(self.frames),
+            **self.stats
+        }
+
+
+def create_shared_market(data_dir: str):
+    """
+    CACHE_BACKEND_URL set: share across replicas through the cache backend.
+    Otherwise: share between processes on this host through shared memory.
+    """
+    if os.getenv("CACHE_BACKEND_URL"):
+        return ReplicaMarketData(create_cache_backend())
+    return SharedMarketData(data_dir)
@@ -0,0 +1,332 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional
+
+from .timeframes import realigned_timeframes, BIN_VERSION
+
+logger = logging.getLogger(__name__)
+
+COLORS = ('green', 'red')
+
+
+class StreakHistoryStore:
+    """
+    Persistent all-time streak distribution (per symbol_timeframe key).
+
+    Backed by SQLite in WAL mode:
+    - `streak_events` is an append-only log of completed streaks (cheap sequential inserts).
+    - `streak_counts` is the compacted snapshot; `compact()` folds the log into it.
+    - `streak_meta` tracks the last processed streak end per key.
+
+    The aggregated counts live in memory, and the formatted distribution per
+    (key, color) is cached until new streaks for that key/color arrive.
+    """
+    COMPACT_EVERY = 1000  # Fold the event log after this many appended events
+
+    def __init__(self, db_path: str, legacy_json: Optional[str] = None):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS streak_events (
+                key TEXT NOT NULL, color TEXT NOT NULL, length INTEGER NOT NULL, end_ts INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS streak_counts (
+                key TEXT NOT NULL, color TEXT NOT NULL, length INTEGER NOT NULL,
+                count INTEGER NOT NULL, last_ts INTEGER NOT NULL,
+                PRIMARY KEY (key, color, length)
+            );
+            CREATE TABLE IF NOT EXISTS streak_meta (
+                key TEXT PRIMARY KEY, last_processed_ts INTEGER NOT NULL
+            );
+        """)
+        self._migrate_bins()
+
+        # { key: {"last_processed_ts": int, "green": {"counts": {len: n}, "last_happened": {len: ms}}, "red": {...}} }
+        self.history: Dict[str, dict] = {}
+        # { (key, color): {len: {"count": n, "last_happened": "dd.mm.YYYY"}} }
+        self._formatted: Dict[tuple, dict] = {}
+        self.pending_events = 0
+        # Rows not yet written to the event log (see flush)
+        self._pending_rows: list = []
+        self._pending_meta: Dict[str, int] = {}
+        self._pending_lock = threading.Lock()
+        # Optional debounced background writer (see attach_persistence)
+        self.persistence = None
+        # Readers of shared market data count streaks in memory but never write
+        self.read_only = False
+
+        self._load()
+        if legacy_json and not self.history:
+            self._import_legacy_json(legacy_json)
+
+    def _migrate_bins(self):
+        """
+        Drops the streaks of timeframes whose bins moved since the database
+        was written (bin version in PRAGMA user_version); their keys are
+        re-ingested from the full history.
+        """
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0] or 1
+        if version >= BIN_VERSION:
+            return
+        stale = sorted(realigned_timeframes(version))
+        with self._lock:
+            self.conn.execute("BEGIN")
+            for tf in stale:
+                for table in ("streak_events", "streak_counts", "streak_meta"):
+                    self.conn.execute(f"DELETE FROM {table} WHERE key LIKE ? ESCAPE '\\'", (f"%\\_{tf}",))
+            self.conn.execute(f"PRAGMA user_version = {BIN_VERSION}")
+            self.conn.execute("COMMIT")
+        logger.info(f"Streak history bins v{version} < v{BIN_VERSION}: dropped {stale}")
+
+    def _empty_entry(self) -> dict:
+        return {"last_processed_ts": 0, "green": {"counts": {}, "last_happened": {}}, "red": {"counts": {}, "last_happened": {}}}
+
+    def _entry(self, key: str) -> dict:
+        if key not in self.history:
+            self.history[key] = self._empty_entry()
+        return self.history[key]
+
+    def _load(self):
+        rows = self.conn.execute("""
+            SELECT key, color, length, SUM(count), MAX(last_ts) FROM (
+                SELECT key, color, length, count, last_ts FROM streak_counts
+                UNION ALL
+                SELECT key, color, length, 1, end_ts FROM streak_events
+            ) GROUP BY key, color, length
+        """).fetchall()
+        for key, color, length, count, last_ts in rows:
+            if color not in COLORS:
+                continue
+            sub_hist = self._entry(key)[color]
+            sub_hist["counts"][int(length)] = int(count)
+            sub_hist["last_happened"][int(length)] = int(last_ts)
+
+        for key, last_processed_ts in self.conn.execute("SELECT key, last_processed_ts FROM streak_meta"):
+            self._entry(key)["last_processed_ts"] = int(last_processed_ts)
+
+        self.pending_events = self.conn.execute("SELECT COUNT(*) FROM streak_events").fetchone()[0]
+
+    def _import_legacy_json(self, path: str):
+        """
+        One-off import of the old whole-file `streak_history.json`.
+        """
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r') as f:
+                legacy = json.load(f)
+            with self._lock:
+                self.conn.execute("BEGIN")
+                for key, hist in legacy.items():
+                    if key.rpartition('_')[2] in realigned_timeframes(1):
+                        # Counted from the old 4h/1d bins: re-ingested instead
+                        continue
+                    entry = self._entry(key)
+                    entry["last_processed_ts"] = int(hist.get("last_processed_ts", 0))
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO streak_meta (key, last_processed_ts) VALUES (?, ?)",
+                        (key, entry["last_processed_ts"]))
+                    for color in COLORS:
+                        sub = hist.get(color, {})
+                        for length_str, count in sub.get("counts", {}).items():
+                            last_ts = int(sub.get("last_happened", {}).get(length_str, 0))
+                            entry[color]["counts"][int(length_str)] = int(count)
+                            entry[color]["last_happened"][int(length_str)] = last_ts
+                            self.conn.execute(
+                                "INSERT OR REPLACE INTO streak_counts (key, color, length, count, last_ts) VALUES (?, ?, ?, ?, ?)",
+                                (key, color, int(length_str), int(count), last_ts))
+                self.conn.execute("COMMIT")
+            os.replace(path, path + ".migrated")
+            logger.info(f"Imported legacy streak history from {path}")
+        except Exception as e:
+            logger.error(f"Failed to import legacy streak history: {e}")
+
+    def ingest(self, key: str, colors: np.ndarray, lengths: np.ndarray, end_ts_ms: np.ndarray) -> int:
+        """
+        Vectorized ingestion of completed streaks. Only streaks ending after the
+        key's last processed timestamp are counted. Returns number of new streaks.
+        """
+        entry = self._entry(key)
+        colors = np.asarray(colors)
+        lengths = np.asarray(lengths, dtype='int64')
+        end_ts_ms = np.asarray(end_ts_ms, dtype='int64')
+
+        mask = (end_ts_ms > entry["last_processed_ts"]) & np.isin(colors, COLORS)
+        if not mask.any():
+            return 0
+
+        new = pd.DataFrame({'color': colors[mask], 'length': lengths[mask], 'end_ts': end_ts_ms[mask]})
+        grouped = new.groupby(['color', 'length'])['end_ts'].agg(['count', 'max'])
+
+        for (color, length), count, last_ts in zip(grouped.index, grouped['count'], grouped['max']):
+            sub_hist = entry[color]
+            length = int(length)
+            sub_hist["counts"][length] = sub_hist["counts"].get(length, 0) + int(count)
+            sub_hist["last_happened"][length] = max(sub_hist["last_happened"].get(length, 0), int(last_ts))
+            self._formatted.pop((key, color), None)
+
+        entry["last_processed_ts"] = max(entry["last_processed_ts"], int(new['end_ts'].max()))
+
+        self._append_events(key, new, entry["last_processed_ts"])
+        return len(new)
+
+    def attach_persistence(self, persistence):
+        """
+        Moves event-log writes off the request path onto the shared background writer.
+        """
+        self.persistence = persistence
+        persistence.register("streak_history", self.flush)
+
+    def _append_events(self, key: str, new: pd.DataFrame, last_processed_ts: int):
+        if self.read_only:
+            return
+        rows = list(zip([key] * len(new), new['color'].tolist(), new['length'].tolist(), new['end_ts'].tolist()))
+        with self._pending_lock:
+            self._pending_rows.extend(rows)
+            self._pending_meta[key] = last_processed_ts
+
+        if self.persistence is not None:
+            self.persistence.mark_dirty("streak_history")
+        else:
+            try:
+                self.flush()
+            except Exception:
+                pass # Already logged, rows stay queued for the next flush
+
+    def flush(self) -> int:
+        """
+        Writes queued streak events (one transaction) and compacts when the log is long.
+        Returns approximate bytes written.
+        """
+        with self._pending_lock:
+            rows, self._pending_rows = self._pending_rows, []
+            meta, self._pending_meta = self._pending_meta, {}
+        if not rows and not meta:
+            return 0
+
+        try:
+            with self._lock:
+                self.conn.execute("BEGIN")
+                self.conn.executemany("INSERT INTO streak_events (key, color, length, end_ts) VALUES (?, ?, ?, ?)", rows)
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO streak_meta (key, last_processed_ts) VALUES (?, ?)",
+                    list(meta.items()))
+                self.conn.execute("COMMIT")
+            self.pending_events += len(rows)
+        except Exception as e:
+            logger.error(f"Failed to append streak events: {e}")
+            try:
+                self.conn.execute("ROLLBACK")
+            except Exception:
+                pass
+            # Put them back so the next flush retries
+            with self._pending_lock:
+                self._pending_rows = rows + self._pending_rows
+                for key, ts in meta.items():
+                    self._pending_meta.setdefault(key, ts)
+            raise
+
+        if self.pending_events >= self.COMPACT_EVERY:
+            self.compact()
+
+        return sum(len(key) + len(color) + 16 for key, color, _, _ in rows) + sum(len(key) + 8 for key in meta)
+
+    def compact(self):
+        """
+        Folds the append-only event log into the counts snapshot.
+        """
+        try:
+            with self._lock:
+                self.conn.execute("BEGIN")
+                self.conn.execute("""
+                    INSERT INTO streak_counts (key, color, length, count, last_ts)
+                    SELECT key, color, length, COUNT(*), MAX(end_ts) FROM streak_events
+                    WHERE true GROUP BY key, color, length
+                    ON CONFLICT (key, color, length) DO UPDATE SET
+                        count = count + excluded.count,
+                        last_ts = MAX(last_ts, excluded.last_ts)
+                """)
+                self.conn.execute("DELETE FROM streak_events")
+                self.conn.execute("COMMIT")
+            self.pending_events = 0
+        except Exception as e:
+            logger.error(f"Streak log compaction failed: {e}")
+
+    def distribution(self, key: str, color: str) -> dict:
+        """
+        Formatted distribution for one color, sorted by streak length. Cached until it changes.
+        """
+        if color not in COLORS:
+            return {}
+        cached = self._formatted.get((key, color))
+        if cached is not None:
+            return cached
+
+        sub_hist = self._entry(key)[color]
+        lengths = sorted(sub_hist["counts"].keys())
+        last_ts = [sub_hist["last_happened"].get(length, 0) for length in lengths]
+        dates = pd.to_datetime(last_ts, unit='ms').strftime("%d.%m.%Y") if lengths else []
+        dist_out = {
+            length: {"count": sub_hist["counts"][length], "last_happened": date_str}
+            for length, date_str in zip(lengths, dates)
+        }
+        self._formatted[(key, color)] = dist_out
+        return dist_out
+
+    def import_entry(self, key: str, entry: dict):
+        """
+        Replaces a key's in-memory history with one mirrored from the ingestion leader.
+        """
+        self.history[key] = {
+            "last_processed_ts": int(entry.get("last_processed_ts", 0)),
+            **{color: {
+                "counts": {int(k): int(v) for k, v in entry.get(color, {}).get("counts", {}).items()},
+                "last_happened": {int(k): int(v) for k, v in entry.get(color, {}).get("last_happened", {}).items()}
+            } for color in COLORS}
+        }
+        for color in COLORS:
+            self._formatted.pop((key, color), None)
+
+    def set_read_only(self, read_only: bool):
+        """
+        Switching to writable reloads from disk, so streaks seen while
+        read-only are re-counted (and persisted) by the next ingest.
+        """
+        if self.read_only and not read_only:
+            self.history.clear()
+            self._formatted.clear()
+            self._load()
+        self.read_only = read_only
+
+    def clear(self):
+        with self._pending_lock:
+            self._pending_rows = []
+            self._pending_meta = {}
+        with self._lock:
+            self.conn.execute("BEGIN")
+            self.conn.execute("DELETE FROM streak_events")
+            self.conn.execute("DELETE FROM streak_counts")
+            self.conn.execute("DELETE FROM streak_meta")
+            self.conn.execute("COMMIT")
+        self.history.clear()
+        self._formatted.clear()
+        self.pending_events = 0
+
+    def close(self):
+        if self.read_only:
+            self.conn.close()
+            return
+        try:
+            self.flush()
+            self.compact()
+            self.conn.close()
+        except Exception as e:
+            logger.error(f"Failed to close streak store: {e}")
@@ -0,0 +1,214 @@
+import os
+import json
+import logging
+import threading
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+from .persistence import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+# Wildcard for "all symbols" / "all timeframes"
+ANY = "*"
+
+
+class SubscriptionRegistry:
+    """
+    Alert subscribers, each with their own symbols, timeframes and threshold.
+
+    Subscribers are indexed by (symbol, timeframe) -> thresholds kept sorted,
+    so the chats to notify for a streak of length L are a bisect away:
+    everything left of `bisect_right(thresholds, L)`. Wildcard subscriptions
+    live under ("*", tf) / (symbol, "*") / ("*", "*") buckets, so a lookup
+    touches at most 4 buckets whatever the number of subscribers.
+    """
+    def __init__(self, path: Optional[str] = None):
+        self.DATA_DIR = "/data" if os.path.exists("/data") else "."
+        self.FILE = path or os.path.join(self.DATA_DIR, "subscriptions.json")
+        # { chat_id: {"chat_id", "symbols": [...], "timeframes": [...], "threshold": int} }
+        self.subscribers: Dict[str, dict] = {}
+        # { (symbol, tf): ([thresholds ascending], [chat_ids in the same order]) }
+        self.index: Dict[Tuple[str, str], Tuple[List[int], List[str]]] = {}
+        self.persistence = None
+        self._lock = threading.Lock()
+        # mtime of the file as last loaded/written (other workers may edit it)
+        self._mtime = None
+        # (chat_id, threshold) of the env default subscriber
+        self._default = None
+        # Local changes waiting for the debounced writer (don't reload over them)
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.FILE):
+            return
+        try:
+            self._mtime = os.path.getmtime(self.FILE)
+            with open(self.FILE, 'r') as f:
+                data = json.load(f)
+            for sub in data.get("subscribers", []):
+                self._put(sub["chat_id"], sub.get("symbols"), sub.get("timeframes"), sub.get("threshold", 5))
+            logger.info(f"Loaded {len(self.subscribers)} alert subscribers")
+        except Exception as e:
+            logger.error(f"Failed to load subscriptions: {e}")
+
+    def attach_persistence(self, persistence):
+        self.persistence = persistence
+        persistence.register("subscriptions", self.flush)
+
+    def flush(self) -> int:
+        with self._lock:
+            data = {"subscribers": list(self.subscribers.values())}
+            self._dirty = False
+        written = atomic_write_json(self.FILE, data)
+        self._mtime = os.path.getmtime(self.FILE)
+        return written
+
+    def reload_if_changed(self):
+        """
+        Picks up subscriptions saved by another process (e.g. another API worker).
+        """
+        try:
+            mtime = os.path.getmtime(self.FILE)
+        except OSError:
+            return
+        if mtime != self._mtime and not self._dirty:
+            with self._lock:
+                self.subscribers.clear()
+                self.index.clear()
+            self.load()
+            if self._default is not None:
+                self.ensure_default(*self._default)
+
+    def _save(self):
+        if self.persistence is not None:
+            self._dirty = True
+            self.persistence.mark_dirty("subscriptions")
+        else:
+            self.flush()
+
+    @staticmethod
+    def _normalize(values: Optional[Iterable[str]], upper: bool) -> List[str]:
+        values = [v.strip() for v in (values or []) if v and v.strip()]
+        if not values or ANY in values:
+            return [ANY]
+        return sorted({v.upper() if upper else v for v in values})
+
+    def _put(self, chat_id, symbols, timeframes, threshold) -> dict:
+        chat_id = str(chat_id)
+        self._unindex(chat_id)
+        sub = {
+            "chat_id": chat_id,
+            "symbols": self._normalize(symbols, upper=True),
+            "timeframes": self._normalize(timeframes, upper=False),
+            "threshold": max(1, int(threshold))
+        }
+        self.subscribers[chat_id] = sub
+        for symbol in sub["symbols"]:
+            for tf in sub["timeframes"]:
+                thresholds, chats = self.index.setdefault((symbol, tf), ([], []))
+                # Keep both lists aligned: insert chat at the threshold's sorted position
+                pos = bisect_right(thresholds, sub["threshold"])
+                thresholds.insert(pos, sub["threshold"])
+                chats.insert(pos, chat_id)
+        return sub
+
+    def _unindex(self, chat_id: str):
+        sub = self.subscribers.pop(chat_id, None)
+        if sub is None:
+            return
+        for symbol in sub["symbols"]:
+            for tf in sub["timeframes"]:
+                bucket = self.index.get((symbol, tf))
+                if bucket is None:
+                    continue
+                thresholds, chats = bucket
+                # Only the run of equal thresholds can hold this chat
+                lo = bisect_right(thresholds, sub["threshold"] - 1)
+                hi = bisect_right(thresholds, sub["threshold"])
+                for i in range(lo, hi):
+                    if chats[i] == chat_id:
+                        del thresholds[i]
+                        del chats[i]
+                        break
+                if not thresholds:
+                    del self.index[(symbol, tf)]
+
+    def subscribe(self, chat_id, symbols: Optional[List[str]] = None,
+                  timeframes: Optional[List[str]] = None, threshold: int = 5) -> dict:
+        """
+        Adds or replaces the subscription of `chat_id`. Empty symbols/timeframes mean all.
+        """
+        with self._lock:
+            sub = self._put(chat_id, symbols, timeframes, threshold)
+        self._save()
+        return sub
+
+    def unsubscribe(self, chat_id) -> bool:
+        with self._lock:
+            existed = str(chat_id) in self.subscribers
+            self._unindex(str(chat_id))
+        if existed:
+            self._save()
+        return existed
+
+    def get(self, chat_id) -> Optional[dict]:
+        return self.subscribers.get(str(chat_id))
+
+    def all(self) -> List[dict]:
+        return list(self.subscribers.values())
+
+    def ensure_default(self, chat_id, threshold: int = 5):
+        """
+        Keeps the legacy single-chat setup (TELEGRAM_CHAT_ID) working: the env
+        chat subscribes to everything unless it already has a subscription.
+        """
+        if chat_id:
+            self._default = (chat_id, threshold)
+        if chat_id and str(chat_id) not in self.subscribers:
+            with self._lock:
+                self._put(chat_id, None, None, threshold)
+
+    def min_threshold(self, symbol: str, timeframe: str) -> Optional[int]:
+        best = None
+        for key in ((symbol, timeframe), (symbol, ANY), (ANY, timeframe), (ANY, ANY)):
+            bucket = self.index.get(key)
+            if bucket and (best is None or bucket[0][0] < best):
+                best = bucket[0][0]
+        return best
+
+    def match(self, symbol: str, timeframe: str, length: int) -> List[str]:
+        """
+        Chats whose threshold is <= `length` for this symbol/timeframe.
+        """
+        matched: List[str] = []
+        for key in ((symbol, timeframe), (symbol, ANY), (ANY, timeframe), (ANY, ANY)):
+            bucket = self.index.get(key)
+            if bucket:
+                thresholds, chats = bucket
+                matched.extend(chats[:bisect_right(thresholds, length)])
+        return matched
+
+    def route(self, alerts: List[dict]) -> Dict[str, List[dict]]:
+        """
+        Groups a batch of alerts ({"symbol", "timeframe", "length", ...}) by chat,
+        so each chat gets a single (digest) message per batch.
+        """
+        by_chat: Dict[str, List[dict]] = {}
+        for alert in alerts:
+            for chat_id in self.match(alert["symbol"], alert["timeframe"], alert["length"]):
+                by_chat.setdefault(chat_id, []).append(alert)
+        return by_chat
+
+    def clear(self):
+        with self._lock:
+            self.subscribers.clear()
+            self.index.clear()
+        self._save()
+
+    def metrics(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "index_buckets": len(self.index),
+            "index_entries": sum(len(t) for t, _ in self.index.values())
+        }
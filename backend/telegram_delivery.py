@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import os
+import time
+import httpx
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Telegram rejects messages longer than this
+MAX_MESSAGE_LENGTH = 4096
+
+# _send outcomes
+SENT, REJECTED, FAILED = "sent", "rejected", "failed"
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens/second, bursts up to `capacity`.
+    """
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def penalize(self, seconds: float):
+        """
+        Server asked us to back off (429 retry_after): empty the bucket for `seconds`.
+        """
+        self._refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+class TelegramDelivery:
+    """
+    Asynchronous Telegram delivery queue shared by all alert producers.
+
+    - `enqueue()` never blocks the caller (evaluation loops keep running).
+    - Alerts queued within `coalesce_window` for the same chat become one digest message.
+    - Sends are limited per chat and globally with token buckets.
+    - Failures are retried with exponential backoff (honouring 429 `retry_after`,
+      which also holds back the global bucket: the flood limit is bot-wide).
+    - A digest Telegram rejects (4xx, e.g. one alert with broken Markdown) is
+      resent alert by alert, and a rejected single alert once more as plain text.
+    - One pooled httpx client is reused for every request.
+    """
+    def __init__(self, token: str, api_base: Optional[str] = None,
+                 per_chat_rate: float = 1.0, global_rate: float = 30.0,
+                 coalesce_window: float = 0.5, max_retries: int = 4,
+                 client: Optional[httpx.AsyncClient] = None):
+        self.token = token
+        # TELEGRAM_API_BASE lets a local stand-in server replace api.telegram.org
+        self.api_base = (api_base or os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")).rstrip('/')
+        self.per_chat_rate = per_chat_rate
+        self.coalesce_window = coalesce_window
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(global_rate)
+        self.chat_buckets: Dict[str, TokenBucket] = {}
+        self.client = client or httpx.AsyncClient(
+            timeout=10.0,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=20)
+        )
+        self._owns_client = client is None
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+        self._batching = False
+        self.stats = {
+            "enqueued": 0,
+            "sent_messages": 0,
+            "coalesced_alerts": 0,
+            "retries": 0,
+            "failed": 0,
+            "rejected": 0,
+            "split_resends": 0,
+            "plain_resends": 0,
+            "rate_limited": 0,
+            "last_latency_ms": None
+        }
+
+    def enqueue(self, chat_id, text: str, parse_mode: Optional[str] = "Markdown"):
+        """
+        Queues a message. Must be called from the event loop; starts the worker lazily.
+        """
+        if not self.token or not chat_id:
+            return
+        self.queue.put_nowait((str(chat_id), text, parse_mode))
+        self.stats["enqueued"] += 1
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def send_now(self, chat_id, text: str, parse_mode: Optional[str] = "Markdown") -> bool:
+        """
+        Direct send (still rate limited and retried) for callers that need the result.
+        """
+        return await self._deliver(str(chat_id), [text], parse_mode)
+
+    def _bucket(self, chat_id: str) -> TokenBucket:
+        if chat_id not in self.chat_buckets:
+            self.chat_buckets[chat_id] = TokenBucket(self.per_chat_rate)
+        return self.chat_buckets[chat_id]
+
+    async def _run(self):
+        while True:
+            first = await self.queue.get()
+            batch = [first]
+            # Collect everything fired in the same tick
+            self._batching = True
+            await asyncio.sleep(self.coalesce_window)
+            while not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            for (chat_id, parse_mode), texts in self._group(batch).items():
+                self.stats["coalesced_alerts"] += len(texts) - 1
+                for parts in self._digests(texts):
+                    # Chats are delivered concurrently; buckets keep each within limits
+                    task = asyncio.create_task(self._deliver(chat_id, parts, parse_mode))
+                    self._inflight.add(task)
+                    task.add_done_callback(self._inflight.discard)
+            self._batching = False
+
+    def _group(self, batch: List[tuple]) -> Dict[Tuple[str, Optional[str]], List[str]]:
+        grouped: Dict[Tuple[str, Optional[str]], List[str]] = {}
+        for chat_id, text, parse_mode in batch:
+            grouped.setdefault((chat_id, parse_mode), []).append(text)
+        return grouped
+
+    def _digests(self, texts: List[str]) -> List[List[str]]:
+        """
+        Groups alerts into as few messages as Telegram's length limit allows
+        (each digest as its list of alerts, joined when sent).
+        """
+        digests, current, size = [], [], 0
+        # A single text over the limit goes out in chunks
+        texts = [text[i:i + MAX_MESSAGE_LENGTH] for text in texts for i in range(0, max(len(text), 1), MAX_MESSAGE_LENGTH)]
+        for text in texts:
+            added = len(text) + (2 if current else 0)
+            if current and size + added > MAX_MESSAGE_LENGTH:
+                digests.append(current)
+                current, size, added = [], 0, len(text)
+            current.append(text)
+            size += added
+        if current:
+            digests.append(current)
+        return digests
+
+    async def _deliver(self, chat_id: str, parts: List[str], parse_mode: Optional[str]) -> bool:
+        """
+        Sends a digest; if Telegram rejects it, falls back to its alerts one
+        by one so a single bad alert doesn't drop the rest.
+        """
+        result = await self._send(chat_id, "\n\n".join(parts), parse_mode)
+        if result == REJECTED:
+            if len(parts) > 1:
+                self.stats["split_resends"] += 1
+                results = [await self._deliver(chat_id, [part], parse_mode) for part in parts]
+                return all(results)
+            if parse_mode:
+                # Usually a formatting error (unbalanced Markdown/HTML): send as plain text
+                self.stats["plain_resends"] += 1
+                result = await self._send(chat_id, parts[0], None)
+        if result != SENT:
+            self.stats["failed"] += 1
+        return result == SENT
+
+    async def _send(self, chat_id: str, text: str, parse_mode: Optional[str]) -> str:
+        url = f"{self.api_base}/bot{self.token}/sendMessage"
+        payload = {"chat_id": chat_id, "text": text}
+        if parse_mode:
+            payload["parse_mode"] = parse_mode
+
+        bucket = self._bucket(chat_id)
+        backoff = 0.5
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            await self.global_bucket.acquire()
+            start = time.perf_counter()
+            try:
+                resp = await self.client.post(url, json=payload)
+                self.stats["last_latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                if resp.status_code == 200:
+                    self.stats["sent_messages"] += 1
+                    return SENT
+                if resp.status_code == 429:
+                    self.stats["rate_limited"] += 1
+                    retry_after = 1.0
+                    try:
+                        retry_after = float(resp.json().get("parameters", {}).get("retry_after", retry_after))
+                    except Exception:
+                        pass
+                    # Flood control applies to the whole bot, not just this chat
+                    bucket.penalize(retry_after)
+                    self.global_bucket.penalize(retry_after)
+                elif 400 <= resp.status_code < 500:
+                    # Bad request / chat not found: retrying as is won't help
+                    logger.error(f"Telegram rejected message for {chat_id}: {resp.text}")
+                    self.stats["rejected"] += 1
+                    return REJECTED
+                else:
+                    logger.warning(f"Telegram error {resp.status_code} for {chat_id}, retrying...")
+                    await asyncio.sleep(backoff)
+            except Exception as e:
+                logger.warning(f"Telegram send error for {chat_id}: {e}")
+                await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+            if attempt < self.max_retries:
+                self.stats["retries"] += 1
+
+        logger.error(f"Telegram delivery to {chat_id} failed after {self.max_retries + 1} attempts")
+        return FAILED
+
+    async def drain(self, timeout: float = 10.0):
+        """
+        Waits until queued and in-flight messages are delivered (or timeout).
+        """
+        deadline = time.monotonic() + timeout
+        while (not self.queue.empty() or self._batching or self._inflight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+    async def close(self):
+        await self.drain()
+        if self._worker is not None:
+            self._worker.cancel()
+        if self._owns_client:
+            await self.client.aclose()
+
+    def metrics(self) -> dict:
+        return {**self.stats, "queued": self.queue.qsize(), "inflight": len(self._inflight)}
@@ -0,0 +1,192 @@
+import time
+import logging
+import pandas as pd
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Timeframes resampled from 1h instead of being fetched (Polymarket ET alignment)
+DERIVED_TIMEFRAMES = ('4h', '1d')
+# Timeframes folded from the base feed in base-feed mode (see CCXTAdapter.BASE_TIMEFRAME)
+BASE_DERIVED_TIMEFRAMES = ('15m', '1h', '4h', '1d')
+# Version of the candle bins; bumped when bins move, so stores counted from
+# older bins (live table, probability cubes, streak history) drop those
+# timeframes and rebuild them. v2: 4h/1d follow the ET wall clock in EDT.
+BIN_VERSION = 2
+_REALIGNED = {1: DERIVED_TIMEFRAMES}
+
+
+def timeframe_ms(tf: str) -> int:
+    if not tf: return 0
+    unit = tf[-1]
+    if not tf[:-1].isdigit(): return 0
+    value = int(tf[:-1])
+    if unit == 'm': return value * 60 * 1000
+    if unit == 'h': return value * 60 * 60 * 1000
+    if unit == 'd': return value * 24 * 60 * 60 * 1000
+    return 0
+
+
+def realigned_timeframes(version: int) -> set:
+    """
+    Timeframes whose bins changed since bin version `version`.
+    """
+    return {tf for v in range(version, BIN_VERSION) for tf in _REALIGNED.get(v, ())}
+
+
+def source_timeframe(tf: str, base: Optional[str] = None) -> str:
+    """
+    Timeframe that is actually fetched for `tf` (4h/1d are derived from 1h,
+    everything in BASE_DERIVED_TIMEFRAMES from `base` in base-feed mode).
+    """
+    if base and tf in BASE_DERIVED_TIMEFRAMES:
+        return base
+    return '1h' if tf in DERIVED_TIMEFRAMES else tf
+
+
+def derived_timeframes(tf: str, base: Optional[str] = None) -> tuple:
+    """
+    Timeframes whose series are computed from the fetched `tf` series.
+    """
+    if base:
+        return BASE_DERIVED_TIMEFRAMES if tf == base else ()
+    return DERIVED_TIMEFRAMES if tf == '1h' else ()
+
+
+def split_key(key: str) -> tuple:
+    """
+    "BTC_1h" -> ("BTC", "1h")
+    """
+    symbol, _, tf = key.rpartition('_')
+    return symbol, tf
+
+
+def next_close_ms(tf: str, now_ms: Optional[int] = None) -> int:
+    """
+    Wall-clock close time (epoch ms) of the candle that is open at `now_ms`.
+    - 1d: Noon to Noon ET
+    - 4h: 0, 4, 8... ET
+    - others: standard UTC alignment
+    Returns 0 for unknown timeframes.
+    """
+    if now_ms is None:
+        now_ms = int(time.time() * 1000)
+    duration_ms = timeframe_ms(tf)
+
+    if tf in DERIVED_TIMEFRAMES:
+        return _et_ms(_wall_close(tf, now_ms))
+
+    if duration_ms <= 0:
+        return 0
+    return (now_ms // duration_ms + 1) * duration_ms
+
+
+def current_open_ms(tf: str, now_ms: Optional[int] = None) -> int:
+    """
+    Expected start (epoch ms) of the candle that is open at `now_ms`.
+    """
+    if tf in DERIVED_TIMEFRAMES:
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        # On a DST switch day the wall-clock candle is an hour shorter/longer
+        return _et_ms(_wall_close(tf, now_ms) - pd.Timedelta(milliseconds=timeframe_ms(tf)))
+    close_ms = next_close_ms(tf, now_ms)
+    return close_ms - timeframe_ms(tf) if close_ms else 0
+
+
+def _wall_close(tf: str, now_ms: int) -> pd.Timestamp:
+    """
+    Naive ET wall time at which the 4h/1d candle open at `now_ms` closes.
+    """
+    now_et = pd.Timestamp(now_ms, unit='ms', tz='UTC').tz_convert('US/Eastern').tz_localize(None)
+    if tf == '1d':
+        target = now_et.normalize() + pd.Timedelta(hours=12)
+        if now_et >= target:
+            target += pd.Timedelta(days=1)
+        return target
+    return now_et.normalize() + pd.Timedelta(hours=(now_et.hour // 4 + 1) * 4)
+
+
+def _et_ms(wall: pd.Timestamp) -> int:
+    """
+    Epoch ms of a naive ET wall time (candle boundaries never fall in the
+    2 AM DST gap or overlap).
+    """
+    return int(wall.tz_localize('US/Eastern').timestamp() * 1000)
+
+
+def resample_ohlcv(df: pd.DataFrame, timeframe: str) -> pd.DataFrame:
+    """
+    Resample 1h data to custom timeframe.
+    Polymarket Daily: 12:00 ET to 12:00 ET (Noon).
+    """
+    if df.empty:
+        return df
+        
+    # Ensure index is datetime
+    if not isinstance(df.index, pd.DatetimeIndex):
+        df.index = pd.to_datetime(df.index, utc=True)
+        
+    # Convert to US/Eastern to handle DST automatically
+    df_et = df.tz_convert('US/Eastern').sort_index()
+
+    if timeframe in DERIVED_TIMEFRAMES:
+        # Bins follow the ET wall clock (next_close_ms): resample on naive
+        # wall time, a tz-aware origin keeps its EST offset and shifts every
+        # bin by an hour during EDT. Bin labels (noon, 0/4/8... ET) are never
+        # skipped or repeated by a DST switch (2 AM).
+        origin = pd.Timestamp("2024-01-01 12:00:00") if timeframe == '1d' else pd.Timestamp("2024-01-01 00:00:00")
+        rule = '24h' if timeframe == '1d' else '4h'
+        frame = df_et.tz_localize(None)
+    else:
+        # Exchange notation ('15m') is not a pandas frequency ('m' means month-end)
+        origin = pd.Timestamp("2024-01-01 00:00:00").tz_localize("US/Eastern")
+        rule = f"{timeframe_ms(timeframe) // 60000}min"
+        frame = df_et
+
+    # Strategy 1: Strict Noon ET (Preferred)
+    try:
+        resampled = frame.resample(rule, origin=origin).agg({
+            'open': 'first',
+            'high': 'max',
+            'low': 'min',
+            'close': 'last',
+            'volume': 'sum'
+        })
+        if resampled.index.tz is None:
+            resampled.index = resampled.index.tz_localize('US/Eastern', ambiguous='NaT', nonexistent='shift_forward')
+        # Check if valid
+        # Allow partial last bin by NOT dropping all NaNs if we have at least some data
+        # But we want to avoid completely empty rows.
+        # partial bins usually have data, just maybe 'volume' missing? No, pandas resample handles it.
+        # The issue is probably that the first bin is partial and getting dropped?
+        # Let's just return resampled if not empty, without strict dropna if it kills everything.
+        if not resampled.empty:
+            # Only drop execution errors (all-NaN rows), keep partials
+            clean = resampled.dropna(how='all')
+            if not clean.empty:
+                return clean
+        
+        logger.warning(f"Strategy 1 (Strict) returned empty for {timeframe}. Trying fallback...")
+    except Exception as e:
+        logger.error(f"Strategy 1 failed for {timeframe}: {e}")
+
+    # Strategy 2: Simple/Standard Resampling (Fallback)
+    # Just use standard daily/4h without custom origin if the above fails
+    try:
+        fallback_rule = '1D' if timeframe == '1d' else '4h'
+        fallback = df_et.resample(fallback_rule).agg({
+            'open': 'first',
+            'high': 'max',
+            'low': 'min',
+            'close': 'last',
+            'volume': 'sum'
+        })
+        clean_fallback = fallback.dropna()
+        if not clean_fallback.empty:
+            logger.info(f"Strategy 2 (Fallback) succeeded for {timeframe}.")
+            return clean_fallback
+    except Exception as e:
+         logger.error(f"Strategy 2 failed for {timeframe}: {e}")
+
+    return pd.DataFrame()
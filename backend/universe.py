@@ -0,0 +1,244 @@
+import json
+import logging
+import os
+import re
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Preferred quotes per exchange (first listed wins); also the naming convention
+# used before the markets are loaded ("BTC" -> "BTC/USDT" on Binance)
+QUOTES = {
+    'binance': ('USDT', 'USDT:USDT', 'USDC'),
+    'coinbase': ('USD', 'USDC'),
+    'coinbaseinternational': ('USDC:USDC',),
+    'hyperliquid': ('USDC:USDC',),
+    'kraken': ('USD', 'USDT'),
+    'okx': ('USDT', 'USDC'),
+    'bybit': ('USDT', 'USDC'),
+}
+FALLBACK_QUOTES = ('USD', 'USDT', 'USDC')
+
+# Polymarket crypto up/down markets: "btc-updown-15m-1733690700" and the
+# natural-language form "bitcoin-up-or-down-december-8-3am-et"
+UPDOWN_SLUG = re.compile(r"^([a-z0-9]+)-updown-")
+NATURAL_SLUG = re.compile(r"^([a-z0-9]+)-up-or-down-")
+POLYMARKET_NAMES = {'bitcoin': 'BTC', 'ethereum': 'ETH', 'solana': 'SOL', 'xrp': 'XRP'}
+
+
+def preferred_markets(symbols: Iterable[str], quotes: Iterable[str]) -> Dict[str, str]:
+    """
+    base -> market symbol among listed `symbols`, the first quote in `quotes` winning.
+    """
+    rank = {q: i for i, q in enumerate(quotes)}
+    best: Dict[str, tuple] = {}
+    for market in symbols:
+        base, _, quote = market.partition('/')
+        r = rank.get(quote)
+        if r is None:
+            continue
+        if base not in best or r < best[base][0]:
+            best[base] = (r, market)
+    return {base: market for base, (_, market) in best.items()}
+
+
+def polymarket_tickers(markets: Iterable[dict]) -> Set[str]:
+    """
+    Symbols with a crypto up/down market in a Gamma /markets (or /events) listing.
+    """
+    tickers = set()
+    for market in markets:
+        slug = (market.get('slug') or market.get('market_slug') or '').lower()
+        match = UPDOWN_SLUG.match(slug)
+        if match:
+            tickers.add(match.group(1).upper())
+            continue
+        match = NATURAL_SLUG.match(slug)
+        if match and match.group(1) in POLYMARKET_NAMES:
+            tickers.add(POLYMARKET_NAMES[match.group(1)])
+    return tickers
+
+
+class SymbolUniverse:
+    """
+    Which symbols exist, how they are named on each exchange, and which ones
+    are ingested.
+
+    - Mapping: base -> market symbol per exchange, built from the exchanges'
+      loaded markets (preferred quotes per QUOTES) instead of a static table.
+      Cached in DATA_DIR/universe.json so a restart maps symbols right away.
+    - Tracked: symbols the scheduler keeps fresh. SYMBOLS (env) seeds it;
+      other symbols are admitted on first request when Polymarket lists an
+      up/down market for them (persisted in the same file).
+    - Shards: tracked symbols are spread over refresh workers by a stable hash,
+      so all timeframes of a symbol land on the same worker.
+    """
+    DEFAULT_SYMBOLS = ('BTC', 'ETH', 'SOL', 'XRP')
+    MAX_TRACKED = 500         # Seeds + admitted symbols
+    POLYMARKET_TTL = 600.0    # Seconds between Polymarket listing refreshes (leader)
+    RELOAD_CHECK = 60.0       # Seconds between checks for a newer universe file
+
+    def __init__(self, data_dir: str, seeds: Optional[List[str]] = None):
+        self.FILE = os.path.join(data_dir, "universe.json")
+        if seeds is None:
+            env = os.getenv("SYMBOLS", "")
+            seeds = [s.strip().upper() for s in env.split(',') if s.strip()] or list(self.DEFAULT_SYMBOLS)
+        self.seeds: List[str] = list(dict.fromkeys(seeds))
+        # { exchange_id: { base: market symbol } }
+        self.markets: Dict[str, Dict[str, str]] = {}
+        self.built_at = 0.0
+        # { symbol: admitted_at }
+        self.admitted: Dict[str, float] = {}
+        self.polymarket: Set[str] = set()
+        self.polymarket_at = 0.0
+        self.read_only = False
+        self._file_mtime = 0.0
+        self._last_reload_check = 0.0
+        self.stats = {"admitted": 0, "refused_polymarket": 0, "refused_full": 0}
+        self.load()
+
+    # --- Persistence ---
+
+    def load(self):
+        try:
+            mtime = os.path.getmtime(self.FILE)
+        except OSError:
+            return
+        try:
+            with open(self.FILE, 'r') as f:
+                data = json.load(f)
+            self.markets = data.get("markets", {})
+            self.built_at = float(data.get("built_at", 0))
+            self.admitted = {s: float(t) for s, t in data.get("admitted", {}).items()}
+            self.polymarket = set(data.get("polymarket", []))
+            self.polymarket_at = float(data.get("polymarket_at", 0))
+            self._file_mtime = mtime
+            logger.info(f"Loaded symbol universe ({len(self.bases())} symbols, {len(self.tracked())} tracked)")
+        except Exception as e:
+            logger.error(f"Failed to load symbol universe: {e}")
+
+    def save(self):
+        if self.read_only:
+            return
+        try:
+            tmp = self.FILE + ".tmp"
+            with open(tmp, 'w') as f:
+                json.dump({
+                    "built_at": self.built_at,
+                    "markets": self.markets,
+                    "admitted": self.admitted,
+                    "polymarket": sorted(self.polymarket),
+                    "polymarket_at": self.polymarket_at
+                }, f)
+            os.replace(tmp, self.FILE)
+            self._file_mtime = os.path.getmtime(self.FILE)
+        except Exception as e:
+            logger.error(f"Failed to save symbol universe: {e}")
+
+    def maybe_reload(self):
+        """
+        Readers pick up the leader's admissions and rebuilt mappings.
+        """
+        now = time.time()
+        if now - self._last_reload_check < self.RELOAD_CHECK:
+            return
+        self._last_reload_check = now
+        try:
+            if os.path.getmtime(self.FILE) > self._file_mtime:
+                self.load()
+        except OSError:
+            pass
+
+    def set_read_only(self, read_only: bool):
+        self.read_only = read_only
+
+    # --- Mapping ---
+
+    def build(self, markets: Dict[str, Iterable[str]]):
+        """
+        Rebuilds the mapping from {exchange_id: listed market symbols}
+        (e.g. AdmissionController.markets after a refresh).
+        """
+        mapping = {exchange_id: preferred_markets(symbols, QUOTES.get(exchange_id, FALLBACK_QUOTES))
+                   for exchange_id, symbols in markets.items()}
+        if not any(mapping.values()):
+            return
+        self.markets = mapping
+        self.built_at = time.time()
+        self.save()
+        logger.info(f"Symbol universe rebuilt: {len(self.bases())} symbols on {len(mapping)} exchanges")
+
+    def map(self, exchange_id: str, symbol: str) -> str:
+        """
+        Exchange market symbol for our symbol ("BTC" -> "BTC/USDT" on Binance).
+        """
+        base = symbol.split('/')[0]
+        mapped = self.markets.get(exchange_id, {}).get(base)
+        if mapped:
+            return mapped
+        # Not listed (or markets not loaded yet): naming convention
+        return f"{base}/{QUOTES.get(exchange_id, FALLBACK_QUOTES)[0]}"
+
+    def bases(self) -> Set[str]:
+        return set().union(*(m.keys() for m in self.markets.values())) if self.markets else set()
+
+    # --- Tracked symbols ---
+
+    def tracked(self) -> List[str]:
+        return self.seeds + sorted(s for s in self.admitted if s not in self.seeds)
+
+    def is_tracked(self, symbol: str) -> bool:
+        return symbol in self.admitted or symbol in self.seeds
+
+    def update_polymarket(self, tickers: Set[str]):
+        self.polymarket = set(tickers)
+        self.polymarket_at = time.time()
+        self.save()
+
+    def polymarket_due(self) -> bool:
+        return time.time() - self.polymarket_at > self.POLYMARKET_TTL
+
+    def admit(self, symbol: str) -> bool:
+        """
+        Starts tracking `symbol` if Polymarket lists an up/down market for it.
+        True if it was newly admitted.
+        """
+        if self.is_tracked(symbol) or self.read_only:
+            return False
+        if symbol.split('/')[0] not in self.polymarket:
+            self.stats["refused_polymarket"] += 1
+            return False
+        if len(self.tracked()) >= self.MAX_TRACKED:
+            self.stats["refused_full"] += 1
+            return False
+        self.admitted[symbol] = time.time()
+        self.stats["admitted"] += 1
+        self.save()
+        logger.info(f"Admitted {symbol} into the symbol universe (Polymarket market listed)")
+        return True
+
+    def remove(self, symbol: str) -> bool:
+        if self.admitted.pop(symbol, None) is None:
+            return False
+        self.save()
+        return True
+
+    # --- Sharding ---
+
+    @staticmethod
+    def shard_of(symbol: str, shards: int) -> int:
+        return zlib.crc32(symbol.encode()) % shards if shards > 1 else 0
+
+    def metrics(self) -> dict:
+        return {
+            "symbols": len(self.bases()),
+            "tracked": len(self.tracked()),
+            "seeds": self.seeds,
+            "admitted": sorted(self.admitted),
+            "polymarket_listed": len(self.polymarket),
+            "mapping_age_s": round(time.time() - self.built_at, 1) if self.built_at else None,
+            "polymarket_age_s": round(time.time() - self.polymarket_at, 1) if self.polymarket_at else None,
+            **self.stats
+        }
@@ -0,0 +1,212 @@
+"""
+Benchmark/check for backend/cache_backend.py and the multi-replica market data
+sharing in backend/shared_market.py (ReplicaMarketData).
+
+Runs a stand-in Redis server (RESP2 subset: PING AUTH SELECT GET SET MGET DEL
+PEXPIRE EVAL (lease renewal) RPUSH LPOP) over asyncio streams, then:
+  1. measures GET/SET/MGET round trips through RedisCacheBackend
+  2. runs a leader and N reader replicas against it, checks readers mirror the
+     leader's series/prices/snapshots, and that a reader takes over after the
+     leader's lease lapses.
+
+Usage: python bench_cache_backend.py [readers]
+"""
+import asyncio
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from backend.cache_backend import RedisCacheBackend
+from backend.shared_market import ReplicaMarketData
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}      # key -> (value, expires_at or None)
+        self.commands = 0
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and time.monotonic() >= entry[1]:
+            del self.data[key]
+            return None
+        return entry[0]
+
+    def execute(self, cmd, args):
+        self.commands += 1
+        if cmd in ("PING", "AUTH", "SELECT"):
+            return "+OK" if cmd != "PING" else "+PONG"
+        if cmd == "GET":
+            value = self._live(args[0])
+            return value if isinstance(value, bytes) else None
+        if cmd == "MGET":
+            return [v if isinstance(v, bytes) else None for v in map(self._live, args)]
+        if cmd == "SET":
+            key, value, rest = args[0], args[1], [a.upper() for a in args[2:]]
+            ttl = None
+            if b"PX" in rest:
+                ttl = int(rest[rest.index(b"PX") + 1]) / 1000
+            if b"NX" in rest and self._live(key) is not None:
+                return None
+            self.data[key] = (value, time.monotonic() + ttl if ttl else None)
+            return "+OK"
+        if cmd == "DEL":
+            return sum(1 for k in args if self.data.pop(k, None) is not None)
+        if cmd == "PEXPIRE":
+            value = self._live(args[0])
+            if value is None:
+                return 0
+            self.data[args[0]] = (value, time.monotonic() + int(args[1]) / 1000)
+            return 1
+        if cmd == "EVAL":
+            # Only the lease renewal script (RENEW_SCRIPT): compare-and-pexpire
+            key, owner, ttl = args[2], args[3], int(args[4])
+            if self._live(key) != owner:
+                return 0
+            return self.execute("PEXPIRE", [key, ttl])
+        if cmd == "RPUSH":
+            items = self._live(args[0])
+            items = items if isinstance(items, list) else []
+            items.extend(args[1:])
+            self.data[args[0]] = (items, None)
+            return len(items)
+        if cmd == "LPOP":
+            items = self._live(args[0])
+            return items.pop(0) if isinstance(items, list) and items else None
+        return Exception(f"ERR unknown command {cmd}")
+
+    @staticmethod
+    def encode(reply) -> bytes:
+        if reply is None:
+            return b"$-1\r\n"
+        if isinstance(reply, Exception):
+            return b"-%s\r\n" % str(reply).encode()
+        if isinstance(reply, str):
+            return reply.encode() + b"\r\n"
+        if isinstance(reply, int):
+            return b":%d\r\n" % reply
+        if isinstance(reply, bytes):
+            return b"$%d\r\n%s\r\n" % (len(reply), reply)
+        return b"*%d\r\n" % len(reply) + b"".join(FakeRedis.encode(r) for r in reply)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                args = []
+                for _ in range(int(line[1:-2])):
+                    length = int((await reader.readline())[1:-2])
+                    args.append((await reader.readexactly(length + 2))[:-2])
+                writer.write(self.encode(self.execute(args[0].decode().upper(), args[1:])))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def make_frame(n: int, start_ms: int = 1_700_000_000_000) -> pd.DataFrame:
+    idx = pd.to_datetime(start_ms + np.arange(n) * 900_000, unit='ms', utc=True)
+    close = 100 + np.cumsum(np.random.default_rng(1).normal(0, 1, n))
+    return pd.DataFrame({"open": close - 0.5, "high": close + 1, "low": close - 1,
+                         "close": close, "volume": np.ones(n)}, index=idx)
+
+
+async def wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        await asyncio.sleep(0.05)
+    return False
+
+
+async def main(n_readers: int):
+    fake = FakeRedis()
+    server = await asyncio.start_server(fake.handle, "127.0.0.1", 0)
+    url = f"redis://:secret@127.0.0.1:{server.sockets[0].getsockname()[1]}/1"
+
+    # 1. Raw backend round trips
+    client = RedisCacheBackend(url)
+    n = 2000
+    start = time.perf_counter()
+    for i in range(n):
+        await client.set(f"k{i}", b"x" * 64, ttl_ms=60000)
+    set_us = (time.perf_counter() - start) / n * 1e6
+    start = time.perf_counter()
+    for i in range(n):
+        await client.get(f"k{i}")
+    get_us = (time.perf_counter() - start) / n * 1e6
+    start = time.perf_counter()
+    values = await client.mget([f"k{i}" for i in range(n)])
+    mget_ms = (time.perf_counter() - start) * 1000
+    assert all(v == b"x" * 64 for v in values)
+    assert await client.set("nx", b"1", nx=True) and not await client.set("nx", b"2", nx=True)
+    print(f"RedisCacheBackend: SET {set_us:.0f}us  GET {get_us:.0f}us  MGET x{n} {mget_ms:.1f}ms")
+
+    # 2. Leader + readers
+    ReplicaMarketData.LEASE_MS = 1500
+    ReplicaMarketData.SYNC_INTERVAL = 0.1
+    leader = ReplicaMarketData(RedisCacheBackend(url), prefix="bench")
+    readers = [ReplicaMarketData(RedisCacheBackend(url), prefix="bench") for _ in range(n_readers)]
+    assert await leader.elect()
+    for r in readers:
+        assert not await r.elect()
+    tasks = [asyncio.create_task(m.run()) for m in [leader] + readers]
+
+    frame = make_frame(5000)
+    keys = [f"{s}/USDT_{tf}" for s in ("BTC", "ETH", "SOL") for tf in ("15m", "1h", "4h", "1d")]
+    start = time.perf_counter()
+    for key in keys:
+        leader.publish_series(key, frame)
+        leader.publish_snapshot(key, {"symbol": key, "streak": 3})
+    leader.publish_price("BTC/USDT", 65000.0, time.time())
+    ok = await wait_for(lambda: all(len(r.frames) == len(keys) and "BTC/USDT" in r.prices for r in readers))
+    sync_ms = (time.perf_counter() - start) * 1000
+    assert ok, "readers did not mirror the leader"
+    got = readers[0].read_series(keys[0])
+    assert len(got) == len(frame) and np.allclose(got['close'].to_numpy(), frame['close'].to_numpy())
+    assert readers[0].read_snapshots()[keys[0]]["streak"] == 3
+    print(f"{n_readers} readers mirrored {len(keys)} x {len(frame)} candles in {sync_ms:.0f}ms "
+          f"({readers[0].stats['synced_bytes'] / 1e6:.1f} MB each)")
+
+    # Unchanged series are not re-transferred; an appended candle is
+    before = readers[0].stats["synced_bytes"]
+    await asyncio.sleep(0.5)
+    assert readers[0].stats["synced_bytes"] == before
+    leader.publish_series(keys[0], make_frame(5001))
+    assert await wait_for(lambda: len(readers[0].read_series(keys[0])) == 5001)
+    print(f"Idle sync transferred 0 bytes; one appended series re-synced "
+          f"{(readers[0].stats['synced_bytes'] - before) / 1e3:.0f} KB")
+
+    # Readers ask the leader for keys it doesn't publish yet
+    readers[0].read_series("DOGE/USDT_1h")
+    assert await wait_for(lambda: "DOGE/USDT_1h" in leader.pending_requests(), timeout=3)
+    print("Reader request for an unknown key reached the leader")
+
+    # Leader stops renewing -> a reader takes over after the lease lapses
+    tasks[0].cancel()
+    start = time.perf_counter()
+    assert await wait_for(lambda: sum(r.is_leader for r in readers) == 1, timeout=5)
+    print(f"Failover: new leader after {(time.perf_counter() - start) * 1000:.0f}ms "
+          f"(lease {ReplicaMarketData.LEASE_MS}ms); {fake.commands} commands served")
+
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    for m in [leader] + readers:
+        await m.backend.close()
+    await client.close()
+    await asyncio.sleep(0.1)   # let the server see the disconnects
+    server.close()
+    await server.wait_closed()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 3))
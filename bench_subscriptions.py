@@ -0,0 +1,74 @@
+"""
+Benchmark for backend/subscriptions.py: indexed (bisect) subscriber lookup vs
+a scan over every subscriber, plus batched per-chat routing.
+
+Usage: python bench_subscriptions.py [subscribers]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from backend.subscriptions import SubscriptionRegistry, ANY
+
+SYMBOLS = ["BTC", "ETH", "SOL", "XRP", "DOGE", "BNB", "ADA", "AVAX"]
+TIMEFRAMES = ["15m", "1h", "4h", "1d"]
+
+
+def scan(subscribers, symbol, timeframe, length):
+    return [
+        s["chat_id"] for s in subscribers
+        if (s["symbols"] == [ANY] or symbol in s["symbols"])
+        and (s["timeframes"] == [ANY] or timeframe in s["timeframes"])
+        and s["threshold"] <= length
+    ]
+
+
+def main(n: int):
+    rng = random.Random(42)
+    path = os.path.join(tempfile.mkdtemp(), "subscriptions.json")
+    registry = SubscriptionRegistry(path)
+    # Persist once at the end, not per subscribe
+    registry.persistence = type("NoPersist", (), {"mark_dirty": lambda self, name: None})()
+
+    start = time.perf_counter()
+    for i in range(n):
+        symbols = [] if rng.random() < 0.1 else rng.sample(SYMBOLS, rng.randint(1, 3))
+        timeframes = [] if rng.random() < 0.2 else rng.sample(TIMEFRAMES, rng.randint(1, 2))
+        registry.subscribe(f"chat-{i}", symbols, timeframes, rng.randint(3, 12))
+    build_ms = (time.perf_counter() - start) * 1000
+    written = registry.flush()
+
+    queries = [(rng.choice(SYMBOLS), rng.choice(TIMEFRAMES), rng.randint(1, 14)) for _ in range(2000)]
+    subscribers = registry.all()
+
+    start = time.perf_counter()
+    indexed = [registry.match(*q) for q in queries]
+    index_us = (time.perf_counter() - start) / len(queries) * 1e6
+
+    start = time.perf_counter()
+    scanned = [scan(subscribers, *q) for q in queries]
+    scan_us = (time.perf_counter() - start) / len(queries) * 1e6
+
+    assert all(sorted(a) == sorted(b) for a, b in zip(indexed, scanned)), "index and scan disagree"
+
+    # One candle-close tick: every symbol x timeframe reports a streak
+    alerts = [{"symbol": s, "timeframe": tf, "length": rng.randint(1, 14)} for s in SYMBOLS for tf in TIMEFRAMES]
+    start = time.perf_counter()
+    routed = registry.route(alerts)
+    route_ms = (time.perf_counter() - start) * 1000
+    deliveries = sum(len(v) for v in routed.values())
+
+    reloaded = SubscriptionRegistry(path)
+    assert len(reloaded.subscribers) == n
+
+    print(f"Subscribers:        {n} ({registry.metrics()['index_entries']} index entries)")
+    print(f"Build:              {build_ms:.1f} ms, persisted {written / 1024:.0f} KB")
+    print(f"Match (bisect):     {index_us:.1f} us/query")
+    print(f"Match (scan):       {scan_us:.1f} us/query ({scan_us / index_us:.0f}x slower)")
+    print(f"Route tick:         {len(alerts)} alerts -> {deliveries} alerts in {len(routed)} chat messages, {route_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
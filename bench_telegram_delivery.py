@@ -0,0 +1,106 @@
+"""
+Throughput check for backend/telegram_delivery.py against a local stand-in
+Telegram server (no real bot token needed).
+
+The stand-in enforces Telegram-like limits (1 msg/s per chat, 30 msg/s global)
+and answers 429 + retry_after when they are exceeded.
+
+Usage: python bench_telegram_delivery.py [chats] [alerts_per_chat]
+"""
+import asyncio
+import json
+import sys
+import time
+
+from backend.telegram_delivery import TelegramDelivery
+
+PER_CHAT_INTERVAL = 1.0
+GLOBAL_PER_SECOND = 30
+
+
+class StandInTelegram:
+    def __init__(self):
+        self.last_by_chat = {}
+        self.window_start = 0.0
+        self.window_count = 0
+        self.accepted = []
+        self.rejected = 0
+
+    def handle(self, payload: dict) -> tuple:
+        now = time.monotonic()
+        chat_id = payload.get("chat_id")
+
+        if now - self.window_start >= 1.0:
+            self.window_start, self.window_count = now, 0
+        last = self.last_by_chat.get(chat_id)
+        if self.window_count >= GLOBAL_PER_SECOND or (last is not None and now - last < PER_CHAT_INTERVAL * 0.95):
+            self.rejected += 1
+            return 429, {"ok": False, "error_code": 429, "parameters": {"retry_after": 1}}
+
+        self.window_count += 1
+        self.last_by_chat[chat_id] = now
+        self.accepted.append(payload)
+        return 200, {"ok": True, "result": {"message_id": len(self.accepted)}}
+
+    async def serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                status, response = self.handle(json.loads(body or b"{}"))
+                data = json.dumps(response).encode()
+                reason = "OK" if status == 200 else "Too Many Requests"
+                writer.write(
+                    f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+
+async def main(chats: int, alerts_per_chat: int):
+    stand_in = StandInTelegram()
+    server = await asyncio.start_server(stand_in.serve, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    delivery = TelegramDelivery("TEST", api_base=f"http://127.0.0.1:{port}")
+
+    start = time.perf_counter()
+    # Two candle-close "ticks": every chat gets a burst of alerts each time
+    for tick in range(2):
+        for chat in range(chats):
+            for n in range(alerts_per_chat):
+                delivery.enqueue(f"chat-{chat}", f"tick {tick} alert {n}", parse_mode=None)
+        await asyncio.sleep(0.1)
+    await delivery.drain(timeout=120)
+    elapsed = time.perf_counter() - start
+
+    alerts_delivered = sum(len(p["text"].split("\n\n")) for p in stand_in.accepted)
+    print(f"Alerts enqueued:    {delivery.stats['enqueued']}")
+    print(f"Alerts delivered:   {alerts_delivered}")
+    print(f"Messages sent:      {len(stand_in.accepted)} (coalesced {delivery.stats['coalesced_alerts']} alerts)")
+    print(f"429 responses:      {stand_in.rejected}")
+    print(f"Elapsed:            {elapsed:.2f}s ({alerts_delivered / elapsed:.0f} alerts/s, {len(stand_in.accepted) / elapsed:.1f} msg/s)")
+    print(f"Delivery metrics:   {delivery.metrics()}")
+
+    await delivery.close()
+    server.close()
+    await server.wait_closed()
+
+
+if __name__ == "__main__":
+    chats = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    alerts_per_chat = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    asyncio.run(main(chats, alerts_per_chat))
@@ -0,0 +1,213 @@
+"""
+Benchmark/check for the dynamic symbol universe (backend/universe.py) and the
+sharded candle scheduler (backend/scheduler.py) at 200 symbols x 4 timeframes.
+
+Runs CCXTAdapter against a local fake exchange (simulated latency, call and
+concurrency counters) in a temp data dir, then:
+  1. builds the symbol mapping from the fake exchange's loaded markets
+  2. admits symbols on demand from a fake Polymarket listing
+  3. cold pass: scheduler passes until every tracked series is cached
+  4. boundary pass: every series due again (incremental `since` fetches)
+  5. live prices: one bulk fetch_tickers vs a ticker request per symbol
+  6. get_batch_stats over all symbols per timeframe
+
+Usage: python bench_universe.py [symbols] [latency_ms]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+TIMEFRAMES = ['15m', '1h', '4h', '1d']
+TF_MS = {'15m': 15 * 60_000, '1h': 60 * 60_000, '4h': 4 * 60 * 60_000, '1d': 24 * 60 * 60_000}
+
+
+class FakeExchange:
+    """
+    ccxt-like async exchange: deterministic candles per symbol up to the open
+    candle, tickers, and counters for calls and requests in flight.
+    """
+    id = 'binance'
+    has = {'fetchTickers': True}
+
+    def __init__(self, bases, latency: float):
+        self.bases = bases
+        self.latency = latency
+        self.calls = {"fetch_ohlcv": 0, "fetch_ticker": 0, "fetch_tickers": 0}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def load_markets_symbols(self):
+        # Several quotes per base: the universe picks the preferred one
+        markets = []
+        for base in self.bases:
+            markets += [f"{base}/USDT:USDT", f"{base}/USDC", f"{base}/BTC"]
+            if zlib.crc32(base.encode()) % 3:
+                markets.append(f"{base}/USDT")
+        return markets
+
+    async def _call(self, name):
+        self.calls[name] += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+
+    @staticmethod
+    def _closes(symbol, t):
+        seed = zlib.crc32(symbol.encode()) % 1000
+        return (10 + seed) * np.exp(0.02 * np.sin(t * 0.37 + seed) + 0.01 * np.cos(t * 1.7 + seed))
+
+    async def fetch_ohlcv(self, symbol, timeframe, limit=1000, since=None):
+        await self._call("fetch_ohlcv")
+        tf_ms = TF_MS[timeframe]
+        now_ms = int(time.time() * 1000)
+        last = now_ms // tf_ms
+        first = since // tf_ms if since is not None else last - limit + 1
+        t = np.arange(first, min(first + limit, last + 1))
+        close = self._closes(symbol, t)
+        open_ = self._closes(symbol, t - 1)
+        high = np.maximum(open_, close) * 1.001
+        low = np.minimum(open_, close) * 0.999
+        return [[int(ti * tf_ms), o, h, l, c, 1.0] for ti, o, h, l, c in zip(t, open_, high, low, close)]
+
+    def _ticker(self, symbol):
+        return {"symbol": symbol, "last": float(self._closes(symbol, np.array([time.time() // 60]))[0])}
+
+    async def fetch_ticker(self, symbol):
+        await self._call("fetch_ticker")
+        return self._ticker(symbol)
+
+    async def fetch_tickers(self, symbols=None):
+        await self._call("fetch_tickers")
+        return {s: self._ticker(s) for s in symbols or []}
+
+    async def close(self):
+        pass
+
+
+async def run(n: int, latency: float):
+    os.chdir(tempfile.mkdtemp())
+    os.environ["SYMBOLS"] = "BTC,ETH,SOL,XRP"
+    from backend.analyzer import Analyzer
+    from backend.freshness import FreshnessManager
+    from backend.scheduler import CandleScheduler
+    from backend.universe import SymbolUniverse, polymarket_tickers
+
+    bases = ["BTC", "ETH", "SOL", "XRP"] + [f"C{i:03d}" for i in range(n + 50)]
+    exchange = FakeExchange(bases, latency)
+    analyzer = Analyzer()
+    adapter = analyzer.adapter
+    await adapter.close()
+    adapter.exchanges = [exchange]
+    universe = adapter.universe
+
+    # 1. Mapping from loaded markets
+    listed = {exchange.id: exchange.load_markets_symbols()}
+    start = time.perf_counter()
+    universe.build(listed)
+    build_ms = (time.perf_counter() - start) * 1000
+    assert universe.map('binance', 'BTC') == ('BTC/USDT' if zlib.crc32(b'BTC') % 3 else 'BTC/USDT:USDT')
+    assert all(universe.map('binance', b).split('/')[1] in ('USDT', 'USDT:USDT') for b in bases)
+    reloaded = SymbolUniverse(adapter.DATA_DIR)
+    assert reloaded.markets == universe.markets, "mapping not persisted"
+    print(f"universe build: {len(universe.bases())} symbols from {len(listed['binance'])} markets in {build_ms:.1f} ms")
+
+    # 2. On-demand admission by Polymarket listing (one symbol without a market)
+    listing = [{"slug": f"{b.lower()}-updown-15m-1733690700"} for b in bases[:n]]
+    listing.append({"slug": "bitcoin-up-or-down-december-8-3am-et"})
+    universe.update_polymarket(polymarket_tickers(listing))
+    for symbol in bases[4:n]:
+        assert universe.admit(symbol), symbol
+    assert not universe.admit(bases[n]), "admitted a symbol without a Polymarket market"
+    symbols = universe.tracked()
+    assert len(symbols) == n and SymbolUniverse(adapter.DATA_DIR).tracked() == symbols
+    print(f"admission: {len(symbols)} tracked ({universe.stats['admitted']} admitted, "
+          f"{universe.stats['refused_polymarket']} refused)")
+
+    freshness = FreshnessManager(adapter)
+    scheduler = CandleScheduler(analyzer, freshness)
+    scheduler.track(symbols, TIMEFRAMES)
+    keys = freshness.tracked_keys()
+    shard_sizes = [len(scheduler.shard_keys(i)) for i in range(scheduler.shards)]
+    print(f"scheduler: {len(keys)} source keys over {scheduler.shards} shards {shard_sizes}, "
+          f"budget {scheduler.SHARD_PASS_BUDGET}/pass, {scheduler.SHARD_CONCURRENCY} in flight/shard")
+
+    # 3. Cold pass: series are fetched as the scheduler passes reach them
+    start = time.perf_counter()
+    passes = 0
+    while any(adapter.cache.get(k) is None or adapter.cache.get(k).empty for k in keys):
+        await scheduler.run_once()
+        passes += 1
+        assert passes < 50, "cold pass did not converge"
+    cold_s = time.perf_counter() - start
+    cold_calls = exchange.calls["fetch_ohlcv"]
+    assert exchange.max_in_flight <= scheduler.shards * scheduler.SHARD_CONCURRENCY
+    print(f"cold: {cold_s:.2f} s, {passes} passes, {cold_calls} fetch_ohlcv, "
+          f"max {exchange.max_in_flight} in flight")
+
+    # 4. Boundary: everything due again (cooldown and schedule reset)
+    adapter.last_update.clear()
+    for k in keys:
+        freshness.next_refresh[k] = 0
+    exchange.max_in_flight = 0
+    start = time.perf_counter()
+    summary = await scheduler.run_once()
+    while freshness.due_keys(keys=keys):
+        summary = await scheduler.run_once()
+    boundary_s = time.perf_counter() - start
+    stale = [k for k in keys if freshness.status.get(k, {}).get("stale")]
+    assert not stale, stale[:5]
+    slowest = max(p["refresh_ms"] for p in summary.values())
+    print(f"boundary: {boundary_s:.2f} s, {exchange.calls['fetch_ohlcv'] - cold_calls} fetch_ohlcv, "
+          f"max {exchange.max_in_flight} in flight, slowest shard pass {slowest:.0f} ms")
+
+    # 5. Live prices
+    adapter.price_cache.clear()
+    before = dict(exchange.calls)
+    start = time.perf_counter()
+    prices = await adapter.fetch_current_prices(symbols)
+    bulk_ms = (time.perf_counter() - start) * 1000
+    bulk_calls = {k: exchange.calls[k] - before[k] for k in before}
+    assert len(prices) == n
+    adapter.price_cache.clear()
+    before = dict(exchange.calls)
+    start = time.perf_counter()
+    await asyncio.gather(*(adapter.fetch_current_price(s) for s in symbols))
+    single_ms = (time.perf_counter() - start) * 1000
+    single_calls = exchange.calls["fetch_ticker"] - before["fetch_ticker"]
+    print(f"prices: bulk {bulk_ms:.1f} ms ({bulk_calls['fetch_tickers']} fetch_tickers, "
+          f"{bulk_calls['fetch_ticker']} fetch_ticker) vs per-symbol {single_ms:.1f} ms ({single_calls} fetch_ticker)")
+
+    # 6. Batch analytics over the whole universe (live prices warm); the first
+    # round also ingests every symbol's streak log
+    for tf in TIMEFRAMES:
+        timings = []
+        for _ in range(2):
+            await adapter.fetch_current_prices(symbols)
+            calls = exchange.calls["fetch_ohlcv"]
+            start = time.perf_counter()
+            stats = await analyzer.get_batch_stats(symbols, tf)
+            timings.append((time.perf_counter() - start) * 1000)
+            assert exchange.calls["fetch_ohlcv"] == calls, "batch stats hit the exchange"
+        ok = sum(1 for s in stats.values() if s and "error" not in s)
+        print(f"batch stats {tf}: {ok}/{n} symbols, first {timings[0]:.1f} ms, again {timings[1]:.1f} ms")
+
+    print(f"universe: {universe.metrics()['tracked']} tracked, cache {len(adapter.cache.keys())} series")
+    await analyzer.close()
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 25.0) / 1000
+    asyncio.run(run(n, latency))
+
+
+if __name__ == "__main__":
+    main()
@@ -31,7 +31,7 @@ const AssetCard = ({ data }) => {
 
     const {
         symbol, timeframe, current_price, candle_open, candle_close_time,
-        current_streak, next_candle_prob, distribution, probability_curve, stats
+        current_streak, next_candle_prob, distribution, probability_curve, stats, live_candle_prob
     } = data;
 
     const isGreen = current_streak.type === 'green';
@@ -80,6 +80,7 @@ const AssetCard = ({ data }) => {
                 openPrice={candle_open}
                 closeTime={candle_close_time}
                 timeframe={timeframe}
+                liveProb={live_candle_prob}
             />
 
             {/* Probabilities */}
@@ -3,9 +3,12 @@ import { Clock } from 'lucide-react';
 import axios from 'axios';
 import { LineChart, Line, ReferenceLine, ResponsiveContainer, YAxis, XAxis, Tooltip } from 'recharts';
 
-const LiveCandleWidget = ({ symbol, currentPrice, openPrice, closeTime, timeframe, variant = 'simple', priceHistory: externalHistory }) => {
+const LiveCandleWidget = ({ symbol, currentPrice, openPrice, closeTime, timeframe, variant = 'simple', priceHistory: externalHistory, liveProb }) => {
     const [timeLeft, setTimeLeft] = useState('');
     const [probGreen, setProbGreen] = useState(50);
+    // P(close green) from the backend's intra-candle table, refreshed with the
+    // batch stats (null until known)
+    const tableProb = liveProb ? liveProb.green : null;
     const [internalHistory, setInternalHistory] = useState([]);
     const [livePrice, setLivePrice] = useState(currentPrice);
 
@@ -19,41 +22,53 @@ const LiveCandleWidget = ({ symbol, currentPrice, openPrice, closeTime, timefram
     useEffect(() => {
         if (externalHistory && externalHistory.length > 0) return;
 
-        const fetchLivePrice = async () => {
+        // Incremental 1-second micro-bars: only the last (still updating) bar and newer ones
+        let since = null;
+        const fetchMicroBars = async () => {
             try {
-                const res = await axios.get(`/api/live/${symbol}`, { params: { _t: Date.now() } });
-                if (res.data && res.data.price) setLivePrice(res.data.price);
+                const params = since ? { since, _t: Date.now() } : { limit: 60, _t: Date.now() };
+                const res = await axios.get(`/api/live/${symbol}/micro`, { params });
+                const bars = res.data && Array.isArray(res.data.bars) ? res.data.bars : [];
+                if (bars.length === 0) return;
+                since = bars[bars.length - 1][0];
+                setLivePrice(bars[bars.length - 1][4]);
+                setInternalHistory(prev => {
+                    const updated = [...prev];
+                    bars.forEach(([time, , , , close]) => {
+                        const point = { time: Math.floor(time / 1000), price: close };
+                        const last = updated[updated.length - 1];
+                        if (last && last.time === point.time) updated[updated.length - 1] = point;
+                        else if (!last || last.time < point.time) updated.push(point);
+                    });
+                    return updated.slice(-100);
+                });
             } catch (error) { console.error(error); }
         };
 
         const fetchHistory = async () => {
             try {
                 const res = await axios.get(`/api/history/${symbol}/1m`, { params: { _t: Date.now() } });
-                if (res.data && Array.isArray(res.data)) setInternalHistory(res.data);
+                if (res.data && Array.isArray(res.data)) {
+                    setInternalHistory(res.data);
+                    // Replay the current minute's micro-bars on top of the fresh candles
+                    since = null;
+                }
             } catch (error) { console.error(error); }
         };
 
+        // The 1m series only changes on candle boundaries: refresh it right after each close
+        let boundaryTimer;
+        const scheduleHistory = () => {
+            const delay = 60000 - (Date.now() % 60000) + 2000;
+            boundaryTimer = setTimeout(() => { fetchHistory(); scheduleHistory(); }, delay);
+        };
+
         fetchHistory();
-        const interval = setInterval(fetchLivePrice, 1000);
-        return () => clearInterval(interval);
+        scheduleHistory();
+        const interval = setInterval(fetchMicroBars, 1000);
+        return () => { clearInterval(interval); clearTimeout(boundaryTimer); };
     }, [symbol, timeframe, externalHistory]);
 
-    useEffect(() => {
-        if (!livePrice || (externalHistory && externalHistory.length > 0)) return;
-
-        setInternalHistory(prev => {
-            const now = Math.floor(Date.now() / 1000);
-            const newPoint = { time: now, price: livePrice };
-            const last = prev[prev.length - 1];
-            if (last && last.time === now) {
-                const updated = [...prev];
-                updated[updated.length - 1] = newPoint;
-                return updated;
-            }
-            return [...prev, newPoint].slice(-100);
-        });
-    }, [livePrice]);
-
     useEffect(() => {
         const timer = setInterval(() => {
             const now = Date.now();
@@ -68,15 +83,20 @@ const LiveCandleWidget = ({ symbol, currentPrice, openPrice, closeTime, timefram
                 setTimeLeft(`${hours > 0 ? hours + 'h ' : ''}${minutes}m ${seconds}s`);
             }
 
-            const delta = livePrice - openPrice;
-            const percentChange = (delta / openPrice) * 100;
-            let prob = 50 + (percentChange * 100);
-            prob = Math.max(1, Math.min(99, prob));
-            setProbGreen(prob);
+            if (tableProb !== null) {
+                setProbGreen(tableProb);
+            } else {
+                // No table value yet: rough guess from the move since the open
+                const delta = livePrice - openPrice;
+                const percentChange = (delta / openPrice) * 100;
+                let prob = 50 + (percentChange * 100);
+                prob = Math.max(1, Math.min(99, prob));
+                setProbGreen(prob);
+            }
 
         }, 1000);
         return () => clearInterval(timer);
-    }, [closeTime, livePrice, openPrice, timeframe]);
+    }, [closeTime, livePrice, openPrice, timeframe, tableProb]);
 
     const isGreen = livePrice >= openPrice;
 
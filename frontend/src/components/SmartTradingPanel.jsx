@@ -65,13 +65,17 @@ const SmartTradingPanel = ({ data, timeframe, setTimeframe, selectedSymbol, onSy
 
         fetchAllHistories();
 
-        // 2. Background Polling for ALL assets (Live Prices)
+        // 2. Background Polling for ALL assets (incremental 1-second micro-bars)
+        const since = {};
         const pollLivePrices = async () => {
             const promises = ASSETS.map(async (asset) => {
                 try {
-                    const res = await axios.get(`/api/live/${asset}`, { params: { _t: Date.now() } });
-                    if (res.data && res.data.price) {
-                        return { asset, price: res.data.price };
+                    const params = since[asset] ? { since: since[asset], _t: Date.now() } : { limit: 60, _t: Date.now() };
+                    const res = await axios.get(`/api/live/${asset}/micro`, { params });
+                    if (res.data && Array.isArray(res.data.bars) && res.data.bars.length > 0) {
+                        const bars = res.data.bars;
+                        since[asset] = bars[bars.length - 1][0];
+                        return { asset, bars };
                     }
                 } catch (e) {
                     // silent fail
@@ -83,33 +87,43 @@ const SmartTradingPanel = ({ data, timeframe, setTimeframe, selectedSymbol, onSy
 
             setMarketHistories(prev => {
                 const next = { ...prev };
-                const now = Math.floor(Date.now() / 1000);
 
                 results.forEach(r => {
                     if (!r) return;
-                    const { asset, price } = r;
+                    const { asset, bars } = r;
                     // Safety: Default into empty array if missing
-                    const history = Array.isArray(next[asset]) ? next[asset] : [];
-
-                    const newPoint = { time: now, price };
-
-                    // Duplicate/Update logic
-                    const last = history[history.length - 1];
-                    let newHistory;
-                    if (last && last.time === now) {
-                        newHistory = [...history];
-                        newHistory[newHistory.length - 1] = newPoint;
-                    } else {
-                        newHistory = [...history, newPoint].slice(-100);
-                    }
-                    next[asset] = newHistory;
+                    const newHistory = Array.isArray(next[asset]) ? [...next[asset]] : [];
+
+                    // Duplicate/Update logic: the first bar may be the one already shown
+                    bars.forEach(([time, , , , close]) => {
+                        const newPoint = { time: Math.floor(time / 1000), price: close };
+                        const last = newHistory[newHistory.length - 1];
+                        if (last && last.time === newPoint.time) {
+                            newHistory[newHistory.length - 1] = newPoint;
+                        } else if (!last || last.time < newPoint.time) {
+                            newHistory.push(newPoint);
+                        }
+                    });
+                    next[asset] = newHistory.slice(-100);
                 });
                 return next;
             });
         };
 
+        // 3. The 1m candles only change on boundaries: refetch right after each close
+        let boundaryTimer;
+        const scheduleHistories = () => {
+            const delay = 60000 - (Date.now() % 60000) + 2000;
+            boundaryTimer = setTimeout(async () => {
+                await fetchAllHistories();
+                ASSETS.forEach(asset => { delete since[asset]; });
+                scheduleHistories();
+            }, delay);
+        };
+        scheduleHistories();
+
         const interval = setInterval(pollLivePrices, 1000);
-        return () => clearInterval(interval);
+        return () => { clearInterval(interval); clearTimeout(boundaryTimer); };
     }, []);
 
     if (!data || data.error || !data.smart_trading) return null;
@@ -291,6 +305,7 @@ const SmartTradingPanel = ({ data, timeframe, setTimeframe, selectedSymbol, onSy
                         variant="simple"
                         // variant="simple" (Fixed duplicate prop)
                         priceHistory={marketHistories[symbol] || []}
+                        liveProb={data.live_candle_prob}
                     />
                 </div>
 
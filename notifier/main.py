@@ -12,6 +12,12 @@ import httpx
 
 from dotenv import load_dotenv
 
+# Shared with the backend (single source). The notifier image copies these
+# modules in at build time (notifier/Dockerfile); locally, run with the repo
+# root on PYTHONPATH (e.g. `PYTHONPATH=.. python main.py` from notifier/).
+from backend.persistence import PersistenceService, atomic_write_json
+from backend.telegram_delivery import TelegramDelivery
+
 # Load env vars
 load_dotenv()
 
@@ -27,6 +33,9 @@ templates = Jinja2Templates(directory="templates")
 # State (In-memory for simplicity, can be saved to JSON)
 SETTINGS_FILE = "/data/notifier_settings.json" if os.path.exists("/data") else "notifier_settings.json"
 
+# Debounced background writer (settings saves never block a request)
+persistence = PersistenceService()
+
 class Settings:
     def __init__(self):
         self.target_url = "https://polymarketbar-production.up.railway.app"
@@ -35,6 +44,8 @@ class Settings:
         self.telegram_chat_id = os.getenv("TELEGRAM_CHAT_ID", "")
         self.streak_threshold = 5
         self.enabled = False
+        # Bumped on every save so the alert stream reconnects with new params
+        self.version = 0
         self.load()
 
     def load(self):
@@ -58,89 +69,132 @@ class Settings:
             except Exception as e:
                 logger.error(f"Failed to load settings: {e}")
 
+    def to_dict(self) -> dict:
+        return {
+            "target_url": self.target_url,
+            "telegram_token": self.telegram_token,
+            "telegram_chat_id": self.telegram_chat_id,
+            "streak_threshold": self.streak_threshold,
+            "enabled": self.enabled
+        }
+
     def save(self):
+        # Marks settings dirty; the background writer does the atomic write
+        self.version += 1
+        persistence.mark_dirty("settings")
+
+    def write(self) -> int:
         try:
-            data = {
-                "target_url": self.target_url,
-                "telegram_token": self.telegram_token,
-                "telegram_chat_id": self.telegram_chat_id,
-                "streak_threshold": self.streak_threshold,
-                "enabled": self.enabled
-            }
-            with open(SETTINGS_FILE, 'w') as f:
-                json.dump(data, f)
+            return atomic_write_json(SETTINGS_FILE, self.to_dict())
         except Exception as e:
             logger.error(f"Failed to save settings: {e}")
+            raise
 
 settings = Settings()
+persistence.register("settings", settings.write)
+
+class StreakAlerts:
+    """
+    Threshold check and dedupe for pushed streak events, per series: one alert
+    per streak and length (plain Python, the notifier ships without NumPy).
 
-# Alert History to prevent spam
-# Key: (symbol, timeframe) -> int (last alerted streak count)
-alert_history: Dict[tuple, int] = {}
+    The backend only pushes streaks at/above the threshold, so the break between
+    two streaks is never seen here: streaks are told apart by their start
+    (first candle's open time), or by the candle close time on backends that
+    don't send it.
+    """
+    def __init__(self):
+        # { "SYMBOL_TF": (start, type, length) of the last alert }
+        self.alerted: Dict[str, tuple] = {}
+
+    def check(self, event: Dict, threshold: int) -> bool:
+        key = f"{event.get('symbol')}_{event.get('timeframe')}"
+        length = int(event.get('length') or 0)
+        if length < threshold:
+            self.alerted.pop(key, None)
+            return False
+        start = event.get('start')
+        if start is None:
+            # Older backend: one alert per candle close (a streak grows by one per close)
+            start = event.get('close_time')
+        state = (start, event.get('type'), length)
+        if self.alerted.get(key) == state:
+            return False
+        self.alerted[key] = state
+        return True
+
+streak_alerts = StreakAlerts()
 
 # Background Task
 async def monitor_loop():
+    """
+    Consumes the backend's push alert stream (/api/alerts/stream, SSE) instead
+    of polling full batch-stats snapshots. The backend only sends streaks at or
+    above our threshold, so nothing flows between events except keepalives.
+    Reconnects when settings change or the connection drops.
+    """
     logger.info("Starting Monitor Loop...")
-    async with httpx.AsyncClient(timeout=10.0) as client:
+    backoff = 1
+    async with httpx.AsyncClient(timeout=httpx.Timeout(10.0, read=60.0)) as client:
         while True:
-            if settings.enabled and settings.target_url:
-                try:
-                    # We need to fetch stats. Ideally the main app has a batch endpoint.
-                    # Or we check each timeframe.
-                    # Let's assume we check 15m, 1h, 4h, 1d
-                    timeframes = ['15m', '1h', '4h', '1d']
-                    
-                    # Optimized: Fetch batch stats if available? 
-                    # Main app has /api/batch-stats/{timeframe} that returns list of ALL symbols
-                    
-                    for tf in timeframes:
-                        try:
-                            url = f"{settings.target_url.rstrip('/')}/api/batch-stats/{tf}"
-                            resp = await client.get(url)
-                            if resp.status_code == 200:
-                                data = resp.json() # List of {symbol, price, streak_type, streak_count...}
-                                await process_stats(data, tf, client)
-                            else:
-                                logger.warning(f"Failed to fetch {tf}: {resp.status_code}")
-                        except Exception as e:
-                            logger.error(f"Error checking {tf}: {e}")
-                            
-                except Exception as e:
-                    logger.error(f"Monitor loop error: {e}")
-            
-            await asyncio.sleep(15) # Check every 15s
-
-async def process_stats(stats_list: List[Dict], timeframe: str, client: httpx.AsyncClient):
-    global alert_history
-    
-    for item in stats_list:
-        symbol = item.get('symbol')
-        count = item.get('streak_count', 0)
-        s_type = item.get('streak_type', 'flat')
-        price = item.get('price', 0)
-        
-        if count >= settings.streak_threshold:
-            # Check history
-            key = (symbol, timeframe)
-            last_alerted = alert_history.get(key, 0)
-            
-            # Alert on NEW threshold breach or INCREASE
-            # Only alert if count > last_alerted check is strict
-            if count > last_alerted:
-                await send_telegram_alert(client, symbol, timeframe, s_type, count, price)
-                alert_history[key] = count
-        else:
-            # Reset history if streak drops
-            key = (symbol, timeframe)
-            if key in alert_history:
-                del alert_history[key]
-
-async def send_telegram_alert(client: httpx.AsyncClient, symbol, timeframe, s_type, count, price):
+            if not (settings.enabled and settings.target_url):
+                await asyncio.sleep(5)
+                continue
+
+            version = settings.version
+            url = f"{settings.target_url.rstrip('/')}/api/alerts/stream"
+            params = {"threshold": settings.streak_threshold, "timeframes": "15m,1h,4h,1d"}
+            try:
+                async with client.stream("GET", url, params=params) as resp:
+                    resp.raise_for_status()
+                    logger.info(f"Connected to alert stream {url}")
+                    backoff = 1
+
+                    event_type, data_lines = None, []
+                    async for line in resp.aiter_lines():
+                        if settings.version != version or not settings.enabled:
+                            logger.info("Settings changed, reconnecting alert stream...")
+                            break
+                        if line.startswith("event:"):
+                            event_type = line[6:].strip()
+                        elif line.startswith("data:"):
+                            data_lines.append(line[5:].strip())
+                        elif line == "" and data_lines:
+                            if event_type == "streak":
+                                await process_streak(json.loads("\n".join(data_lines)))
+                            event_type, data_lines = None, []
+            except Exception as e:
+                logger.error(f"Alert stream error: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+
+async def process_streak(event: Dict):
+    """
+    event: {symbol, timeframe, type ('green'/'red'), length, start, price, close_time}
+    The backend only pushes streaks >= threshold whose (start, type, length) changed.
+    """
+    if streak_alerts.check(event, settings.streak_threshold):
+        await send_telegram_alert(event.get('symbol'), event.get('timeframe'), event.get('type', 'flat'),
+                                  int(event.get('length', 0)), event.get('price', 0))
+
+# Telegram delivery queue (rebuilt when the bot token changes in settings)
+_delivery: Optional[TelegramDelivery] = None
+
+def get_delivery() -> TelegramDelivery:
+    global _delivery
+    if _delivery is None or _delivery.token != settings.telegram_token:
+        if _delivery is not None:
+            asyncio.create_task(_delivery.close())
+        _delivery = TelegramDelivery(settings.telegram_token)
+    return _delivery
+
+async def send_telegram_alert(symbol, timeframe, s_type, count, price):
     if not settings.telegram_token or not settings.telegram_chat_id:
         return
 
-    emoji = "🟢" if s_type == "up" else "🔴"
-    direction = "YÜKSELİŞ" if s_type == "up" else "DÜŞÜŞ"
+    is_up = s_type in ("up", "green")
+    emoji = "🟢" if is_up else "🔴"
+    direction = "YÜKSELİŞ" if is_up else "DÜŞÜŞ"
     
     msg = (
         f"🚨 **STREAK ALARMI: {symbol}** 🚨\n\n"
@@ -149,34 +203,29 @@ async def send_telegram_alert(client: httpx.AsyncClient, symbol, timeframe, s_ty
         f"#{symbol} #{s_type} #PolymarketBar"
     )
     
-    url = f"https://api.telegram.org/bot{settings.telegram_token}/sendMessage"
-    payload = {
-        "chat_id": settings.telegram_chat_id,
-        "text": msg,
-        "parse_mode": "Markdown"
-    }
-    
-    try:
-        resp = await client.post(url, json=payload)
-        if resp.status_code == 200:
-            logger.info(f"Sent alert for {symbol} {timeframe}")
-        else:
-            logger.error(f"Telegram fail: {resp.text}")
-    except Exception as e:
-        logger.error(f"Telegram send error: {e}")
+    # Queued: rate limited per chat, coalesced with alerts from the same tick, retried
+    get_delivery().enqueue(settings.telegram_chat_id, msg, parse_mode="Markdown")
+    logger.info(f"Queued alert for {symbol} {timeframe}")
 
 # Lifecycle
 @app.on_event("startup")
 async def startup_event():
+    persistence.start()
     asyncio.create_task(monitor_loop())
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await asyncio.to_thread(persistence.stop)
+    if _delivery is not None:
+        await _delivery.close()
+
 # Routes
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     return templates.TemplateResponse("index.html", {
         "request": request,
         "settings": settings,
-        "alert_count": len(alert_history)
+        "alert_count": len(streak_alerts.alerted)
     })
 
 @app.post("/settings")
@@ -200,8 +249,7 @@ async def update_settings(
 
 @app.post("/test-alert")
 async def test_alert():
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        await send_telegram_alert(client, "TEST", "1m", "up", 999, 420.69)
+    await send_telegram_alert("TEST", "1m", "up", 999, 420.69)
     return RedirectResponse(url="/", status_code=303)
 
 if __name__ == "__main__":
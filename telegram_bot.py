@@ -4,7 +4,7 @@ import os
 import sys
 import json
 import logging
-import httpx
+import time
 from datetime import datetime
 
 # Configure Logging
@@ -20,57 +20,77 @@ sys.path.append(os.getcwd())
 
 try:
     from backend.analyzer import Analyzer
+    from backend.telegram_delivery import TelegramDelivery
+    from backend.timeframes import next_close_ms, source_timeframe
+    from backend.rules import RuleEngine, Rule, streak_rule
+    from backend.shared_market import SharedMarketData
+    from backend.freshness import FreshnessManager
+    from backend.scheduler import CandleScheduler
 except ImportError:
     # Handle case where user runs from inside a subdir
     sys.path.append(os.path.join(os.getcwd(), '..'))
     from backend.analyzer import Analyzer
+    from backend.telegram_delivery import TelegramDelivery
+    from backend.timeframes import next_close_ms, source_timeframe
+    from backend.rules import RuleEngine, Rule, streak_rule
+    from backend.shared_market import SharedMarketData
+    from backend.freshness import FreshnessManager
+    from backend.scheduler import CandleScheduler
 
 # Configuration
 SETTINGS_FILE = "telegram_settings.json"
+MAX_CONCURRENT_EVALS = 8   # Bounded fan-out of stats evaluations per boundary
+SETTLE_DELAY = 2.0         # Seconds after a boundary before the exchange has the closed candle
+FRESH_WAIT = 20.0          # Max seconds a pass waits for the scheduler's post-boundary refresh
+SETTINGS_POLL = 5.0        # Seconds between settings mtime checks
+
+DEFAULT_SETTINGS = {
+    "streak_threshold": 5,
+    "symbols": "auto",   # "auto": the backend's tracked symbols (SymbolUniverse), or an explicit list
+    "timeframes": ["15m", "1h", "4h", "1d"]
+}
+
+# Last parsed settings, reused until the file's mtime changes
+_settings_cache = {"mtime": None, "data": None}
 
 def load_settings():
-    defaults = {
-        "streak_threshold": 5,
-        "symbols": ["BTC", "ETH", "SOL", "XRP"],
-        "timeframes": ["15m", "1h", "4h", "1d"]
-    }
     if not os.path.exists(SETTINGS_FILE):
         with open(SETTINGS_FILE, "w") as f:
-            json.dump(defaults, f, indent=4)
-        return defaults
-    
+            json.dump(DEFAULT_SETTINGS, f, indent=4)
+
     try:
+        mtime = os.path.getmtime(SETTINGS_FILE)
+        if _settings_cache["data"] is not None and mtime == _settings_cache["mtime"]:
+            return _settings_cache["data"]
         with open(SETTINGS_FILE, "r") as f:
-            return json.load(f)
+            data = json.load(f)
+        if _settings_cache["data"] is not None:
+            logger.info("Settings file changed, reloaded.")
+        _settings_cache["mtime"], _settings_cache["data"] = mtime, data
+        return data
     except Exception as e:
         logger.error(f"Failed to load settings: {e}")
-        return defaults
+        # Keep running on the last good settings (e.g. file mid-write)
+        return _settings_cache["data"] or DEFAULT_SETTINGS
+
+# Shared delivery queue (one pooled client, rate limits, coalescing, retries)
+_delivery = None
 
 async def send_telegram_msg(token, chat_id, text):
+    global _delivery
     if not token or not chat_id:
         logger.warning("No Telegram credentials found.")
         return
         
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
-    payload = {
-        "chat_id": chat_id,
-        "text": text,
-        "parse_mode": "HTML"
-    }
-    
+    # Sanitize Unicode surrogates
     try:
-        # Sanitize Unicode surrogates
-        try:
-             text = text.encode('utf-16', 'surrogatepass').decode('utf-16')
-        except:
-             pass 
-
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(url, json=payload, timeout=10.0)
-            resp.raise_for_status()
-            logger.info("Notification sent success.")
-    except Exception as e:
-        logger.error(f"Telegram send failed: {e}")
+         text = text.encode('utf-16', 'surrogatepass').decode('utf-16')
+    except:
+         pass 
+
+    if _delivery is None or _delivery.token != token:
+        _delivery = TelegramDelivery(token)
+    _delivery.enqueue(chat_id, text, parse_mode="HTML")
 
 def get_emotional_comment(streak_length):
     if streak_length <= 2: return "Pretty Normal \U0001F634"
@@ -78,6 +98,94 @@ def get_emotional_comment(streak_length):
     elif streak_length <= 7: return "Market Anomaly Detected! \U0001F525"
     else: return "\U0001F6A8 EXTREME DEVIATION EVENT \U0001F6A8\U0001F4E2"
 
+def build_rules(settings):
+    """
+    Streak rule from `streak_threshold` plus optional custom `rules` from the settings file.
+    """
+    rules = [streak_rule(settings.get("streak_threshold", 5))]
+    for data in settings.get("rules", []):
+        try:
+            rules.append(Rule.from_dict(data))
+        except Exception as e:
+            logger.error(f"Invalid rule {data}: {e}")
+    return rules
+
+async def fetch_stats(analyzer, semaphore, symbol, tf):
+    async with semaphore:
+        try:
+            # Cached series; refreshes belong to the scheduler (or the backend leader)
+            return await analyzer.get_stats(symbol, tf)
+        except Exception as e:
+            logger.error(f"Error processing {symbol} {tf}: {e}")
+            return None
+
+def format_alert(fired):
+    stats = fired["stats"]
+    symbol, tf = fired["symbol"], fired["timeframe"]
+    if fired["rule"] != "streak":
+        return f"\U0001F514 <b>{symbol} {tf}: {fired['message'] or fired['rule']}</b>"
+
+    length = stats['current_streak']['length']
+    emoji = "\U0001F7E2" if stats['current_streak']['type'] == 'green' else "\U0001F534"
+    prev_len = int(abs(fired["previous"] or 0))
+    return (
+        f"{emoji} <b>{symbol} {tf} Streak: {length}</b>\n"
+        f"{get_emotional_comment(length)}\n"
+        f"<i>Previous record: {prev_len}</i>"
+    )
+
+async def wait_fresh(freshness, keys):
+    """
+    Waits (up to FRESH_WAIT) until the scheduler has refreshed `keys` past
+    the boundary that just passed.
+    """
+    deadline = time.time() + FRESH_WAIT
+    while freshness.due_keys(keys=keys) and time.time() < deadline:
+        await asyncio.sleep(0.5)
+
+async def timeframe_loop(tf, wake, analyzer, semaphore, token, chat_id, engine, freshness):
+    """
+    Evaluates every symbol for one timeframe concurrently, then sleeps until
+    just after that timeframe's next candle boundary (or until settings change).
+    """
+    while True:
+        try:
+            settings = load_settings()
+            symbols = settings.get("symbols", "auto")
+            if not isinstance(symbols, list):
+                universe = analyzer.adapter.universe
+                universe.maybe_reload()
+                symbols = universe.tracked()
+
+            started = time.time()
+            if analyzer.adapter.shared is None:
+                # Fetching ourselves: the local scheduler keeps these series fresh
+                for symbol in symbols:
+                    freshness.track(symbol, tf)
+                source_tf = source_timeframe(tf, analyzer.adapter.BASE_TIMEFRAME)
+                await wait_fresh(freshness, [f"{symbol}_{source_tf}" for symbol in symbols])
+            results = await asyncio.gather(*(fetch_stats(analyzer, semaphore, symbol, tf) for symbol in symbols))
+
+            # One vectorized rule pass over every series updated this tick
+            for stats in results:
+                if stats:
+                    engine.update(stats)
+            for fired in engine.evaluate():
+                logger.info(f"Triggering {fired['rule']} alert for {fired['symbol']} {fired['timeframe']}")
+                await send_telegram_msg(token, chat_id, format_alert(fired))
+
+            logger.info(f"{tf} pass complete: {len(symbols)} symbols in {time.time() - started:.1f}s")
+        except Exception as e:
+            logger.critical(f"{tf} loop crash: {e}")
+
+        close_ms = next_close_ms(tf)
+        wait = close_ms / 1000 + SETTLE_DELAY - time.time() if close_ms else 60
+        try:
+            await asyncio.wait_for(wake.wait(), timeout=max(wait, 1.0))
+        except asyncio.TimeoutError:
+            pass
+        wake.clear()
+
 async def main():
     logger.info("Starting Standalone Telegram Bot...")
     
@@ -93,75 +201,70 @@ async def main():
         return
 
     analyzer = Analyzer()
-    last_alerted = {} # Key: SYMBOL_TF, Value: length
+    # Reuse the backend's market data when it is running on this host
+    shared = SharedMarketData(analyzer.DATA_DIR)
+    engine = RuleEngine([]) # Rules are compiled from settings below; keeps dedupe state per rule and series
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_EVALS)
+    # Boundary-aligned refreshes while no backend leader ingests for us
+    freshness = FreshnessManager(analyzer.adapter)
+    scheduler = CandleScheduler(analyzer, freshness)
+    scheduler_task = None
+    loops = {} # Key: TF, Value: (task, wake event)
 
     logger.info("Bot initialized. Monitoring markets...")
     await send_telegram_msg(token, chat_id, "\u2705 <b>Bot Started Monitoring</b>")
 
-    while True:
-        try:
-            settings = load_settings()
-            threshold = settings.get("streak_threshold", 5)
-            symbols = settings.get("symbols", ["BTC"])
-            timeframes = settings.get("timeframes", ["1h"])
-            
-            for symbol in symbols:
+    settings = None
+    try:
+        while True:
+            # Read-only while a backend ingests; fetch ourselves (without taking over) otherwise
+            leader = shared.leader_alive()
+            if leader and analyzer.adapter.shared is None:
+                logger.info("Backend ingestion leader found, reading shared market data.")
+                analyzer.attach_shared(shared)
+            elif not leader and analyzer.adapter.shared is not None:
+                logger.info("Backend ingestion leader gone, fetching from the exchange.")
+                analyzer.attach_shared(None)
+            if leader and scheduler_task is not None:
+                scheduler_task.cancel()
+                scheduler_task = None
+            elif not leader and scheduler_task is None:
+                scheduler_task = asyncio.create_task(scheduler.run())
+
+            current = load_settings()
+            if current is not settings:
+                # First run or file changed: reconcile per-timeframe loops
+                settings = current
+                try:
+                    engine.set_rules(build_rules(settings))
+                except Exception as e:
+                    logger.error(f"Failed to compile alert rules: {e}")
+                timeframes = set(settings.get("timeframes", ["1h"]))
+                for tf in list(loops):
+                    if tf not in timeframes:
+                        loops.pop(tf)[0].cancel()
                 for tf in timeframes:
-                    # Update & Fetch
-                    # We rely on Analyzer's adapter which uses CCXT
-                    # Note: Analyzer instance persists, so CCXT connection is reused
-                    
-                    try:
-                        # Force update cache first (this handles API calls)
-                        await analyzer.adapter.update_cache(symbol, tf)
-                        
-                        stats = await analyzer.get_stats(symbol, tf)
-                        if not stats: continue
-                        
-                        streak = stats['current_streak']
-                        length = streak['length']
-                        s_type = streak['type']
-                        
-                        key = f"{symbol}_{tf}"
-                        prev_len = last_alerted.get(key, 0)
-                        
-                        # Reset
-                        if length < prev_len:
-                            last_alerted[key] = 0
-                            prev_len = 0
-                            
-                        # Alert Condition
-                        if length >= threshold and length > prev_len:
-                            emoji = "\U0001F7E2" if s_type == 'green' else "\U0001F534"
-                            comment = get_emotional_comment(length)
-                            
-                            msg = (
-                                f"{emoji} <b>{symbol} {tf} Streak: {length}</b>\n"
-                                f"{comment}\n"
-                                f"<i>Previous record: {prev_len}</i>"
-                            )
-                            
-                            logger.info(f"Triggering alert for {symbol} {tf} (Len: {length})")
-                            await send_telegram_msg(token, chat_id, msg)
-                            
-                            last_alerted[key] = length
-                            
-                    except Exception as loop_e:
-                        logger.error(f"Error processing {symbol} {tf}: {loop_e}")
-                        
-                    # Slow down to be nice to APIs
-                    await asyncio.sleep(1)
-            
-            logger.info("Cycle complete. Sleeping 30s...")
-            await asyncio.sleep(30)
-            
-        except KeyboardInterrupt:
-            break
-        except Exception as main_e:
-            logger.critical(f"Main loop crash: {main_e}")
-            await asyncio.sleep(60) # Wait a minute before restart
-            
-    await analyzer.close()
+                    if tf in loops:
+                        # Re-evaluate now with the new symbols/threshold
+                        loops[tf][1].set()
+                    else:
+                        wake = asyncio.Event()
+                        task = asyncio.create_task(
+                            timeframe_loop(tf, wake, analyzer, semaphore, token, chat_id, engine, freshness)
+                        )
+                        loops[tf] = (task, wake)
+            await asyncio.sleep(SETTINGS_POLL)
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    finally:
+        for task, _ in loops.values():
+            task.cancel()
+        if scheduler_task is not None:
+            scheduler_task.cancel()
+        if _delivery is not None:
+            await _delivery.close()
+        await analyzer.close()
+        shared.close()
 
 if __name__ == "__main__":
     asyncio.run(main())